@@ -3,11 +3,47 @@ AivisSpeech API サーバーのエントリーポイント
 
 FastAPIアプリケーションを初期化し、各種ルーターを登録する
 """
+from contextlib import asynccontextmanager
+from typing import AsyncIterator
+
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 
 from config import settings, logger
+from middleware.server_timing import ServerTimingMiddleware
 from routers import health, speech, dictionary, llm, sentiment
+from services.audio import shutdown_audio_encoder
+from services.engine import get_engine_health_monitor, get_speaker_residency
+from services.speech import get_aivis_client, close_aivis_client, get_filler_pool, get_prewarmer
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI) -> AsyncIterator[None]:
+    """
+    アプリケーションの起動・終了時の処理を行う。
+
+    AivisSpeech Engine用のクライアント（共有接続プール）を起動時に一度だけ生成し、
+    終了時に接続とエンコード用のワーカープロセスを閉じる。エンジンの死活監視、
+    設定された話者のエンジンでの初期化、マニフェストの定型文とつなぎの音声の事前合成は
+    バックグラウンドで行う。
+    """
+    app.state.aivis_client = get_aivis_client()
+    logger.info(f"AivisSpeech Engineクライアントを初期化しました: {app.state.aivis_client.base_url}")
+    app.state.speaker_residency = get_speaker_residency()
+    app.state.speaker_residency.start()
+    app.state.engine_health_monitor = get_engine_health_monitor()
+    app.state.engine_health_monitor.start()
+    app.state.prewarmer.start()
+    app.state.filler_pool = get_filler_pool()
+    if settings.tts_filler_budget_ms > 0:
+        app.state.filler_pool.start()
+    yield
+    await app.state.filler_pool.stop()
+    await app.state.prewarmer.stop()
+    await app.state.engine_health_monitor.stop()
+    await app.state.speaker_residency.stop()
+    await close_aivis_client()
+    shutdown_audio_encoder()
 
 
 def create_application() -> FastAPI:
@@ -24,9 +60,19 @@ def create_application() -> FastAPI:
         version=settings.api_version,
         docs_url=settings.docs_url,
         redoc_url=settings.redoc_url,
-        openapi_url=settings.openapi_url
+        openapi_url=settings.openapi_url,
+        lifespan=lifespan
     )
     
+    # 起動時に事前合成する定型文のマニフェストを読み込む
+    app.state.prewarmer = get_prewarmer()
+    if settings.tts_prewarm_enabled:
+        app.state.prewarmer.load(settings.tts_prewarm_manifest)
+
+    # 処理段階ごとの所要時間を Server-Timing ヘッダーで返す
+    if settings.server_timing_enabled:
+        app.add_middleware(ServerTimingMiddleware, allow_origin=settings.server_timing_allow_origin or None)
+
     # CORSの設定
     app.add_middleware(
         CORSMiddleware,
@@ -34,6 +80,7 @@ def create_application() -> FastAPI:
         allow_credentials=settings.cors_allow_credentials,
         allow_methods=settings.cors_allow_methods,
         allow_headers=settings.cors_allow_headers,
+        expose_headers=settings.cors_expose_headers,
     )
     
     # ルーターの登録
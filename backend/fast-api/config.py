@@ -5,7 +5,7 @@ AivisSpeech API サーバーの設定モジュール
 """
 import os
 import logging
-from typing import List
+from typing import List, Optional
 from dotenv import load_dotenv
 
 # .envファイルから環境変数を読み込む
@@ -35,14 +35,133 @@ class Settings:
         """
         環境変数から設定を読み込み、デフォルト値がある場合は適用する。
         """
-        # AivisSpeech EngineのベースURL
-        self.aivis_base_url: str = os.getenv("AIVIS_ENGINE_URL", "http://aivis:10101")
-        
+        # AivisSpeech EngineのベースURL（カンマ区切りで複数指定すると負荷分散する）
+        self.aivis_base_urls: List[str] = [
+            url.strip() for url in os.getenv("AIVIS_ENGINE_URL", "http://aivis:10101").split(",") if url.strip()
+        ]
+        self.aivis_base_url: str = self.aivis_base_urls[0]
+        self.aivis_failure_threshold: int = int(os.getenv("AIVIS_FAILURE_THRESHOLD", "3"))
+        self.aivis_ejection_seconds: float = float(os.getenv("AIVIS_EJECTION_SECONDS", "30.0"))
+        self.aivis_max_ejection_seconds: float = float(os.getenv("AIVIS_MAX_EJECTION_SECONDS", "300.0"))
+
+        # AivisSpeech Engineへの接続プール・タイムアウト設定
+        self.aivis_connect_timeout: float = float(os.getenv("AIVIS_CONNECT_TIMEOUT", "3.0"))
+        self.aivis_read_timeout: float = float(os.getenv("AIVIS_READ_TIMEOUT", "60.0"))
+        self.aivis_max_connections: int = int(os.getenv("AIVIS_MAX_CONNECTIONS", "64"))
+        self.aivis_max_keepalive_connections: int = int(os.getenv("AIVIS_MAX_KEEPALIVE_CONNECTIONS", "32"))
+        self.aivis_keepalive_expiry: float = float(os.getenv("AIVIS_KEEPALIVE_EXPIRY", "30.0"))
+
+        # エンジンへのリクエストの優先度付き待ち行列とサーキットブレーカーの設定
+        self.engine_max_concurrency: int = int(os.getenv("ENGINE_MAX_CONCURRENCY", "8"))
+        self.engine_max_concurrency_normal: int = int(os.getenv("ENGINE_MAX_CONCURRENCY_NORMAL", "6"))
+        self.engine_max_concurrency_background: int = int(os.getenv("ENGINE_MAX_CONCURRENCY_BACKGROUND", "2"))
+        self.engine_priority_aging_seconds: float = float(os.getenv("ENGINE_PRIORITY_AGING_SECONDS", "5.0"))
+        self.engine_max_queue: int = int(os.getenv("ENGINE_MAX_QUEUE", "64"))
+        self.engine_queue_wait_default: float = float(os.getenv("ENGINE_QUEUE_WAIT_DEFAULT", "10.0"))
+        self.engine_queue_wait_tts: float = float(os.getenv("ENGINE_QUEUE_WAIT_TTS", "3.0"))
+        self.engine_queue_wait_synthesis: float = float(os.getenv("ENGINE_QUEUE_WAIT_SYNTHESIS", "3.0"))
+        self.engine_queue_wait_batch: float = float(os.getenv("ENGINE_QUEUE_WAIT_BATCH", "30.0"))
+        self.engine_breaker_failure_threshold: int = int(os.getenv("ENGINE_BREAKER_FAILURE_THRESHOLD", "5"))
+        self.engine_breaker_reset_timeout: float = float(os.getenv("ENGINE_BREAKER_RESET_TIMEOUT", "10.0"))
+
+        # 合成音声キャッシュの設定
+        self.audio_cache_enabled: bool = os.getenv("AUDIO_CACHE_ENABLED", "true").lower() == "true"
+        self.audio_cache_dir: str = os.getenv(
+            "AUDIO_CACHE_DIR",
+            os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "audio_cache")
+        )
+        self.audio_cache_memory_bytes: int = int(os.getenv("AUDIO_CACHE_MEMORY_BYTES", str(64 * 1024 * 1024)))
+        self.audio_cache_disk_bytes: int = int(os.getenv("AUDIO_CACHE_DISK_BYTES", str(1024 * 1024 * 1024)))
+        self.audio_cache_eviction_window: int = int(os.getenv("AUDIO_CACHE_EVICTION_WINDOW", "8"))
+        self.audio_query_cache_size: int = int(os.getenv("AUDIO_QUERY_CACHE_SIZE", "2048"))
+        self.engine_fingerprint_ttl: float = float(os.getenv("ENGINE_FINGERPRINT_TTL", "60.0"))
+
+        # 合成音声の先頭の無音の除去（再生開始までの時間を短縮する）
+        self.tts_trim_leading_silence: bool = os.getenv("TTS_TRIM_LEADING_SILENCE", "true").lower() == "true"
+        self.tts_silence_threshold_db: float = float(os.getenv("TTS_SILENCE_THRESHOLD_DB", "-50.0"))
+        self.tts_silence_padding_ms: float = float(os.getenv("TTS_SILENCE_PADDING_MS", "20.0"))
+
+        # 音声ファイルで口形のタイムラインを返す X-TTS-Visemes ヘッダーの上限（バイト数）
+        # プロキシやHTTPクライアントのヘッダーの上限（4〜16KB程度）に収まるよう、超える場合は413を返す
+        self.tts_viseme_header_max_bytes: int = int(os.getenv("TTS_VISEME_HEADER_MAX_BYTES", "4096"))
+
+        # 圧縮形式（ogg, mp3, flac）へのエンコードと低帯域プロファイルの設定
+        self.audio_encoder_workers: int = int(os.getenv("AUDIO_ENCODER_WORKERS", "2"))
+        self.tts_low_bandwidth_sampling_rate: int = int(os.getenv("TTS_LOW_BANDWIDTH_SAMPLING_RATE", "24000"))
+
+        # 起動時に合成しておく定型文の設定
+        self.tts_prewarm_enabled: bool = os.getenv("TTS_PREWARM_ENABLED", "true").lower() == "true"
+        self.tts_prewarm_manifest: str = os.getenv(
+            "TTS_PREWARM_MANIFEST",
+            os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "prewarm.json")
+        )
+        self.tts_prewarm_retry_seconds: float = float(os.getenv("TTS_PREWARM_RETRY_SECONDS", "5.0"))
+        self.tts_prewarm_max_attempts: int = int(os.getenv("TTS_PREWARM_MAX_ATTEMPTS", "3"))
+
+        # 起動時にエンジンへ読み込ませておく話者の設定（カンマ区切りの話者ID）
+        self.engine_init_speakers: List[int] = [
+            int(speaker) for speaker in os.getenv("ENGINE_INIT_SPEAKERS", "888753760").split(",") if speaker.strip()
+        ]
+        self.engine_init_retry_seconds: float = float(os.getenv("ENGINE_INIT_RETRY_SECONDS", "10.0"))
+        self.engine_init_max_attempts: int = int(os.getenv("ENGINE_INIT_MAX_ATTEMPTS", "3"))
+
+        # エンジンの死活監視の設定（間隔を0にすると監視しない）
+        self.engine_health_interval: float = float(os.getenv("ENGINE_HEALTH_INTERVAL", "5.0"))
+        self.engine_health_timeout: float = float(os.getenv("ENGINE_HEALTH_TIMEOUT", "2.0"))
+
+        # 話者一覧とユーザー辞書の応答を保持する秒数（0にすると保持しない）
+        self.engine_metadata_cache_ttl: float = float(os.getenv("ENGINE_METADATA_CACHE_TTL", "300.0"))
+
+        # 応答前にクライアントが切断した合成の扱い
+        # demote: キャッシュに格納するため background の優先度で続行する（キャッシュ無効時は中止）
+        # cancel: エンジンへのリクエストを中止する
+        self.tts_disconnect_action: str = os.getenv("TTS_DISCONNECT_ACTION", "demote").lower()
+
+        # 複数の文からなるテキストを文ごとに合成・キャッシュして連結するかどうか
+        self.tts_segment_cache_enabled: bool = os.getenv("TTS_SEGMENT_CACHE_ENABLED", "true").lower() == "true"
+
+        # 文単位のストリーミング音声合成の設定
+        self.tts_stream_concurrency: int = int(os.getenv("TTS_STREAM_CONCURRENCY", "3"))
+
+        # 最初の文の合成がこの時間（ミリ秒）を超える場合は、先につなぎの音声を流す（0にすると流さない）
+        self.tts_filler_budget_ms: float = float(os.getenv("TTS_FILLER_BUDGET_MS", "0"))
+        # つなぎの文言（カンマ区切り、ENGINE_INIT_SPEAKERS の話者で起動時に合成する）
+        self.tts_filler_texts: List[str] = [
+            text.strip() for text in os.getenv("TTS_FILLER_TEXTS", "えーと…,えっと、,うーんと…").split(",") if text.strip()
+        ]
+
+        # WebSocketでの音声合成の設定
+        self.tts_ws_concurrency: int = int(os.getenv("TTS_WS_CONCURRENCY", "3"))
+        self.tts_ws_max_pending: int = int(os.getenv("TTS_WS_MAX_PENDING", "32"))
+
+        # 一括音声合成の設定
+        self.tts_batch_concurrency: int = int(os.getenv("TTS_BATCH_CONCURRENCY", "4"))
+        self.tts_batch_max_items: int = int(os.getenv("TTS_BATCH_MAX_ITEMS", "500"))
+        self.tts_batch_group_size: int = int(os.getenv("TTS_BATCH_GROUP_SIZE", "8"))
+        self.aivis_use_multi_synthesis: bool = os.getenv("AIVIS_USE_MULTI_SYNTHESIS", "true").lower() == "true"
+
+        # LLMの回答のストリームから文を先回りして合成する設定
+        # 話者IDは /api/llm/voice_mode_answer の speaker_id、省略時は TTS_SPECULATIVE_SPEAKER_ID を使う
+        self.tts_speculative_enabled: bool = os.getenv("TTS_SPECULATIVE_ENABLED", "false").lower() == "true"
+        self.tts_speculative_speaker_id: Optional[int] = (
+            int(os.getenv("TTS_SPECULATIVE_SPEAKER_ID")) if os.getenv("TTS_SPECULATIVE_SPEAKER_ID") else None
+        )
+        self.tts_speculative_max_jobs: int = int(os.getenv("TTS_SPECULATIVE_MAX_JOBS", "8"))
+        self.tts_speculative_max_sentences: int = int(os.getenv("TTS_SPECULATIVE_MAX_SENTENCES", "12"))
+
         # CORSの設定
         self.cors_origins: List[str] = os.getenv("CORS_ORIGINS", "*").split(",")
         self.cors_allow_credentials: bool = os.getenv("CORS_ALLOW_CREDENTIALS", "True").lower() == "true"
         self.cors_allow_methods: List[str] = os.getenv("CORS_ALLOW_METHODS", "*").split(",")
         self.cors_allow_headers: List[str] = os.getenv("CORS_ALLOW_HEADERS", "*").split(",")
+        # ブラウザから読み取れるようにするレスポンスヘッダー（口形のタイムラインなど）
+        self.cors_expose_headers: List[str] = os.getenv(
+            "CORS_EXPOSE_HEADERS", "X-TTS-Cache,X-TTS-Visemes,X-TTS-Filler-Ms,Server-Timing"
+        ).split(",")
+
+        # 処理段階ごとの所要時間を返す Server-Timing ヘッダーの設定
+        self.server_timing_enabled: bool = os.getenv("SERVER_TIMING_ENABLED", "true").lower() == "true"
+        self.server_timing_allow_origin: str = os.getenv("SERVER_TIMING_ALLOW_ORIGIN", "*")
         
         # FastAPIの設定
         self.api_title: str = os.getenv("API_TITLE", "AivisSpeech API")
@@ -0,0 +1,66 @@
+"""
+Server-Timing ヘッダーを付与するミドルウェア
+
+リクエストごとに処理段階の所要時間の記録先を用意し、記録があればレスポンスに
+Server-Timing ヘッダーを付ける。音声合成のリクエストでは、レスポンスの送信に
+要した時間（response_write）もヒストグラムに記録する。
+"""
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+from services.speech.stage_timing import RequestTimings, current_timings, get_stage_metrics, UNKNOWN
+
+
+class ServerTimingMiddleware:
+    """処理段階の所要時間を Server-Timing ヘッダーで返すASGIミドルウェア"""
+
+    def __init__(self, app: Any, allow_origin: Optional[str] = "*"):
+        """
+        Args:
+            app: ASGIアプリケーション
+            allow_origin: Timing-Allow-Origin ヘッダーの値（Noneの場合は付けない）
+        """
+        self.app = app
+        self.allow_origin = allow_origin
+
+    async def __call__(self, scope: Dict[str, Any], receive: Any, send: Any) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        timings = RequestTimings()
+        token = current_timings.set(timings)
+        started = time.perf_counter()
+        write_started: Optional[float] = None
+        body_bytes = 0
+
+        async def send_with_timing(message: Dict[str, Any]) -> None:
+            nonlocal write_started, body_bytes
+            if message["type"] == "http.response.start":
+                write_started = time.perf_counter()
+                if timings.stages:
+                    headers: List[Tuple[bytes, bytes]] = list(message.get("headers", []))
+                    value = timings.server_timing(write_started - started)
+                    headers.append((b"server-timing", value.encode("latin-1")))
+                    if self.allow_origin:
+                        headers.append((b"timing-allow-origin", self.allow_origin.encode("latin-1")))
+                    message = {**message, "headers": headers}
+            elif message["type"] == "http.response.body":
+                body_bytes += len(message.get("body", b""))
+                if not message.get("more_body", False) and write_started is not None:
+                    self._observe_write(timings, time.perf_counter() - write_started, body_bytes)
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            current_timings.reset(token)
+
+    @staticmethod
+    def _observe_write(timings: RequestTimings, seconds: float, size: int) -> None:
+        """音声合成のリクエストであれば、レスポンスの送信時間を記録する"""
+        if timings.speaker_id is None:
+            return
+        get_stage_metrics().observe(
+            "response_write", timings.speaker_id, timings.text_length or UNKNOWN, seconds, size
+        )
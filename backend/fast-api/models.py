@@ -4,7 +4,9 @@ AivisSpeech API サーバーのデータモデル
 リクエストとレスポンスのデータ構造を定義する。
 """
 from pydantic import BaseModel, Field
-from typing import Dict, Any, Literal, Optional, List, Union
+from typing import Dict, Any, Literal, Optional, List, Tuple, Union
+
+from config import settings
 
 # 音声合成リクエストモデル
 class TextRequest(BaseModel):
@@ -25,22 +27,108 @@ class TTSRequest(BaseModel):
     """テキストから直接音声を生成するワンステップ用のリクエストモデル"""
     text: str = Field(..., description="合成したいテキスト", example="こんにちは、世界")
     speaker_id: int = Field(888753760, description="話者ID。/speakers で取得可能")
-    format: Literal["wav", "base64"] = Field(
+    format: Literal["wav", "base64", "ogg", "mp3", "flac"] = Field(
         "wav", 
-        description="出力形式。wav: 音声ファイル、base64: Base64エンコード"
+        description="出力形式。wav: 音声ファイル、base64: Base64エンコード、ogg: Ogg Opus、mp3: MP3、flac: FLAC"
+    )
+    delivery: Literal["inline", "url"] = Field(
+        "inline",
+        description="返し方。inline: 音声データをそのまま返す、url: キャッシュ済み音声のURL（/audio/{sha256}.{形式}）を返す"
+    )
+    visemes: bool = Field(
+        False,
+        description=(
+            "口パク用の口形（母音）のタイムラインも返す。wav などの音声ファイルでは X-TTS-Visemes ヘッダーで返す"
+            "（ヘッダーが TTS_VISEME_HEADER_MAX_BYTES を超える場合は413。長いテキストは base64 または delivery=url を使う）"
+        )
+    )
+    profile: Literal["standard", "low_bandwidth"] = Field(
+        "standard",
+        description="音質プロファイル。low_bandwidth: サンプリングレートを下げたモノラル音声を合成する"
+    )
+    speed_scale: Optional[float] = Field(
+        None, ge=0.5, le=2.0, description="話速（audio_queryのspeedScaleを上書き）"
+    )
+    pitch_scale: Optional[float] = Field(
+        None, ge=-0.15, le=0.15, description="音高（audio_queryのpitchScaleを上書き）"
+    )
+    intonation_scale: Optional[float] = Field(
+        None, ge=0.0, le=2.0, description="抑揚（audio_queryのintonationScaleを上書き）"
+    )
+    volume_scale: Optional[float] = Field(
+        None, ge=0.0, le=2.0, description="音量（audio_queryのvolumeScaleを上書き）"
+    )
+
+    def query_overrides(self) -> Optional[Dict[str, Any]]:
+        """
+        指定されたパラメータをaudio_queryのキー名で返す
+
+        Returns:
+            Optional[Dict[str, Any]]: 上書きするパラメータ（指定がなければNone）。
+                low_bandwidth プロファイルでは outputSamplingRate と outputStereo を含む
+        """
+        overrides = {
+            "speedScale": self.speed_scale,
+            "pitchScale": self.pitch_scale,
+            "intonationScale": self.intonation_scale,
+            "volumeScale": self.volume_scale,
+        }
+        overrides = {name: value for name, value in overrides.items() if value is not None}
+        if self.profile == "low_bandwidth":
+            overrides["outputSamplingRate"] = settings.tts_low_bandwidth_sampling_rate
+            overrides["outputStereo"] = False
+        return overrides or None
+
+class TTSBatchItem(BaseModel):
+    """一括音声合成の1件分"""
+    text: str = Field(..., description="合成したいテキスト")
+    speaker_id: int = Field(888753760, description="話者ID。/speakers で取得可能")
+
+
+class TTSBatchRequest(BaseModel):
+    """一括音声合成のリクエストモデル"""
+    items: List[TTSBatchItem] = Field(..., description="合成するテキストと話者IDのリスト")
+    format: Literal["ndjson", "zip"] = Field(
+        "ndjson",
+        description="出力形式。ndjson: Base64音声を1行ずつ、zip: WAVファイルをまとめたZIP"
+    )
+    concurrency: Optional[int] = Field(
+        None, ge=1, description="エンジンへの同時リクエスト数（省略時は設定値、設定値が上限）"
     )
 
+
 class AudioBase64Response(BaseModel):
     """Base64エンコードされた音声データのレスポンスモデル"""
     base64_audio: str = Field(..., description="Base64エンコードされた音声データ")
     content_type: str = Field("audio/wav", description="音声のMIMEタイプ")
+    visemes: Optional[List[Tuple[str, int, int]]] = Field(
+        None, description="口形のタイムライン（[口形, 開始ミリ秒, 終了ミリ秒] のリスト）"
+    )
+
+
+class AudioURLResponse(BaseModel):
+    """キャッシュ済み音声のURLのレスポンスモデル"""
+    url: str = Field(..., description="音声のURL（内容のハッシュを含み、内容は変わらない）")
+    sha256: str = Field(..., description="音声データのSHA-256（ETagと同じ値）")
+    content_type: str = Field(..., description="音声のMIMEタイプ")
+    size: int = Field(..., description="音声データのバイト数")
+    cached: bool = Field(..., description="合成結果がキャッシュにあったかどうか")
+    visemes: Optional[List[Tuple[str, int, int]]] = Field(
+        None, description="口形のタイムライン（[口形, 開始ミリ秒, 終了ミリ秒] のリスト）"
+    )
 
 
 class StatusResponse(BaseModel):
     """システムステータスのレスポンスモデル"""
-    status: str = Field(..., description="ステータス（ok または error）")
+    status: str = Field(..., description="ステータス（ok、error、または未確認の場合は unknown）")
     message: str = Field(..., description="ステータスメッセージ")
-    engine_info: Optional[Dict[str, Any]] = Field(None, description="エンジン情報（存在する場合）")
+    engine_info: Optional[Dict[str, Any]] = Field(
+        None, description="エンジン情報（バージョン、応答時間、最後に成功した時刻。存在する場合）"
+    )
+    engines: Optional[List[Dict[str, Any]]] = Field(None, description="エンジンごとの死活監視の結果")
+    warmup: Optional[Dict[str, Any]] = Field(None, description="定型文の事前合成の進捗")
+    speakers: Optional[Dict[str, Any]] = Field(None, description="エンジンでの話者の初期化状態")
+    filler: Optional[Dict[str, Any]] = Field(None, description="つなぎの音声の保持数と利用状況")
 
 
 class SentimentRequest(BaseModel):
@@ -3,7 +3,7 @@ AivisSpeech API サーバーのユーザー辞書関連のエンドポイント
 
 ユーザー辞書に関するエンドポイントを提供する。
 """
-from fastapi import APIRouter
+from fastapi import APIRouter, Request, Response
 from typing import Dict, Any
 
 import services
@@ -11,12 +11,23 @@ import services
 router = APIRouter(tags=["dictionary"])
 
 # /user_dict エンドポイントの定義
-@router.get("/user_dict", summary="ユーザー辞書の取得")
-async def get_user_dict() -> Dict[str, Any]:
+@router.get("/user_dict", summary="ユーザー辞書の取得", response_model=Dict[str, Any])
+async def get_user_dict(request: Request) -> Response:
     """
     AivisSpeech Engineに登録されているユーザー辞書を取得する。
+
+    辞書はメモリに保持し、有効期限を過ぎるとバックグラウンドで取得し直す。
+    ETag による再検証（If-None-Match で304）と gzip に対応する。
     
+    Args:
+        request: リクエスト（If-None-Match と Accept-Encoding を参照する）
+
     Returns:
-        Dict[str, Any]: ユーザー辞書データ
+        Response: ユーザー辞書データ（JSON）または304
     """
-    return services.get_user_dict()
\ No newline at end of file
+    return await services.get_cached_json_response(
+        "user_dict",
+        services.get_user_dict,
+        if_none_match=request.headers.get("if-none-match"),
+        accept_encoding=request.headers.get("accept-encoding")
+    )
\ No newline at end of file
@@ -4,7 +4,8 @@ AivisSpeech API サーバーのヘルスチェック関連のエンドポイン
 サーバーとAivisSpeech Engineの状態を確認するためのエンドポイントを提供する。
 """
 from fastapi import APIRouter
-from typing import Dict, Any
+from fastapi.responses import PlainTextResponse
+from typing import Dict, Any, List
 
 import services
 from models import StatusResponse
@@ -27,10 +28,62 @@ async def root() -> Dict[str, str]:
 @router.get("/status", summary="AivisSpeech Engineの状態確認", response_model=StatusResponse)
 async def status() -> Dict[str, Any]:
     """
-    AivisSpeech Engineの状態を確認する。
+    AivisSpeech Engineの状態、話者の初期化状態、定型文の事前合成の進捗、
+    つなぎの音声の利用状況を確認する。
+    エンジンの状態はバックグラウンドの死活監視で最後に確認したもので、
+    このエンドポイント自体はエンジンへ問い合わせない。
     
     Returns:
         Dict[str, Any]: エンジンの状態情報を含むレスポンス
     """
-    success, response_data = services.get_engine_version()
-    return response_data
\ No newline at end of file
+    return {
+        **services.get_engine_health(),
+        "speakers": services.get_speaker_residency_status(),
+        "warmup": services.get_prewarm_status(),
+        "filler": services.get_filler_status(),
+    }
+
+
+@router.get("/status/engines", summary="AivisSpeech Engineごとの振り分け状態")
+async def engine_pool_status() -> List[Dict[str, Any]]:
+    """
+    負荷分散対象の各AivisSpeech Engineの状態を確認する。
+    
+    Returns:
+        List[Dict[str, Any]]: エンジンごとの処理中のリクエスト数、失敗数、除外状態
+    """
+    return services.get_engine_pool_status()
+
+
+@router.get("/status/admission", summary="AivisSpeech Engineへのリクエストの混雑状況")
+async def engine_admission_status() -> Dict[str, Any]:
+    """
+    AivisSpeech Engineへのリクエストの待ち行列とサーキットブレーカーの状態を確認する。
+    
+    Returns:
+        Dict[str, Any]: 実行中の数、待ち行列の長さ、待ち時間、拒否数、ブレーカーの状態
+    """
+    return services.get_engine_admission_status()
+
+
+@router.get("/status/metadata_cache", summary="話者一覧とユーザー辞書のキャッシュの状態")
+async def metadata_cache_status() -> Dict[str, Any]:
+    """
+    メモリに保持している話者一覧とユーザー辞書の状態を確認する。
+    
+    Returns:
+        Dict[str, Any]: 有効期限、保持している応答のETagと経過時間、ヒット数、エンジンからの取得回数
+    """
+    return services.get_metadata_cache_stats()
+
+
+@router.get("/metrics", summary="Prometheus形式のメトリクス", response_class=PlainTextResponse)
+async def metrics() -> PlainTextResponse:
+    """
+    音声合成の処理段階（audio_query、合成、エンコード、Base64化、レスポンスの送信など）ごとの
+    所要時間と生成したバイト数のヒストグラムを、話者IDとテキスト長の区分ごとに返す。
+
+    Returns:
+        PlainTextResponse: Prometheusのテキスト形式のメトリクス
+    """
+    return PlainTextResponse(services.render_metrics(), media_type="text/plain; version=0.0.4")
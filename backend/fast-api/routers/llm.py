@@ -11,6 +11,7 @@ import json
 import asyncio
 from datetime import datetime
 
+import services
 from config import settings, logger
 
 router = APIRouter(
@@ -24,6 +25,7 @@ class QueryRequest(BaseModel):
     context: Optional[Dict[str, Any]] = None # 追加のコンテキスト情報(オプション)
     language: Optional[str] = None # 応答言語
     stream: Optional[bool] = True  # ストリーミングオプション
+    speaker_id: Optional[int] = None  # 回答を読み上げる話者ID（音声モードで回答の文を先回りして合成する）
 
 class QueryResponse(BaseModel):
     """LLMからの応答モデル（非ストリーミング用）"""
@@ -249,6 +251,9 @@ async def process_query(request: QueryRequest):
 async def process_voice_mode_answer(request: QueryRequest):
     """
     音声モード用の処理
+
+    先回りの音声合成が有効な場合は、回答のストリームから完結した文を speaker_id の話者で
+    合成しておき、続く /tts の待ち時間を短くする。
     """
     try:
         inputs = {
@@ -258,11 +263,16 @@ async def process_voice_mode_answer(request: QueryRequest):
         
         # ストリーミングが有効な場合はストリーミングレスポンスを返す
         if request.stream:
+            stream = stream_dify_response(
+                settings.dify_voice_workflow_id or settings.dify_workflow_id,
+                inputs
+            )
+            # 後から届く /tts がキャッシュヒットするよう、完結した文から合成を始める
+            speaker_id = services.resolve_speculative_speaker(request.speaker_id)
+            if speaker_id is not None:
+                stream = services.speculate_from_stream(stream, speaker_id)
             return StreamingResponse(
-                stream_dify_response(
-                    settings.dify_voice_workflow_id or settings.dify_workflow_id,
-                    inputs
-                ),
+                stream,
                 media_type="text/event-stream",
                 headers={
                     "Cache-Control": "no-cache",
@@ -3,29 +3,56 @@ AivisSpeech API サーバーの音声合成関連のエンドポイント
 
 音声合成に関するエンドポイントを提供する。
 """
-from fastapi import APIRouter, Response
+from fastapi import APIRouter, Depends, HTTPException, Request, Response, WebSocket, status
+from fastapi.responses import StreamingResponse
 from typing import Dict, Any, List, Union
 
 import services
-from models import TextRequest, AudioQueryRequest, TTSRequest, AudioBase64Response
+from config import settings
+from models import (
+    TextRequest, AudioQueryRequest, TTSRequest, TTSBatchRequest, AudioBase64Response, AudioURLResponse
+)
 
 
 # APIルートを作成
 router = APIRouter(tags=["speech"])
 
+# ルートごとのエンジンへのリクエストの優先度と待ち時間の上限
+# 対話中の発話（/tts, /tts/stream, /ws/tts）を最優先し、一括合成は後回しにする
+tts_policy = Depends(services.engine_request_policy(
+    services.Priority.INTERACTIVE, settings.engine_queue_wait_tts
+))
+synthesis_policy = Depends(services.engine_request_policy(
+    services.Priority.NORMAL, settings.engine_queue_wait_synthesis
+))
+batch_policy = Depends(services.engine_request_policy(
+    services.Priority.BACKGROUND, settings.engine_queue_wait_batch
+))
 
-@router.get("/speakers", summary="話者一覧の取得")
-async def get_speakers() -> List[Dict[str, Any]]:
+
+@router.get("/speakers", summary="話者一覧の取得", response_model=List[Dict[str, Any]])
+async def get_speakers(request: Request) -> Response:
     """
     利用可能な話者（スピーカー）の一覧を取得する。
+
+    一覧はメモリに保持し、有効期限を過ぎるとバックグラウンドで取得し直す。
+    ETag による再検証（If-None-Match で304）と gzip に対応する。
     
+    Args:
+        request: リクエスト（If-None-Match と Accept-Encoding を参照する）
+
     Returns:
-        List[Dict[str, Any]]: 利用可能な話者の一覧
+        Response: 利用可能な話者の一覧（JSON）または304
     """
-    return services.get_speakers()
+    return await services.get_cached_json_response(
+        "speakers",
+        services.get_speakers,
+        if_none_match=request.headers.get("if-none-match"),
+        accept_encoding=request.headers.get("accept-encoding")
+    )
 
 
-@router.post("/audio_query", summary="音声合成用のクエリを作成")
+@router.post("/audio_query", summary="音声合成用のクエリを作成", dependencies=[synthesis_policy])
 async def create_audio_query(request: TextRequest) -> Dict[str, Any]:
     """
     テキストから音声合成用のクエリを作成する。
@@ -36,10 +63,10 @@ async def create_audio_query(request: TextRequest) -> Dict[str, Any]:
     Returns:
         Dict[str, Any]: 音声合成用のクエリデータ
     """
-    return services.create_audio_query(request.text, request.speaker_id)
+    return await services.create_audio_query(request.text, request.speaker_id)
 
 
-@router.post("/synthesis", summary="音声合成の実行")
+@router.post("/synthesis", summary="音声合成の実行", dependencies=[synthesis_policy])
 async def synthesis(request: AudioQueryRequest) -> Response:
     """
     audio_queryを使用して音声を合成する。
@@ -50,25 +77,183 @@ async def synthesis(request: AudioQueryRequest) -> Response:
     Returns:
         Response: 合成された音声データ（WAVファイル）
     """
-    audio_content = services.synthesize_speech(request.query, request.speaker_id)
+    audio_content = await services.synthesize_speech(request.query, request.speaker_id)
     return services.get_wav_response(audio_content)
 
 
-@router.post("/tts", summary="テキストから音声を直接生成", response_model=None)
+@router.post("/tts", summary="テキストから音声を直接生成", response_model=None, dependencies=[tts_policy])
 async def text_to_speech(
-    request: TTSRequest
-) -> Union[Response, AudioBase64Response]:
+    request: TTSRequest,
+    http_request: Request
+) -> Union[Response, AudioBase64Response, AudioURLResponse]:
     """
     テキストから直接音声を生成するワンステップAPIエンドポイント。
     フォーマットを指定して異なる形式で受け取ることができます。
+    speed_scale などを指定すると、キャッシュ済みのaudio_queryを上書きして
+    再合成するため、同じ発話の速さ違いなどを合成処理のみで生成できます。
+    profile に low_bandwidth を指定すると、サンプリングレートを下げたモノラル音声を
+    合成します。ogg と組み合わせると通信量を大きく抑えられます。
+    delivery に url を指定すると、音声の代わりに /audio/{sha256}.{形式} のURLを返します。
+    URLの内容は変わらないため、ブラウザやプロキシのキャッシュで再生し直しやシークができます。
+    visemes に true を指定すると、口パク用の口形（母音）のタイムラインを
+    [口形, 開始ミリ秒, 終了ミリ秒] のリストで合わせて返します。音声ファイルでは
+    X-TTS-Visemes ヘッダーで返すため、TTS_VISEME_HEADER_MAX_BYTES（既定4096バイト）を
+    超える場合は413を返します。長いテキストは base64 または delivery に url を指定してください。
+    応答前にクライアントが切断した場合は合成を中止します（キャッシュが有効な場合は
+    低い優先度で合成を続け、結果をキャッシュに格納します）。
 
     Args:
         request: テキスト、話者ID、出力フォーマットを含むリクエスト
+        http_request: 切断を監視するHTTPリクエスト
 
     Returns:
-        Union[Response, AudioBase64Response]:
+        Union[Response, AudioBase64Response, AudioURLResponse]:
             指定されたフォーマットの音声データ
             - wav: 直接ダウンロード可能な音声ファイル
             - base64: Base64エンコードされたJSON
+            - ogg / mp3 / flac: 圧縮形式の音声ファイル（変換結果もキャッシュされる）
+            delivery が url の場合は音声のURLを含むJSON
+            visemes が true の場合、JSONでは visemes フィールド、音声ファイルでは
+            X-TTS-Visemes ヘッダーに口形のタイムラインを含む
+    """
+    return await services.run_until_disconnected(http_request, services.text_to_speech(
+        request.text,
+        request.speaker_id,
+        request.format,
+        query_overrides=request.query_overrides(),
+        delivery=request.delivery,
+        include_visemes=request.visemes
+    ))
+
+
+@router.api_route("/audio/{name}", methods=["GET", "HEAD"], summary="キャッシュ済み音声の取得")
+async def get_published_audio(name: str, request: Request) -> Response:
+    """
+    /tts で delivery に url を指定して得たURLの音声を返す。
+
+    内容のハッシュをファイル名とするため、Cache-Control は immutable で、
+    ETag は内容のSHA-256になる。Range リクエストによる部分取得（シーク）と
+    If-None-Match による再検証に対応する。エンジンへのリクエストは発生しない。
+
+    Args:
+        name: ファイル名（{sha256}.{形式}）
+        request: リクエスト（Range などのヘッダーを参照する）
+
+    Returns:
+        Response: 音声データ（200, 206, 304, 416 のいずれか）
+    """
+    return await services.get_published_audio(
+        name,
+        range_header=request.headers.get("range"),
+        if_range=request.headers.get("if-range"),
+        if_none_match=request.headers.get("if-none-match"),
+        method=request.method
+    )
+
+
+@router.post(
+    "/tts/stream",
+    summary="テキストから音声を文単位でストリーミング生成",
+    response_model=None,
+    dependencies=[tts_policy]
+)
+async def text_to_speech_stream(request: TTSRequest, http_request: Request) -> Response:
+    """
+    テキストを文（。！？や改行）単位に分割して並列に合成し、
+    先頭の文から順にWAVとしてストリーミングで返す。
+    ヘッダーは1つだけ送信され、以降は各文のPCMデータが続く。
+    長い回答でも最初の文が合成でき次第、再生を開始できる。
+    最初の文の合成が TTS_FILLER_BUDGET_MS を超える場合は、先につなぎの音声（「えーと…」など）を流し、
+    その長さ（ミリ秒）を X-TTS-Filler-Ms ヘッダーで返す。
+    送信開始の前後を問わず、クライアントが切断した時点で残りの文の合成を中止する。
+
+    Args:
+        request: テキスト、話者ID、audio_queryの上書きパラメータを含むリクエスト
+            （formatは無視され、常にWAVで返す）
+        http_request: 切断を監視するHTTPリクエスト
+
+    Returns:
+        Response: チャンク転送されるWAV音声（StreamingResponse）
+    """
+    return await services.run_until_disconnected(http_request, services.stream_text_to_speech(
+        request.text,
+        request.speaker_id,
+        query_overrides=request.query_overrides()
+    ))
+
+
+@router.post(
+    "/tts/batch",
+    summary="複数のテキストを一括で音声合成",
+    response_model=None,
+    dependencies=[batch_policy]
+)
+async def text_to_speech_batch(request: TTSBatchRequest) -> StreamingResponse:
+    """
+    複数の (テキスト, 話者ID) をまとめて音声合成する。
+    重複は1回だけ合成し、エンジンへの同時リクエスト数を制限しながら、
+    完了したものから順にストリーミングで返す。
+
+    Args:
+        request: 合成するテキストと話者IDのリスト、出力形式、同時実行数
+
+    Returns:
+        StreamingResponse:
+            - ndjson: 1件1行のJSON（index, positions, base64_audio または error）
+            - zip: 連番のWAVファイルと manifest.json を含むZIP
+    """
+    if not request.items:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="合成するテキストが指定されていません"
+        )
+    if len(request.items) > settings.tts_batch_max_items:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"件数が上限（{settings.tts_batch_max_items}）を超えています"
+        )
+    return await services.batch_text_to_speech(
+        [(item.text, item.speaker_id) for item in request.items],
+        request.format,
+        request.concurrency
+    )
+
+
+@router.websocket("/ws/tts", dependencies=[tts_policy])
+async def text_to_speech_websocket(websocket: WebSocket) -> None:
+    """
+    1本のWebSocket接続でテキストの断片を送り、合成できたものから音声を受け取る。
+
+    クライアントは {"type": "synthesize", "seq": 1, "text": "..."} を送信し、
+    {"type": "audio", "seq": 1, ...} に続くバイナリフレーム（先頭4バイトがseq）で
+    音声を受け取る。{"type": "cancel", "seq": 1} で未送信の合成を取り消せる。
+    Base64を使わずに音声を返すため、HTTPでの発話ごとの接続とデータ量の増加がない。
+
+    Args:
+        websocket: WebSocket接続
+    """
+    await services.TTSWebSocketSession(websocket).run()
+
+
+@router.get("/tts/cache", summary="音声キャッシュの統計情報")
+async def get_tts_cache_stats() -> Dict[str, Any]:
+    """
+    合成音声キャッシュのヒット・ミス数や使用量を取得する。
+
+    Returns:
+        Dict[str, Any]: キャッシュの統計情報
+    """
+    return services.get_cache_stats()
+
+
+@router.get("/tts/metrics", summary="音声合成の処理段階ごとの所要時間")
+async def get_tts_stage_metrics() -> Dict[str, Any]:
+    """
+    音声合成の処理段階ごとの所要時間（平均・p50・p95）と生成したバイト数を、
+    話者IDとテキスト長の区分ごとに取得する。リクエストごとの内訳は
+    レスポンスの Server-Timing ヘッダーで確認できる。
+
+    Returns:
+        Dict[str, Any]: 処理段階ごとの集計
     """
-    return services.text_to_speech(request.text, request.speaker_id, request.format)
\ No newline at end of file
+    return services.get_stage_metrics_summary()
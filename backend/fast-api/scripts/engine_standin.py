@@ -0,0 +1,378 @@
+#!/usr/bin/env python3
+"""
+AivisSpeech Engineの代わりに動作するローカルのスタンドイン
+
+実際のエンジンのイメージなしで負荷試験やベンチマークを行うための軽量なサーバー。
+/version, /speakers, /user_dict, /audio_query, /synthesis, /multi_synthesis,
+/initialize_speaker を実装し、テキストの長さに応じた決定的な合成音声（WAV）を返す。
+応答時間の分布、失敗率、同時処理数の上限は設定で変更できる。
+
+    python scripts/engine_standin.py --profile cpu --port 10101
+    AIVIS_ENGINE_URL=http://localhost:10101 uvicorn app:app
+
+テストからは create_app() で生成したアプリを httpx.ASGITransport 経由で使用できる。
+"""
+
+import argparse
+import asyncio
+import hashlib
+import io
+import json
+import os
+import random
+import sys
+import zipfile
+from dataclasses import dataclass, field, replace
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+from fastapi import Body, FastAPI, HTTPException, Query
+from fastapi.responses import Response
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from services.audio.wav import WavInfo, build_wav_header  # noqa: E402
+
+ENGINE_VERSION = "1.0.0-standin"
+DEFAULT_SPEAKER_ID = 888753760
+
+# 句読点で区切ったまとまりをアクセント句とする
+_PUNCTUATION = "、。！？,.!?"
+_VOWELS = "aiueo"
+# モーラ1つあたりの長さ（秒）
+_CONSONANT_LENGTH = 0.05
+_VOWEL_LENGTH = 0.1
+_PAUSE_LENGTH = 0.3
+
+
+@dataclass
+class LatencyProfile:
+    """
+    1種類のリクエストの応答時間の分布
+
+    応答時間は (base_ms + per_char_ms × 文字数) に、中央値1の対数正規分布
+    （標準偏差 jitter）の係数を掛けたものになる。
+    """
+    base_ms: float = 0.0
+    per_char_ms: float = 0.0
+    jitter: float = 0.0
+
+    def sample(self, chars: int, rng: random.Random) -> float:
+        """応答時間（秒）を1つ選ぶ"""
+        seconds = (self.base_ms + self.per_char_ms * chars) / 1000
+        if seconds <= 0:
+            return 0.0
+        return seconds * (rng.lognormvariate(0.0, self.jitter) if self.jitter > 0 else 1.0)
+
+
+@dataclass
+class StandinConfig:
+    """スタンドインの設定"""
+    audio_query: LatencyProfile = field(default_factory=LatencyProfile)
+    synthesis: LatencyProfile = field(default_factory=LatencyProfile)
+    failure_rate: float = 0.0
+    max_concurrency: int = 0
+    max_queue: int = 0
+    seed: int = 0
+
+
+# 名前付きの設定（instant はCI向けに遅延なし、cpu / gpu は実際のエンジンに近い値）
+PROFILES: Dict[str, StandinConfig] = {
+    "instant": StandinConfig(),
+    "cpu": StandinConfig(
+        audio_query=LatencyProfile(base_ms=30, per_char_ms=2, jitter=0.2),
+        synthesis=LatencyProfile(base_ms=150, per_char_ms=35, jitter=0.25),
+        max_concurrency=1,
+    ),
+    "gpu": StandinConfig(
+        audio_query=LatencyProfile(base_ms=20, per_char_ms=1, jitter=0.2),
+        synthesis=LatencyProfile(base_ms=60, per_char_ms=6, jitter=0.2),
+        max_concurrency=4,
+    ),
+}
+
+
+def build_audio_query(text: str) -> Dict[str, Any]:
+    """
+    テキストから決定的なaudio_queryを生成する（空白以外の1文字を1モーラとする）
+
+    Args:
+        text: テキスト
+
+    Returns:
+        Dict[str, Any]: AivisSpeech Engineと同じ形式のaudio_query
+    """
+    accent_phrases: List[Dict[str, Any]] = []
+    moras: List[Dict[str, Any]] = []
+
+    def close_phrase(punctuation: Optional[str]) -> None:
+        if not moras:
+            return
+        accent_phrases.append({
+            "moras": list(moras),
+            "accent": 1,
+            "pause_mora": None if punctuation in (None, "。", ".") else {
+                "text": "、", "consonant": None, "consonant_length": None,
+                "vowel": "pau", "vowel_length": _PAUSE_LENGTH, "pitch": 0.0,
+            },
+            "is_interrogative": punctuation in ("？", "?"),
+        })
+        moras.clear()
+
+    for char in text:
+        if char in _PUNCTUATION:
+            close_phrase(char)
+        elif not char.isspace():
+            code = ord(char)
+            moras.append({
+                "text": char,
+                "consonant": "k" if code % 2 else None,
+                "consonant_length": _CONSONANT_LENGTH if code % 2 else None,
+                "vowel": _VOWELS[code % len(_VOWELS)],
+                "vowel_length": _VOWEL_LENGTH,
+                "pitch": 5.5 + (code % 7) / 10,
+            })
+    close_phrase(None)
+
+    return {
+        "accent_phrases": accent_phrases,
+        "speedScale": 1.0,
+        "intonationScale": 1.0,
+        "tempoDynamicsScale": 1.0,
+        "pitchScale": 0.0,
+        "volumeScale": 1.0,
+        "prePhonemeLength": 0.1,
+        "postPhonemeLength": 0.1,
+        "pauseLength": None,
+        "pauseLengthScale": 1.0,
+        "outputSamplingRate": 44100,
+        "outputStereo": False,
+        "kana": "",
+    }
+
+
+def _query_duration(query: Dict[str, Any]) -> float:
+    """audio_queryから音声全体の秒数を求める"""
+    speed = float(query.get("speedScale") or 1.0)
+    spoken = 0.0
+    for phrase in query.get("accent_phrases", []):
+        for mora in phrase.get("moras", []):
+            spoken += (mora.get("consonant_length") or 0.0) + (mora.get("vowel_length") or 0.0)
+        pause = phrase.get("pause_mora")
+        if pause:
+            spoken += (pause.get("vowel_length") or 0.0) * float(query.get("pauseLengthScale") or 1.0)
+    return (
+        float(query.get("prePhonemeLength") or 0.0)
+        + spoken / speed
+        + float(query.get("postPhonemeLength") or 0.0)
+    )
+
+
+def synthesize_wav(query: Dict[str, Any], speaker_id: int) -> bytes:
+    """
+    audio_queryの長さに合わせた決定的なWAVを生成する
+
+    前後の無音（prePhonemeLength, postPhonemeLength）の間に、クエリと話者から決まる
+    周波数の正弦波を置く。同じクエリと話者からは常に同じバイト列になる。
+
+    Args:
+        query: audio_query
+        speaker_id: 話者ID
+
+    Returns:
+        bytes: 16bit PCMのWAV
+    """
+    rate = int(query.get("outputSamplingRate") or 44100)
+    channels = 2 if query.get("outputStereo") else 1
+    speed = float(query.get("speedScale") or 1.0)
+    pre = float(query.get("prePhonemeLength") or 0.0)
+    post = float(query.get("postPhonemeLength") or 0.0)
+    total = int(round(_query_duration(query) * rate))
+    voiced_start = min(total, int(round(pre * rate)))
+    voiced_end = max(voiced_start, total - int(round(post * rate)))
+
+    digest = hashlib.sha256(
+        json.dumps([query.get("accent_phrases"), speaker_id, speed], sort_keys=True).encode("utf-8")
+    ).digest()
+    frequency = 180 + digest[0] % 120
+    samples = np.zeros(total, dtype=np.float64)
+    t = np.arange(voiced_end - voiced_start) / rate
+    samples[voiced_start:voiced_end] = 0.3 * float(query.get("volumeScale") or 1.0) * np.sin(2 * np.pi * frequency * t)
+    pcm = (np.clip(samples, -1.0, 1.0) * 32767).astype("<i2")
+    if channels == 2:
+        pcm = np.repeat(pcm, 2)
+    data = pcm.tobytes()
+    return build_wav_header(WavInfo(1, channels, rate, 16, 44, len(data)), len(data)) + data
+
+
+def _query_chars(query: Dict[str, Any]) -> int:
+    """audio_queryのモーラ数（応答時間の算出に使う文字数）"""
+    return sum(len(phrase.get("moras", [])) for phrase in query.get("accent_phrases", []))
+
+
+class _EngineState:
+    """同時処理数の制限と乱数の状態"""
+
+    def __init__(self, config: StandinConfig):
+        self.config = config
+        self.rng = random.Random(config.seed)
+        self.semaphore = asyncio.Semaphore(config.max_concurrency) if config.max_concurrency > 0 else None
+        self.waiting = 0
+        self.active = 0
+        self.max_active = 0
+        self.requests = 0
+        self.failures = 0
+        self.initialized_speakers: set = set()
+
+    async def run(self, profile: LatencyProfile, chars: int) -> None:
+        """同時処理数の上限の範囲で応答時間だけ待ち、設定された確率で失敗させる"""
+        self.requests += 1
+        if self.semaphore is not None and self.semaphore.locked():
+            if self.config.max_queue and self.waiting >= self.config.max_queue:
+                self.failures += 1
+                raise HTTPException(status_code=503, detail="standin queue is full")
+        self.waiting += 1
+        try:
+            if self.semaphore is not None:
+                await self.semaphore.acquire()
+        finally:
+            self.waiting -= 1
+        self.active += 1
+        self.max_active = max(self.max_active, self.active)
+        try:
+            await asyncio.sleep(profile.sample(chars, self.rng))
+            if self.config.failure_rate > 0 and self.rng.random() < self.config.failure_rate:
+                self.failures += 1
+                raise HTTPException(status_code=500, detail="standin injected failure")
+        finally:
+            self.active -= 1
+            if self.semaphore is not None:
+                self.semaphore.release()
+
+
+def create_app(config: Optional[StandinConfig] = None) -> FastAPI:
+    """
+    スタンドインのアプリケーションを生成する
+
+    Args:
+        config: 応答時間・失敗率・同時処理数の設定（省略時は遅延なし）
+
+    Returns:
+        FastAPI: エンジンと同じエンドポイントを持つアプリケーション（state.engine に統計を持つ）
+    """
+    app = FastAPI(title="AivisSpeech Engine stand-in")
+    state = _EngineState(config or StandinConfig())
+    app.state.engine = state
+
+    @app.get("/version")
+    async def version() -> str:
+        return ENGINE_VERSION
+
+    @app.get("/speakers")
+    async def speakers() -> List[Dict[str, Any]]:
+        return [{
+            "name": "Stand-in",
+            "speaker_uuid": "00000000-0000-0000-0000-000000000000",
+            "styles": [{"name": "ノーマル", "id": DEFAULT_SPEAKER_ID, "type": "talk"}],
+            "version": ENGINE_VERSION,
+        }]
+
+    @app.get("/user_dict")
+    async def user_dict() -> Dict[str, Any]:
+        return {}
+
+    @app.post("/initialize_speaker", status_code=204)
+    async def initialize_speaker(speaker: int, skip_reinit: bool = False) -> Response:
+        state.initialized_speakers.add(speaker)
+        return Response(status_code=204)
+
+    @app.get("/is_initialized_speaker")
+    async def is_initialized_speaker(speaker: int) -> bool:
+        return speaker in state.initialized_speakers
+
+    @app.post("/audio_query")
+    async def audio_query(text: str = Query(...), speaker: int = Query(...)) -> Dict[str, Any]:
+        await state.run(state.config.audio_query, len(text))
+        return build_audio_query(text)
+
+    @app.post("/synthesis")
+    async def synthesis(speaker: int, query: Dict[str, Any] = Body(...)) -> Response:
+        await state.run(state.config.synthesis, _query_chars(query))
+        return Response(synthesize_wav(query, speaker), media_type="audio/wav")
+
+    @app.post("/multi_synthesis")
+    async def multi_synthesis(speaker: int, queries: List[Dict[str, Any]] = Body(...)) -> Response:
+        await state.run(state.config.synthesis, sum(_query_chars(query) for query in queries))
+        buffer = io.BytesIO()
+        with zipfile.ZipFile(buffer, "w") as archive:
+            for index, query in enumerate(queries, start=1):
+                archive.writestr(f"{index:03d}.wav", synthesize_wav(query, speaker))
+        return Response(buffer.getvalue(), media_type="application/zip")
+
+    return app
+
+
+def main():
+    parser = argparse.ArgumentParser(description="AivisSpeech Engineのスタンドインを起動")
+    parser.add_argument(
+        "--profile",
+        choices=sorted(PROFILES),
+        default="cpu",
+        help="応答時間と同時処理数の既定値"
+    )
+    parser.add_argument(
+        "--latency_scale",
+        type=float,
+        default=1.0,
+        help="応答時間に掛ける係数"
+    )
+    parser.add_argument(
+        "--failure_rate",
+        type=float,
+        default=None,
+        help="audio_query・synthesisが500を返す確率（0〜1）"
+    )
+    parser.add_argument(
+        "--max_concurrency",
+        type=int,
+        default=None,
+        help="同時に処理するリクエスト数の上限（0は無制限）"
+    )
+    parser.add_argument(
+        "--max_queue",
+        type=int,
+        default=None,
+        help="処理待ちの上限（超えた場合は503、0は無制限）"
+    )
+    parser.add_argument(
+        "--seed",
+        type=int,
+        default=0,
+        help="応答時間と失敗の乱数のシード"
+    )
+    parser.add_argument("--host", type=str, default="127.0.0.1", help="待ち受けるアドレス")
+    parser.add_argument("--port", type=int, default=10101, help="待ち受けるポート")
+
+    args = parser.parse_args()
+
+    base = PROFILES[args.profile]
+    scale = max(0.0, args.latency_scale)
+    config = replace(
+        base,
+        audio_query=replace(base.audio_query, base_ms=base.audio_query.base_ms * scale,
+                            per_char_ms=base.audio_query.per_char_ms * scale),
+        synthesis=replace(base.synthesis, base_ms=base.synthesis.base_ms * scale,
+                          per_char_ms=base.synthesis.per_char_ms * scale),
+        failure_rate=base.failure_rate if args.failure_rate is None else args.failure_rate,
+        max_concurrency=base.max_concurrency if args.max_concurrency is None else args.max_concurrency,
+        max_queue=base.max_queue if args.max_queue is None else args.max_queue,
+        seed=args.seed,
+    )
+
+    import uvicorn
+    print(f"AivisSpeech Engineのスタンドインを起動します: http://{args.host}:{args.port} ({args.profile})")
+    uvicorn.run(create_app(config), host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
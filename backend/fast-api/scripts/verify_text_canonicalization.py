@@ -0,0 +1,102 @@
+#!/usr/bin/env python3
+"""
+キャッシュキーの正規化がエンジンの解析結果を変えないことを確認するスクリプト
+
+正規化の例（と定型文）について、変換前後のテキストの audio_query を稼働中の
+AivisSpeech Engine で取得し、accent_phrases が一致することを確認する。
+一致しない例があれば終了コード1で終了する。
+"""
+
+import argparse
+import json
+import os
+import sys
+
+import httpx
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from services.text.canonical import CANONICALIZATION_EXAMPLES, canonicalize_text  # noqa: E402
+
+
+def load_manifest_texts(path):
+    """定型文のマニフェストからテキストを読み込む"""
+    with open(path, encoding="utf-8") as f:
+        return [entry["text"] for entry in json.load(f) if entry.get("text")]
+
+
+def fetch_accent_phrases(client, text, speaker_id):
+    """audio_query を取得し、accent_phrases を返す"""
+    response = client.post("/audio_query", params={"text": text, "speaker": speaker_id})
+    response.raise_for_status()
+    return response.json()["accent_phrases"]
+
+
+def verify(engine_url, speaker_id, texts):
+    """
+    各テキストについて変換前後の accent_phrases を比較する
+
+    Returns:
+        list: 一致しなかった (変換前, 変換後) のリスト
+    """
+    mismatches = []
+    with httpx.Client(base_url=engine_url, timeout=30.0) as client:
+        for raw in texts:
+            canonical = canonicalize_text(raw)
+            if canonical == raw:
+                print(f"  変換なし: {raw!r}")
+                continue
+            same = fetch_accent_phrases(client, raw, speaker_id) == fetch_accent_phrases(client, canonical, speaker_id)
+            print(f"  {'一致' if same else '不一致'}: {raw!r} -> {canonical!r}")
+            if not same:
+                mismatches.append((raw, canonical))
+    return mismatches
+
+
+def main():
+    parser = argparse.ArgumentParser(description="キャッシュキーの正規化がaudio_queryを変えないことを確認")
+    parser.add_argument(
+        "--engine_url",
+        type=str,
+        default=os.getenv("AIVIS_ENGINE_URL", "http://localhost:10101").split(",")[0],
+        help="AivisSpeech EngineのURL"
+    )
+    parser.add_argument(
+        "--speaker",
+        type=int,
+        default=888753760,
+        help="話者ID"
+    )
+    parser.add_argument(
+        "--manifest",
+        type=str,
+        default=None,
+        help="あわせて確認する定型文のマニフェスト（data/prewarm.json など）"
+    )
+    parser.add_argument(
+        "texts",
+        nargs="*",
+        help="あわせて確認するテキスト"
+    )
+
+    args = parser.parse_args()
+
+    texts = [raw for raw, _ in CANONICALIZATION_EXAMPLES] + list(args.texts)
+    if args.manifest:
+        texts += load_manifest_texts(args.manifest)
+
+    try:
+        mismatches = verify(args.engine_url, args.speaker, texts)
+    except httpx.HTTPError as e:
+        print(f"エンジンへの接続に失敗しました: {e}")
+        sys.exit(2)
+
+    if mismatches:
+        print(f"\n{len(mismatches)}件の例でaudio_queryが変わりました")
+        sys.exit(1)
+
+    print("\n全ての例でaudio_queryが一致しました")
+
+
+if __name__ == "__main__":
+    main()
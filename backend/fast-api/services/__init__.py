@@ -5,24 +5,75 @@ Services package for AivisSpeech API
 """
 
 # 各サービスのre-export
-from .engine.engine_service import get_engine_version, get_speakers, get_user_dict
+from .engine.engine_service import (
+    get_engine_version,
+    get_speakers,
+    get_user_dict,
+    get_engine_pool_status,
+    get_engine_admission_status,
+)
+from .engine.speaker_residency import get_speaker_residency_status
+from .engine.health_monitor import get_engine_health
+from .engine.metadata_cache import get_cached_json_response, get_metadata_cache_stats
 from .speech.speech_service import (
     create_audio_query,
     synthesize_speech,
-    text_to_speech
+    synthesize_text,
+    synthesize_composed,
+    text_to_speech,
+    get_published_audio,
+    get_viseme_timeline,
+    get_cache_stats,
+    get_stage_metrics_summary,
 )
+from .speech.streaming import stream_text_to_speech
+from .speech.batch import batch_text_to_speech
+from .speech.ws_session import TTSWebSocketSession
+from .speech.disconnect import run_until_disconnected
+from .speech.stage_timing import render_metrics
+from .speech.speculative import speculate_from_stream, resolve_speculative_speaker
+from .speech.admission import Priority, engine_request_policy
+from .speech.prewarm import get_prewarm_status
+from .speech.filler import get_filler_status
 from .response.formatters import (
     get_wav_response,
+    get_encoded_audio_response,
     get_base64_response,
+    get_wav_stream_response,
 )
 
 __all__ = [
     "get_engine_version",
     "get_speakers", 
     "get_user_dict",
+    "get_engine_pool_status",
+    "get_engine_admission_status",
+    "get_speaker_residency_status",
+    "get_engine_health",
+    "get_cached_json_response",
+    "get_metadata_cache_stats",
     "create_audio_query",
     "synthesize_speech",
+    "synthesize_text",
+    "synthesize_composed",
     "text_to_speech",
+    "get_published_audio",
+    "get_viseme_timeline",
+    "get_cache_stats",
+    "get_stage_metrics_summary",
+    "render_metrics",
+    "stream_text_to_speech",
+    "batch_text_to_speech",
+    "TTSWebSocketSession",
+    "run_until_disconnected",
+    "speculate_from_stream",
+    "resolve_speculative_speaker",
+    "Priority",
+    "engine_request_policy",
+    "get_prewarm_status",
+    "get_filler_status",
     "get_wav_response",
+    "get_encoded_audio_response",
     "get_base64_response",
+    "get_wav_stream_response",
 ] 
\ No newline at end of file
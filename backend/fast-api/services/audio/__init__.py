@@ -0,0 +1,37 @@
+"""
+Audio processing module
+
+合成音声（WAV）のバイト列を扱うユーティリティを提供するモジュール。
+"""
+
+from .wav import (
+    WavInfo,
+    parse_wav,
+    build_wav_header,
+    pcm_view,
+    pcm_samples,
+    concat_wav,
+    slice_wav,
+    find_sound_bounds,
+    trim_silence,
+    pcm_to_float,
+)
+from .encoder import AUDIO_FORMATS, AudioEncoder, encode_wav, get_audio_encoder, shutdown_audio_encoder
+
+__all__ = [
+    "WavInfo",
+    "parse_wav",
+    "build_wav_header",
+    "pcm_view",
+    "pcm_samples",
+    "concat_wav",
+    "slice_wav",
+    "find_sound_bounds",
+    "trim_silence",
+    "pcm_to_float",
+    "AUDIO_FORMATS",
+    "AudioEncoder",
+    "encode_wav",
+    "get_audio_encoder",
+    "shutdown_audio_encoder",
+]
@@ -0,0 +1,197 @@
+"""
+Audio encoder
+
+合成音声（WAV）を圧縮形式（Ogg Opus, MP3, FLAC）に変換する。
+エンコードはCPU負荷が高いため、イベントループを止めないようプロセスプールで実行する。
+"""
+import asyncio
+import io
+import time
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+from typing import Any, Dict, Optional
+
+import numpy as np
+
+from config import settings, logger
+from .wav import parse_wav, pcm_samples, pcm_to_float
+
+try:
+    import soundfile as sf
+except (ImportError, OSError):
+    # libsndfile が見つからない環境では圧縮形式を提供しない
+    sf = None
+
+
+@dataclass(frozen=True)
+class AudioFormat:
+    """圧縮形式の定義"""
+    name: str
+    media_type: str
+    extension: str
+    container: str
+    subtype: str
+
+
+# 提供する圧縮形式（キーはリクエストで指定する形式名）
+AUDIO_FORMATS: Dict[str, AudioFormat] = {
+    "ogg": AudioFormat("ogg", "audio/ogg", "ogg", "OGG", "OPUS"),
+    "mp3": AudioFormat("mp3", "audio/mpeg", "mp3", "MP3", "MPEG_LAYER_III"),
+    "flac": AudioFormat("flac", "audio/flac", "flac", "FLAC", "PCM_16"),
+}
+
+# Opusが対応するサンプリングレート
+OPUS_SAMPLE_RATES = (8000, 12000, 16000, 24000, 48000)
+
+
+def resample_linear(samples: np.ndarray, source_rate: int, target_rate: int) -> np.ndarray:
+    """
+    線形補間でサンプリングレートを変換する
+
+    Args:
+        samples: (フレーム数, チャンネル数) の配列
+        source_rate: 変換前のサンプリングレート
+        target_rate: 変換後のサンプリングレート
+
+    Returns:
+        np.ndarray: 変換後の (フレーム数, チャンネル数) のfloat32配列
+    """
+    num_frames = int(round(len(samples) * target_rate / source_rate))
+    positions = np.arange(num_frames) * (source_rate / target_rate)
+    source = np.arange(len(samples))
+    return np.stack(
+        [np.interp(positions, source, samples[:, ch]).astype(np.float32) for ch in range(samples.shape[1])],
+        axis=1
+    )
+
+
+def encode_wav(wav: bytes, format_name: str) -> bytes:
+    """
+    WAVを指定の圧縮形式に変換する（プロセスプールのワーカーで実行される）
+
+    Args:
+        wav: WAVファイルのバイト列
+        format_name: 形式名（AUDIO_FORMATS のキー）
+
+    Returns:
+        bytes: 変換後の音声データ
+
+    Raises:
+        ValueError: 対応していない形式・サンプル形式の場合
+        RuntimeError: soundfile（libsndfile）が利用できない場合
+    """
+    if sf is None:
+        raise RuntimeError("soundfile が利用できないため圧縮形式に変換できません")
+    audio_format = AUDIO_FORMATS.get(format_name)
+    if audio_format is None:
+        raise ValueError(f"Unsupported format: {format_name}")
+
+    info = parse_wav(wav)
+    samples = pcm_samples(wav, info)
+    sample_rate = info.sample_rate
+    if audio_format.subtype == "OPUS" and sample_rate not in OPUS_SAMPLE_RATES:
+        # Opusは対応レートが限られるため、直近の上位レートに変換する
+        target_rate = next((rate for rate in OPUS_SAMPLE_RATES if rate >= sample_rate), OPUS_SAMPLE_RATES[-1])
+        samples = resample_linear(pcm_to_float(samples), sample_rate, target_rate)
+        sample_rate = target_rate
+
+    buffer = io.BytesIO()
+    sf.write(buffer, samples, sample_rate, format=audio_format.container, subtype=audio_format.subtype)
+    return buffer.getvalue()
+
+
+class AudioEncoder:
+    """プロセスプールで圧縮形式への変換を行うエンコーダー"""
+
+    def __init__(self, max_workers: int):
+        """
+        Args:
+            max_workers: エンコードに使うプロセス数
+        """
+        self.max_workers = max(1, max_workers)
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._stats: Dict[str, Any] = {"encoded": 0, "input_bytes": 0, "output_bytes": 0, "encode_seconds": 0.0}
+
+    @property
+    def available(self) -> bool:
+        """圧縮形式への変換が利用できるかどうか"""
+        return sf is not None
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(max_workers=self.max_workers)
+        return self._executor
+
+    async def encode(self, wav: bytes, format_name: str) -> bytes:
+        """
+        WAVを指定の圧縮形式に変換する
+
+        Args:
+            wav: WAVファイルのバイト列
+            format_name: 形式名（ogg, mp3, flac）
+
+        Returns:
+            bytes: 変換後の音声データ
+
+        Raises:
+            ValueError: 対応していない形式・サンプル形式の場合
+            RuntimeError: soundfile（libsndfile）が利用できない場合
+        """
+        if not self.available:
+            raise RuntimeError("soundfile が利用できないため圧縮形式に変換できません")
+        start = time.perf_counter()
+        loop = asyncio.get_running_loop()
+        encoded = await loop.run_in_executor(self._get_executor(), encode_wav, wav, format_name)
+        self._stats["encoded"] += 1
+        self._stats["input_bytes"] += len(wav)
+        self._stats["output_bytes"] += len(encoded)
+        self._stats["encode_seconds"] += time.perf_counter() - start
+        return encoded
+
+    def shutdown(self) -> None:
+        """ワーカープロセスを終了する"""
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+    def get_stats(self) -> Dict[str, Any]:
+        """
+        エンコードの統計情報を取得する
+
+        Returns:
+            Dict[str, Any]: 変換件数、入出力バイト数、圧縮率、所要時間
+        """
+        return {
+            "available": self.available,
+            **self._stats,
+            "compression_ratio": (
+                self._stats["output_bytes"] / self._stats["input_bytes"] if self._stats["input_bytes"] else 0.0
+            ),
+        }
+
+
+# アプリケーション全体で共有するエンコーダー
+_encoder_instance: Optional[AudioEncoder] = None
+
+
+def get_audio_encoder() -> AudioEncoder:
+    """
+    共有のAudioEncoderを取得する
+
+    Returns:
+        AudioEncoder: 共有インスタンス
+    """
+    global _encoder_instance
+    if _encoder_instance is None:
+        _encoder_instance = AudioEncoder(settings.audio_encoder_workers)
+        if not _encoder_instance.available:
+            logger.warning("soundfile が利用できないため、圧縮形式の音声は提供されません")
+    return _encoder_instance
+
+
+def shutdown_audio_encoder() -> None:
+    """共有のAudioEncoderのワーカープロセスを終了する"""
+    global _encoder_instance
+    if _encoder_instance is not None:
+        _encoder_instance.shutdown()
+        _encoder_instance = None
@@ -0,0 +1,313 @@
+"""
+WAV utilities
+
+RIFF/WAVEヘッダーの解析と生成を行う。
+音声データ本体（PCM）はデコードせずに扱い、連結や切り出しはヘッダーの書き換えと
+PCMのバイト列の結合のみで行う。無音判定などのサンプル単位の処理は、
+PCMをコピーせずに参照するNumPy配列で行う。
+"""
+import struct
+from dataclasses import dataclass
+from typing import Optional, Sequence, Tuple
+
+import numpy as np
+
+
+# ストリーミング時など、全体の長さが未確定の場合に使用するサイズ値
+STREAMING_CHUNK_SIZE = 0xFFFFFFFF
+
+
+@dataclass
+class WavInfo:
+    """WAVファイルのフォーマット情報とPCMデータの位置"""
+    audio_format: int
+    num_channels: int
+    sample_rate: int
+    bits_per_sample: int
+    data_offset: int
+    data_size: int
+
+    @property
+    def block_align(self) -> int:
+        """1サンプル（全チャンネル分）のバイト数"""
+        return self.num_channels * self.bits_per_sample // 8
+
+    @property
+    def byte_rate(self) -> int:
+        """1秒あたりのバイト数"""
+        return self.sample_rate * self.block_align
+
+    @property
+    def num_frames(self) -> int:
+        """PCMデータのフレーム数"""
+        return self.data_size // self.block_align if self.block_align else 0
+
+    @property
+    def duration(self) -> float:
+        """再生時間（秒）"""
+        return self.num_frames / self.sample_rate if self.sample_rate else 0.0
+
+    def same_format(self, other: "WavInfo") -> bool:
+        """PCMをそのまま連結できる同一フォーマットかどうか"""
+        return (
+            self.audio_format == other.audio_format
+            and self.num_channels == other.num_channels
+            and self.sample_rate == other.sample_rate
+            and self.bits_per_sample == other.bits_per_sample
+        )
+
+
+def parse_wav(data: bytes) -> WavInfo:
+    """
+    WAVのバイト列からヘッダーを解析する
+
+    Args:
+        data: WAVファイルのバイト列
+
+    Returns:
+        WavInfo: フォーマット情報とPCMデータの位置
+
+    Raises:
+        ValueError: RIFF/WAVEとして解釈できない場合
+    """
+    if len(data) < 12 or data[0:4] != b"RIFF" or data[8:12] != b"WAVE":
+        raise ValueError("RIFF/WAVE形式ではありません")
+
+    fmt = None
+    offset = 12
+    while offset + 8 <= len(data):
+        chunk_id = data[offset:offset + 4]
+        chunk_size = struct.unpack_from("<I", data, offset + 4)[0]
+        body = offset + 8
+        if chunk_id == b"fmt ":
+            if chunk_size < 16:
+                raise ValueError("fmtチャンクが不正です")
+            fmt = struct.unpack_from("<HHIIHH", data, body)
+        elif chunk_id == b"data":
+            if fmt is None:
+                raise ValueError("dataチャンクの前にfmtチャンクがありません")
+            # ストリーミング用のサイズ値などは実際の長さに切り詰める
+            data_size = min(chunk_size, len(data) - body)
+            audio_format, num_channels, sample_rate, _, _, bits_per_sample = fmt
+            return WavInfo(
+                audio_format=audio_format,
+                num_channels=num_channels,
+                sample_rate=sample_rate,
+                bits_per_sample=bits_per_sample,
+                data_offset=body,
+                data_size=data_size,
+            )
+        # チャンクは2バイト境界に揃えられる
+        offset = body + chunk_size + (chunk_size & 1)
+
+    raise ValueError("dataチャンクが見つかりません")
+
+
+def build_wav_header(info: WavInfo, data_size: Optional[int]) -> bytes:
+    """
+    PCMデータ用の44バイトのWAVヘッダーを生成する
+
+    Args:
+        info: フォーマット情報
+        data_size: PCMデータのバイト数（Noneの場合は長さ未確定のストリーミング用）
+
+    Returns:
+        bytes: WAVヘッダー
+    """
+    if data_size is None:
+        riff_size = data_chunk_size = STREAMING_CHUNK_SIZE
+    else:
+        riff_size = 36 + data_size
+        data_chunk_size = data_size
+    return struct.pack(
+        "<4sI4s4sIHHIIHH4sI",
+        b"RIFF", riff_size, b"WAVE",
+        b"fmt ", 16,
+        info.audio_format, info.num_channels, info.sample_rate,
+        info.byte_rate, info.block_align, info.bits_per_sample,
+        b"data", data_chunk_size,
+    )
+
+
+# PCMのフォーマット（WAVE_FORMAT_PCM, WAVE_FORMAT_IEEE_FLOAT）とサンプルの型の対応
+_SAMPLE_DTYPES = {
+    (1, 8): np.dtype("u1"),
+    (1, 16): np.dtype("<i2"),
+    (1, 32): np.dtype("<i4"),
+    (3, 32): np.dtype("<f4"),
+}
+
+
+def pcm_view(data: bytes, info: Optional[WavInfo] = None) -> memoryview:
+    """
+    PCMデータ部分をコピーせずに参照する
+
+    Args:
+        data: WAVファイルのバイト列
+        info: 解析済みのヘッダー（省略時は解析する）
+
+    Returns:
+        memoryview: PCMデータ部分のビュー
+    """
+    if info is None:
+        info = parse_wav(data)
+    return memoryview(data)[info.data_offset:info.data_offset + info.data_size]
+
+
+def pcm_samples(data: bytes, info: Optional[WavInfo] = None) -> np.ndarray:
+    """
+    PCMデータをコピーせずにNumPy配列として参照する
+
+    Args:
+        data: WAVファイルのバイト列
+        info: 解析済みのヘッダー（省略時は解析する）
+
+    Returns:
+        np.ndarray: (フレーム数, チャンネル数) の読み取り専用配列
+
+    Raises:
+        ValueError: 対応していないサンプル形式の場合
+    """
+    if info is None:
+        info = parse_wav(data)
+    dtype = _SAMPLE_DTYPES.get((info.audio_format, info.bits_per_sample))
+    if dtype is None:
+        raise ValueError(
+            f"対応していないサンプル形式です: format={info.audio_format}, bits={info.bits_per_sample}"
+        )
+    view = pcm_view(data, info)[:info.num_frames * info.block_align]
+    return np.frombuffer(view, dtype=dtype).reshape(-1, info.num_channels)
+
+
+def pcm_to_float(samples: np.ndarray) -> np.ndarray:
+    """
+    サンプルを -1.0〜1.0 のfloat32に変換する
+
+    Args:
+        samples: pcm_samplesで得た配列
+
+    Returns:
+        np.ndarray: 同じ形状のfloat32配列
+    """
+    if samples.dtype.kind == "f":
+        return samples.astype(np.float32)
+    if samples.dtype.kind == "u":
+        return (samples.astype(np.float32) - 128.0) / 128.0
+    return samples.astype(np.float32) / float(np.iinfo(samples.dtype).max + 1)
+
+
+def concat_wav(segments: Sequence[bytes]) -> bytes:
+    """
+    同じフォーマットのWAVを連結する（ヘッダーのみ作り直し、PCMはそのまま結合する）
+
+    Args:
+        segments: WAVファイルのバイト列のリスト
+
+    Returns:
+        bytes: 連結したWAV
+
+    Raises:
+        ValueError: 空のリスト、またはフォーマットが一致しない場合
+    """
+    if not segments:
+        raise ValueError("連結するWAVがありません")
+    infos = [parse_wav(segment) for segment in segments]
+    first = infos[0]
+    if not all(first.same_format(info) for info in infos[1:]):
+        raise ValueError("フォーマットが異なるWAVは連結できません")
+    views = [pcm_view(segment, info) for segment, info in zip(segments, infos)]
+    header = build_wav_header(first, sum(len(view) for view in views))
+    return b"".join([header, *views])
+
+
+def slice_wav(data: bytes, start: float = 0.0, end: Optional[float] = None) -> bytes:
+    """
+    WAVを時間で切り出す（フレーム境界に揃える）
+
+    Args:
+        data: WAVファイルのバイト列
+        start: 開始位置（秒）
+        end: 終了位置（秒、省略時は末尾まで）
+
+    Returns:
+        bytes: 切り出したWAV
+    """
+    info = parse_wav(data)
+    start_frame = min(max(0, int(round(start * info.sample_rate))), info.num_frames)
+    end_frame = info.num_frames if end is None else int(round(end * info.sample_rate))
+    end_frame = min(max(start_frame, end_frame), info.num_frames)
+    return _slice_frames(data, info, start_frame, end_frame)
+
+
+def _slice_frames(data: bytes, info: WavInfo, start_frame: int, end_frame: int) -> bytes:
+    """フレーム範囲を切り出したWAVを生成する"""
+    view = pcm_view(data, info)[start_frame * info.block_align:end_frame * info.block_align]
+    return b"".join([build_wav_header(info, len(view)), view])
+
+
+def find_sound_bounds(
+    data: bytes,
+    threshold_db: float = -50.0,
+    window_ms: float = 10.0
+) -> Tuple[int, int]:
+    """
+    無音ではない区間のフレーム範囲を求める
+
+    窓ごとのRMS（フルスケール比）を一括で計算し、閾値を超える最初と最後の窓を探す。
+
+    Args:
+        data: WAVファイルのバイト列
+        threshold_db: 無音とみなす音量の上限（dBFS）
+        window_ms: 判定に使う窓の長さ（ミリ秒）
+
+    Returns:
+        Tuple[int, int]: 音のある区間の開始・終了フレーム（全体が無音の場合は (0, 0)）
+    """
+    info = parse_wav(data)
+    normalized = pcm_to_float(pcm_samples(data, info))
+
+    window = max(1, int(info.sample_rate * window_ms / 1000))
+    num_windows = -(-len(normalized) // window)
+    if num_windows == 0:
+        return 0, 0
+    padded = np.zeros((num_windows * window, info.num_channels), dtype=np.float32)
+    padded[:len(normalized)] = normalized
+    energy = np.mean(np.square(padded.reshape(num_windows, -1)), axis=1)
+
+    threshold = 10.0 ** (threshold_db / 10.0)
+    loud = np.flatnonzero(energy > threshold)
+    if loud.size == 0:
+        return 0, 0
+    return int(loud[0]) * window, min(int(loud[-1] + 1) * window, info.num_frames)
+
+
+def trim_silence(
+    data: bytes,
+    threshold_db: float = -50.0,
+    padding_ms: float = 20.0,
+    leading: bool = True,
+    trailing: bool = True
+) -> bytes:
+    """
+    先頭・末尾の無音を取り除く
+
+    Args:
+        data: WAVファイルのバイト列
+        threshold_db: 無音とみなす音量の上限（dBFS）
+        padding_ms: 音の前後に残す余白（ミリ秒）
+        leading: 先頭の無音を取り除くかどうか
+        trailing: 末尾の無音を取り除くかどうか
+
+    Returns:
+        bytes: 無音を取り除いたWAV（全体が無音の場合は元のまま）
+    """
+    info = parse_wav(data)
+    start, end = find_sound_bounds(data, threshold_db)
+    if start == end:
+        return data
+    padding = int(info.sample_rate * padding_ms / 1000)
+    start = max(0, start - padding) if leading else 0
+    end = min(info.num_frames, end + padding) if trailing else info.num_frames
+    if start == 0 and end == info.num_frames:
+        return data
+    return _slice_frames(data, info, start, end)
@@ -4,10 +4,25 @@ Engine management module
 AivisSpeech Engineの管理機能を提供するモジュール。
 """
 
-from .engine_service import get_engine_version, get_speakers, get_user_dict
+from .engine_service import get_engine_version, get_speakers, get_user_dict, get_engine_pool_status, get_engine_admission_status
+from .speaker_residency import SpeakerResidency, get_speaker_residency, get_speaker_residency_status
+from .health_monitor import EngineHealthMonitor, get_engine_health_monitor, get_engine_health
+from .metadata_cache import MetadataCache, get_metadata_cache, get_cached_json_response, get_metadata_cache_stats
 
 __all__ = [
     "get_engine_version",
     "get_speakers",
     "get_user_dict",
+    "get_engine_pool_status",
+    "get_engine_admission_status",
+    "SpeakerResidency",
+    "get_speaker_residency",
+    "get_speaker_residency_status",
+    "EngineHealthMonitor",
+    "get_engine_health_monitor",
+    "get_engine_health",
+    "MetadataCache",
+    "get_metadata_cache",
+    "get_cached_json_response",
+    "get_metadata_cache_stats",
 ] 
\ No newline at end of file
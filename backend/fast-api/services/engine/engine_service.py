@@ -3,94 +3,93 @@ Engine management service
 
 AivisSpeech Engineの管理機能を提供する。
 """
-import requests
-from typing import Dict, Any, Tuple
+from typing import Dict, Any, List, Tuple
 from fastapi import HTTPException
 
-from config import settings, logger
+from ..speech.aivis_client import get_aivis_client
+from ..speech.stage_timing import register_speakers
 
 
-def get_engine_version() -> Tuple[bool, Dict[str, Any]]:
+async def get_engine_version() -> Tuple[bool, Dict[str, Any]]:
     """
     AivisSpeech Engineのバージョン情報を取得する
-    
+
     Returns:
         Tuple[bool, Dict[str, Any]]: 成功フラグとレスポンスデータ
-        
-    副作用: なし（外部APIへのリードオンリーリクエスト）
+
+    副作用: なし（外部APIへのリードオンリーリクエスト）。/status は死活監視の
+    結果（get_engine_health）を返すため、この関数はエンジンへ直接確認する場合に使う
     """
     try:
-        response = requests.get(f"{settings.aivis_base_url}/version")
-        if response.status_code == 200:
-            return True, {
-                "status": "ok",
-                "message": "AivisSpeech Engineが正常に動作しています",
-                "engine_info": response.json()
-            }
-        else:
-            return False, {
-                "status": "error",
-                "message": "AivisSpeech Engineに接続できましたが、正常なレスポンスが返ってきませんでした",
-            }
-    except requests.exceptions.RequestException as e:
-        logger.error(f"AivisSpeech Engineに接続できません: {e}")
+        engine_info = await get_aivis_client().get_version()
+    except HTTPException as e:
         return False, {
             "status": "error",
-            "message": f"AivisSpeech Engineに接続できません: {e}",
+            "message": e.detail,
         }
+    return True, {
+        "status": "ok",
+        "message": "AivisSpeech Engineが正常に動作しています",
+        "engine_info": engine_info
+    }
 
 
-def get_speakers() -> Dict[str, Any]:
+async def get_speakers() -> List[Dict[str, Any]]:
     """
     AivisSpeech Engineから話者一覧を取得する
-    
+
     Returns:
-        Dict[str, Any]: 話者一覧データ
-        
+        List[Dict[str, Any]]: 話者一覧データ
+
     Raises:
         HTTPException: API呼び出しが失敗した場合
-        
-    副作用: なし（外部APIへのリードオンリーリクエスト）
+
+    副作用: 取得したスタイルIDを、処理段階の計測で話者IDのラベルに使える話者として記録する
     """
-    try:
-        response = requests.get(f"{settings.aivis_base_url}/speakers")
-        if response.status_code != 200:
-            raise HTTPException(
-                status_code=response.status_code,
-                detail="AivisSpeech Engineからスピーカー情報を取得できませんでした"
-            )
-        return response.json()
-    except requests.exceptions.RequestException as e:
-        logger.error(f"AivisSpeech Engineに接続できません: {e}")
-        raise HTTPException(
-            status_code=503,
-            detail=f"AivisSpeech Engineに接続できません: {e}"
-        )
-
-
-def get_user_dict() -> Dict[str, Any]:
+    speakers = await get_aivis_client().get_speakers()
+    register_speakers(
+        style["id"]
+        for speaker in speakers
+        for style in speaker.get("styles", [])
+        if isinstance(style.get("id"), int)
+    )
+    return speakers
+
+
+async def get_user_dict() -> Dict[str, Any]:
     """
     AivisSpeech Engineからユーザー辞書を取得する
-    
+
     Returns:
         Dict[str, Any]: ユーザー辞書データ
-        
+
     Raises:
         HTTPException: API呼び出しが失敗した場合
-        
+
     副作用: なし（外部APIへのリードオンリーリクエスト）
     """
-    try:
-        response = requests.get(f"{settings.aivis_base_url}/user_dict")
-        if response.status_code != 200:
-            raise HTTPException(
-                status_code=response.status_code,
-                detail="AivisSpeech Engineからユーザー辞書を取得できませんでした"
-            )
-        return response.json()
-    except requests.exceptions.RequestException as e:
-        logger.error(f"AivisSpeech Engineに接続できません: {e}")
-        raise HTTPException(
-            status_code=503,
-            detail=f"AivisSpeech Engineに接続できません: {e}"
-        ) 
\ No newline at end of file
+    return await get_aivis_client().get_user_dict()
+
+
+def get_engine_pool_status() -> List[Dict[str, Any]]:
+    """
+    振り分け先の各AivisSpeech Engineの状態を取得する
+
+    Returns:
+        List[Dict[str, Any]]: エンジンごとの処理中の数、失敗数、除外状態
+
+    副作用: なし（メモリ上の状態を返すのみ）
+    """
+    return get_aivis_client().pool.get_stats()
+
+
+def get_engine_admission_status() -> Dict[str, Any]:
+    """
+    AivisSpeech Engineへのリクエストの待ち行列とサーキットブレーカーの状態を取得する
+
+    Returns:
+        Dict[str, Any]: 待ち行列の長さ、待ち時間、拒否数、ブレーカーの状態
+
+    副作用: なし（メモリ上の状態を返すのみ）
+    """
+    return get_aivis_client().admission.get_stats()
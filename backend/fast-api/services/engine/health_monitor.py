@@ -0,0 +1,218 @@
+"""
+Engine health monitor
+
+各AivisSpeech Engineの /version を一定間隔でバックグラウンドから確認し、
+最新の状態（接続可否、バージョン、応答時間、最後に成功した時刻）をメモリに保持する。
+/status はエンジンへ問い合わせずにこの状態を返すため、監視からの頻繁なアクセスが
+エンジンの負荷にならない。キャッシュキーに含めるエンジン識別子も、有効期限を過ぎた時と
+再起動を検出した時にここで求め直す（リクエストの処理中には求め直さない）。
+
+エンジンは起動時刻（uptime）を返さないため、再起動はバージョンの変化と、
+接続できなかったエンジンに再び接続できたことから検出し、話者の初期化をやり直す
+（保持している話者一覧とユーザー辞書も破棄する）。
+"""
+import asyncio
+import time
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional
+from fastapi import HTTPException
+
+from config import settings, logger
+from ..speech.aivis_client import get_aivis_client
+from .metadata_cache import get_metadata_cache
+from .speaker_residency import get_speaker_residency
+
+
+@dataclass
+class EngineHealth:
+    """1台のエンジンの死活監視の結果"""
+    url: str
+    reachable: Optional[bool] = None
+    version: Any = None
+    rtt_ms: Optional[float] = None
+    last_success: Optional[float] = None
+    last_checked: Optional[float] = None
+    consecutive_failures: int = 0
+    restarts_detected: int = 0
+    error: Optional[str] = None
+
+    def to_dict(self) -> Dict[str, Any]:
+        """レスポンス用の辞書に変換する"""
+        return {
+            "url": self.url,
+            "reachable": self.reachable,
+            "version": self.version,
+            "rtt_ms": self.rtt_ms,
+            "last_success": self.last_success,
+            "last_checked": self.last_checked,
+            "consecutive_failures": self.consecutive_failures,
+            "restarts_detected": self.restarts_detected,
+            "error": self.error,
+        }
+
+
+class EngineHealthMonitor:
+    """各エンジンの /version を定期的に確認し、最新の状態を保持する"""
+
+    def __init__(self, interval: float, timeout: float):
+        """
+        Args:
+            interval: 確認の間隔（秒）
+            timeout: 1回の確認のタイムアウト（秒）
+        """
+        self.interval = interval
+        self.timeout = timeout
+        self._engines: Dict[str, EngineHealth] = {}
+        self._snapshot: Dict[str, Any] = {
+            "status": "unknown",
+            "message": "AivisSpeech Engineの状態をまだ確認していません",
+            "engine_info": None,
+            "engines": [],
+        }
+        self._task: Optional["asyncio.Task[None]"] = None
+
+    @property
+    def running(self) -> bool:
+        """定期的な確認を実行中かどうか"""
+        return self._task is not None and not self._task.done()
+
+    def start(self) -> None:
+        """バックグラウンドで定期的な確認を開始する（最初の確認はすぐに行う）"""
+        if self.running or self.interval <= 0:
+            return
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        """定期的な確認を停止する"""
+        if self.running:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+        self._task = None
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                await self.poll_once()
+            except Exception as e:
+                logger.error(f"AivisSpeech Engineの状態を確認できませんでした: {e}")
+            await asyncio.sleep(self.interval)
+
+    async def poll_once(self) -> Dict[str, Any]:
+        """
+        すべてのエンジンの状態を1回確認し、保持する状態を更新する
+
+        Returns:
+            Dict[str, Any]: 更新後の状態（get_snapshot と同じ）
+        """
+        client = get_aivis_client()
+        urls = [backend.url for backend in client.pool.backends]
+        restarts = await asyncio.gather(*(self._probe(url) for url in urls))
+        reachable = [url for url in urls if self._engines[url].reachable]
+        if reachable and (any(restarts) or client.fingerprint_due()):
+            await client.refresh_fingerprint(reachable[0], self._engines[reachable[0]].version)
+        self._rebuild_snapshot(urls)
+        return self._snapshot
+
+    async def _probe(self, url: str) -> bool:
+        """
+        1台のエンジンを確認し、再起動を検出した場合は話者の初期化をやり直させる
+
+        Returns:
+            bool: 再起動を検出したかどうか
+        """
+        health = self._engines.setdefault(url, EngineHealth(url))
+        previous_reachable, previous_version = health.reachable, health.version
+        start = time.perf_counter()
+        try:
+            version = await get_aivis_client().probe_version(url, self.timeout)
+        except HTTPException as e:
+            health.reachable = False
+            health.consecutive_failures += 1
+            health.error = str(e.detail)
+            health.last_checked = time.time()
+            get_speaker_residency().observe_engine(url, False)
+            return False
+
+        health.rtt_ms = round((time.perf_counter() - start) * 1000, 1)
+        health.reachable = True
+        health.version = version
+        health.consecutive_failures = 0
+        health.error = None
+        health.last_checked = health.last_success = time.time()
+
+        restarted = previous_reachable is False or (
+            previous_version is not None and version != previous_version
+        )
+        if restarted:
+            health.restarts_detected += 1
+            # 再起動後は話者やユーザー辞書が変わっている可能性があるため取得し直させる
+            get_metadata_cache().invalidate()
+        get_speaker_residency().observe_engine(url, True, restarted)
+        return restarted
+
+    def _rebuild_snapshot(self, urls: List[str]) -> None:
+        """/status で返す状態を組み立てておく"""
+        engines = [self._engines[url] for url in urls if url in self._engines]
+        reachable = [health for health in engines if health.reachable]
+        if reachable:
+            primary = reachable[0]
+            status = "ok"
+            message = "AivisSpeech Engineが正常に動作しています"
+            if len(reachable) < len(engines):
+                message += f"（{len(engines) - len(reachable)}台に接続できません）"
+        else:
+            primary = None
+            status = "error"
+            message = next((h.error for h in engines if h.error), "AivisSpeech Engineに接続できません")
+        self._snapshot = {
+            "status": status,
+            "message": message,
+            "engine_info": None if primary is None else {
+                "version": primary.version,
+                "rtt_ms": primary.rtt_ms,
+                "last_success": primary.last_success,
+            },
+            "engines": [health.to_dict() for health in engines],
+        }
+
+    def get_snapshot(self) -> Dict[str, Any]:
+        """
+        最後に確認した状態を取得する（エンジンへは問い合わせない）
+
+        Returns:
+            Dict[str, Any]: 全体の状態（ok, error, unknown）、メッセージ、
+                応答したエンジンのバージョン・応答時間・最後に成功した時刻、エンジンごとの状態
+        """
+        return self._snapshot
+
+
+# アプリケーション全体で共有するインスタンス
+_monitor_instance: Optional[EngineHealthMonitor] = None
+
+
+def get_engine_health_monitor() -> EngineHealthMonitor:
+    """
+    共有のEngineHealthMonitorを取得する
+
+    Returns:
+        EngineHealthMonitor: 設定された間隔で確認する共有インスタンス
+    """
+    global _monitor_instance
+    if _monitor_instance is None:
+        _monitor_instance = EngineHealthMonitor(settings.engine_health_interval, settings.engine_health_timeout)
+    return _monitor_instance
+
+
+def get_engine_health() -> Dict[str, Any]:
+    """
+    死活監視で最後に確認したエンジンの状態を取得する
+
+    Returns:
+        Dict[str, Any]: EngineHealthMonitor.get_snapshot() の結果
+
+    副作用: なし（メモリ上の状態を返すのみ）
+    """
+    return get_engine_health_monitor().get_snapshot()
@@ -0,0 +1,294 @@
+"""
+Engine metadata cache
+
+話者一覧（/speakers）とユーザー辞書（/user_dict）の応答をメモリに保持する。
+JSONへの変換とgzip圧縮は取得時に1回だけ行い、強いETagを付けて返す。
+If-None-Match が一致する場合は304を返す。
+
+有効期限を過ぎた応答はそのまま返しつつバックグラウンドで取得し直すため、
+エンジンへのリクエストは有効期限ごとに1回程度になる。
+"""
+import asyncio
+import gzip
+import hashlib
+import json
+import time
+from dataclasses import dataclass
+from typing import Any, Awaitable, Callable, Dict, Optional
+from fastapi import HTTPException
+from fastapi.responses import Response
+
+from config import settings, logger
+from ..response.ranged import etag_matches
+from ..speech.admission import Priority, current_priority
+from ..speech.singleflight import SingleFlight
+
+# クライアントには毎回ETagで再検証させる（変更がなければ304で済む）
+REVALIDATE_CACHE_CONTROL = "no-cache"
+
+
+@dataclass
+class CachedDocument:
+    """JSONに変換済みの応答"""
+    body: bytes
+    gzip_body: bytes
+    digest: str
+    fetched_at: float
+
+    @property
+    def etag(self) -> str:
+        """非圧縮の本文の強いETag（引用符付き）"""
+        return f'"{self.digest}"'
+
+    @property
+    def gzip_etag(self) -> str:
+        """gzip圧縮した本文の強いETag（引用符付き）"""
+        return f'"{self.digest}-gzip"'
+
+
+def build_document(data: Any) -> CachedDocument:
+    """
+    応答のデータをJSONに変換し、gzip圧縮した本文とETagを求める
+
+    Args:
+        data: エンジンから取得したデータ
+
+    Returns:
+        CachedDocument: 変換済みの応答
+    """
+    body = json.dumps(data, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+    return CachedDocument(
+        body=body,
+        # 同じ内容からは同じ圧縮結果になるよう、gzipヘッダーの時刻を固定する
+        gzip_body=gzip.compress(body, mtime=0),
+        digest=hashlib.sha256(body).hexdigest()[:32],
+        fetched_at=time.monotonic(),
+    )
+
+
+def accepts_gzip(accept_encoding: Optional[str]) -> bool:
+    """
+    Accept-Encoding ヘッダーがgzipを受け付けるかを判定する
+
+    Args:
+        accept_encoding: Accept-Encoding ヘッダーの値
+
+    Returns:
+        bool: gzip（または *）が q=0 以外で含まれる場合は True
+    """
+    for item in (accept_encoding or "").split(","):
+        coding, _, params = item.strip().partition(";")
+        if coding.strip().lower() not in ("gzip", "*"):
+            continue
+        name, _, value = params.strip().partition("=")
+        if name.strip().lower() == "q":
+            try:
+                return float(value) > 0
+            except ValueError:
+                return False
+        return True
+    return False
+
+
+def get_document_response(
+    document: CachedDocument,
+    if_none_match: Optional[str] = None,
+    accept_encoding: Optional[str] = None
+) -> Response:
+    """
+    変換済みの応答を、条件付きリクエストとgzipに対応して返す
+
+    Args:
+        document: 変換済みの応答
+        if_none_match: If-None-Match ヘッダーの値
+        accept_encoding: Accept-Encoding ヘッダーの値
+
+    Returns:
+        Response: 200（JSON）または304（未変更）
+    """
+    compressed = accepts_gzip(accept_encoding)
+    headers = {
+        "ETag": document.gzip_etag if compressed else document.etag,
+        "Cache-Control": REVALIDATE_CACHE_CONTROL,
+        "Vary": "Accept-Encoding",
+    }
+    # 圧縮の有無によらず内容は同じため、どちらのETagでも未変更とみなす
+    if etag_matches(if_none_match, document.etag, document.gzip_etag):
+        return Response(status_code=304, headers=headers)
+    if compressed:
+        headers["Content-Encoding"] = "gzip"
+        return Response(content=document.gzip_body, media_type="application/json", headers=headers)
+    return Response(content=document.body, media_type="application/json", headers=headers)
+
+
+class MetadataCache:
+    """名前ごとに変換済みの応答を保持し、有効期限を過ぎたらバックグラウンドで取得し直す"""
+
+    def __init__(self, ttl: float):
+        """
+        Args:
+            ttl: 応答の有効期限（秒、0以下の場合は保持せず毎回取得する）
+        """
+        self.ttl = ttl
+        self._documents: Dict[str, CachedDocument] = {}
+        self._flight = SingleFlight()
+        self._refreshing: Dict[str, "asyncio.Task[None]"] = {}
+        # invalidate() のたびに増やし、それより前に始めた取得の結果は保持しない
+        self._generation = 0
+        self._hits = 0
+        self._stale_hits = 0
+        self._misses = 0
+        self._refreshes = 0
+        self._refresh_errors = 0
+
+    async def get(self, name: str, fetch: Callable[[], Awaitable[Any]]) -> CachedDocument:
+        """
+        変換済みの応答を取得する
+
+        保持していない場合はエンジンから取得する（同時に届いたリクエストでは1回だけ取得する）。
+        有効期限を過ぎている場合は保持している応答を返し、バックグラウンドで取得し直す。
+
+        Args:
+            name: 応答の名前（speakers, user_dict）
+            fetch: エンジンからデータを取得する関数
+
+        Returns:
+            CachedDocument: 変換済みの応答
+
+        Raises:
+            HTTPException: 保持している応答がなく、エンジンから取得できなかった場合
+        """
+        if self.ttl <= 0:
+            return build_document(await fetch())
+
+        document = self._documents.get(name)
+        if document is None:
+            self._misses += 1
+            return await self._fetch_shared(name, fetch)
+
+        if time.monotonic() - document.fetched_at >= self.ttl:
+            self._stale_hits += 1
+            self._schedule_refresh(name, fetch)
+        else:
+            self._hits += 1
+        return document
+
+    async def _fetch_shared(self, name: str, fetch: Callable[[], Awaitable[Any]]) -> CachedDocument:
+        """エンジンから取得する（同じ世代で実行中の取得があればその結果を待つ）"""
+        generation = self._generation
+        document, _ = await self._flight.do((name, generation), lambda: self._fetch(name, fetch, generation))
+        return document
+
+    async def _fetch(self, name: str, fetch: Callable[[], Awaitable[Any]], generation: int) -> CachedDocument:
+        document = build_document(await fetch())
+        # 取得中に破棄された場合は、再起動前のエンジンの応答かもしれないため保持しない
+        if generation == self._generation:
+            self._documents[name] = document
+            self._refreshes += 1
+        return document
+
+    def _schedule_refresh(self, name: str, fetch: Callable[[], Awaitable[Any]]) -> None:
+        """バックグラウンドでの取得し直しを開始する（実行中の場合は何もしない）"""
+        task = self._refreshing.get(name)
+        if task is not None and not task.done():
+            return
+        self._refreshing[name] = asyncio.create_task(self._refresh(name, fetch))
+
+    async def _refresh(self, name: str, fetch: Callable[[], Awaitable[Any]]) -> None:
+        # 利用者の合成リクエストを妨げないよう、最も低い優先度でエンジンへ送る
+        current_priority.set(Priority.BACKGROUND)
+        try:
+            await self._fetch_shared(name, fetch)
+        except HTTPException as e:
+            # 取得し直せなかった場合は、次の有効期限まで保持している応答を返し続ける
+            self._refresh_errors += 1
+            if name in self._documents:
+                self._documents[name].fetched_at = time.monotonic()
+            logger.warning(f"{name} を取得し直せませんでした: {e.detail}")
+
+    def invalidate(self) -> None:
+        """
+        保持している応答をすべて破棄する（エンジンの再起動を検出した場合など）
+
+        バックグラウンドでの取得し直しは中止し、実行中の取得の結果も保持しない。
+        """
+        self._generation += 1
+        for task in self._refreshing.values():
+            task.cancel()
+        self._refreshing.clear()
+        self._documents.clear()
+
+    def get_stats(self) -> Dict[str, Any]:
+        """
+        キャッシュの統計を取得する
+
+        Returns:
+            Dict[str, Any]: 有効期限、保持している応答の経過時間、ヒット数、取得回数
+        """
+        now = time.monotonic()
+        return {
+            "ttl_seconds": self.ttl,
+            "documents": {
+                name: {"etag": document.etag, "age_seconds": round(now - document.fetched_at, 1)}
+                for name, document in self._documents.items()
+            },
+            "hits": self._hits,
+            "stale_hits": self._stale_hits,
+            "misses": self._misses,
+            "refreshes": self._refreshes,
+            "refresh_errors": self._refresh_errors,
+        }
+
+
+# アプリケーション全体で共有するインスタンス
+_cache_instance: Optional[MetadataCache] = None
+
+
+def get_metadata_cache() -> MetadataCache:
+    """
+    共有のMetadataCacheを取得する
+
+    Returns:
+        MetadataCache: 設定された有効期限の共有インスタンス
+    """
+    global _cache_instance
+    if _cache_instance is None:
+        _cache_instance = MetadataCache(settings.engine_metadata_cache_ttl)
+    return _cache_instance
+
+
+async def get_cached_json_response(
+    name: str,
+    fetch: Callable[[], Awaitable[Any]],
+    if_none_match: Optional[str] = None,
+    accept_encoding: Optional[str] = None
+) -> Response:
+    """
+    エンジンから取得するデータを、キャッシュとETagによる再検証に対応して返す
+
+    Args:
+        name: 応答の名前（speakers, user_dict）
+        fetch: エンジンからデータを取得する関数
+        if_none_match: If-None-Match ヘッダーの値
+        accept_encoding: Accept-Encoding ヘッダーの値
+
+    Returns:
+        Response: 200（JSON、gzipの場合は圧縮済みの本文）または304
+
+    Raises:
+        HTTPException: 保持している応答がなく、エンジンから取得できなかった場合
+    """
+    document = await get_metadata_cache().get(name, fetch)
+    return get_document_response(document, if_none_match, accept_encoding)
+
+
+def get_metadata_cache_stats() -> Dict[str, Any]:
+    """
+    話者一覧とユーザー辞書のキャッシュの統計を取得する
+
+    Returns:
+        Dict[str, Any]: MetadataCache.get_stats() の結果
+
+    副作用: なし（メモリ上の状態を返すのみ）
+    """
+    return get_metadata_cache().get_stats()
@@ -0,0 +1,206 @@
+"""
+Speaker residency
+
+エンジンは話者のモデルを最初の合成時に読み込むため、話者ごとの最初の合成が遅くなる。
+起動時に設定された話者を各エンジンで初期化（/initialize_speaker）しておき、
+どの話者が読み込み済みかを管理する。死活監視（EngineHealthMonitor）がエンジンの
+再起動を検出した場合は、そのエンジンで改めて初期化する。
+"""
+import asyncio
+import time
+from typing import Any, Dict, List, Optional, Tuple
+from fastapi import HTTPException
+
+from config import settings, logger
+from ..speech.admission import Priority, current_priority
+from ..speech.aivis_client import get_aivis_client
+
+# 話者ごとの状態
+PENDING = "pending"
+INITIALIZING = "initializing"
+RESIDENT = "resident"
+FAILED = "failed"
+
+
+class SpeakerResidency:
+    """設定された話者を各エンジンに読み込ませ、読み込み状態を管理する"""
+
+    def __init__(self, speaker_ids: List[int]):
+        """
+        Args:
+            speaker_ids: 初期化する話者IDのリスト
+        """
+        self.speaker_ids = list(dict.fromkeys(speaker_ids))
+        self.restarts_detected = 0
+        self._states: Dict[Tuple[str, int], str] = {}
+        self._errors: Dict[Tuple[str, int], str] = {}
+        self._started = False
+        self._rerun = False
+        self._task: Optional["asyncio.Task[None]"] = None
+        self._finished_at: Optional[float] = None
+
+    @staticmethod
+    def _engine_urls() -> List[str]:
+        return [backend.url for backend in get_aivis_client().pool.backends]
+
+    @property
+    def running(self) -> bool:
+        """初期化を実行中かどうか"""
+        return self._task is not None and not self._task.done()
+
+    def start(self) -> None:
+        """バックグラウンドで初期化を開始する（実行中の場合は終了後にもう一度実行する）"""
+        if not self.speaker_ids:
+            return
+        self._started = True
+        if self.running:
+            self._rerun = True
+            return
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        """初期化を中断する"""
+        if self.running:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+        self._task = None
+
+    def observe_engine(self, url: str, reachable: bool, restarted: bool = False) -> None:
+        """
+        死活監視の結果を反映する
+
+        再起動を検出したエンジンでは、すべての話者を初期化し直す。読み込めていない話者が
+        残っている場合も、前回の試行から一定時間が経っていれば初期化を再開する。
+
+        Args:
+            url: 確認したエンジン
+            reachable: エンジンに接続できたかどうか
+            restarted: エンジンの再起動を検出したかどうか
+        """
+        if not reachable or not self._started:
+            return
+
+        if restarted:
+            self.restarts_detected += 1
+            logger.info(f"AivisSpeech Engineの再起動を検出しました。話者を初期化し直します: {url}")
+            for key in self._states:
+                if key[0] == url:
+                    self._states[key] = PENDING
+            self.start()
+            return
+
+        incomplete = any(self._states.get(key) != RESIDENT for key in self._keys())
+        retry_due = (
+            self._finished_at is not None
+            and time.monotonic() - self._finished_at >= settings.engine_init_retry_seconds
+        )
+        if incomplete and retry_due and not self.running:
+            self.start()
+
+    def _keys(self) -> List[Tuple[str, int]]:
+        return [(url, speaker_id) for url in self._engine_urls() for speaker_id in self.speaker_ids]
+
+    async def _initialize(self, url: str, speaker_id: int) -> None:
+        """1台のエンジンで1人の話者を初期化する"""
+        key = (url, speaker_id)
+        self._states[key] = INITIALIZING
+        try:
+            await get_aivis_client().initialize_speaker(speaker_id, backend_url=url)
+        except HTTPException as e:
+            self._states[key] = FAILED
+            self._errors[key] = str(e.detail)
+            return
+        self._states[key] = RESIDENT
+        self._errors.pop(key, None)
+
+    async def _run(self) -> None:
+        # 利用者のリクエストを妨げないよう、最も低い優先度でエンジンへ送る
+        current_priority.set(Priority.BACKGROUND)
+        try:
+            while True:
+                self._rerun = False
+                for attempt in range(max(1, settings.engine_init_max_attempts)):
+                    targets = [key for key in self._keys() if self._states.get(key) != RESIDENT]
+                    if not targets:
+                        break
+                    if attempt > 0:
+                        await asyncio.sleep(settings.engine_init_retry_seconds)
+                    # モデルの読み込みでメモリ使用量が急増しないよう、1件ずつ初期化する
+                    for url, speaker_id in targets:
+                        await self._initialize(url, speaker_id)
+                if not self._rerun:
+                    break
+        finally:
+            self._finished_at = time.monotonic()
+
+        failed = [key for key in self._keys() if self._states.get(key) != RESIDENT]
+        if failed:
+            logger.warning(f"初期化できなかった話者があります: {failed}")
+        else:
+            logger.info(f"話者を初期化しました: {self.speaker_ids}")
+
+    def get_status(self) -> Dict[str, Any]:
+        """
+        話者の初期化状態を取得する
+
+        Returns:
+            Dict[str, Any]: 全体の状態（disabled, pending, initializing, ready, degraded）、
+                話者ごと・エンジンごとの状態、検出した再起動の回数
+        """
+        keys = self._keys() if self.speaker_ids else []
+        states = [self._states.get(key, PENDING) for key in keys]
+        if not self.speaker_ids:
+            state = "disabled"
+        elif self.running:
+            state = "initializing"
+        elif states and all(s == RESIDENT for s in states):
+            state = "ready"
+        elif FAILED in states:
+            state = "degraded"
+        else:
+            state = "pending"
+        return {
+            "state": state,
+            "speakers": [
+                {
+                    "speaker_id": speaker_id,
+                    "engines": {
+                        url: self._states.get((url, speaker_id), PENDING)
+                        for url in self._engine_urls()
+                    },
+                }
+                for speaker_id in self.speaker_ids
+            ],
+            "errors": {f"{url}#{speaker_id}": error for (url, speaker_id), error in self._errors.items()},
+            "restarts_detected": self.restarts_detected,
+        }
+
+
+# アプリケーション全体で共有するインスタンス
+_residency_instance: Optional[SpeakerResidency] = None
+
+
+def get_speaker_residency() -> SpeakerResidency:
+    """
+    共有のSpeakerResidencyを取得する
+
+    Returns:
+        SpeakerResidency: 設定された話者を対象とする共有インスタンス
+    """
+    global _residency_instance
+    if _residency_instance is None:
+        _residency_instance = SpeakerResidency(settings.engine_init_speakers)
+    return _residency_instance
+
+
+def get_speaker_residency_status() -> Dict[str, Any]:
+    """
+    話者の初期化状態を取得する
+
+    Returns:
+        Dict[str, Any]: SpeakerResidency.get_status() の結果
+    """
+    return get_speaker_residency().get_status()
@@ -4,9 +4,22 @@ Response formatting module
 各種形式での音声レスポンス生成機能を提供するモジュールです。
 """
 
-from .formatters import get_wav_response, get_base64_response
+from .formatters import (
+    get_wav_response,
+    get_encoded_audio_response,
+    get_base64_response,
+    get_wav_stream_response,
+    get_ndjson_stream_response,
+    get_zip_stream_response,
+)
+from .ranged import get_immutable_audio_response
 
 __all__ = [
     "get_wav_response",
-    "get_base64_response"
+    "get_encoded_audio_response",
+    "get_base64_response",
+    "get_wav_stream_response",
+    "get_ndjson_stream_response",
+    "get_zip_stream_response",
+    "get_immutable_audio_response",
 ] 
\ No newline at end of file
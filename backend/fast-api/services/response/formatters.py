@@ -4,17 +4,20 @@ Response formatters
 各種形式での音声レスポンス生成機能を提供する。
 """
 import base64
-from fastapi.responses import Response
+from typing import Any, AsyncIterator, Dict, List, Optional
+from fastapi.responses import Response, StreamingResponse
 
 from models import AudioBase64Response
+from ..audio.encoder import AUDIO_FORMATS
 
 
-def get_wav_response(audio_content: bytes) -> Response:
+def get_wav_response(audio_content: bytes, headers: Optional[Dict[str, str]] = None) -> Response:
     """
     音声データをWAVファイルレスポンスに変換する
     
     Args:
         audio_content: 音声データ
+        headers: 追加するレスポンスヘッダー
         
     Returns:
         Response: WAVファイルのレスポンス
@@ -23,16 +26,48 @@ def get_wav_response(audio_content: bytes) -> Response:
     return Response(
         content=audio_content,
         media_type="audio/wav",
-        headers={"Content-Disposition": "attachment; filename=audio.wav"}
+        headers={"Content-Disposition": "attachment; filename=audio.wav", **(headers or {})}
     )
 
 
-def get_base64_response(audio_content: bytes) -> AudioBase64Response:
+def get_encoded_audio_response(
+    audio_content: bytes,
+    format_name: str,
+    headers: Optional[Dict[str, str]] = None
+) -> Response:
+    """
+    圧縮形式の音声データをファイルレスポンスに変換する
+
+    Args:
+        audio_content: 音声データ
+        format_name: 形式名（ogg, mp3, flac）
+        headers: 追加するレスポンスヘッダー
+
+    Returns:
+        Response: 形式に応じたContent-Typeの音声ファイルのレスポンス
+
+    """
+    audio_format = AUDIO_FORMATS[format_name]
+    return Response(
+        content=audio_content,
+        media_type=audio_format.media_type,
+        headers={
+            "Content-Disposition": f"attachment; filename=audio.{audio_format.extension}",
+            **(headers or {})
+        }
+    )
+
+
+def get_base64_response(
+    audio_content: bytes,
+    visemes: Optional[List[List[Any]]] = None
+) -> AudioBase64Response:
     """
     音声データをBase64エンコードされたレスポンスに変換する
     
     Args:
         audio_content: 音声データ
+        visemes: 口形のタイムライン（指定した場合のみレスポンスに含める）
         
     Returns:
         AudioBase64Response: Base64エンコードされた音声データのレスポンス
@@ -41,5 +76,80 @@ def get_base64_response(audio_content: bytes) -> AudioBase64Response:
     audio_base64 = base64.b64encode(audio_content).decode('utf-8')
     return AudioBase64Response(
         base64_audio=audio_base64,
-        content_type="audio/wav"
-    )
\ No newline at end of file
+        content_type="audio/wav",
+        visemes=visemes
+    )
+
+
+def get_wav_stream_response(
+    chunks: AsyncIterator[bytes],
+    headers: Optional[Dict[str, str]] = None
+) -> StreamingResponse:
+    """
+    WAVのバイト列を順に送信するストリーミングレスポンスを生成する
+    
+    Args:
+        chunks: WAVヘッダーとPCMデータを順に返す非同期イテレーター
+        headers: 追加するレスポンスヘッダー
+        
+    Returns:
+        StreamingResponse: チャンク転送されるWAVのレスポンス
+        
+    """
+    return StreamingResponse(
+        chunks,
+        media_type="audio/wav",
+        headers={
+            "Cache-Control": "no-cache",
+            "X-Accel-Buffering": "no",  # Nginxのバッファリング無効化
+            **(headers or {})
+        }
+    )
+
+
+def get_ndjson_stream_response(
+    lines: AsyncIterator[str],
+    headers: Optional[Dict[str, str]] = None
+) -> StreamingResponse:
+    """
+    1行ずつJSONを送信するストリーミングレスポンスを生成する
+    
+    Args:
+        lines: 改行で終わるJSON文字列を返す非同期イテレーター
+        headers: 追加するレスポンスヘッダー
+        
+    Returns:
+        StreamingResponse: NDJSONのレスポンス
+        
+    """
+    return StreamingResponse(
+        lines,
+        media_type="application/x-ndjson",
+        headers={"X-Accel-Buffering": "no", **(headers or {})}
+    )
+
+
+def get_zip_stream_response(
+    chunks: AsyncIterator[bytes],
+    headers: Optional[Dict[str, str]] = None
+) -> StreamingResponse:
+    """
+    ZIPアーカイブを逐次送信するストリーミングレスポンスを生成する
+    
+    Args:
+        chunks: ZIPのバイト列を順に返す非同期イテレーター
+        headers: 追加するレスポンスヘッダー
+        
+    Returns:
+        StreamingResponse: ZIPファイルのレスポンス
+        
+    """
+    return StreamingResponse(
+        chunks,
+        media_type="application/zip",
+        headers={
+            "Content-Disposition": "attachment; filename=audio.zip",
+            "X-Accel-Buffering": "no",
+            **(headers or {})
+        }
+    )
@@ -0,0 +1,223 @@
+"""
+Ranged responses
+
+キャッシュ済み音声を不変（immutable）のコンテンツとして返すレスポンスを提供する。
+強いETagによる再検証（304）と Range リクエスト（206）に対応し、
+ディスク上のファイルはサーバーが対応していれば sendfile（ASGIの zerocopysend 拡張）で送信する。
+"""
+from typing import Mapping, Optional, Tuple
+
+import anyio
+from fastapi.responses import JSONResponse, Response
+from starlette.types import Receive, Scope, Send
+
+# 内容が変わらないため、ブラウザやプロキシに無期限にキャッシュさせる
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+
+# ファイルを開く前にキャッシュから追い出された場合のエラーメッセージ
+EVICTED_DETAIL = "音声が見つかりません（キャッシュから削除された可能性があります）"
+
+
+def parse_byte_range(value: str, size: int) -> Optional[Tuple[int, int]]:
+    """
+    Range ヘッダーを解釈する
+
+    単一の範囲（bytes=0-99, bytes=100-, bytes=-100）のみに対応する。
+
+    Args:
+        value: Range ヘッダーの値
+        size: コンテンツのバイト数
+
+    Returns:
+        Optional[Tuple[int, int]]: 先頭と末尾のバイト位置（末尾を含む）。
+            解釈できない・複数の範囲の場合は None（全体を返す）
+
+    Raises:
+        ValueError: 範囲がコンテンツの外にある場合（416を返す）
+    """
+    unit, _, spec = value.partition("=")
+    if unit.strip().lower() != "bytes" or "," in spec:
+        return None
+    first, sep, last = spec.strip().partition("-")
+    first, last = first.strip(), last.strip()
+    if not sep:
+        return None
+    if not first:
+        # 末尾からのバイト数の指定
+        if not last.isdigit():
+            return None
+        suffix = int(last)
+        if suffix == 0 or size == 0:
+            raise ValueError("範囲がコンテンツの外にあります")
+        return max(0, size - suffix), size - 1
+    if not first.isdigit() or (last and not last.isdigit()):
+        return None
+    start = int(first)
+    end = int(last) if last else size - 1
+    if start >= size:
+        raise ValueError("範囲がコンテンツの外にあります")
+    if end < start:
+        return None
+    return start, min(end, size - 1)
+
+
+def etag_matches(if_none_match: Optional[str], *quoted_etags: str) -> bool:
+    """
+    If-None-Match ヘッダーがいずれかのETagと一致するかを判定する（弱い比較）
+
+    Args:
+        if_none_match: If-None-Match ヘッダーの値
+        quoted_etags: 引用符付きのETag
+
+    Returns:
+        bool: 一致する場合（* の場合を含む）は True
+    """
+    if if_none_match is None:
+        return False
+    candidates = [tag.strip().removeprefix("W/") for tag in if_none_match.split(",")]
+    return "*" in candidates or any(etag in candidates for etag in quoted_etags)
+
+
+class RangedAudioResponse(Response):
+    """メモリ上のバイト列またはファイルの一部（または全体）を返すレスポンス"""
+
+    chunk_size = 64 * 1024
+
+    def __init__(
+        self,
+        content: Optional[bytes] = None,
+        path: Optional[str] = None,
+        start: int = 0,
+        length: int = 0,
+        status_code: int = 200,
+        headers: Optional[Mapping[str, str]] = None,
+        media_type: Optional[str] = None,
+        send_body: bool = True
+    ):
+        """
+        Args:
+            content: メモリ上の音声データ（path と排他）
+            path: 音声ファイルのパス
+            start: 送信する先頭のバイト位置
+            length: 送信するバイト数
+            status_code: ステータスコード
+            headers: レスポンスヘッダー（Content-Length を含む）
+            media_type: Content-Type
+            send_body: False の場合はヘッダーのみ送信する（HEAD, 304）
+        """
+        self.content = content
+        self.path = path
+        self.start = start
+        self.length = length
+        self.send_body = send_body
+        self.status_code = status_code
+        self.media_type = media_type
+        self.background = None
+        self.init_headers(headers)
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if not self.send_body or self.length == 0:
+            await send({"type": "http.response.start", "status": self.status_code, "headers": self.raw_headers})
+            await send({"type": "http.response.body", "body": b"", "more_body": False})
+            return
+
+        if self.content is not None:
+            await send({"type": "http.response.start", "status": self.status_code, "headers": self.raw_headers})
+            body = memoryview(self.content)[self.start:self.start + self.length]
+            await send({"type": "http.response.body", "body": bytes(body), "more_body": False})
+            return
+
+        # ヘッダーを送る前に開き、追い出されたファイルではステータスを送る前に404を返す
+        try:
+            opened = await anyio.open_file(self.path, mode="rb")
+        except FileNotFoundError:
+            await JSONResponse(status_code=404, content={"detail": EVICTED_DETAIL})(scope, receive, send)
+            return
+        async with opened as file:
+            await send({"type": "http.response.start", "status": self.status_code, "headers": self.raw_headers})
+            if "http.response.zerocopysend" in scope.get("extensions", {}):
+                # サーバーがsendfileに対応している場合はカーネル内でコピーさせる
+                await send({
+                    "type": "http.response.zerocopysend",
+                    "file": file.wrapped,
+                    "offset": self.start,
+                    "count": self.length,
+                    "more_body": False,
+                })
+                return
+            await file.seek(self.start)
+            remaining = self.length
+            while remaining > 0:
+                chunk = await file.read(min(self.chunk_size, remaining))
+                if not chunk:
+                    break
+                remaining -= len(chunk)
+                await send({"type": "http.response.body", "body": chunk, "more_body": remaining > 0})
+            if remaining > 0:
+                # ファイルが途中で切り詰められていた場合も応答を終了させる
+                await send({"type": "http.response.body", "body": b"", "more_body": False})
+
+
+def get_immutable_audio_response(
+    etag: str,
+    media_type: str,
+    size: int,
+    content: Optional[bytes] = None,
+    path: Optional[str] = None,
+    range_header: Optional[str] = None,
+    if_range: Optional[str] = None,
+    if_none_match: Optional[str] = None,
+    method: str = "GET"
+) -> Response:
+    """
+    内容が変わらない音声を、条件付きリクエストと Range に対応して返す
+
+    Args:
+        etag: 強いETag（引用符なし。コンテンツのハッシュ）
+        media_type: Content-Type
+        size: 音声データのバイト数
+        content: メモリ上の音声データ
+        path: 音声ファイルのパス（content がない場合に使用）
+        range_header: Range ヘッダーの値
+        if_range: If-Range ヘッダーの値
+        if_none_match: If-None-Match ヘッダーの値
+        method: リクエストメソッド（HEAD の場合はボディを送らない）
+
+    Returns:
+        Response: 200（全体）, 206（部分）, 304（未変更）, 416（範囲外）のいずれか
+            （path のファイルが送信までに追い出されていた場合は送信時に404）
+    """
+    quoted_etag = f'"{etag}"'
+    headers = {
+        "ETag": quoted_etag,
+        "Cache-Control": IMMUTABLE_CACHE_CONTROL,
+        "Accept-Ranges": "bytes",
+    }
+
+    if etag_matches(if_none_match, quoted_etag):
+        return Response(status_code=304, headers=headers)
+
+    start, length, status_code = 0, size, 200
+    # If-Range がETagと一致しない場合は範囲指定を無視して全体を返す
+    if range_header and (if_range is None or if_range.strip() == quoted_etag):
+        try:
+            byte_range = parse_byte_range(range_header, size)
+        except ValueError:
+            return Response(status_code=416, headers={**headers, "Content-Range": f"bytes */{size}"})
+        if byte_range is not None:
+            start, end = byte_range
+            length = end - start + 1
+            status_code = 206
+            headers["Content-Range"] = f"bytes {start}-{end}/{size}"
+
+    headers["Content-Length"] = str(length)
+    return RangedAudioResponse(
+        content=content,
+        path=path if content is None else None,
+        start=start,
+        length=length,
+        status_code=status_code,
+        headers=headers,
+        media_type=media_type,
+        send_body=method.upper() != "HEAD"
+    )
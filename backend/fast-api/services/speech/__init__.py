@@ -4,12 +4,65 @@ Speech synthesis module
 AivisSpeech APIとの通信および音声合成機能を提供するモジュールです。
 """
 
-from .aivis_client import AivisSpeechClient
-from .speech_service import create_audio_query, synthesize_speech, text_to_speech
+from .aivis_client import AivisSpeechClient, get_aivis_client, close_aivis_client
+from .audio_cache import AudioCache, get_audio_cache
+from .query_cache import QueryCache, get_query_cache
+from .speech_service import (
+    create_audio_query,
+    synthesize_speech,
+    synthesize_text,
+    synthesize_composed,
+    text_to_speech,
+    get_published_audio,
+    get_viseme_timeline,
+    get_cache_stats,
+    get_stage_metrics_summary,
+)
+from .streaming import stream_text_to_speech
+from .batch import batch_text_to_speech
+from .ws_session import TTSWebSocketSession
+from .disconnect import run_until_disconnected, get_disconnect_stats
+from .stage_timing import render_metrics
+from .speculative import SpeculativeSynthesizer, speculate_from_stream, resolve_speculative_speaker
+from .filler import FillerPool, get_filler_pool, get_filler_status
+from .prewarm import Prewarmer, get_prewarmer, get_prewarm_status, load_prewarm_manifest
+from .admission import AdmissionController, CircuitBreaker, Priority, engine_request_policy
 
 __all__ = [
     "AivisSpeechClient",
+    "get_aivis_client",
+    "close_aivis_client",
+    "AudioCache",
+    "get_audio_cache",
+    "QueryCache",
+    "get_query_cache",
     "create_audio_query",
     "synthesize_speech",
+    "synthesize_text",
+    "synthesize_composed",
+    "SpeculativeSynthesizer",
+    "speculate_from_stream",
+    "resolve_speculative_speaker",
+    "FillerPool",
+    "get_filler_pool",
+    "get_filler_status",
     "text_to_speech",
+    "get_published_audio",
+    "get_viseme_timeline",
+    "get_cache_stats",
+    "get_stage_metrics_summary",
+    "render_metrics",
+    "stream_text_to_speech",
+    "batch_text_to_speech",
+    "TTSWebSocketSession",
+    "run_until_disconnected",
+    "get_disconnect_stats",
+    "Prewarmer",
+    "get_prewarmer",
+    "get_prewarm_status",
+    "load_prewarm_manifest",
+    "AdmissionController",
+    "CircuitBreaker",
+    "Priority",
+    "engine_request_policy",
 ] 
\ No newline at end of file
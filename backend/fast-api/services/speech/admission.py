@@ -0,0 +1,479 @@
+"""
+Admission control
+
+AivisSpeech Engineへのリクエストの前段に置く、優先度付きの待ち行列とサーキットブレーカー。
+リクエストは優先度クラス（interactive > normal > background）ごとに並び、
+空いた実行枠は優先度の高いクラスから割り当てる。クラスごとに同時実行数の上限を設け、
+待ち時間に応じて優先度を引き上げる（エージング）ことで低優先度の処理も止まらないようにする。
+待てない場合やエンジンが不調な間は即座に 503（Retry-After 付き）を返す。
+"""
+import asyncio
+import math
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from typing import Any, AsyncIterator, Awaitable, Callable, Deque, Dict, List, Optional, Tuple
+from fastapi import HTTPException
+
+from config import settings, logger
+
+
+class Priority:
+    """エンジンへのリクエストの優先度クラス"""
+    INTERACTIVE = "interactive"
+    NORMAL = "normal"
+    BACKGROUND = "background"
+
+
+# 優先度クラスの順位（小さいほど優先）
+PRIORITY_RANKS: Dict[str, int] = {
+    Priority.INTERACTIVE: 0,
+    Priority.NORMAL: 1,
+    Priority.BACKGROUND: 2,
+}
+
+# リクエストごとの優先度と待ち時間の上限（ルートごとに設定し、生成したタスクにも引き継がれる）
+current_priority: ContextVar[str] = ContextVar("current_priority", default=Priority.NORMAL)
+current_max_wait: ContextVar[Optional[float]] = ContextVar("current_max_wait", default=None)
+
+
+class PriorityTicket:
+    """
+    一連のエンジンへのリクエスト（single-flightで共有される合成など）の優先度
+
+    低い優先度で始まった処理に高い優先度の待ち手が合流した場合に、
+    待ち行列に並んでいるリクエストごと優先度を引き上げる（優先度の逆転を防ぐ）。
+    待ち手がいなくなった処理は、待ち行列に並んでいるリクエストごと優先度を引き下げる。
+    """
+
+    def __init__(self, priority: str):
+        """
+        Args:
+            priority: 初期の優先度クラス
+        """
+        self.priority = priority
+        self._waiting: List[Tuple["AdmissionController", "_Waiter"]] = []
+
+    def raise_to(self, priority: str) -> None:
+        """
+        優先度を引き上げる（現在より低い優先度が指定された場合は何もしない）
+
+        Args:
+            priority: 引き上げ後の優先度クラス
+        """
+        if PRIORITY_RANKS[priority] >= PRIORITY_RANKS[self.priority]:
+            return
+        self._change(priority)
+
+    def lower_to(self, priority: str) -> None:
+        """
+        優先度を引き下げる（現在より高い優先度が指定された場合は何もしない）
+
+        Args:
+            priority: 引き下げ後の優先度クラス
+        """
+        if PRIORITY_RANKS[priority] <= PRIORITY_RANKS[self.priority]:
+            return
+        self._change(priority)
+
+    def _change(self, priority: str) -> None:
+        self.priority = priority
+        for controller, waiter in list(self._waiting):
+            controller._move(waiter, priority)
+
+
+# 実行中の処理の優先度チケット（設定されている場合は current_priority より優先する）
+current_ticket: ContextVar[Optional[PriorityTicket]] = ContextVar("current_ticket", default=None)
+
+
+def engine_request_policy(priority: str, max_wait: Optional[float] = None) -> Callable[[], Awaitable[None]]:
+    """
+    ルートごとの優先度と待ち時間の上限を設定するFastAPIの依存関係を生成する
+
+    Args:
+        priority: 優先度クラス（Priority のいずれか）
+        max_wait: エンジンの待ち行列で待つ時間の上限（秒、省略時は既定値）
+
+    Returns:
+        Callable[[], Awaitable[None]]: ``Depends`` に渡す関数
+    """
+    if priority not in PRIORITY_RANKS:
+        raise ValueError(f"Unknown priority: {priority}")
+
+    async def dependency() -> None:
+        current_priority.set(priority)
+        current_max_wait.set(max_wait)
+    return dependency
+
+
+def _unavailable(detail: str, retry_after: float) -> HTTPException:
+    """Retry-After ヘッダー付きの503を生成する"""
+    return HTTPException(
+        status_code=503,
+        detail=detail,
+        headers={"Retry-After": str(max(1, math.ceil(retry_after)))}
+    )
+
+
+class CircuitBreaker:
+    """
+    エンジン全体の健全性を判定するサーキットブレーカー
+
+    closed: 通常状態。連続失敗が閾値に達すると open になる
+    open: リクエストを送らずに即座に失敗させる。一定時間後に half_open になる
+    half_open: 試行リクエストを1件だけ通し、成功すれば closed、失敗すれば open に戻る
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, failure_threshold: int, reset_timeout: float):
+        """
+        Args:
+            failure_threshold: open にするまでの連続失敗回数
+            reset_timeout: open から half_open に移るまでの秒数
+        """
+        self.failure_threshold = max(1, failure_threshold)
+        self.reset_timeout = reset_timeout
+        self._state = self.CLOSED
+        self._consecutive_failures = 0
+        self._opened_at = 0.0
+        self._probe_in_flight = False
+        self._times_opened = 0
+
+    @property
+    def state(self) -> str:
+        """現在の状態（open の期限切れは half_open として扱う）"""
+        if self._state == self.OPEN and time.monotonic() - self._opened_at >= self.reset_timeout:
+            self._state = self.HALF_OPEN
+        return self._state
+
+    def retry_after(self) -> float:
+        """open の状態が解除されるまでの秒数"""
+        return max(0.0, self._opened_at + self.reset_timeout - time.monotonic())
+
+    def before_call(self) -> None:
+        """
+        リクエストを送ってよいか判定する
+
+        Raises:
+            HTTPException: open の間、または half_open で試行中の場合（503）
+        """
+        state = self.state
+        if state == self.OPEN:
+            raise _unavailable("AivisSpeech Engineが不調のため一時的にリクエストを停止しています", self.retry_after())
+        if state == self.HALF_OPEN:
+            if self._probe_in_flight:
+                raise _unavailable("AivisSpeech Engineの復旧を確認中です", 1)
+            self._probe_in_flight = True
+
+    def record_success(self) -> None:
+        """成功を記録する"""
+        if self._state != self.CLOSED:
+            logger.info("AivisSpeech Engineへのリクエストを再開します")
+        self._state = self.CLOSED
+        self._consecutive_failures = 0
+        self._probe_in_flight = False
+
+    def record_failure(self) -> None:
+        """失敗を記録する"""
+        self._consecutive_failures += 1
+        if self._state == self.HALF_OPEN or self._consecutive_failures >= self.failure_threshold:
+            if self._state != self.OPEN:
+                self._times_opened += 1
+                logger.warning(f"AivisSpeech Engineへのリクエストを{self.reset_timeout:.0f}秒間停止します")
+            self._state = self.OPEN
+            self._opened_at = time.monotonic()
+        self._probe_in_flight = False
+
+    def record_ignored(self) -> None:
+        """結果を判定しない完了（キャンセルなど）を記録する"""
+        self._probe_in_flight = False
+
+    def get_stats(self) -> Dict[str, Any]:
+        """
+        状態を取得する
+
+        Returns:
+            Dict[str, Any]: 状態、連続失敗回数、open になった回数
+        """
+        return {
+            "state": self.state,
+            "consecutive_failures": self._consecutive_failures,
+            "retry_after_seconds": round(self.retry_after(), 1) if self._state == self.OPEN else 0.0,
+            "times_opened": self._times_opened,
+        }
+
+
+@dataclass
+class _Waiter:
+    """待ち行列に並んでいるリクエスト"""
+    priority: str
+    enqueued_at: float
+    future: "asyncio.Future[None]"
+
+
+@dataclass
+class _ClassState:
+    """優先度クラスごとの状態"""
+    limit: int
+    active: int = 0
+    queue: Deque[_Waiter] = field(default_factory=deque)
+    admitted: int = 0
+    rejected: int = 0
+    wait_times: Deque[float] = field(default_factory=lambda: deque(maxlen=1000))
+
+
+def _wait_summary(wait_times: Deque[float]) -> Dict[str, float]:
+    """待ち時間の平均・p95・最大を求める"""
+    ordered = sorted(wait_times)
+    if not ordered:
+        return {"wait_seconds_avg": 0.0, "wait_seconds_p95": 0.0, "wait_seconds_max": 0.0}
+    return {
+        "wait_seconds_avg": sum(ordered) / len(ordered),
+        "wait_seconds_p95": ordered[int(len(ordered) * 0.95)],
+        "wait_seconds_max": ordered[-1],
+    }
+
+
+class AdmissionController:
+    """優先度付きの待ち行列による同時実行数の制御"""
+
+    def __init__(
+        self,
+        max_concurrency: int,
+        max_queue: int,
+        default_max_wait: float,
+        breaker: CircuitBreaker,
+        class_limits: Optional[Dict[str, int]] = None,
+        aging_seconds: float = 5.0
+    ):
+        """
+        Args:
+            max_concurrency: エンジンへの同時リクエスト数の上限（全クラス合計）
+            max_queue: 待ち行列に並べる数の上限（全クラス合計）
+            default_max_wait: ルートで指定がない場合の待ち時間の上限（秒）
+            breaker: サーキットブレーカー
+            class_limits: 優先度クラスごとの同時実行数の上限（省略したクラスは全体の上限）
+            aging_seconds: 待ち時間がこの秒数に達するごとに優先度を1段階引き上げる
+        """
+        self.max_concurrency = max(1, max_concurrency)
+        self.max_queue = max(0, max_queue)
+        self.default_max_wait = default_max_wait
+        self.breaker = breaker
+        self.aging_seconds = aging_seconds
+        self._classes: Dict[str, _ClassState] = {
+            priority: _ClassState(
+                limit=min(self.max_concurrency, max(1, (class_limits or {}).get(priority, self.max_concurrency)))
+            )
+            for priority in PRIORITY_RANKS
+        }
+        self._active = 0
+        self._queued = 0
+        self._wait_times: Deque[float] = deque(maxlen=1000)
+        self._stats = {
+            "admitted": 0,
+            "rejected_queue_full": 0,
+            "rejected_timeout": 0,
+            "rejected_circuit_open": 0,
+        }
+
+    def _score(self, waiter: _Waiter, now: float) -> float:
+        """割り当ての優先順位（小さいほど優先、待ち時間に応じて小さくなる）"""
+        aging = (now - waiter.enqueued_at) / self.aging_seconds if self.aging_seconds > 0 else 0.0
+        return PRIORITY_RANKS[waiter.priority] - aging
+
+    def _dispatch(self) -> None:
+        """空いている実行枠を、クラスの上限の範囲で優先順位の高い待ち手に割り当てる"""
+        while self._active < self.max_concurrency:
+            now = time.monotonic()
+            chosen: Optional[_ClassState] = None
+            best = math.inf
+            for state in self._classes.values():
+                if not state.queue or state.active >= state.limit:
+                    continue
+                score = self._score(state.queue[0], now)
+                if score < best:
+                    chosen, best = state, score
+            if chosen is None:
+                return
+            waiter = chosen.queue.popleft()
+            self._queued -= 1
+            if waiter.future.done():
+                continue
+            self._active += 1
+            chosen.active += 1
+            waiter.future.set_result(None)
+
+    def _release_slot(self, priority: str) -> None:
+        """実行枠を返却し、待ち手に割り当て直す"""
+        self._active -= 1
+        self._classes[priority].active -= 1
+        self._dispatch()
+
+    def _move(self, waiter: _Waiter, priority: str) -> None:
+        """待ち行列に並んでいるリクエストを別の優先度クラスへ移す"""
+        state = self._classes[waiter.priority]
+        if waiter.future.done() or waiter not in state.queue:
+            return
+        state.queue.remove(waiter)
+        waiter.priority = priority
+        self._classes[priority].queue.append(waiter)
+        self._dispatch()
+
+    async def _acquire_slot(
+        self,
+        priority: str,
+        max_wait: float,
+        ticket: Optional[PriorityTicket] = None
+    ) -> str:
+        """
+        実行枠を確保する（上限時間まで待つ）
+
+        Returns:
+            str: 実行枠を割り当てられた優先度クラス（待機中に引き上げられた場合は引き上げ後）
+        """
+        state = self._classes[priority]
+        can_start = self._active < self.max_concurrency and state.active < state.limit and not state.queue
+        if not can_start and self._queued >= self.max_queue:
+            self._stats["rejected_queue_full"] += 1
+            state.rejected += 1
+            raise _unavailable("AivisSpeech Engineが混雑しています", max_wait or 1)
+
+        waiter = _Waiter(priority, time.monotonic(), asyncio.get_running_loop().create_future())
+        state.queue.append(waiter)
+        self._queued += 1
+        self._dispatch()
+        if not waiter.future.done():
+            if ticket is not None:
+                ticket._waiting.append((self, waiter))
+            try:
+                await asyncio.wait_for(waiter.future, timeout=max_wait)
+            except BaseException as e:
+                state = self._classes[waiter.priority]
+                if waiter.future.done() and not waiter.future.cancelled():
+                    # 待ち時間切れと同時に枠が割り当てられた場合は返却する
+                    self._release_slot(waiter.priority)
+                elif waiter in state.queue:
+                    state.queue.remove(waiter)
+                    self._queued -= 1
+                if isinstance(e, asyncio.TimeoutError):
+                    self._stats["rejected_timeout"] += 1
+                    state.rejected += 1
+                    raise _unavailable("AivisSpeech Engineの待ち時間が上限を超えました", max_wait)
+                raise
+            finally:
+                if ticket is not None:
+                    ticket._waiting.remove((self, waiter))
+        waited = time.monotonic() - waiter.enqueued_at
+        self._wait_times.append(waited)
+        self._classes[waiter.priority].wait_times.append(waited)
+        return waiter.priority
+
+    @asynccontextmanager
+    async def admit(
+        self,
+        max_wait: Optional[float] = None,
+        priority: Optional[str] = None
+    ) -> AsyncIterator[None]:
+        """
+        エンジンへのリクエストを1件実行する枠を確保する
+
+        Args:
+            max_wait: 待ち時間の上限（省略時はルートの設定値、なければ既定値）
+            priority: 優先度クラス（省略時は実行中の処理のチケット、ルートの設定値、normal の順）
+
+        Raises:
+            HTTPException: 待ち行列が満杯、待ち時間切れ、またはブレーカーが open の場合（503）
+        """
+        if max_wait is None:
+            max_wait = current_max_wait.get()
+        if max_wait is None:
+            max_wait = self.default_max_wait
+        ticket = None
+        if priority is None:
+            ticket = current_ticket.get()
+            priority = ticket.priority if ticket is not None else current_priority.get()
+
+        try:
+            self.breaker.before_call()
+        except HTTPException:
+            self._stats["rejected_circuit_open"] += 1
+            raise
+        try:
+            priority = await self._acquire_slot(priority, max_wait, ticket)
+        except BaseException:
+            self.breaker.record_ignored()
+            raise
+        self._stats["admitted"] += 1
+        self._classes[priority].admitted += 1
+        try:
+            yield
+        finally:
+            self._release_slot(priority)
+
+    @property
+    def active(self) -> int:
+        """実行中のリクエスト数"""
+        return self._active
+
+    @property
+    def queue_depth(self) -> int:
+        """待ち行列に並んでいるリクエスト数"""
+        return self._queued
+
+    def get_stats(self) -> Dict[str, Any]:
+        """
+        待ち行列とブレーカーの状態を取得する
+
+        Returns:
+            Dict[str, Any]: 実行中の数、待ち行列の長さ、待ち時間、拒否数（全体と優先度クラスごと）、
+                ブレーカーの状態
+        """
+        return {
+            "active": self._active,
+            "max_concurrency": self.max_concurrency,
+            "queue_depth": self._queued,
+            "max_queue": self.max_queue,
+            **self._stats,
+            **_wait_summary(self._wait_times),
+            "classes": {
+                priority: {
+                    "active": state.active,
+                    "limit": state.limit,
+                    "queue_depth": len(state.queue),
+                    "admitted": state.admitted,
+                    "rejected": state.rejected,
+                    **_wait_summary(state.wait_times),
+                }
+                for priority, state in self._classes.items()
+            },
+            "circuit_breaker": self.breaker.get_stats(),
+        }
+
+
+def create_admission_controller() -> AdmissionController:
+    """
+    設定値からAdmissionControllerを生成する
+
+    Returns:
+        AdmissionController: 設定済みのAdmissionController
+    """
+    return AdmissionController(
+        max_concurrency=settings.engine_max_concurrency,
+        max_queue=settings.engine_max_queue,
+        default_max_wait=settings.engine_queue_wait_default,
+        breaker=CircuitBreaker(
+            failure_threshold=settings.engine_breaker_failure_threshold,
+            reset_timeout=settings.engine_breaker_reset_timeout
+        ),
+        class_limits={
+            Priority.INTERACTIVE: settings.engine_max_concurrency,
+            Priority.NORMAL: settings.engine_max_concurrency_normal,
+            Priority.BACKGROUND: settings.engine_max_concurrency_background,
+        },
+        aging_seconds=settings.engine_priority_aging_seconds
+    )
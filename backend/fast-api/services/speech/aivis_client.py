@@ -3,84 +3,488 @@ AivisSpeech API Client
 
 AivisSpeech Engineとの通信を担うクライアントクラス
 """
-import requests
-from typing import Dict, Any
+import asyncio
+import hashlib
+import io
+import json
+import time
+import zipfile
+import httpx
+from typing import Dict, Any, List, Optional
 from fastapi import HTTPException
 
 from config import settings, logger
+from .admission import create_admission_controller
+from .engine_pool import EnginePool
+
+# エンジン識別子を求められなかった場合に、次に求め直すまでの秒数
+FINGERPRINT_RETRY_SECONDS = 5.0
 
 
 class AivisSpeechClient:
-    """AivisSpeech Engine APIクライアント"""
-    
-    def __init__(self, base_url: str = None):
+    """
+    AivisSpeech Engine APIクライアント
+
+    keep-aliveの接続プールを共有する非同期クライアント。
+    アプリケーションのlifespanで一度だけ生成し、全リクエストで使い回す。
+    複数のエンジンが指定された場合はEnginePoolで振り分ける。
+    """
+
+    def __init__(
+        self,
+        base_url: str = None,
+        transport: Optional[httpx.AsyncBaseTransport] = None
+    ):
+        """
+        Args:
+            base_url: AivisSpeech EngineのベースURL（カンマ区切りで複数指定可、省略時は設定値）
+            transport: httpxのトランスポート（テスト用の差し替え口）
+        """
+        urls = (
+            [url.strip() for url in base_url.split(",") if url.strip()]
+            if base_url else settings.aivis_base_urls
+        )
         self.base_url = base_url or settings.aivis_base_url
-    
-    def create_audio_query(self, text: str, speaker_id: int) -> Dict[str, Any]:
+        self.pool = EnginePool(
+            urls,
+            failure_threshold=settings.aivis_failure_threshold,
+            ejection_seconds=settings.aivis_ejection_seconds,
+            max_ejection_seconds=settings.aivis_max_ejection_seconds
+        )
+        self.admission = create_admission_controller()
+        self._transport = transport
+        self._http: Optional[httpx.AsyncClient] = None
+        self._fingerprint: Optional[str] = None
+        self._fingerprint_next_refresh: float = 0.0
+        self._fingerprint_task: Optional["asyncio.Task[str]"] = None
+        # /multi_synthesis に対応しているか（未確認の場合はNone）
+        self.supports_multi_synthesis: Optional[bool] = None
+
+    @property
+    def http(self) -> httpx.AsyncClient:
         """
-        テキストからaudio_queryを作成する
-        
+        共有のhttpx.AsyncClientを返す（未生成なら生成する）
+
+        Returns:
+            httpx.AsyncClient: keep-alive接続プールを持つクライアント
+        """
+        if self._http is None or self._http.is_closed:
+            self._http = httpx.AsyncClient(
+                timeout=httpx.Timeout(
+                    settings.aivis_read_timeout,
+                    connect=settings.aivis_connect_timeout
+                ),
+                limits=httpx.Limits(
+                    max_connections=settings.aivis_max_connections,
+                    max_keepalive_connections=settings.aivis_max_keepalive_connections,
+                    keepalive_expiry=settings.aivis_keepalive_expiry
+                ),
+                transport=self._transport
+            )
+        return self._http
+
+    async def aclose(self) -> None:
+        """接続プールを閉じる"""
+        if self._http is not None and not self._http.is_closed:
+            await self._http.aclose()
+        self._http = None
+
+    async def _request(
+        self,
+        method: str,
+        path: str,
+        error_detail: str,
+        backend_url: Optional[str] = None,
+        **kwargs: Any
+    ) -> httpx.Response:
+        """
+        AivisSpeech Engineへリクエストを送信する
+
         Args:
-            text: 合成したいテキスト
-            speaker_id: 話者ID
-            
+            method: HTTPメソッド
+            path: エンドポイントのパス
+            error_detail: 成功（2xx）以外が返ってきた場合のエラーメッセージ
+            backend_url: 送信先のエンジン（省略時はEnginePoolで選ぶ）
+            **kwargs: httpxへそのまま渡す引数
+
         Returns:
-            Dict[str, Any]: audio_queryデータ
-            
+            httpx.Response: 成功（2xx）のレスポンス
+
         Raises:
-            HTTPException: API呼び出しが失敗した場合
+            HTTPException: 接続に失敗した場合（503）、待ち行列に入れない場合や
+                サーキットブレーカーが開いている場合（503、Retry-After 付き）、
+                または成功（2xx）以外が返ってきた場合
+
+        Note:
+            接続自体に失敗した場合（リクエストが処理されていない場合）に限り、
+            別のエンジンで1回だけ再試行する（送信先を指定した場合は再試行しない）。
         """
-        try:
-            params = {"speaker": speaker_id, "text": text}
-            response = requests.post(
-                f"{self.base_url}/audio_query", 
-                params=params
+        async with self.admission.admit():
+            try:
+                response = await self._send(method, path, backend_url=backend_url, **kwargs)
+            except HTTPException:
+                self.admission.breaker.record_failure()
+                raise
+            except BaseException:
+                # キャンセルなどはエンジンの健全性として扱わない
+                self.admission.breaker.record_ignored()
+                raise
+            if response.status_code >= 500:
+                self.admission.breaker.record_failure()
+            else:
+                self.admission.breaker.record_success()
+        if not response.is_success:
+            raise HTTPException(
+                status_code=response.status_code,
+                detail=error_detail
             )
-            if response.status_code != 200:
+        return response
+
+    async def _send(
+        self,
+        method: str,
+        path: str,
+        backend_url: Optional[str] = None,
+        **kwargs: Any
+    ) -> httpx.Response:
+        """
+        EnginePoolで選んだエンジン（または指定されたエンジン）へリクエストを送信する
+
+        Raises:
+            HTTPException: 接続に失敗した場合（503）
+            ValueError: 指定されたエンジンがプールにない場合
+        """
+        target = None
+        if backend_url is not None:
+            target = self.pool.get(backend_url)
+            if target is None:
+                raise ValueError(f"エンジンがプールにありません: {backend_url}")
+        attempts = 2 if len(self.pool) > 1 and target is None else 1
+        previous = None
+        for attempt in range(attempts):
+            backend = self.pool.acquire(exclude=previous, target=target)
+            try:
+                response = await self.http.request(method, f"{backend.url}{path}", **kwargs)
+            except httpx.RequestError as e:
+                self.pool.release(backend, success=False)
+                logger.error(f"AivisSpeech Engineに接続できません: {backend.url}: {e}")
+                if isinstance(e, (httpx.ConnectError, httpx.ConnectTimeout)) and attempt + 1 < attempts:
+                    previous = backend
+                    continue
                 raise HTTPException(
-                    status_code=response.status_code,
-                    detail="AivisSpeech Engineからオーディオクエリを取得できませんでした"
+                    status_code=503,
+                    detail=f"AivisSpeech Engineに接続できません: {e}"
                 )
-            return response.json()
-        except requests.exceptions.RequestException as e:
-            logger.error(f"AivisSpeech Engineに接続できません: {e}")
+            except BaseException:
+                self.pool.release(backend, success=None)
+                raise
+            self.pool.release(backend, success=response.status_code < 500)
+            return response
+
+    async def get_version(self) -> Any:
+        """
+        エンジンのバージョン情報を取得する
+
+        Returns:
+            Any: バージョン情報
+
+        Raises:
+            HTTPException: API呼び出しが失敗した場合
+        """
+        response = await self._request(
+            "GET",
+            "/version",
+            "AivisSpeech Engineに接続できましたが、正常なレスポンスが返ってきませんでした"
+        )
+        return response.json()
+
+    async def _probe(self, backend_url: str, path: str, timeout: float) -> httpx.Response:
+        """
+        1台のエンジンへ直接GETを送信する
+
+        待ち行列、サーキットブレーカー、EnginePoolを経由しない。処理中の数や失敗の回数に
+        数えないため、監視のための確認が遅い・失敗した場合にもエンジンは除外されない。
+        接続は通常のリクエストと同じ接続プールを使う。
+
+        Raises:
+            HTTPException: 接続に失敗した場合（503）、または成功（2xx）以外が返ってきた場合
+        """
+        try:
+            response = await self.http.get(f"{backend_url.rstrip('/')}{path}", timeout=timeout)
+        except httpx.RequestError as e:
             raise HTTPException(
                 status_code=503,
                 detail=f"AivisSpeech Engineに接続できません: {e}"
             )
-    
-    def synthesize_speech(self, query: Dict[str, Any], speaker_id: int) -> bytes:
+        if not response.is_success:
+            raise HTTPException(
+                status_code=response.status_code,
+                detail="AivisSpeech Engineに接続できましたが、正常なレスポンスが返ってきませんでした"
+            )
+        return response
+
+    async def probe_version(self, backend_url: str, timeout: float) -> Any:
+        """
+        死活監視のために1台のエンジンのバージョン情報を取得する
+
+        待ち行列・サーキットブレーカー・EnginePoolを経由しない（混雑時や不調時にも状態を
+        確認でき、確認の結果が振り分けや除外に影響しないようにする）。
+
+        Args:
+            backend_url: 確認するエンジン
+            timeout: タイムアウト（秒）
+
+        Returns:
+            Any: バージョン情報
+
+        Raises:
+            HTTPException: 接続に失敗した場合（503）、または成功（2xx）以外が返ってきた場合
+        """
+        response = await self._probe(backend_url, "/version", timeout)
+        return response.json()
+
+    async def get_speakers(self) -> List[Dict[str, Any]]:
+        """
+        話者一覧を取得する
+
+        Returns:
+            List[Dict[str, Any]]: 話者一覧データ
+
+        Raises:
+            HTTPException: API呼び出しが失敗した場合
+        """
+        response = await self._request(
+            "GET",
+            "/speakers",
+            "AivisSpeech Engineからスピーカー情報を取得できませんでした"
+        )
+        return response.json()
+
+    async def get_user_dict(self) -> Dict[str, Any]:
+        """
+        ユーザー辞書を取得する
+
+        Returns:
+            Dict[str, Any]: ユーザー辞書データ
+
+        Raises:
+            HTTPException: API呼び出しが失敗した場合
+        """
+        response = await self._request(
+            "GET",
+            "/user_dict",
+            "AivisSpeech Engineからユーザー辞書を取得できませんでした"
+        )
+        return response.json()
+
+    async def get_fingerprint(self) -> str:
+        """
+        エンジンのバージョンとユーザー辞書から求めた識別子を返す
+
+        キャッシュキーに含めることで、エンジンの更新や辞書の変更後に
+        古い合成結果が返らないようにする。通常は保持している値を返すのみで、
+        有効期限（ENGINE_FINGERPRINT_TTL）を過ぎている場合はバックグラウンドで求め直す
+        （死活監視が動いている場合はそちらで先に求め直される）。まだ一度も求めていない
+        場合のみ、求め終わるのを待つ。
+
+        Returns:
+            str: エンジンのバージョンとユーザー辞書のハッシュ（取得できない場合は "unknown"）
+        """
+        if time.monotonic() >= self._fingerprint_next_refresh:
+            if self._fingerprint is None:
+                return await self.refresh_fingerprint()
+            self._start_fingerprint_refresh(None, None)
+        return self._fingerprint or "unknown"
+
+    def fingerprint_due(self) -> bool:
+        """エンジン識別子を求め直す時期かどうか"""
+        return time.monotonic() >= self._fingerprint_next_refresh
+
+    async def refresh_fingerprint(self, backend_url: Optional[str] = None, version: Any = None) -> str:
+        """
+        エンジン識別子を求め直して保持する（同時に呼ばれた場合は1回だけ問い合わせる）
+
+        待ち行列・EnginePoolを経由せずにエンジンへ直接問い合わせるため、
+        混雑していても合成のリクエストの後ろで待たされない。
+
+        Args:
+            backend_url: 問い合わせるエンジン（省略時は振り分け対象のエンジン）
+            version: 死活監視で取得済みのバージョン情報（省略時は /version から取得する）
+
+        Returns:
+            str: 求め直した識別子（取得できない場合は保持している値か "unknown"）
+        """
+        task = self._start_fingerprint_refresh(backend_url, version)
+        # 呼び出し元のリクエストが中断されても、求め直しは続ける
+        return await asyncio.shield(task)
+
+    def _start_fingerprint_refresh(self, backend_url: Optional[str], version: Any) -> "asyncio.Task[str]":
+        if self._fingerprint_task is None or self._fingerprint_task.done():
+            self._fingerprint_task = asyncio.create_task(self._fetch_fingerprint(backend_url, version))
+        return self._fingerprint_task
+
+    async def _fetch_fingerprint(self, backend_url: Optional[str], version: Any) -> str:
+        if backend_url is None:
+            now = time.monotonic()
+            backend_url = next(
+                (b.url for b in self.pool.backends if b.is_available(now)), self.pool.backends[0].url
+            )
+        timeout = settings.engine_health_timeout
+        try:
+            if version is None:
+                version = (await self._probe(backend_url, "/version", timeout)).json()
+            user_dict = (await self._probe(backend_url, "/user_dict", timeout)).json()
+        except (HTTPException, ValueError) as e:
+            # 求められなかった場合は、有効期限を待たずに求め直す
+            self._fingerprint_next_refresh = time.monotonic() + min(
+                FINGERPRINT_RETRY_SECONDS, settings.engine_fingerprint_ttl
+            )
+            logger.warning(f"エンジン識別子を更新できませんでした: {getattr(e, 'detail', e)}")
+            return self._fingerprint or "unknown"
+        payload = json.dumps(
+            {"version": version, "user_dict": user_dict},
+            sort_keys=True,
+            ensure_ascii=False
+        )
+        self._fingerprint = hashlib.sha256(payload.encode("utf-8")).hexdigest()[:16]
+        self._fingerprint_next_refresh = time.monotonic() + settings.engine_fingerprint_ttl
+        return self._fingerprint
+
+    async def create_audio_query(self, text: str, speaker_id: int) -> Dict[str, Any]:
+        """
+        テキストからaudio_queryを作成する
+
+        Args:
+            text: 合成したいテキスト
+            speaker_id: 話者ID
+
+        Returns:
+            Dict[str, Any]: audio_queryデータ
+
+        Raises:
+            HTTPException: API呼び出しが失敗した場合
+        """
+        response = await self._request(
+            "POST",
+            "/audio_query",
+            "AivisSpeech Engineからオーディオクエリを取得できませんでした",
+            params={"speaker": speaker_id, "text": text}
+        )
+        return response.json()
+
+    async def synthesize_speech(self, query: Dict[str, Any], speaker_id: int) -> bytes:
         """
         audio_queryから音声を合成する
-        
+
         Args:
             query: audio_queryデータ
             speaker_id: 話者ID
-            
+
         Returns:
             bytes: 合成された音声データ（WAV形式）
-            
+
         Raises:
             HTTPException: API呼び出しが失敗した場合
         """
+        response = await self._request(
+            "POST",
+            "/synthesis",
+            "AivisSpeech Engineから音声を合成できませんでした",
+            params={"speaker": speaker_id},
+            json=query
+        )
+        return response.content
+
+    async def initialize_speaker(self, speaker_id: int, backend_url: Optional[str] = None) -> None:
+        """
+        話者のモデルをエンジンに読み込ませる（読み込み済みの場合は何もしない）
+
+        Args:
+            speaker_id: 話者ID
+            backend_url: 送信先のエンジン（省略時はEnginePoolで選ぶ）
+
+        Raises:
+            HTTPException: API呼び出しが失敗した場合
+        """
+        await self._request(
+            "POST",
+            "/initialize_speaker",
+            f"AivisSpeech Engineで話者 {speaker_id} を初期化できませんでした",
+            backend_url=backend_url,
+            params={"speaker": speaker_id, "skip_reinit": "true"}
+        )
+
+    async def multi_synthesis(self, queries: List[Dict[str, Any]], speaker_id: int) -> List[bytes]:
+        """
+        複数のaudio_queryをまとめて音声合成する
+
+        Args:
+            queries: audio_queryデータのリスト
+            speaker_id: 話者ID
+
+        Returns:
+            List[bytes]: queriesと同じ順の音声データ（WAV形式）
+
+        Raises:
+            HTTPException: API呼び出しが失敗した場合。エンジンが /multi_synthesis に
+                対応していない場合は supports_multi_synthesis が False になる
+        """
         try:
-            params = {"speaker": speaker_id}
-            headers = {"Content-Type": "application/json"}
-            response = requests.post(
-                f"{self.base_url}/synthesis",
-                params=params,
-                headers=headers,
-                json=query
+            response = await self._request(
+                "POST",
+                "/multi_synthesis",
+                "AivisSpeech Engineから音声をまとめて合成できませんでした",
+                params={"speaker": speaker_id},
+                json=queries
             )
-            if response.status_code != 200:
-                raise HTTPException(
-                    status_code=response.status_code,
-                    detail="AivisSpeech Engineから音声を合成できませんでした"
-                )
-            return response.content
-        except requests.exceptions.RequestException as e:
-            logger.error(f"AivisSpeech Engineに接続できません: {e}")
+        except HTTPException as e:
+            if e.status_code in (404, 405):
+                self.supports_multi_synthesis = False
+            raise
+        self.supports_multi_synthesis = True
+
+        # レスポンスは連番のWAVファイルを含むZIP
+        try:
+            with zipfile.ZipFile(io.BytesIO(response.content)) as archive:
+                names = sorted(name for name in archive.namelist() if name.endswith(".wav"))
+                audios = [archive.read(name) for name in names]
+        except zipfile.BadZipFile:
             raise HTTPException(
-                status_code=503,
-                detail=f"AivisSpeech Engineに接続できません: {e}"
-            ) 
\ No newline at end of file
+                status_code=502,
+                detail="AivisSpeech Engineから不正なZIPが返されました"
+            )
+        if len(audios) != len(queries):
+            raise HTTPException(
+                status_code=502,
+                detail="AivisSpeech Engineから返された音声の数が一致しません"
+            )
+        return audios
+
+
+# アプリケーション全体で共有するクライアントインスタンス
+_client_instance: Optional[AivisSpeechClient] = None
+
+
+def get_aivis_client() -> AivisSpeechClient:
+    """
+    共有のAivisSpeechClientを取得する
+
+    Returns:
+        AivisSpeechClient: 共有クライアント
+
+    Note:
+        通常はアプリケーションのlifespan開始時に生成される。
+        lifespan外（テストなど）から呼ばれた場合はその場で生成する。
+    """
+    global _client_instance
+    if _client_instance is None:
+        _client_instance = AivisSpeechClient()
+    return _client_instance
+
+
+async def close_aivis_client() -> None:
+    """共有クライアントの接続プールを閉じて破棄する"""
+    global _client_instance
+    if _client_instance is not None:
+        await _client_instance.aclose()
+        _client_instance = None
@@ -0,0 +1,409 @@
+"""
+Audio cache
+
+合成済み音声をコンテンツアドレス（ハッシュ）で保持する2層キャッシュ。
+メモリ層（バイト数上限付きLRU）とディスク層（data/ 配下）で構成し、
+追い出しは再生成コスト（合成時間×バイト数）を考慮して行う。
+"""
+import asyncio
+import hashlib
+import json
+import os
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Dict, Any, List, Optional, Tuple
+
+from config import settings, logger
+from ..text.canonical import canonicalize_text
+
+
+@dataclass
+class AudioCacheEntry:
+    """キャッシュエントリ"""
+    size: int
+    synthesis_time: float
+    audio: Optional[bytes] = None
+
+    @property
+    def cost(self) -> float:
+        """再生成コスト（合成時間×バイト数）"""
+        return self.synthesis_time * self.size
+
+
+def _hash_payload(payload: Dict[str, Any]) -> str:
+    """辞書を正規化したJSONにしてSHA-256を求める"""
+    serialized = json.dumps(payload, sort_keys=True, ensure_ascii=False, separators=(",", ":"))
+    return hashlib.sha256(serialized.encode("utf-8")).hexdigest()
+
+
+def make_tts_key(
+    text: str,
+    speaker_id: int,
+    query_params: Optional[Dict[str, Any]],
+    engine_tag: str
+) -> str:
+    """
+    テキストからの合成結果用のキャッシュキーを生成する
+
+    Args:
+        text: 合成するテキスト（キーには canonicalize_text で正規化したものを使う）
+        speaker_id: 話者ID
+        query_params: audio_queryに適用するパラメータ
+        engine_tag: エンジンのバージョン・ユーザー辞書の識別子
+
+    Returns:
+        str: SHA-256の16進文字列
+    """
+    return _hash_payload({
+        "kind": "tts",
+        "text": canonicalize_text(text),
+        "speaker": speaker_id,
+        "params": query_params or {},
+        "engine": engine_tag,
+    })
+
+
+def make_synthesis_key(query: Dict[str, Any], speaker_id: int, engine_tag: str) -> str:
+    """
+    audio_queryからの合成結果用のキャッシュキーを生成する
+
+    Args:
+        query: audio_queryデータ
+        speaker_id: 話者ID
+        engine_tag: エンジンのバージョン・ユーザー辞書の識別子
+
+    Returns:
+        str: SHA-256の16進文字列
+    """
+    return _hash_payload({
+        "kind": "synthesis",
+        "query": query,
+        "speaker": speaker_id,
+        "engine": engine_tag,
+    })
+
+
+def variant_key(key: str, format_name: str) -> str:
+    """
+    WAVのキャッシュキーから圧縮形式の変換結果用のキーを生成する
+
+    Args:
+        key: WAVのキャッシュキー
+        format_name: 形式名（ogg, mp3, flac）
+
+    Returns:
+        str: ``{key}.{format_name}`` 形式のキー（ディスク層では同じ名前のファイルになる）
+    """
+    return f"{key}.{format_name}"
+
+
+def content_key(audio: bytes, format_name: str) -> Tuple[str, str]:
+    """
+    音声データの内容そのものから、配信用（/audio/{ハッシュ}.{形式名}）のキャッシュキーを生成する
+
+    Args:
+        audio: 配信する音声データ
+        format_name: 形式名（wav, ogg, mp3, flac）
+
+    Returns:
+        Tuple[str, str]: 音声データのSHA-256の16進文字列とキャッシュキー。
+            WAVはハッシュそのもの、圧縮形式は variant_key と同じ ``{ハッシュ}.{形式名}``
+    """
+    digest = hashlib.sha256(audio).hexdigest()
+    return digest, digest if format_name == "wav" else variant_key(digest, format_name)
+
+
+class AudioCache:
+    """
+    メモリ層とディスク層からなる合成音声キャッシュ
+
+    WAVは ``{key}.wav``、圧縮形式の変換結果は同じキーに形式名を付けた
+    ``{key}.{形式名}`` としてWAVと並べて保存する。
+    各層はアクセス順（LRU）を保持し、容量を超えた場合はLRU末尾の
+    eviction_window件の候補から再生成コストが最も小さいものを追い出す。
+    """
+
+    def __init__(
+        self,
+        directory: Optional[str],
+        memory_budget_bytes: int,
+        disk_budget_bytes: int,
+        eviction_window: int = 8
+    ):
+        """
+        Args:
+            directory: ディスク層の保存先（Noneの場合はメモリ層のみ）
+            memory_budget_bytes: メモリ層の上限バイト数
+            disk_budget_bytes: ディスク層の上限バイト数
+            eviction_window: 追い出し候補として比較するLRU末尾の件数
+        """
+        self.directory = directory
+        self.memory_budget_bytes = memory_budget_bytes
+        self.disk_budget_bytes = disk_budget_bytes
+        self.eviction_window = max(1, eviction_window)
+
+        self._memory: "OrderedDict[str, AudioCacheEntry]" = OrderedDict()
+        self._memory_bytes = 0
+        self._disk: "OrderedDict[str, AudioCacheEntry]" = OrderedDict()
+        self._disk_bytes = 0
+        self._stats = {
+            "memory_hits": 0,
+            "disk_hits": 0,
+            "misses": 0,
+            "memory_evictions": 0,
+            "disk_evictions": 0,
+        }
+
+        if self.directory:
+            self._load_disk_index()
+
+    # ---- ディスク層のパス ----
+
+    def _audio_path(self, key: str) -> str:
+        # 形式名付きのキー（variant_key）はそのままファイル名にする
+        return os.path.join(self.directory, key if "." in key else f"{key}.wav")
+
+    def _meta_path(self, key: str) -> str:
+        return os.path.join(self.directory, f"{key}.json")
+
+    def _load_disk_index(self) -> None:
+        """既存のディスク層の内容をインデックスに読み込む"""
+        os.makedirs(self.directory, exist_ok=True)
+        records = []
+        for entry in os.scandir(self.directory):
+            if entry.name.endswith((".json", ".tmp")):
+                continue
+            key = entry.name[:-4] if entry.name.endswith(".wav") else entry.name
+            synthesis_time = 0.0
+            try:
+                with open(self._meta_path(key), "r", encoding="utf-8") as f:
+                    synthesis_time = float(json.load(f).get("synthesis_time", 0.0))
+            except (OSError, ValueError):
+                pass
+            stat = entry.stat()
+            records.append((stat.st_mtime, key, AudioCacheEntry(stat.st_size, synthesis_time)))
+        # 更新日時の古い順に並べてLRU順とする
+        for _, key, record in sorted(records, key=lambda r: r[0]):
+            self._disk[key] = record
+            self._disk_bytes += record.size
+        if records:
+            logger.info(f"音声キャッシュ（ディスク）を読み込みました: {len(records)}件, {self._disk_bytes}バイト")
+
+    def _write_disk(self, key: str, audio: bytes, synthesis_time: float) -> None:
+        """音声とメタデータを一時ファイル経由でアトミックに書き込む"""
+        tmp_path = f"{self._audio_path(key)}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(audio)
+        os.replace(tmp_path, self._audio_path(key))
+        with open(self._meta_path(key), "w", encoding="utf-8") as f:
+            json.dump({"synthesis_time": synthesis_time, "size": len(audio)}, f)
+
+    def _read_disk(self, key: str) -> Optional[bytes]:
+        try:
+            with open(self._audio_path(key), "rb") as f:
+                return f.read()
+        except OSError:
+            return None
+
+    def _remove_disk(self, keys: List[str]) -> None:
+        for key in keys:
+            for path in (self._audio_path(key), self._meta_path(key)):
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+
+    # ---- 追い出し ----
+
+    def _pick_victim(self, tier: "OrderedDict[str, AudioCacheEntry]") -> str:
+        """LRU末尾の候補から再生成コストが最小のキーを選ぶ"""
+        candidates = []
+        for key in tier:
+            candidates.append(key)
+            if len(candidates) >= self.eviction_window:
+                break
+        return min(candidates, key=lambda k: tier[k].cost)
+
+    def _evict_memory(self) -> None:
+        while self._memory_bytes > self.memory_budget_bytes and self._memory:
+            key = self._pick_victim(self._memory)
+            entry = self._memory.pop(key)
+            self._memory_bytes -= entry.size
+            self._stats["memory_evictions"] += 1
+
+    def _evict_disk(self) -> List[str]:
+        """容量を超えた分をインデックスから外し、ファイルを削除するキーを返す"""
+        evicted = []
+        while self._disk_bytes > self.disk_budget_bytes and self._disk:
+            key = self._pick_victim(self._disk)
+            entry = self._disk.pop(key)
+            self._disk_bytes -= entry.size
+            evicted.append(key)
+            self._stats["disk_evictions"] += 1
+        return evicted
+
+    def _store_memory(self, key: str, audio: bytes, synthesis_time: float) -> None:
+        if len(audio) > self.memory_budget_bytes:
+            return
+        previous = self._memory.pop(key, None)
+        if previous is not None:
+            self._memory_bytes -= previous.size
+        self._memory[key] = AudioCacheEntry(len(audio), synthesis_time, audio)
+        self._memory_bytes += len(audio)
+        self._evict_memory()
+
+    # ---- 公開API ----
+
+    async def get(self, key: str) -> Optional[bytes]:
+        """
+        キャッシュから音声を取得する
+
+        Args:
+            key: キャッシュキー
+
+        Returns:
+            Optional[bytes]: 音声データ（存在しない場合はNone）
+        """
+        entry = self._memory.get(key)
+        if entry is not None:
+            self._memory.move_to_end(key)
+            self._stats["memory_hits"] += 1
+            return entry.audio
+
+        record = self._disk.get(key)
+        if record is not None:
+            audio = await asyncio.to_thread(self._read_disk, key)
+            if audio is not None:
+                if key in self._disk:
+                    self._disk.move_to_end(key)
+                self._stats["disk_hits"] += 1
+                self._store_memory(key, audio, record.synthesis_time)
+                return audio
+            # ファイルが外部から削除されていた場合はインデックスからも外す
+            # （読み込み中に追い出しや置き換えが済んでいる場合は二重に減らさない）
+            if self._disk.pop(key, None) is record:
+                self._disk_bytes -= record.size
+
+        self._stats["misses"] += 1
+        return None
+
+    def contains(self, key: str) -> bool:
+        """
+        キャッシュにキーが存在するかどうかを返す（統計やLRU順は変更しない）
+
+        Args:
+            key: キャッシュキー
+
+        Returns:
+            bool: メモリ層またはディスク層に存在する場合はTrue
+        """
+        return key in self._memory or key in self._disk
+
+    async def locate(self, key: str) -> Optional[Tuple[Optional[bytes], Optional[str], int]]:
+        """
+        音声をそのまま配信するために、キャッシュ上の位置を取得する
+
+        メモリ層にあればその音声データを、ディスク層のみにあればファイルのパスを返す。
+        ディスク層の音声はメモリ層へ昇格させず、ファイルから直接送信させる。
+
+        Args:
+            key: キャッシュキー
+
+        Returns:
+            Optional[Tuple[Optional[bytes], Optional[str], int]]:
+                (音声データ, ファイルのパス, バイト数)。どちらか一方のみが設定される。
+                存在しない場合はNone
+        """
+        entry = self._memory.get(key)
+        if entry is not None:
+            self._memory.move_to_end(key)
+            self._stats["memory_hits"] += 1
+            return entry.audio, None, entry.size
+
+        record = self._disk.get(key)
+        if record is not None:
+            path = self._audio_path(key)
+            if await asyncio.to_thread(os.path.isfile, path):
+                if key in self._disk:
+                    self._disk.move_to_end(key)
+                self._stats["disk_hits"] += 1
+                return None, path, record.size
+            if self._disk.pop(key, None) is record:
+                self._disk_bytes -= record.size
+
+        self._stats["misses"] += 1
+        return None
+
+    async def put(self, key: str, audio: bytes, synthesis_time: float) -> None:
+        """
+        音声をキャッシュに格納する（メモリ層とディスク層の両方）
+
+        Args:
+            key: キャッシュキー
+            audio: 音声データ
+            synthesis_time: 合成に要した秒数（追い出しコストの算出に使用）
+        """
+        self._store_memory(key, audio, synthesis_time)
+
+        if not self.directory or len(audio) > self.disk_budget_bytes:
+            return
+        try:
+            await asyncio.to_thread(self._write_disk, key, audio, synthesis_time)
+        except OSError as e:
+            logger.warning(f"音声キャッシュをディスクに書き込めませんでした: {e}")
+            return
+        previous = self._disk.pop(key, None)
+        if previous is not None:
+            self._disk_bytes -= previous.size
+        self._disk[key] = AudioCacheEntry(len(audio), synthesis_time)
+        self._disk_bytes += len(audio)
+        evicted = self._evict_disk()
+        if evicted:
+            await asyncio.to_thread(self._remove_disk, evicted)
+
+    def get_stats(self) -> Dict[str, Any]:
+        """
+        キャッシュの統計情報を取得する
+
+        Returns:
+            Dict[str, Any]: ヒット・ミス数、各層の件数と使用バイト数
+        """
+        hits = self._stats["memory_hits"] + self._stats["disk_hits"]
+        lookups = hits + self._stats["misses"]
+        return {
+            **self._stats,
+            "hits": hits,
+            "hit_rate": hits / lookups if lookups else 0.0,
+            "memory_entries": len(self._memory),
+            "memory_bytes": self._memory_bytes,
+            "memory_budget_bytes": self.memory_budget_bytes,
+            "disk_entries": len(self._disk),
+            "disk_bytes": self._disk_bytes,
+            "disk_budget_bytes": self.disk_budget_bytes,
+        }
+
+
+# アプリケーション全体で共有するキャッシュインスタンス
+_cache_instance: Optional[AudioCache] = None
+
+
+def get_audio_cache() -> AudioCache:
+    """
+    共有の音声キャッシュを取得する
+
+    Returns:
+        AudioCache: 音声キャッシュ
+
+    Note:
+        シングルトンパターンにより、アプリケーション全体で
+        同一のインスタンスを再利用する。
+    """
+    global _cache_instance
+    if _cache_instance is None:
+        _cache_instance = AudioCache(
+            directory=settings.audio_cache_dir,
+            memory_budget_bytes=settings.audio_cache_memory_bytes,
+            disk_budget_bytes=settings.audio_cache_disk_bytes,
+            eviction_window=settings.audio_cache_eviction_window
+        )
+    return _cache_instance
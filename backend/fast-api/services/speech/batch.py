@@ -0,0 +1,249 @@
+"""
+Batch speech synthesis
+
+複数の (テキスト, 話者ID) をまとめて音声合成する。
+重複を除いたうえでキャッシュ済みのものは即座に返し、残りは話者ごとに
+グループ化して同時実行数を制限しながらエンジンへ送る。
+エンジンが /multi_synthesis に対応していればグループ単位で一度に合成する。
+"""
+import asyncio
+import base64
+import json
+import time
+import zipfile
+from dataclasses import dataclass, field
+from typing import AsyncIterator, Dict, List, Optional, Sequence, Tuple
+from fastapi import HTTPException
+from fastapi.responses import StreamingResponse
+
+from config import settings, logger
+from .aivis_client import get_aivis_client
+from ..text.canonical import canonicalize_text
+from .speech_service import create_audio_query, lookup_cached_audio, store_cached_audio
+from ..response.formatters import get_ndjson_stream_response, get_zip_stream_response
+
+
+@dataclass
+class BatchItem:
+    """重複除去後の合成対象"""
+    index: int
+    text: str
+    speaker_id: int
+    positions: List[int] = field(default_factory=list)
+
+
+@dataclass
+class BatchResult:
+    """1件分の合成結果"""
+    item: BatchItem
+    audio: Optional[bytes] = None
+    cached: bool = False
+    error: Optional[str] = None
+
+
+def dedupe_items(items: Sequence[Tuple[str, int]]) -> List[BatchItem]:
+    """
+    (テキスト, 話者ID) の重複を除く
+
+    Args:
+        items: (テキスト, 話者ID) のリスト
+
+    Returns:
+        List[BatchItem]: 初出順の合成対象（元のリクエストでの位置を保持）
+    """
+    unique: Dict[Tuple[str, int], BatchItem] = {}
+    for position, (text, speaker_id) in enumerate(items):
+        key = (canonicalize_text(text), speaker_id)
+        if key not in unique:
+            unique[key] = BatchItem(index=len(unique), text=text, speaker_id=speaker_id)
+        unique[key].positions.append(position)
+    return list(unique.values())
+
+
+async def _synthesize_group(group: List[Tuple[BatchItem, Optional[str]]]) -> List[BatchResult]:
+    """
+    同じ話者のグループを合成する
+
+    /multi_synthesis が使える場合は一度にまとめて合成し、
+    使えない場合は1件ずつ合成する。失敗は該当項目のエラーとして返す。
+    """
+    client = get_aivis_client()
+    speaker_id = group[0][0].speaker_id
+    results: List[BatchResult] = []
+
+    prepared = []
+    for item, key in group:
+        try:
+            prepared.append((item, key, await create_audio_query(item.text, speaker_id)))
+        except HTTPException as e:
+            results.append(BatchResult(item, error=e.detail))
+
+    if (
+        len(prepared) > 1
+        and settings.aivis_use_multi_synthesis
+        and client.supports_multi_synthesis is not False
+    ):
+        start = time.perf_counter()
+        try:
+            audios = await client.multi_synthesis([query for _, _, query in prepared], speaker_id)
+        except HTTPException as e:
+            logger.warning(f"まとめて合成できなかったため1件ずつ合成します: {e.detail}")
+        else:
+            synthesis_time = (time.perf_counter() - start) / len(prepared)
+            for (item, key, _), audio in zip(prepared, audios):
+                await store_cached_audio(key, audio, synthesis_time)
+                results.append(BatchResult(item, audio=audio))
+            return results
+
+    for item, key, query in prepared:
+        start = time.perf_counter()
+        try:
+            audio = await client.synthesize_speech(query, speaker_id)
+        except HTTPException as e:
+            results.append(BatchResult(item, error=e.detail))
+            continue
+        await store_cached_audio(key, audio, time.perf_counter() - start)
+        results.append(BatchResult(item, audio=audio))
+    return results
+
+
+async def run_batch(items: List[BatchItem], concurrency: int) -> AsyncIterator[BatchResult]:
+    """
+    合成対象をまとめて処理し、完了したものから結果を返す
+
+    Args:
+        items: 重複除去済みの合成対象
+        concurrency: エンジンへ同時に送るグループ数
+
+    Yields:
+        BatchResult: 合成結果（完了順）
+    """
+    pending: Dict[int, List[Tuple[BatchItem, Optional[str]]]] = {}
+    for item in items:
+        key, audio = await lookup_cached_audio(item.text, item.speaker_id)
+        if audio is not None:
+            yield BatchResult(item, audio=audio, cached=True)
+        else:
+            pending.setdefault(item.speaker_id, []).append((item, key))
+
+    group_size = max(1, settings.tts_batch_group_size)
+    groups = [
+        speaker_items[i:i + group_size]
+        for speaker_items in pending.values()
+        for i in range(0, len(speaker_items), group_size)
+    ]
+    if not groups:
+        return
+
+    semaphore = asyncio.Semaphore(max(1, concurrency))
+    completed: "asyncio.Queue[BatchResult]" = asyncio.Queue()
+
+    async def run_group(group: List[Tuple[BatchItem, Optional[str]]]) -> None:
+        async with semaphore:
+            try:
+                results = await _synthesize_group(group)
+            except Exception as e:
+                logger.error(f"一括音声合成でエラーが発生しました: {e}")
+                results = [BatchResult(item, error=str(e)) for item, _ in group]
+        for result in results:
+            completed.put_nowait(result)
+
+    tasks = [asyncio.create_task(run_group(group)) for group in groups]
+    try:
+        for _ in range(sum(len(group) for group in groups)):
+            yield await completed.get()
+    finally:
+        for task in tasks:
+            task.cancel()
+
+
+async def _iter_ndjson(results: AsyncIterator[BatchResult]) -> AsyncIterator[str]:
+    """合成結果を1件1行のJSON（音声はBase64）に変換する"""
+    async for result in results:
+        line = {
+            "index": result.item.index,
+            "positions": result.item.positions,
+            "text": result.item.text,
+            "speaker_id": result.item.speaker_id,
+            "cached": result.cached,
+        }
+        if result.error is not None:
+            line["error"] = result.error
+        else:
+            line["base64_audio"] = base64.b64encode(result.audio).decode("utf-8")
+            line["content_type"] = "audio/wav"
+        yield json.dumps(line, ensure_ascii=False) + "\n"
+
+
+class _ZipStreamBuffer:
+    """ZipFileの書き込みを受け取り、送信用に取り出せるようにするバッファ"""
+
+    def __init__(self) -> None:
+        self._chunks: List[bytes] = []
+
+    def write(self, data: bytes) -> int:
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self) -> None:
+        pass
+
+    def drain(self) -> bytes:
+        data = b"".join(self._chunks)
+        self._chunks.clear()
+        return data
+
+
+async def _iter_zip(results: AsyncIterator[BatchResult]) -> AsyncIterator[bytes]:
+    """合成結果を逐次ZIPアーカイブとして出力する（末尾に manifest.json を含む）"""
+    buffer = _ZipStreamBuffer()
+    manifest = []
+    with zipfile.ZipFile(buffer, "w", compression=zipfile.ZIP_STORED) as archive:
+        async for result in results:
+            entry = {
+                "index": result.item.index,
+                "positions": result.item.positions,
+                "text": result.item.text,
+                "speaker_id": result.item.speaker_id,
+                "cached": result.cached,
+            }
+            if result.error is not None:
+                entry["error"] = result.error
+            else:
+                entry["file"] = f"{result.item.index:04d}.wav"
+                archive.writestr(entry["file"], result.audio)
+            manifest.append(entry)
+            yield buffer.drain()
+        manifest.sort(key=lambda entry: entry["index"])
+        archive.writestr("manifest.json", json.dumps(manifest, ensure_ascii=False, indent=2))
+    yield buffer.drain()
+
+
+async def batch_text_to_speech(
+    items: Sequence[Tuple[str, int]],
+    format_type: str,
+    concurrency: Optional[int] = None
+) -> StreamingResponse:
+    """
+    複数のテキストをまとめて音声合成し、完了したものから順にストリーミングで返す
+
+    Args:
+        items: (テキスト, 話者ID) のリスト
+        format_type: 出力形式（ndjson, zip のいずれか）
+        concurrency: エンジンへの同時リクエスト数（設定値を上限とする）
+
+    Returns:
+        StreamingResponse: NDJSONまたはZIPのストリーミングレスポンス
+    """
+    unique_items = dedupe_items(items)
+    limit = min(concurrency or settings.tts_batch_concurrency, settings.tts_batch_concurrency)
+    results = run_batch(unique_items, limit)
+    headers = {"X-TTS-Batch-Items": str(len(unique_items))}
+
+    if format_type == "ndjson":
+        return get_ndjson_stream_response(_iter_ndjson(results), headers=headers)
+    elif format_type == "zip":
+        return get_zip_stream_response(_iter_zip(results), headers=headers)
+    else:
+        # このケースは実際には発生しない
+        raise ValueError(f"Unsupported format: {format_type}")
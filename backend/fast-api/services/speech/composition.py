@@ -0,0 +1,119 @@
+"""
+Segment composition
+
+複数の文からなるテキストを文ごとに合成・キャッシュし、WAVヘッダーを作り直して
+1つの音声に連結する。LLMの回答のように定型の文（案内や締めの言葉など）を共有する
+テキストでは、テキスト全体のキャッシュにない場合でもキャッシュ済みの文を再利用できる。
+"""
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from ..audio.wav import concat_wav, parse_wav
+
+
+@dataclass
+class ComposedAudio:
+    """文ごとの音声を連結した結果"""
+    audio: bytes
+    durations: List[float]
+    cached: List[bool]
+
+    @property
+    def cached_ratio(self) -> float:
+        """音声の長さのうちキャッシュ済みの文が占める割合（0〜1）"""
+        total = sum(self.durations)
+        if total <= 0:
+            return 1.0 if all(self.cached) else 0.0
+        return sum(d for d, hit in zip(self.durations, self.cached) if hit) / total
+
+
+def compose_segments(segments: Sequence[Tuple[bytes, bool]]) -> ComposedAudio:
+    """
+    文ごとの音声を連結する（PCMはそのまま結合し、ヘッダーのみ作り直す）
+
+    Args:
+        segments: 文ごとの音声データ（WAV形式）とキャッシュヒットしたかどうか
+
+    Returns:
+        ComposedAudio: 連結した音声と、文ごとの秒数とキャッシュヒットしたかどうか
+
+    Raises:
+        ValueError: WAVとして解釈できない、またはフォーマットが一致しない場合
+    """
+    audios = [audio for audio, _ in segments]
+    return ComposedAudio(
+        audio=concat_wav(audios),
+        durations=[parse_wav(audio).duration for audio in audios],
+        cached=[hit for _, hit in segments],
+    )
+
+
+class CompositionStats:
+    """文単位の合成で、どれだけの音声をキャッシュから返したかの統計"""
+
+    def __init__(self) -> None:
+        self.requests = 0
+        self.full_hits = 0
+        self.partial_hits = 0
+        self.segments = 0
+        self.segment_hits = 0
+        self.audio_seconds = 0.0
+        self.cached_audio_seconds = 0.0
+
+    def observe_hit(self, duration: Optional[float]) -> None:
+        """テキスト全体がキャッシュにあった場合を記録する"""
+        self.requests += 1
+        self.full_hits += 1
+        if duration is not None:
+            self.audio_seconds += duration
+            self.cached_audio_seconds += duration
+
+    def observe(self, composed: ComposedAudio) -> None:
+        """文ごとの音声を連結した場合を記録する"""
+        self.requests += 1
+        hits = sum(composed.cached)
+        if hits == len(composed.cached):
+            self.full_hits += 1
+        elif hits:
+            self.partial_hits += 1
+        self.segments += len(composed.cached)
+        self.segment_hits += hits
+        self.audio_seconds += sum(composed.durations)
+        self.cached_audio_seconds += sum(d for d, hit in zip(composed.durations, composed.cached) if hit)
+
+    def get_stats(self) -> Dict[str, Any]:
+        """
+        統計を取得する
+
+        Returns:
+            Dict[str, Any]: 複数の文からなるリクエストの数、全体・一部がキャッシュにあった数、
+                文のヒット率、音声の長さのうちキャッシュから返した割合
+        """
+        return {
+            "requests": self.requests,
+            "full_hits": self.full_hits,
+            "partial_hits": self.partial_hits,
+            "segments": self.segments,
+            "segment_hit_rate": self.segment_hits / self.segments if self.segments else 0.0,
+            "audio_seconds": round(self.audio_seconds, 3),
+            "cached_audio_ratio": (
+                self.cached_audio_seconds / self.audio_seconds if self.audio_seconds else 0.0
+            ),
+        }
+
+
+# アプリケーション全体で共有するインスタンス
+_stats_instance: Optional[CompositionStats] = None
+
+
+def get_composition_stats() -> CompositionStats:
+    """
+    共有のCompositionStatsを取得する
+
+    Returns:
+        CompositionStats: 共有インスタンス
+    """
+    global _stats_instance
+    if _stats_instance is None:
+        _stats_instance = CompositionStats()
+    return _stats_instance
@@ -0,0 +1,108 @@
+"""
+Client disconnect handling
+
+来場者が立ち去ったりフロントエンドが fetch を中断したりしても、サーバーは合成を続けて
+結果を捨ててしまう。/tts などの応答前にクライアントの切断を検出してハンドラーを
+キャンセルし、待ち手のいなくなったエンジンへのリクエストを中止（または低い優先度へ
+引き下げ）できるようにする。
+"""
+import asyncio
+from typing import Any, Awaitable, Dict, Optional, TypeVar, Union
+from fastapi import Request
+from fastapi.responses import Response
+
+from config import logger
+
+T = TypeVar("T")
+
+# 応答前にクライアントが切断したことを示すステータスコード（nginx の慣例）
+CLIENT_CLOSED_REQUEST = 499
+
+
+class DisconnectStats:
+    """クライアントの切断と、それによって中止・引き下げたエンジンの処理の数"""
+
+    def __init__(self) -> None:
+        self.disconnected = 0
+        self.cancelled = 0
+        self.demoted = 0
+
+    def get_stats(self) -> Dict[str, Any]:
+        """
+        統計情報を取得する
+
+        Returns:
+            Dict[str, Any]: 応答前に切断したリクエスト数（disconnected）、中止した合成の数（cancelled）、
+                キャッシュのために低い優先度で続行した合成の数（demoted）
+        """
+        return {
+            "disconnected": self.disconnected,
+            "cancelled": self.cancelled,
+            "demoted": self.demoted,
+        }
+
+
+# アプリケーション全体で共有するインスタンス
+_stats_instance: Optional[DisconnectStats] = None
+
+
+def get_disconnect_stats() -> DisconnectStats:
+    """
+    共有のDisconnectStatsを取得する
+
+    Returns:
+        DisconnectStats: 共有インスタンス
+    """
+    global _stats_instance
+    if _stats_instance is None:
+        _stats_instance = DisconnectStats()
+    return _stats_instance
+
+
+async def _wait_for_disconnect(request: Request) -> None:
+    """クライアントが切断するまで待つ（リクエストボディは読み込み済みであること）"""
+    while True:
+        message = await request.receive()
+        if message["type"] == "http.disconnect":
+            return
+
+
+async def run_until_disconnected(request: Request, awaitable: Awaitable[T]) -> Union[T, Response]:
+    """
+    クライアントの切断を監視しながら処理を実行する
+
+    処理が終わる前にクライアントが切断した場合は処理をキャンセルする。
+    キャンセルは single-flight で共有している合成まで伝わり、待ち手がいなくなった
+    合成は中止または低い優先度へ引き下げられる。
+
+    Args:
+        request: 監視するリクエスト
+        awaitable: 実行する処理（ハンドラーの本体）
+
+    Returns:
+        Union[T, Response]: 処理結果。切断した場合は 499 のレスポンス（クライアントには届かない）
+    """
+    work = asyncio.ensure_future(awaitable)
+    watcher = asyncio.create_task(_wait_for_disconnect(request))
+    try:
+        await asyncio.wait({work, watcher}, return_when=asyncio.FIRST_COMPLETED)
+    except asyncio.CancelledError:
+        work.cancel()
+        watcher.cancel()
+        raise
+
+    if work.done():
+        watcher.cancel()
+        return work.result()
+
+    # キャンセルが合成まで伝わり終えるまで待つ
+    work.cancel()
+    try:
+        await work
+    except asyncio.CancelledError:
+        pass
+    except Exception as e:
+        logger.debug(f"切断後の処理でエラーが発生しました: {e}")
+    get_disconnect_stats().disconnected += 1
+    logger.info(f"応答前にクライアントが切断したため処理を中止しました: {request.url.path}")
+    return Response(status_code=CLIENT_CLOSED_REQUEST)
@@ -0,0 +1,161 @@
+"""
+Engine pool
+
+複数のAivisSpeech Engineへリクエストを振り分ける。
+処理中のリクエスト数が最も少ないエンジンを選び、連続して失敗したエンジンは
+一定時間振り分け対象から外す（アウトライア除外）。除外期間が過ぎると再び
+振り分け対象に戻し、再度失敗した場合は除外期間を延ばす。
+"""
+import itertools
+import time
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional
+
+from config import logger
+
+
+@dataclass
+class EngineBackend:
+    """振り分け先のエンジン1台分の状態"""
+    url: str
+    outstanding: int = 0
+    consecutive_failures: int = 0
+    ejections: int = 0
+    ejected_until: float = 0.0
+    total_requests: int = 0
+    total_failures: int = 0
+
+    def is_available(self, now: float) -> bool:
+        """振り分け対象かどうか"""
+        return now >= self.ejected_until
+
+
+class EnginePool:
+    """least-outstanding-requests 方式のエンジンプール"""
+
+    def __init__(
+        self,
+        urls: List[str],
+        failure_threshold: int = 3,
+        ejection_seconds: float = 30.0,
+        max_ejection_seconds: float = 300.0
+    ):
+        """
+        Args:
+            urls: エンジンのベースURLのリスト
+            failure_threshold: 除外するまでの連続失敗回数
+            ejection_seconds: 最初の除外期間（秒）
+            max_ejection_seconds: 除外期間の上限（秒）
+        """
+        if not urls:
+            raise ValueError("エンジンのURLが指定されていません")
+        self.backends = [EngineBackend(url.rstrip("/")) for url in urls]
+        self.failure_threshold = max(1, failure_threshold)
+        self.ejection_seconds = ejection_seconds
+        self.max_ejection_seconds = max_ejection_seconds
+        # 処理中の数が同じ場合に偏らないよう、候補の並びを順に回す
+        self._rotation = itertools.count()
+
+    def __len__(self) -> int:
+        return len(self.backends)
+
+    def get(self, url: str) -> Optional[EngineBackend]:
+        """
+        URLからエンジンを取得する
+
+        Args:
+            url: エンジンのベースURL
+
+        Returns:
+            Optional[EngineBackend]: 該当するエンジン（プールにない場合はNone）
+        """
+        url = url.rstrip("/")
+        return next((b for b in self.backends if b.url == url), None)
+
+    def acquire(
+        self,
+        exclude: Optional[EngineBackend] = None,
+        target: Optional[EngineBackend] = None
+    ) -> EngineBackend:
+        """
+        リクエストを送るエンジンを選び、処理中の数を加算する
+
+        Args:
+            exclude: 候補から外すエンジン（再試行時に直前のエンジンを避けるため）
+            target: 必ずこのエンジンに送る場合に指定する（話者の初期化など、全台に送る処理用）
+
+        Returns:
+            EngineBackend: 選ばれたエンジン
+
+        Note:
+            全台が除外中の場合は、除外期間が最も早く終わるエンジンを選ぶ。
+        """
+        if target is not None:
+            target.outstanding += 1
+            target.total_requests += 1
+            return target
+        now = time.monotonic()
+        offset = next(self._rotation) % len(self.backends)
+        ordered = self.backends[offset:] + self.backends[:offset]
+        candidates = [b for b in ordered if b.is_available(now) and b is not exclude]
+        if candidates:
+            backend = min(candidates, key=lambda b: b.outstanding)
+        else:
+            backend = min(
+                (b for b in ordered if b is not exclude),
+                key=lambda b: b.ejected_until,
+                default=ordered[0]
+            )
+        backend.outstanding += 1
+        backend.total_requests += 1
+        return backend
+
+    def release(self, backend: EngineBackend, success: Optional[bool]) -> None:
+        """
+        リクエストの完了を記録する
+
+        Args:
+            backend: acquireで選ばれたエンジン
+            success: 成功したかどうか（キャンセルなど判定しない場合はNone）
+        """
+        backend.outstanding = max(0, backend.outstanding - 1)
+        if success is None:
+            return
+        if success:
+            backend.consecutive_failures = 0
+            backend.ejections = 0
+            return
+
+        backend.total_failures += 1
+        backend.consecutive_failures += 1
+        if backend.consecutive_failures >= self.failure_threshold:
+            duration = min(
+                self.ejection_seconds * (2 ** backend.ejections),
+                self.max_ejection_seconds
+            )
+            backend.ejected_until = time.monotonic() + duration
+            backend.ejections += 1
+            # 再び振り分け対象に戻ったときは1回の失敗で再除外する
+            backend.consecutive_failures = self.failure_threshold - 1
+            logger.warning(f"AivisSpeech Engineを{duration:.0f}秒間振り分け対象から外します: {backend.url}")
+
+    def get_stats(self) -> List[Dict[str, Any]]:
+        """
+        各エンジンの状態を取得する
+
+        Returns:
+            List[Dict[str, Any]]: エンジンごとの処理中の数、失敗数、除外状態
+        """
+        now = time.monotonic()
+        return [
+            {
+                "url": b.url,
+                "available": b.is_available(now),
+                "outstanding": b.outstanding,
+                "consecutive_failures": b.consecutive_failures,
+                "ejected_for_seconds": max(0.0, round(b.ejected_until - now, 1)),
+                "total_requests": b.total_requests,
+                "total_failures": b.total_failures,
+            }
+            for b in self.backends
+        ]
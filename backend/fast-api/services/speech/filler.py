@@ -0,0 +1,160 @@
+"""
+Filler clips
+
+エンジンの応答が遅い間にアバターが黙り込まないよう、「えーと…」などの短いつなぎの音声を
+話者ごとに合成して保持しておく。/tts/stream で最初の文が設定した待ち時間（予算）内に
+合成できない場合に、本来の音声の前に流す。つなぎの音声は起動時に background の優先度で
+合成し、その場では合成しない（保持していない話者は次回のためにバックグラウンドで合成する）。
+"""
+import asyncio
+from typing import Any, Dict, List, Optional, Set
+from fastapi import HTTPException
+
+from config import settings, logger
+from .admission import Priority, current_priority
+from .speech_service import synthesize_text
+from ..audio.wav import trim_silence
+
+
+class FillerPool:
+    """話者ごとに合成済みのつなぎの音声を保持し、順番に貸し出す"""
+
+    def __init__(self, texts: List[str], speaker_ids: List[int]):
+        """
+        Args:
+            texts: つなぎの文言
+            speaker_ids: 起動時につなぎの音声を合成する話者ID
+        """
+        self.texts = [text for text in texts if text.strip()]
+        self.speaker_ids = list(speaker_ids)
+        self._clips: Dict[int, List[bytes]] = {}
+        self._next: Dict[int, int] = {}
+        self._warming: Set[int] = set()
+        self._tasks: Set["asyncio.Task[None]"] = set()
+        self._served: Dict[int, int] = {}
+        self._missing = 0
+        self._failed = 0
+
+    def start(self) -> None:
+        """設定された話者のつなぎの音声をバックグラウンドで合成する"""
+        for speaker_id in self.speaker_ids:
+            self._schedule_warm(speaker_id)
+
+    async def stop(self) -> None:
+        """実行中の合成を中断する"""
+        tasks = list(self._tasks)
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    def _schedule_warm(self, speaker_id: int) -> None:
+        if not self.texts or speaker_id in self._warming or speaker_id in self._clips:
+            return
+        self._warming.add(speaker_id)
+        task = asyncio.create_task(self.warm(speaker_id))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def warm(self, speaker_id: int) -> None:
+        """
+        1人の話者のつなぎの音声を合成する（前後の無音は取り除く）
+
+        Args:
+            speaker_id: 話者ID
+        """
+        # 利用者のリクエストを妨げないよう、最も低い優先度でエンジンへ送る
+        current_priority.set(Priority.BACKGROUND)
+        clips = []
+        try:
+            for text in self.texts:
+                try:
+                    audio, _ = await synthesize_text(text, speaker_id)
+                except HTTPException as e:
+                    self._failed += 1
+                    logger.warning(f"つなぎの音声を合成できませんでした: {text}: {e.detail}")
+                    continue
+                try:
+                    clips.append(trim_silence(
+                        audio,
+                        threshold_db=settings.tts_silence_threshold_db,
+                        padding_ms=settings.tts_silence_padding_ms
+                    ))
+                except ValueError:
+                    # WAVとして解釈できない音声はストリームに連結できないため使わない
+                    self._failed += 1
+            if clips:
+                self._clips[speaker_id] = clips
+        finally:
+            self._warming.discard(speaker_id)
+
+    def take(self, speaker_id: int) -> Optional[bytes]:
+        """
+        つなぎの音声を1つ取り出す（同じ話者では文言を順番に使う）
+
+        Args:
+            speaker_id: 話者ID
+
+        Returns:
+            Optional[bytes]: つなぎの音声（WAV形式）。合成済みのものがない場合はNone
+        """
+        clips = self._clips.get(speaker_id)
+        if not clips:
+            self._missing += 1
+            self._schedule_warm(speaker_id)
+            return None
+        index = self._next.get(speaker_id, 0)
+        self._next[speaker_id] = (index + 1) % len(clips)
+        self._served[speaker_id] = self._served.get(speaker_id, 0) + 1
+        return clips[index]
+
+    def get_stats(self) -> Dict[str, Any]:
+        """
+        つなぎの音声の利用状況を取得する
+
+        Returns:
+            Dict[str, Any]: 話者ごとの保持数と利用回数、保持していなかった回数、合成の失敗数
+        """
+        speaker_ids = sorted(set(self._clips) | set(self._served) | self._warming)
+        return {
+            "budget_ms": settings.tts_filler_budget_ms,
+            "speakers": {
+                str(speaker_id): {
+                    "clips": len(self._clips.get(speaker_id, [])),
+                    "served": self._served.get(speaker_id, 0),
+                    "warming": speaker_id in self._warming,
+                }
+                for speaker_id in speaker_ids
+            },
+            "served": sum(self._served.values()),
+            "missing": self._missing,
+            "failed": self._failed,
+        }
+
+
+# アプリケーション全体で共有するインスタンス
+_pool_instance: Optional[FillerPool] = None
+
+
+def get_filler_pool() -> FillerPool:
+    """
+    共有のFillerPoolを取得する
+
+    Returns:
+        FillerPool: 設定された文言と話者の共有インスタンス
+    """
+    global _pool_instance
+    if _pool_instance is None:
+        _pool_instance = FillerPool(settings.tts_filler_texts, settings.engine_init_speakers)
+    return _pool_instance
+
+
+def get_filler_status() -> Dict[str, Any]:
+    """
+    つなぎの音声の利用状況を取得する
+
+    Returns:
+        Dict[str, Any]: FillerPool.get_stats() の結果
+
+    副作用: なし（メモリ上の状態を返すのみ）
+    """
+    return get_filler_pool().get_stats()
@@ -0,0 +1,188 @@
+"""
+Prewarm
+
+挨拶や待機中の呼びかけなど、決まった文言の音声を起動時にバックグラウンドで合成し、
+合成音声キャッシュに格納しておく。その日の最初の利用者でも合成待ちが発生しないようにする。
+通常のリクエストを優先するため、エンジンへは background の優先度で送る。
+"""
+import asyncio
+import json
+import os
+import time
+from typing import Any, Dict, List, Optional, Tuple
+from fastapi import HTTPException
+
+from config import settings, logger
+from .admission import Priority, current_priority
+from .speech_service import synthesize_text
+
+# マニフェストで話者IDを省略した場合の話者ID
+DEFAULT_SPEAKER_ID = 888753760
+
+
+def load_prewarm_manifest(path: str) -> List[Tuple[str, int]]:
+    """
+    事前に合成する文言の一覧（マニフェスト）を読み込む
+
+    マニフェストは {"text": ..., "speaker_id": ...} のJSON配列。
+    speaker_id は省略可能。
+
+    Args:
+        path: マニフェストのパス
+
+    Returns:
+        List[Tuple[str, int]]: (テキスト, 話者ID) のリスト（ファイルがない場合は空）
+
+    Raises:
+        ValueError: マニフェストの形式が正しくない場合
+    """
+    if not os.path.exists(path):
+        return []
+    with open(path, "r", encoding="utf-8") as f:
+        data = json.load(f)
+    if not isinstance(data, list):
+        raise ValueError("マニフェストはJSON配列である必要があります")
+
+    entries: List[Tuple[str, int]] = []
+    for i, entry in enumerate(data):
+        if not isinstance(entry, dict) or not isinstance(entry.get("text"), str):
+            raise ValueError(f"マニフェストの{i + 1}件目に text がありません")
+        text = entry["text"].strip()
+        if text:
+            entries.append((text, int(entry.get("speaker_id", DEFAULT_SPEAKER_ID))))
+    return entries
+
+
+class Prewarmer:
+    """マニフェストの文言を1件ずつ合成してキャッシュに格納する"""
+
+    def __init__(self) -> None:
+        self.entries: List[Tuple[str, int]] = []
+        self.state = "disabled"
+        self._task: Optional["asyncio.Task[None]"] = None
+        self._completed = 0
+        self._cached = 0
+        self._failed = 0
+        self._started_at: Optional[float] = None
+        self._finished_at: Optional[float] = None
+
+    def load(self, path: str) -> None:
+        """
+        マニフェストを読み込む（読み込めない場合は事前合成を行わない）
+
+        Args:
+            path: マニフェストのパス
+        """
+        try:
+            self.entries = load_prewarm_manifest(path)
+        except (OSError, ValueError) as e:
+            logger.error(f"事前合成のマニフェストを読み込めませんでした: {path}: {e}")
+            self.entries = []
+        self.state = "pending" if self.entries else "disabled"
+        if self.entries:
+            logger.info(f"事前合成のマニフェストを読み込みました: {len(self.entries)}件")
+
+    def start(self) -> None:
+        """バックグラウンドで事前合成を開始する"""
+        if self.state != "pending" or self._task is not None:
+            return
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        """事前合成を中断する"""
+        if self._task is not None and not self._task.done():
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+        self._task = None
+
+    async def _warm(self, text: str, speaker_id: int) -> None:
+        """1件を合成する（エンジンに接続できない間は間隔を空けて再試行する）"""
+        for attempt in range(max(1, settings.tts_prewarm_max_attempts)):
+            try:
+                _, cache_hit = await synthesize_text(text, speaker_id)
+            except HTTPException as e:
+                if e.status_code == 503 and attempt + 1 < settings.tts_prewarm_max_attempts:
+                    await asyncio.sleep(settings.tts_prewarm_retry_seconds)
+                    continue
+                logger.warning(f"事前合成に失敗しました: {text}: {e.detail}")
+                self._failed += 1
+                return
+            if cache_hit:
+                self._cached += 1
+            self._completed += 1
+            return
+
+    async def _run(self) -> None:
+        # 通常のリクエストを妨げないよう、最も低い優先度でエンジンへ送る
+        current_priority.set(Priority.BACKGROUND)
+        self.state = "running"
+        self._started_at = time.monotonic()
+        try:
+            for text, speaker_id in self.entries:
+                await self._warm(text, speaker_id)
+        except asyncio.CancelledError:
+            self.state = "cancelled"
+            raise
+        except Exception as e:
+            logger.error(f"事前合成でエラーが発生しました: {e}")
+            self.state = "failed"
+        else:
+            self.state = "completed"
+            logger.info(
+                f"事前合成が完了しました: {self._completed}件（うちキャッシュ済み{self._cached}件）、"
+                f"失敗{self._failed}件"
+            )
+        finally:
+            self._finished_at = time.monotonic()
+
+    def get_status(self) -> Dict[str, Any]:
+        """
+        事前合成の進捗を取得する
+
+        Returns:
+            Dict[str, Any]: 状態（disabled, pending, running, completed, cancelled, failed）、件数、経過時間
+        """
+        elapsed = 0.0
+        if self._started_at is not None:
+            elapsed = (self._finished_at or time.monotonic()) - self._started_at
+        total = len(self.entries)
+        done = self._completed + self._failed
+        return {
+            "state": self.state,
+            "total": total,
+            "completed": self._completed,
+            "already_cached": self._cached,
+            "failed": self._failed,
+            "progress": done / total if total else 1.0,
+            "elapsed_seconds": round(elapsed, 1),
+        }
+
+
+# アプリケーション全体で共有するインスタンス
+_prewarmer_instance: Optional[Prewarmer] = None
+
+
+def get_prewarmer() -> Prewarmer:
+    """
+    共有のPrewarmerを取得する
+
+    Returns:
+        Prewarmer: 共有インスタンス
+    """
+    global _prewarmer_instance
+    if _prewarmer_instance is None:
+        _prewarmer_instance = Prewarmer()
+    return _prewarmer_instance
+
+
+def get_prewarm_status() -> Dict[str, Any]:
+    """
+    事前合成の進捗を取得する
+
+    Returns:
+        Dict[str, Any]: Prewarmer.get_status() の結果
+    """
+    return get_prewarmer().get_status()
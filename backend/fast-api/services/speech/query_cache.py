@@ -0,0 +1,143 @@
+"""
+Audio query cache
+
+audio_queryの結果（テキスト解析済みのクエリ）を (テキスト, 話者ID) ごとに保持する。
+キャッシュしたクエリの話速・音高などを上書きして再合成することで、
+同じ発話の別バリエーションをaudio_queryなしで生成できるようにする。
+"""
+import copy
+from collections import OrderedDict
+from typing import Dict, Any, Optional, Tuple
+
+from config import settings
+from ..text.canonical import canonicalize_text, get_canonicalization_stats
+
+
+# 上書きを許可するaudio_queryのパラメータ
+OVERRIDABLE_QUERY_PARAMS = (
+    "speedScale",
+    "pitchScale",
+    "intonationScale",
+    "volumeScale",
+    "outputSamplingRate",
+    "outputStereo",
+)
+
+# 上書きすると音声のフォーマット（サンプリングレート・チャンネル数）が変わるパラメータ
+FORMAT_QUERY_PARAMS = ("outputSamplingRate", "outputStereo")
+
+
+def apply_query_overrides(
+    query: Dict[str, Any],
+    overrides: Optional[Dict[str, Any]]
+) -> Dict[str, Any]:
+    """
+    audio_queryのコピーにパラメータの上書きを適用する
+
+    Args:
+        query: 元のaudio_queryデータ（変更しない）
+        overrides: 上書きするパラメータ（audio_queryのキー名）
+
+    Returns:
+        Dict[str, Any]: 上書き後のaudio_queryデータ
+
+    Raises:
+        ValueError: 上書きが許可されていないパラメータが含まれる場合
+    """
+    result = copy.deepcopy(query)
+    for name, value in (overrides or {}).items():
+        if name not in OVERRIDABLE_QUERY_PARAMS:
+            raise ValueError(f"Unsupported query override: {name}")
+        result[name] = value
+    return result
+
+
+class QueryCache:
+    """件数上限付きLRUのaudio_queryキャッシュ"""
+
+    def __init__(self, max_entries: int):
+        """
+        Args:
+            max_entries: 保持する最大件数
+        """
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[Tuple[str, int, str], Dict[str, Any]]" = OrderedDict()
+        self._hits = 0
+        self._misses = 0
+
+    @staticmethod
+    def _key(text: str, speaker_id: int, engine_tag: str) -> Tuple[str, int, str]:
+        return (canonicalize_text(text), speaker_id, engine_tag)
+
+    def get(self, text: str, speaker_id: int, engine_tag: str) -> Optional[Dict[str, Any]]:
+        """
+        キャッシュからaudio_queryを取得する
+
+        Args:
+            text: 合成したいテキスト
+            speaker_id: 話者ID
+            engine_tag: エンジンのバージョン・ユーザー辞書の識別子
+
+        Returns:
+            Optional[Dict[str, Any]]: audio_queryのコピー（存在しない場合はNone）
+        """
+        key = self._key(text, speaker_id, engine_tag)
+        query = self._entries.get(key)
+        get_canonicalization_stats().observe("audio_query", key, text, query is not None)
+        if query is None:
+            self._misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self._hits += 1
+        return copy.deepcopy(query)
+
+    def put(self, text: str, speaker_id: int, engine_tag: str, query: Dict[str, Any]) -> None:
+        """
+        audio_queryをキャッシュに格納する
+
+        Args:
+            text: 合成したいテキスト
+            speaker_id: 話者ID
+            engine_tag: エンジンのバージョン・ユーザー辞書の識別子
+            query: audio_queryデータ
+        """
+        if self.max_entries <= 0:
+            return
+        key = self._key(text, speaker_id, engine_tag)
+        self._entries[key] = copy.deepcopy(query)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def get_stats(self) -> Dict[str, Any]:
+        """
+        キャッシュの統計情報を取得する
+
+        Returns:
+            Dict[str, Any]: ヒット・ミス数と件数
+        """
+        lookups = self._hits + self._misses
+        return {
+            "hits": self._hits,
+            "misses": self._misses,
+            "hit_rate": self._hits / lookups if lookups else 0.0,
+            "entries": len(self._entries),
+            "max_entries": self.max_entries,
+        }
+
+
+# アプリケーション全体で共有するキャッシュインスタンス
+_query_cache_instance: Optional[QueryCache] = None
+
+
+def get_query_cache() -> QueryCache:
+    """
+    共有のaudio_queryキャッシュを取得する
+
+    Returns:
+        QueryCache: audio_queryキャッシュ
+    """
+    global _query_cache_instance
+    if _query_cache_instance is None:
+        _query_cache_instance = QueryCache(settings.audio_query_cache_size)
+    return _query_cache_instance
@@ -0,0 +1,29 @@
+"""
+Text segmentation
+
+音声合成を文単位で並列化するため、日本語テキストを文境界で分割する。
+"""
+import re
+from typing import List
+
+
+# 文末記号（直後に続く閉じ括弧も同じ文に含める）または改行を区切りとする
+_SENTENCE_PATTERN = re.compile(r"[^。！？!?\n]*(?:[。！？!?]+[」』）)]*|\n|$)")
+
+
+def split_sentences(text: str) -> List[str]:
+    """
+    テキストを文単位に分割する
+
+    Args:
+        text: 分割するテキスト
+
+    Returns:
+        List[str]: 前後の空白を除いた空でない文のリスト（区切り記号は文に含める）
+    """
+    sentences = []
+    for match in _SENTENCE_PATTERN.finditer(text):
+        sentence = match.group(0).strip()
+        if sentence:
+            sentences.append(sentence)
+    return sentences
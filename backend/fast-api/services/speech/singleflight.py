@@ -0,0 +1,113 @@
+"""
+Single-flight
+
+同じキーの処理が実行中の場合、新たに実行せずに実行中の結果を待つ。
+同時に届いた同一内容のTTSリクエストでエンジンを1回だけ呼び出すために使用する。
+"""
+import asyncio
+from typing import Any, Awaitable, Callable, Dict, Hashable, Optional, Tuple, TypeVar
+
+T = TypeVar("T")
+
+
+class SingleFlight:
+    """キーごとに実行中の処理を共有するコアレッサー"""
+
+    def __init__(self, on_abandon: Optional[Callable[[Hashable, "asyncio.Task[Any]"], None]] = None) -> None:
+        """
+        Args:
+            on_abandon: 待ち手が全員キャンセルされた時点で処理が未完了の場合に呼び出す関数
+                （キーと処理のタスクを受け取り、処理を中止するか続行するかを決める）
+        """
+        self._on_abandon = on_abandon
+        self._inflight: Dict[Hashable, "asyncio.Task[Any]"] = {}
+        self._waiters: Dict["asyncio.Task[Any]", int] = {}
+        self._leaders = 0
+        self._followers = 0
+        self._abandoned = 0
+
+    def _forget(self, key: Hashable, task: "asyncio.Task[Any]") -> None:
+        if self._inflight.get(key) is task:
+            del self._inflight[key]
+        # 待ち手がいなくなった場合でも例外が未回収の警告にならないようにする
+        if not task.cancelled():
+            task.exception()
+
+    async def do(self, key: Hashable, fn: Callable[[], Awaitable[T]]) -> Tuple[T, bool]:
+        """
+        キーに対する処理を実行する（実行中であればその結果を待つ）
+
+        Args:
+            key: 処理を識別するキー
+            fn: 実行する処理
+
+        Returns:
+            Tuple[T, bool]: 処理結果と、他のリクエストの実行結果を共有したかどうか
+
+        Note:
+            処理は独立したタスクとして実行するため、呼び出し元がキャンセルされても
+            他の待ち手やキャッシュへの格納には影響しない。待ち手が全員キャンセルされた
+            場合の扱いは on_abandon で決める。
+        """
+        task = self._inflight.get(key)
+        shared = task is not None
+        if task is None:
+            task = asyncio.create_task(fn())
+            self._inflight[key] = task
+            task.add_done_callback(lambda t: self._forget(key, t))
+            self._leaders += 1
+        else:
+            self._followers += 1
+
+        self._waiters[task] = self._waiters.get(task, 0) + 1
+        try:
+            return await asyncio.shield(task), shared
+        except asyncio.CancelledError:
+            if self._leave(task) == 0 and not task.done():
+                self._abandoned += 1
+                if self._on_abandon is not None:
+                    self._on_abandon(key, task)
+            raise
+        except BaseException:
+            self._leave(task)
+            raise
+        finally:
+            if task.done():
+                self._waiters.pop(task, None)
+
+    def _leave(self, task: "asyncio.Task[Any]") -> int:
+        """待ち手を1つ減らし、残りの待ち手の数を返す"""
+        remaining = self._waiters.get(task, 1) - 1
+        if remaining > 0:
+            self._waiters[task] = remaining
+        else:
+            self._waiters.pop(task, None)
+        return remaining
+
+    def running(self, key: Hashable) -> bool:
+        """
+        キーに対する処理が実行中かどうか
+
+        Args:
+            key: 処理を識別するキー
+
+        Returns:
+            bool: 実行中であればTrue
+        """
+        task = self._inflight.get(key)
+        return task is not None and not task.done()
+
+    def get_stats(self) -> Dict[str, Any]:
+        """
+        統計情報を取得する
+
+        Returns:
+            Dict[str, Any]: 実行した数（leaders）、結果を共有した数（followers）、実行中の数、
+                待ち手が全員キャンセルされた数（abandoned）
+        """
+        return {
+            "leaders": self._leaders,
+            "followers": self._followers,
+            "in_flight": len(self._inflight),
+            "abandoned": self._abandoned,
+        }
@@ -0,0 +1,125 @@
+"""
+Speculation stats
+
+LLMの回答から先回りして合成した文（投機的な合成）が、その後の /tts で
+使われたかどうかを記録する。合成処理（speech_service）と投機的な合成の実行
+（speculative.py）の両方から参照するため、どちらにも依存しないモジュールに置く。
+"""
+import time
+from collections import OrderedDict
+from contextvars import ContextVar
+from typing import Any, Dict, Hashable, Optional
+
+# 投機的な合成の実行中かどうか（生成したタスクにも引き継がれる）
+speculative_synthesis: ContextVar[bool] = ContextVar("speculative_synthesis", default=False)
+
+# 使われるのを待つ文の数の上限（超えた場合は古いものから使われなかったものとして扱う）
+MAX_TRACKED = 1024
+
+
+class SpeculationStats:
+    """投機的に合成した文と、その後のリクエストでの利用状況"""
+
+    def __init__(self, max_tracked: int = MAX_TRACKED) -> None:
+        self.max_tracked = max_tracked
+        self._pending: "OrderedDict[Hashable, float]" = OrderedDict()
+        self.active = 0
+        self.started = 0
+        self.dropped = 0
+        self.cancelled = 0
+        self.failed = 0
+        self.cache_hits = 0
+        self.joined = 0
+        self.misses = 0
+        self.expired = 0
+        self.already_cached = 0
+        self._lead_seconds = 0.0
+
+    def mark(self, key: Hashable) -> None:
+        """
+        投機的な合成を開始した文を記録する
+
+        Args:
+            key: 合成のキー（正規化したテキスト、話者ID、パラメータ）
+        """
+        self.started += 1
+        self._pending[key] = time.monotonic()
+        self._pending.move_to_end(key)
+        while len(self._pending) > self.max_tracked:
+            self._pending.popitem(last=False)
+            self.expired += 1
+
+    def forget(self, key: Hashable) -> None:
+        """
+        合成する前からキャッシュにあった文を記録から除く（先回りの効果がないため）
+
+        Args:
+            key: 合成のキー
+        """
+        if self._pending.pop(key, None) is not None:
+            self.already_cached += 1
+
+    def consume(self, key: Hashable, outcome: str) -> None:
+        """
+        通常のリクエストでの合成を記録する（投機的に合成した文の場合のみ数える）
+
+        Args:
+            key: 合成のキー
+            outcome: cache（キャッシュにあった）、joined（実行中の合成に合流した）、
+                miss（合成し直した）のいずれか
+        """
+        started_at = self._pending.pop(key, None)
+        if started_at is None:
+            return
+        self._lead_seconds += time.monotonic() - started_at
+        if outcome == "cache":
+            self.cache_hits += 1
+        elif outcome == "joined":
+            self.joined += 1
+        else:
+            self.misses += 1
+
+    def get_stats(self) -> Dict[str, Any]:
+        """
+        統計を取得する
+
+        Returns:
+            Dict[str, Any]: 実行中・開始・上限による見送り・中止・失敗の数と、
+                投機的に合成した文（元からキャッシュにあった文を除く）のうち
+                /tts で使われた割合（hit_rate）、
+                合成の開始から使われるまでの平均秒数
+        """
+        used = self.cache_hits + self.joined
+        consumed = used + self.misses
+        speculated = self.started - self.already_cached
+        return {
+            "active": self.active,
+            "started": self.started,
+            "dropped": self.dropped,
+            "cancelled": self.cancelled,
+            "failed": self.failed,
+            "already_cached": self.already_cached,
+            "cache_hits": self.cache_hits,
+            "joined": self.joined,
+            "misses": self.misses,
+            "unused": len(self._pending) + self.expired,
+            "hit_rate": used / speculated if speculated else 0.0,
+            "avg_lead_seconds": round(self._lead_seconds / consumed, 3) if consumed else 0.0,
+        }
+
+
+# アプリケーション全体で共有するインスタンス
+_stats_instance: Optional[SpeculationStats] = None
+
+
+def get_speculation_stats() -> SpeculationStats:
+    """
+    共有のSpeculationStatsを取得する
+
+    Returns:
+        SpeculationStats: 共有インスタンス
+    """
+    global _stats_instance
+    if _stats_instance is None:
+        _stats_instance = SpeculationStats()
+    return _stats_instance
@@ -0,0 +1,149 @@
+"""
+Speculative synthesis
+
+音声モードではLLMの回答を受け取ってから /tts を呼び出すため、回答の生成と音声合成の
+待ち時間が直列に加わる。LLMの回答のストリームから文が完結した時点で先回りして合成を
+開始し、後から届く /tts（文単位の合成）がキャッシュヒットするか、実行中の合成に合流する
+ようにする。合成は最も低い優先度で行い、/tts が合流した時点で優先度が引き上げられる。
+"""
+import asyncio
+import json
+from typing import AsyncIterator, List, Optional
+from fastapi import HTTPException
+
+from config import settings, logger
+from .admission import Priority, current_priority
+from .segmentation import split_sentences
+from .speculation_stats import SpeculationStats, get_speculation_stats, speculative_synthesis
+from .speech_service import synthesis_key, synthesize_text
+
+
+class SpeculativeSynthesizer:
+    """1件の回答のストリームから、完結した文を順に先回りして合成する"""
+
+    def __init__(self, speaker_id: int, max_sentences: int, max_jobs: int):
+        """
+        Args:
+            speaker_id: 合成に使う話者ID（/tts で指定される話者と一致する必要がある）
+            max_sentences: この回答で先回りして合成する文の数の上限
+            max_jobs: アプリケーション全体で同時に実行する投機的な合成の数の上限
+        """
+        self.speaker_id = speaker_id
+        self.max_sentences = max_sentences
+        self.max_jobs = max_jobs
+        self._buffer = ""
+        self._emitted = 0
+        self._tasks: List["asyncio.Task[None]"] = []
+
+    def feed(self, text: str) -> None:
+        """
+        回答の断片を追加し、完結した文の合成を開始する
+
+        最後の文は続く断片で文末の記号や閉じ括弧が加わる可能性があるため、
+        次の文が始まるか finish が呼ばれるまで合成しない。
+
+        Args:
+            text: 回答の断片
+        """
+        self._buffer += text
+        sentences = split_sentences(self._buffer)
+        self._start(sentences[self._emitted:-1])
+        self._emitted = max(self._emitted, len(sentences) - 1)
+
+    def finish(self) -> None:
+        """回答の終わりに、残りの文の合成を開始する"""
+        sentences = split_sentences(self._buffer)
+        self._start(sentences[self._emitted:])
+        self._emitted = len(sentences)
+
+    def cancel(self) -> None:
+        """実行中の合成を取り消す（回答を受け取るクライアントが切断した場合など）"""
+        stats = get_speculation_stats()
+        for task in self._tasks:
+            if not task.done():
+                task.cancel()
+                stats.cancelled += 1
+
+    def _start(self, sentences: List[str]) -> None:
+        stats = get_speculation_stats()
+        for sentence in sentences:
+            if len(self._tasks) >= self.max_sentences or stats.active >= self.max_jobs:
+                stats.dropped += 1
+                continue
+            stats.active += 1
+            task = asyncio.create_task(self._synthesize(sentence, stats))
+            # 開始前に取り消された場合も実行中の数を減らす
+            task.add_done_callback(lambda _: setattr(stats, "active", stats.active - 1))
+            self._tasks.append(task)
+
+    async def _synthesize(self, sentence: str, stats: SpeculationStats) -> None:
+        # 利用者のリクエストを妨げないよう最も低い優先度で合成する
+        speculative_synthesis.set(True)
+        current_priority.set(Priority.BACKGROUND)
+        key = synthesis_key(sentence, self.speaker_id)
+        stats.mark(key)
+        try:
+            _, cache_hit = await synthesize_text(sentence, self.speaker_id)
+            if cache_hit:
+                stats.forget(key)
+        except HTTPException as e:
+            stats.failed += 1
+            logger.debug(f"先回りの音声合成に失敗しました: {sentence}: {e.detail}")
+
+
+def resolve_speculative_speaker(speaker_id: Optional[int]) -> Optional[int]:
+    """
+    先回りの合成に使う話者IDを決める
+
+    Args:
+        speaker_id: リクエストで指定された話者ID
+
+    Returns:
+        Optional[int]: 話者ID（先回りの合成が無効な場合や話者が決まらない場合はNone）
+    """
+    if not settings.tts_speculative_enabled:
+        return None
+    return speaker_id if speaker_id is not None else settings.tts_speculative_speaker_id
+
+
+async def speculate_from_stream(lines: AsyncIterator[str], speaker_id: int) -> AsyncIterator[str]:
+    """
+    LLMの回答のストリーム（1行1件のJSON）をそのまま中継しながら、文を先回りして合成する
+
+    type が content の行の本文を文に区切って合成し、ストリームの終わりで残りの文を合成する。
+    error を受け取った場合やクライアントが途中で切断した場合は、実行中の合成を取り消す。
+
+    Args:
+        lines: stream_dify_response が返す行
+        speaker_id: 合成に使う話者ID
+
+    Yields:
+        str: 受け取った行（変更しない）
+    """
+    synthesizer = SpeculativeSynthesizer(
+        speaker_id,
+        max_sentences=settings.tts_speculative_max_sentences,
+        max_jobs=settings.tts_speculative_max_jobs
+    )
+    failed = False
+    completed = False
+    try:
+        async for line in lines:
+            try:
+                chunk = json.loads(line)
+            except ValueError:
+                chunk = None
+            if isinstance(chunk, dict) and not failed:
+                if chunk.get("type") == "content" and chunk.get("content"):
+                    synthesizer.feed(chunk["content"])
+                elif chunk.get("type") == "error":
+                    failed = True
+                    synthesizer.cancel()
+            yield line
+        completed = True
+    finally:
+        # 最後まで中継できた場合のみ残りの文を合成し、途中で切断された場合は取り消す
+        if completed and not failed:
+            synthesizer.finish()
+        elif not failed:
+            synthesizer.cancel()
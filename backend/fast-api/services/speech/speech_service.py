@@ -3,77 +3,732 @@ Speech synthesis service
 
 音声合成のビジネスロジックを提供する。
 """
-from typing import Dict, Any, Union
+import asyncio
+import json
+import re
+import time
+from typing import Dict, Any, Optional, Tuple, Union
+from fastapi import HTTPException
 from fastapi.responses import Response
 
-from .aivis_client import AivisSpeechClient
-from ..response.formatters import get_wav_response, get_base64_response
-from models import AudioBase64Response
+from config import settings
+from .aivis_client import get_aivis_client
+from .audio_cache import (
+    AudioCache,
+    content_key,
+    get_audio_cache,
+    make_tts_key,
+    make_synthesis_key,
+    variant_key,
+)
+from .query_cache import get_query_cache, apply_query_overrides
+from .admission import Priority, PriorityTicket, current_priority, current_ticket
+from .composition import compose_segments, get_composition_stats
+from .disconnect import get_disconnect_stats
+from .singleflight import SingleFlight
+from .speculation_stats import get_speculation_stats, speculative_synthesis
+from .segmentation import split_sentences
+from .stage_timing import get_stage_metrics, label_request, measure_stage, record_cached_ratio
+from .visemes import VisemeTimeline, build_viseme_timeline, dump_viseme_timeline, shift_viseme_timeline
+from ..audio.encoder import AUDIO_FORMATS, get_audio_encoder
+from ..audio.wav import parse_wav, trim_silence
+from ..response.formatters import get_wav_response, get_encoded_audio_response, get_base64_response
+from ..response.ranged import EVICTED_DETAIL, get_immutable_audio_response
+from ..text.canonical import canonicalize_text, get_canonicalization_stats
+from models import AudioBase64Response, AudioURLResponse
 
 
-# グローバルクライアントインスタンス
-_client = AivisSpeechClient()
+# /audio/{sha256}.{形式名} のファイル名
+_PUBLISHED_AUDIO_NAME = re.compile(r"([0-9a-f]{64})\.([a-z0-9]+)")
 
+# 実行中の合成ごとの優先度チケット（合流した待ち手の優先度に合わせて引き上げる）
+_flight_tickets: Dict[Any, PriorityTicket] = {}
 
-def create_audio_query(text: str, speaker_id: int) -> Dict[str, Any]:
+
+def _get_cache() -> Optional[AudioCache]:
+    """キャッシュが有効な場合に共有の音声キャッシュを返す"""
+    return get_audio_cache() if settings.audio_cache_enabled else None
+
+
+def _abandon_synthesis(flight_key: Any, task: "asyncio.Task[Any]") -> None:
+    """
+    待ち手が全員いなくなった（クライアントが切断した）合成の扱いを決める
+
+    結果をキャッシュに格納できる場合は background の優先度に引き下げて続行し、
+    格納できない場合や TTS_DISCONNECT_ACTION が cancel の場合は中止する。
+    投機的な合成が取り消された場合も中止する。
+    """
+    stats = get_disconnect_stats()
+    ticket = _flight_tickets.get(flight_key)
+    demote = (
+        settings.tts_disconnect_action == "demote"
+        and not speculative_synthesis.get()
+        and _get_cache() is not None
+    )
+    if demote and ticket is not None:
+        ticket.lower_to(Priority.BACKGROUND)
+        stats.demoted += 1
+        return
+    task.cancel()
+    stats.cancelled += 1
+    if ticket is not None:
+        del _flight_tickets[flight_key]
+
+
+# 同一内容の合成を同時に1回だけ実行するためのコアレッサー
+_synthesis_flight = SingleFlight(on_abandon=_abandon_synthesis)
+
+
+async def create_audio_query(text: str, speaker_id: int) -> Dict[str, Any]:
     """
     テキストからaudio_queryを作成する
-    
+
     Args:
         text: 合成したいテキスト
         speaker_id: 話者ID
-        
+
     Returns:
         Dict[str, Any]: audio_queryデータ
-        
+
+    Note:
+        結果は (テキスト, 話者ID) ごとにキャッシュされ、2回目以降は
+        エンジンのテキスト解析を行わずに返す。
     """
-    return _client.create_audio_query(text, speaker_id)
+    client = get_aivis_client()
+    query_cache = get_query_cache()
+    engine_tag = await client.get_fingerprint()
+    query_data = query_cache.get(text, speaker_id, engine_tag)
+    if query_data is None:
+        with measure_stage("audio_query", speaker_id, text):
+            query_data = await client.create_audio_query(text, speaker_id)
+        query_cache.put(text, speaker_id, engine_tag, query_data)
+    return query_data
 
 
-def synthesize_speech(query: Dict[str, Any], speaker_id: int) -> bytes:
+async def synthesize_speech(query: Dict[str, Any], speaker_id: int) -> bytes:
     """
     audio_queryから音声を合成する
-    
+
     Args:
         query: audio_queryデータ
         speaker_id: 話者ID
-        
+
     Returns:
         bytes: 合成された音声データ（WAV形式）
-        
+
     """
-    return _client.synthesize_speech(query, speaker_id)
+    client = get_aivis_client()
+    cache = _get_cache()
+    if cache is None:
+        with measure_stage("synthesis", speaker_id) as stage:
+            audio_content = await client.synthesize_speech(query, speaker_id)
+            stage.bytes = len(audio_content)
+        return audio_content
+
+    key = make_synthesis_key(query, speaker_id, await client.get_fingerprint())
+    audio_content = await cache.get(key)
+    if audio_content is None:
+        start = time.perf_counter()
+        with measure_stage("synthesis", speaker_id) as stage:
+            audio_content = await client.synthesize_speech(query, speaker_id)
+            stage.bytes = len(audio_content)
+        await cache.put(key, audio_content, time.perf_counter() - start)
+    return audio_content
 
 
-def text_to_speech(
-    text: str, 
-    speaker_id: int, 
-    format_type: str
-) -> Union[Response, AudioBase64Response]:
+async def lookup_cached_audio(
+    text: str,
+    speaker_id: int,
+    query_overrides: Optional[Dict[str, Any]] = None
+) -> Tuple[Optional[str], Optional[bytes]]:
+    """
+    テキストの合成結果をキャッシュから探す
+
+    Args:
+        text: 合成したいテキスト
+        speaker_id: 話者ID
+        query_overrides: audio_queryに上書きするパラメータ
+
+    Returns:
+        Tuple[Optional[str], Optional[bytes]]:
+            キャッシュキー（キャッシュ無効時はNone）とキャッシュ済みの音声データ（なければNone）
+    """
+    cache = _get_cache()
+    if cache is None:
+        return None, None
+    with measure_stage("cache_lookup", speaker_id, text):
+        key = await _tts_cache_key(text, speaker_id, query_overrides)
+        audio_content = await cache.get(key)
+    get_canonicalization_stats().observe("tts", key, text, audio_content is not None)
+    return key, audio_content
+
+
+async def _tts_cache_key(
+    text: str,
+    speaker_id: int,
+    query_overrides: Optional[Dict[str, Any]]
+) -> str:
+    """テキストの合成結果のキャッシュキーを求める"""
+    return make_tts_key(text, speaker_id, query_overrides, await get_aivis_client().get_fingerprint())
+
+
+async def store_cached_audio(key: Optional[str], audio_content: bytes, synthesis_time: float) -> None:
+    """
+    合成結果をキャッシュに格納する
+
+    Args:
+        key: lookup_cached_audioで得たキャッシュキー（Noneの場合は何もしない）
+        audio_content: 音声データ
+        synthesis_time: 合成に要した秒数
+    """
+    cache = _get_cache()
+    if cache is not None and key is not None:
+        await cache.put(key, audio_content, synthesis_time)
+
+
+def synthesis_key(
+    text: str,
+    speaker_id: int,
+    query_overrides: Optional[Dict[str, Any]] = None
+) -> Tuple[Any, ...]:
+    """
+    同じ内容の合成を識別するキーを求める（実行中の合成の共有と投機的な合成の記録に使う）
+
+    Args:
+        text: 合成したいテキスト
+        speaker_id: 話者ID
+        query_overrides: audio_queryに上書きするパラメータ
+
+    Returns:
+        Tuple[Any, ...]: 正規化したテキスト、話者ID、パラメータの組
+    """
+    return (
+        canonicalize_text(text),
+        speaker_id,
+        tuple(sorted((query_overrides or {}).items()))
+    )
+
+
+async def synthesize_text(
+    text: str,
+    speaker_id: int,
+    query_overrides: Optional[Dict[str, Any]] = None
+) -> Tuple[bytes, bool]:
+    """
+    テキストから音声を合成する（キャッシュがあればそれを返す）
+
+    Args:
+        text: 合成したいテキスト
+        speaker_id: 話者ID
+        query_overrides: audio_queryに上書きするパラメータ（speedScaleなど）。
+            キャッシュ済みのaudio_queryに適用するため、バリエーションの生成は合成処理のみで済む
+
+    Returns:
+        Tuple[bytes, bool]: 音声データ（WAV形式）とキャッシュヒットしたかどうか
+
+    Note:
+        同じ内容の合成が実行中の場合は、その結果を共有する（single-flight）。
+        待ち手が全員キャンセルされた合成は、中止するか background の優先度で続行する。
+    """
+    flight_key = synthesis_key(text, speaker_id, query_overrides)
+    # 投機的に合成した文が使われたかどうかは、通常のリクエストでのみ数える
+    speculation = None if speculative_synthesis.get() else get_speculation_stats()
+
+    key, audio_content = await lookup_cached_audio(text, speaker_id, query_overrides)
+    if audio_content is not None:
+        if speculation is not None:
+            speculation.consume(flight_key, "cache")
+        return audio_content, True
+
+    # 同じ内容の合成が実行中であれば、エンジンを呼ばずにその結果を待つ
+    # 低い優先度の合成に高い優先度のリクエストが合流した場合は、合成の優先度を引き上げる
+    ticket = _flight_tickets.get(flight_key)
+    if ticket is None:
+        ticket = _flight_tickets[flight_key] = PriorityTicket(current_priority.get())
+    else:
+        ticket.raise_to(current_priority.get())
+
+    async def synthesize() -> bytes:
+        current_ticket.set(ticket)
+        try:
+            start = time.perf_counter()
+            query_data = apply_query_overrides(
+                await create_audio_query(text, speaker_id),
+                query_overrides
+            )
+            with measure_stage("synthesis", speaker_id, text) as stage:
+                audio = await get_aivis_client().synthesize_speech(query_data, speaker_id)
+                stage.bytes = len(audio)
+            synthesis_time = time.perf_counter() - start
+            await store_cached_audio(key, audio, synthesis_time)
+            # 口形のタイムラインは合成に使ったクエリから求め、音声と並べてキャッシュする
+            if key is not None:
+                timeline = build_viseme_timeline(query_data, _wav_duration(audio))
+                await _store_viseme_timeline(key, timeline, synthesis_time)
+            return audio
+        finally:
+            if _flight_tickets.get(flight_key) is ticket:
+                del _flight_tickets[flight_key]
+
+    try:
+        audio_content, shared = await _synthesis_flight.do(flight_key, synthesize)
+    finally:
+        # 待ち手がいなくなっても続行している合成のチケットは、合成の終了時に削除する
+        if _flight_tickets.get(flight_key) is ticket and not _synthesis_flight.running(flight_key):
+            del _flight_tickets[flight_key]
+    if speculation is not None:
+        speculation.consume(flight_key, "joined" if shared else "miss")
+    return audio_content, False
+
+
+async def synthesize_composed(
+    text: str,
+    speaker_id: int,
+    query_overrides: Optional[Dict[str, Any]] = None
+) -> Tuple[bytes, bool]:
+    """
+    テキストから音声を合成する（複数の文からなる場合は文ごとに合成して連結する）
+
+    テキスト全体がキャッシュにない場合は、文ごとにキャッシュを参照し、ない文だけを合成する。
+    連結した音声はテキスト全体のキャッシュにも格納する。
+    音声の長さのうちキャッシュ済みの文が占める割合は Server-Timing（cached_audio）と
+    統計（get_cache_stats の composition）で確認できる。
+
+    Args:
+        text: 合成したいテキスト
+        speaker_id: 話者ID
+        query_overrides: audio_queryに上書きするパラメータ
+
+    Returns:
+        Tuple[bytes, bool]: 音声データ（WAV形式）と、音声全体がキャッシュにあったかどうか
+
+    Note:
+        1文のみのテキスト、キャッシュが無効な場合、TTS_SEGMENT_CACHE_ENABLED が false の場合は
+        synthesize_text と同じ。同時に合成する文の数は TTS_STREAM_CONCURRENCY で制限する。
+    """
+    segments = split_sentences(text)
+    if not settings.tts_segment_cache_enabled or _get_cache() is None or len(segments) < 2:
+        return await synthesize_text(text, speaker_id, query_overrides)
+
+    stats = get_composition_stats()
+    key, audio_content = await lookup_cached_audio(text, speaker_id, query_overrides)
+    if audio_content is not None:
+        stats.observe_hit(_wav_duration(audio_content))
+        record_cached_ratio(1.0)
+        return audio_content, True
+
+    start = time.perf_counter()
+    semaphore = asyncio.Semaphore(max(1, settings.tts_stream_concurrency))
+
+    async def synthesize_segment(segment: str) -> Tuple[bytes, bool]:
+        async with semaphore:
+            return await synthesize_text(segment, speaker_id, query_overrides)
+
+    tasks = [asyncio.create_task(synthesize_segment(segment)) for segment in segments]
+    try:
+        results = await asyncio.gather(*tasks)
+    except BaseException:
+        for task in tasks:
+            task.cancel()
+        raise
+
+    try:
+        composed = compose_segments(results)
+    except ValueError:
+        # 文ごとの音声を連結できない場合はテキスト全体を合成する
+        return await synthesize_text(text, speaker_id, query_overrides)
+
+    # 口形のタイムラインは求められた時に文ごとのタイムラインから組み立てる（get_viseme_timeline）
+    await store_cached_audio(key, composed.audio, time.perf_counter() - start)
+
+    stats.observe(composed)
+    record_cached_ratio(composed.cached_ratio)
+    return composed.audio, False
+
+
+def _composes_segments(text: str) -> bool:
+    """synthesize_composed が文ごとに合成して連結するテキストかどうか"""
+    return settings.tts_segment_cache_enabled and _get_cache() is not None and len(split_sentences(text)) >= 2
+
+
+async def _compose_viseme_timeline(
+    text: str,
+    speaker_id: int,
+    query_overrides: Optional[Dict[str, Any]]
+) -> VisemeTimeline:
+    """文ごとの口形のタイムラインを、連結した音声での位置にずらしてつなげる"""
+    timeline: VisemeTimeline = []
+    offset = 0.0
+    for segment in split_sentences(text):
+        audio, _ = await synthesize_text(segment, speaker_id, query_overrides)
+        segment_timeline = await get_viseme_timeline(segment, speaker_id, query_overrides, audio, audio)
+        timeline.extend(shift_viseme_timeline(segment_timeline, -round(offset * 1000)))
+        offset += _wav_duration(audio) or 0.0
+    return timeline
+
+
+def _wav_duration(audio: bytes) -> Optional[float]:
+    """WAVの秒数を求める（WAVとして解釈できない場合はNone）"""
+    try:
+        return parse_wav(audio).duration
+    except ValueError:
+        return None
+
+
+async def _store_viseme_timeline(key: str, timeline: VisemeTimeline, synthesis_time: float) -> None:
+    """口形のタイムラインを音声のキャッシュキーに並べて格納する"""
+    data = dump_viseme_timeline(timeline).encode("utf-8")
+    await store_cached_audio(variant_key(key, "visemes"), data, synthesis_time)
+
+
+async def get_viseme_timeline(
+    text: str,
+    speaker_id: int,
+    query_overrides: Optional[Dict[str, Any]] = None,
+    audio: Optional[bytes] = None,
+    trimmed: Optional[bytes] = None
+) -> VisemeTimeline:
+    """
+    /tts で返す音声に合わせた口形のタイムラインを取得する
+
+    合成時に音声と並べてキャッシュしたタイムラインを使用し、キャッシュにない場合のみ
+    audio_query（クエリキャッシュがあればそれ）から求め直す。文ごとに合成して連結した
+    音声（synthesize_composed）では、文ごとのタイムラインをつなげて求める。
+
+    Args:
+        text: 合成したいテキスト
+        speaker_id: 話者ID
+        query_overrides: audio_queryに上書きするパラメータ
+        audio: 合成された音声（省略時は synthesize_composed で取得する）
+        trimmed: audio から先頭の無音を取り除いた音声（省略時はここで取り除く）
+
+    Returns:
+        VisemeTimeline: [口形, 開始ミリ秒, 終了ミリ秒] のリスト（先頭の無音を取り除いた音声が基準）
+    """
+    if audio is None:
+        audio, _ = await synthesize_composed(text, speaker_id, query_overrides)
+    if trimmed is None:
+        trimmed = trim_leading_silence(audio)
+
+    cache = _get_cache()
+    key, cached = None, None
+    if cache is not None:
+        key = await _tts_cache_key(text, speaker_id, query_overrides)
+        cached = await cache.get(variant_key(key, "visemes"))
+    if cached is not None:
+        timeline = json.loads(cached)
+    else:
+        start = time.perf_counter()
+        if _composes_segments(text):
+            timeline = await _compose_viseme_timeline(text, speaker_id, query_overrides)
+        else:
+            query_data = apply_query_overrides(await create_audio_query(text, speaker_id), query_overrides)
+            timeline = build_viseme_timeline(query_data, _wav_duration(audio))
+        if key is not None:
+            await _store_viseme_timeline(key, timeline, time.perf_counter() - start)
+
+    original_duration, trimmed_duration = _wav_duration(audio), _wav_duration(trimmed)
+    if original_duration is None or trimmed_duration is None:
+        return timeline
+    return shift_viseme_timeline(timeline, round((original_duration - trimmed_duration) * 1000))
+
+
+def trim_leading_silence(audio: bytes) -> bytes:
+    """
+    合成音声の先頭の無音を取り除く（設定で無効な場合やWAVとして解釈できない場合はそのまま返す）
+
+    Args:
+        audio: 音声データ（WAV形式）
+
+    Returns:
+        bytes: 先頭の無音を取り除いた音声データ
+    """
+    if not settings.tts_trim_leading_silence:
+        return audio
+    try:
+        with measure_stage("trim"):
+            return trim_silence(
+                audio,
+                threshold_db=settings.tts_silence_threshold_db,
+                padding_ms=settings.tts_silence_padding_ms,
+                trailing=False
+            )
+    except ValueError:
+        return audio
+
+
+async def synthesize_encoded(
+    text: str,
+    speaker_id: int,
+    format_name: str,
+    query_overrides: Optional[Dict[str, Any]] = None
+) -> Tuple[bytes, bool]:
+    """
+    テキストから音声を合成し、圧縮形式に変換する（変換結果もキャッシュする）
+
+    Args:
+        text: 合成したいテキスト
+        speaker_id: 話者ID
+        format_name: 形式名（ogg, mp3, flac）
+        query_overrides: audio_queryに上書きするパラメータ
+
+    Returns:
+        Tuple[bytes, bool]: 変換後の音声データと、変換結果がキャッシュにあったかどうか
+
+    Raises:
+        HTTPException: 変換できない場合（soundfile が利用できない場合は501）
+    """
+    encoded, cache_hit, _ = await _synthesize_encoded(text, speaker_id, format_name, query_overrides)
+    return encoded, cache_hit
+
+
+async def _synthesize_encoded(
+    text: str,
+    speaker_id: int,
+    format_name: str,
+    query_overrides: Optional[Dict[str, Any]] = None,
+    include_visemes: bool = False
+) -> Tuple[bytes, bool, Optional[VisemeTimeline]]:
+    """synthesize_encoded に加え、変換した音声に合わせた口形のタイムラインも求める"""
+    cache = _get_cache()
+    key = None
+    if cache is not None:
+        key = variant_key(await _tts_cache_key(text, speaker_id, query_overrides), format_name)
+        encoded = await cache.get(key)
+        if encoded is not None:
+            visemes = await get_viseme_timeline(text, speaker_id, query_overrides) if include_visemes else None
+            return encoded, True, visemes
+
+    audio_content, _ = await synthesize_composed(text, speaker_id, query_overrides)
+    start = time.perf_counter()
+    trimmed = trim_leading_silence(audio_content)
+    try:
+        with measure_stage("encode", speaker_id, text) as stage:
+            encoded = await get_audio_encoder().encode(trimmed, format_name)
+            stage.bytes = len(encoded)
+    except RuntimeError as e:
+        raise HTTPException(status_code=501, detail=str(e))
+    except ValueError as e:
+        raise HTTPException(status_code=500, detail=f"音声を{format_name}形式に変換できませんでした: {e}")
+    if cache is not None:
+        await cache.put(key, encoded, time.perf_counter() - start)
+    visemes = None
+    if include_visemes:
+        # 変換した音声（連結・無音の除去後）そのものを基準にする
+        visemes = await get_viseme_timeline(text, speaker_id, query_overrides, audio_content, trimmed)
+    return encoded, False, visemes
+
+
+def get_cache_stats() -> Dict[str, Any]:
+    """
+    音声キャッシュの統計情報を取得する
+
+    Returns:
+        Dict[str, Any]: ヒット・ミス数などの統計情報
+    """
+    cache = _get_cache()
+    extra_stats = {
+        "query_cache": get_query_cache().get_stats(),
+        "single_flight": _synthesis_flight.get_stats(),
+        "disconnects": get_disconnect_stats().get_stats(),
+        "encoder": get_audio_encoder().get_stats(),
+        "canonicalization": get_canonicalization_stats().get_stats(),
+        "composition": get_composition_stats().get_stats(),
+        "speculation": get_speculation_stats().get_stats(),
+    }
+    if cache is None:
+        return {"enabled": False, **extra_stats}
+    return {"enabled": True, **cache.get_stats(), **extra_stats}
+
+
+def get_stage_metrics_summary() -> Dict[str, Any]:
+    """
+    処理段階ごとの所要時間と生成したバイト数の集計を取得する
+
+    Returns:
+        Dict[str, Any]: 処理段階・話者ID・テキスト長の区分ごとの件数、平均・p50・p95（ミリ秒）、バイト数
+    """
+    return get_stage_metrics().get_stats()
+
+
+def _media_type(format_name: str) -> str:
+    """形式名からContent-Typeを求める"""
+    return "audio/wav" if format_name == "wav" else AUDIO_FORMATS[format_name].media_type
+
+
+async def publish_audio(
+    audio_content: bytes,
+    format_name: str,
+    synthesis_time: float,
+    cache_hit: bool,
+    visemes: Optional[VisemeTimeline] = None
+) -> AudioURLResponse:
+    """
+    音声を内容のハッシュで音声キャッシュに格納し、配信用のURLを返す
+
+    URLは内容そのもののハッシュを含むため、同じURLの内容は変わらない。
+    ブラウザやリバースプロキシがそのままキャッシュでき、再生し直しやシークで
+    合成処理は発生しない。
+
+    Args:
+        audio_content: 配信する音声データ
+        format_name: 形式名（wav, ogg, mp3, flac）
+        synthesis_time: 音声の生成に要した秒数（追い出しコストの算出に使用）
+        cache_hit: 合成結果がキャッシュにあったかどうか
+        visemes: 口形のタイムライン（指定した場合のみレスポンスに含める）
+
+    Returns:
+        AudioURLResponse: 音声のURLとハッシュ
+
+    Raises:
+        HTTPException: 音声キャッシュが無効な場合（501）
+    """
+    cache = _get_cache()
+    if cache is None:
+        raise HTTPException(status_code=501, detail="音声キャッシュが無効なため、URLでは返せません")
+    digest, key = content_key(audio_content, format_name)
+    if not cache.contains(key):
+        await cache.put(key, audio_content, synthesis_time)
+    return AudioURLResponse(
+        url=f"/audio/{digest}.{format_name}",
+        sha256=digest,
+        content_type=_media_type(format_name),
+        size=len(audio_content),
+        cached=cache_hit,
+        visemes=visemes
+    )
+
+
+async def get_published_audio(
+    name: str,
+    range_header: Optional[str] = None,
+    if_range: Optional[str] = None,
+    if_none_match: Optional[str] = None,
+    method: str = "GET"
+) -> Response:
+    """
+    publish_audio で格納した音声を返す
+
+    Args:
+        name: ファイル名（{sha256}.{形式名}）
+        range_header: Range ヘッダーの値
+        if_range: If-Range ヘッダーの値
+        if_none_match: If-None-Match ヘッダーの値
+        method: リクエストメソッド
+
+    Returns:
+        Response: 音声のレスポンス（immutable なCache-Controlと強いETagを付与し、Range に対応）。
+            ディスク層のみにある音声はファイルから直接送信する
+
+    Raises:
+        HTTPException: 音声が存在しない場合（404）
+    """
+    match = _PUBLISHED_AUDIO_NAME.fullmatch(name)
+    cache = _get_cache()
+    if match is None or cache is None or match.group(2) not in ("wav", *AUDIO_FORMATS):
+        raise HTTPException(status_code=404, detail="音声が見つかりません")
+    digest, format_name = match.groups()
+    key = digest if format_name == "wav" else variant_key(digest, format_name)
+    location = await cache.locate(key)
+    if location is None:
+        raise HTTPException(status_code=404, detail=EVICTED_DETAIL)
+    content, path, size = location
+    return get_immutable_audio_response(
+        etag=digest,
+        media_type=_media_type(format_name),
+        size=size,
+        content=content,
+        path=path,
+        range_header=range_header,
+        if_range=if_range,
+        if_none_match=if_none_match,
+        method=method
+    )
+
+
+def _tts_headers(cache_hit: bool, visemes: Optional[VisemeTimeline]) -> Dict[str, str]:
+    """
+    音声ファイルのレスポンスに付けるヘッダーを生成する
+
+    Raises:
+        HTTPException: 口形のタイムラインが TTS_VISEME_HEADER_MAX_BYTES を超える場合（413）
+    """
+    headers = {"X-TTS-Cache": "HIT" if cache_hit else "MISS"}
+    if visemes is not None:
+        value = dump_viseme_timeline(visemes)
+        if len(value) > settings.tts_viseme_header_max_bytes:
+            raise HTTPException(
+                status_code=413,
+                detail=(
+                    f"口形のタイムライン（{len(value)}バイト）がヘッダーの上限"
+                    f"（{settings.tts_viseme_header_max_bytes}バイト）を超えます。"
+                    "format に base64 を指定するか delivery に url を指定して、JSONで受け取ってください"
+                )
+            )
+        headers["X-TTS-Visemes"] = value
+    return headers
+
+
+async def text_to_speech(
+    text: str,
+    speaker_id: int,
+    format_type: str,
+    query_overrides: Optional[Dict[str, Any]] = None,
+    delivery: str = "inline",
+    include_visemes: bool = False
+) -> Union[Response, AudioBase64Response, AudioURLResponse]:
     """
     テキストから直接音声を生成し、指定された形式で返す
-    
+
     Args:
         text: 合成したいテキスト
         speaker_id: 話者ID
-        format_type: 出力形式（wav, base64 のいずれか）
-        
+        format_type: 出力形式（wav, base64, ogg, mp3, flac のいずれか）
+        query_overrides: audio_queryに上書きするパラメータ（speedScaleなど）
+        delivery: 返し方（inline: 音声データ、url: キャッシュ済み音声のURL）
+        include_visemes: 口形のタイムラインも返すかどうか（JSONではフィールド、
+            音声ファイルでは X-TTS-Visemes ヘッダーで返す。ヘッダーは
+            TTS_VISEME_HEADER_MAX_BYTES までで、超える場合は413）
+
     Returns:
-        Union[Response, AudioBase64Response]: 
-            指定された形式の音声レスポンス
-            
-    """
-    # audio_queryを取得
-    query_data = create_audio_query(text, speaker_id)
-    
-    # 音声合成
-    audio_content = synthesize_speech(query_data, speaker_id)
-    
+        Union[Response, AudioBase64Response, AudioURLResponse]:
+            指定された形式の音声レスポンス、または音声のURL
+
+    Raises:
+        HTTPException: base64 をURLで返そうとした場合（400）、
+            X-TTS-Visemes ヘッダーが上限を超える場合（413）
+    """
+    if delivery == "url" and format_type == "base64":
+        raise HTTPException(status_code=400, detail="base64 形式はURLでは返せません")
+    label_request(speaker_id, text)
+    start = time.perf_counter()
+    visemes = None
+
+    # 圧縮形式は変換結果をWAVと並べてキャッシュする
+    if format_type in AUDIO_FORMATS:
+        encoded, cache_hit, visemes = await _synthesize_encoded(
+            text, speaker_id, format_type, query_overrides, include_visemes
+        )
+        if delivery == "url":
+            return await publish_audio(encoded, format_type, time.perf_counter() - start, cache_hit, visemes)
+        return get_encoded_audio_response(encoded, format_type, headers=_tts_headers(cache_hit, visemes))
+
+    # 音声合成（audio_query + synthesis、キャッシュがあれば再利用。複数の文は文ごとに合成して連結する）
+    original_audio, cache_hit = await synthesize_composed(text, speaker_id, query_overrides)
+    audio_content = trim_leading_silence(original_audio)
+    if include_visemes:
+        visemes = await get_viseme_timeline(text, speaker_id, query_overrides, original_audio, audio_content)
+
     # フォーマットに応じた出力
     if format_type == "wav":
-        return get_wav_response(audio_content)
+        if delivery == "url":
+            return await publish_audio(audio_content, "wav", time.perf_counter() - start, cache_hit, visemes)
+        return get_wav_response(audio_content, headers=_tts_headers(cache_hit, visemes))
     elif format_type == "base64":
-        return get_base64_response(audio_content)
+        with measure_stage("base64", speaker_id, text) as stage:
+            response = get_base64_response(audio_content, visemes)
+            stage.bytes = len(response.base64_audio)
+        return response
     else:
         # このケースは実際には発生しない
-        raise ValueError(f"Unsupported format: {format_type}") 
\ No newline at end of file
+        raise ValueError(f"Unsupported format: {format_type}")
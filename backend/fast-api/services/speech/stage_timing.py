@@ -0,0 +1,368 @@
+"""
+Stage timing
+
+/tts の処理段階（キャッシュの参照、audio_query、合成、無音の除去、エンコード、
+Base64化、レスポンスの送信）ごとの所要時間と生成したバイト数を、
+話者IDとテキスト長の区分ごとのヒストグラムに記録する。話者IDのラベルは話者一覧と
+ENGINE_INIT_SPEAKERS にある話者に限り、それ以外は other にまとめる（クライアントが
+任意の話者IDを送っても系列が増え続けないようにするため）。
+集計は /metrics（Prometheus形式）と /tts/metrics で、リクエストごとの所要時間は
+Server-Timing ヘッダー（middleware/server_timing.py）で確認できる。
+"""
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Sequence, Set, Tuple
+
+from config import settings
+
+# Prometheusクライアントがある場合は、その既定のレジストリのメトリクスも /metrics に含める
+try:
+    from prometheus_client import generate_latest
+    PROMETHEUS_AVAILABLE = True
+except ImportError:
+    PROMETHEUS_AVAILABLE = False
+    generate_latest = None
+
+# 所要時間（秒）のヒストグラムの区切り
+LATENCY_BUCKETS: Tuple[float, ...] = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+# 生成したバイト数のヒストグラムの区切り
+BYTES_BUCKETS: Tuple[float, ...] = (1024, 4096, 16384, 65536, 262144, 1048576, 4194304)
+# テキスト長（文字数）の区分の上限
+TEXT_LENGTH_BUCKETS: Tuple[int, ...] = (10, 30, 80, 200)
+
+UNKNOWN = "unknown"
+# 話者一覧にも ENGINE_INIT_SPEAKERS にもない話者IDのラベル
+OTHER_SPEAKER = "other"
+
+# エンジンの話者一覧から得たスタイルID
+_known_speakers: Set[int] = set()
+
+
+def register_speakers(speaker_ids: Iterable[int]) -> None:
+    """
+    エンジンの話者一覧にある話者ID（スタイルID）を、ラベルに使える話者として記録する
+
+    Args:
+        speaker_ids: 話者ID
+    """
+    _known_speakers.update(speaker_ids)
+
+
+def speaker_label(speaker_id: Any) -> str:
+    """
+    話者IDのラベルを求める
+
+    Args:
+        speaker_id: 話者ID
+
+    Returns:
+        str: 話者一覧または ENGINE_INIT_SPEAKERS にある話者はそのID、それ以外は other
+    """
+    if speaker_id in _known_speakers or speaker_id in settings.engine_init_speakers:
+        return str(speaker_id)
+    return OTHER_SPEAKER
+
+
+def text_length_bucket(text: Optional[str]) -> str:
+    """
+    テキスト長の区分を求める
+
+    Args:
+        text: テキスト（不明な場合はNone）
+
+    Returns:
+        str: "1-10", "11-30", "31-80", "81-200", "201+" のいずれか（不明な場合は unknown）
+    """
+    if text is None:
+        return UNKNOWN
+    lower = 1
+    for upper in TEXT_LENGTH_BUCKETS:
+        if len(text) <= upper:
+            return f"{lower}-{upper}"
+        lower = upper + 1
+    return f"{lower}+"
+
+
+class Histogram:
+    """区切りごとの件数と、値の合計・件数を持つヒストグラム（Prometheusのhistogramと同じ形）"""
+
+    def __init__(self, buckets: Sequence[float]):
+        """
+        Args:
+            buckets: 区切りの値（昇順、各区間は上限を含む）
+        """
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float) -> None:
+        """値を1件記録する"""
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def quantile(self, q: float) -> float:
+        """
+        分位点を区切りの値で近似する（該当する区間の上限を返す）
+
+        Args:
+            q: 分位（0〜1）
+
+        Returns:
+            float: 分位点の近似値（最後の区間に入る場合は最大の区切り、記録がなければ0）
+        """
+        if self.count == 0:
+            return 0.0
+        target = q * self.count
+        cumulative = 0
+        for upper, count in zip(self.buckets, self.counts):
+            cumulative += count
+            if cumulative >= target:
+                return upper
+        return self.buckets[-1]
+
+    def cumulative_counts(self) -> List[Tuple[str, int]]:
+        """Prometheus形式の (le, 累積件数) のリスト"""
+        result = []
+        cumulative = 0
+        for upper, count in zip(self.buckets, self.counts):
+            cumulative += count
+            result.append((f"{upper:g}", cumulative))
+        result.append(("+Inf", self.count))
+        return result
+
+
+class StageMetrics:
+    """処理段階・話者ID・テキスト長の区分ごとの所要時間とバイト数のヒストグラム"""
+
+    def __init__(self) -> None:
+        self._durations: Dict[Tuple[str, str, str], Histogram] = {}
+        self._bytes: Dict[Tuple[str, str, str], Histogram] = {}
+
+    def observe(
+        self,
+        stage: str,
+        speaker_id: str,
+        text_length: str,
+        seconds: float,
+        size: Optional[int] = None
+    ) -> None:
+        """
+        1回の処理を記録する
+
+        Args:
+            stage: 処理段階の名前
+            speaker_id: 話者ID（ラベル）
+            text_length: テキスト長の区分（ラベル）
+            seconds: 所要時間（秒）
+            size: 生成したバイト数（生成しない段階ではNone）
+        """
+        labels = (stage, speaker_id, text_length)
+        self._durations.setdefault(labels, Histogram(LATENCY_BUCKETS)).observe(seconds)
+        if size is not None:
+            self._bytes.setdefault(labels, Histogram(BYTES_BUCKETS)).observe(size)
+
+    def get_stats(self) -> Dict[str, Any]:
+        """
+        集計を取得する
+
+        Returns:
+            Dict[str, Any]: ラベルの組み合わせごとの件数、平均・p50・p95（ミリ秒）、バイト数
+        """
+        stages = []
+        for (stage, speaker_id, text_length), histogram in sorted(self._durations.items()):
+            entry = {
+                "stage": stage,
+                "speaker_id": speaker_id,
+                "text_length": text_length,
+                "count": histogram.count,
+                "avg_ms": round(histogram.sum / histogram.count * 1000, 1),
+                "p50_ms": round(histogram.quantile(0.5) * 1000, 1),
+                "p95_ms": round(histogram.quantile(0.95) * 1000, 1),
+            }
+            sizes = self._bytes.get((stage, speaker_id, text_length))
+            if sizes is not None:
+                entry["bytes_total"] = int(sizes.sum)
+                entry["bytes_avg"] = int(sizes.sum / sizes.count)
+            stages.append(entry)
+        return {"stages": stages}
+
+    def render_prometheus(self) -> str:
+        """
+        Prometheusのテキスト形式で出力する
+
+        Returns:
+            str: tts_stage_duration_seconds と tts_stage_bytes のヒストグラム
+        """
+        lines: List[str] = []
+        for name, help_text, histograms in (
+            ("tts_stage_duration_seconds", "TTS pipeline stage duration", self._durations),
+            ("tts_stage_bytes", "Bytes produced by TTS pipeline stage", self._bytes),
+        ):
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} histogram")
+            for (stage, speaker_id, text_length), histogram in sorted(histograms.items()):
+                labels = f'stage="{stage}",speaker_id="{speaker_id}",text_length="{text_length}"'
+                for le, count in histogram.cumulative_counts():
+                    lines.append(f'{name}_bucket{{{labels},le="{le}"}} {count}')
+                lines.append(f"{name}_sum{{{labels}}} {histogram.sum:g}")
+                lines.append(f"{name}_count{{{labels}}} {histogram.count}")
+        return "\n".join(lines) + "\n"
+
+
+class RequestTimings:
+    """1件のリクエストの処理段階ごとの所要時間（Server-Timing ヘッダーの内容）"""
+
+    def __init__(self) -> None:
+        self.speaker_id: Optional[str] = None
+        self.text_length: Optional[str] = None
+        # 処理段階ごとの (最初の開始時刻, 最後の終了時刻)（time.perf_counter の値）
+        self.stages: Dict[str, Tuple[float, float]] = {}
+        self.cached_ratio: Optional[float] = None
+
+    def label(self, speaker_id: Optional[int], text: Optional[str]) -> None:
+        """リクエストの話者IDとテキスト長を設定する（最初に設定したものを使う）"""
+        if self.speaker_id is None and speaker_id is not None:
+            self.speaker_id = speaker_label(speaker_id)
+            self.text_length = text_length_bucket(text)
+
+    def add(self, stage: str, start: float, end: float) -> None:
+        """
+        処理段階の区間を記録する
+
+        同じ段階を複数回行った場合は、最初の開始から最後の終了までを1つの区間にする
+        （文単位で並列に合成した場合に、所要時間を合計して実時間より長く見せないため）。
+
+        Args:
+            stage: 処理段階の名前
+            start: 開始時刻（time.perf_counter の値）
+            end: 終了時刻（time.perf_counter の値）
+        """
+        span = self.stages.get(stage)
+        if span is not None:
+            start, end = min(span[0], start), max(span[1], end)
+        self.stages[stage] = (start, end)
+
+    def server_timing(self, total: Optional[float] = None) -> str:
+        """
+        Server-Timing ヘッダーの値を生成する
+
+        Args:
+            total: リクエスト全体の所要時間（秒、省略時は含めない）
+
+        Returns:
+            str: "audio_query;dur=12.3, synthesis;dur=456.7" の形式の値
+                （文単位で合成した場合はキャッシュから返した音声の割合 cached_audio;desc="0.67" を含む）
+        """
+        entries = [f"{stage};dur={(end - start) * 1000:.1f}" for stage, (start, end) in self.stages.items()]
+        if self.cached_ratio is not None:
+            entries.append(f'cached_audio;desc="{self.cached_ratio:.2f}"')
+        if total is not None:
+            entries.append(f"total;dur={total * 1000:.1f}")
+        return ", ".join(entries)
+
+
+# 処理中のリクエストの所要時間（ミドルウェアで設定し、生成したタスクにも引き継がれる）
+current_timings: ContextVar[Optional[RequestTimings]] = ContextVar("current_timings", default=None)
+
+
+class StageRecord:
+    """measure_stage で計測中の処理段階（生成したバイト数を設定する）"""
+
+    def __init__(self) -> None:
+        self.bytes: Optional[int] = None
+
+
+# アプリケーション全体で共有するインスタンス
+_metrics_instance: Optional[StageMetrics] = None
+
+
+def get_stage_metrics() -> StageMetrics:
+    """
+    共有のStageMetricsを取得する
+
+    Returns:
+        StageMetrics: 共有インスタンス
+    """
+    global _metrics_instance
+    if _metrics_instance is None:
+        _metrics_instance = StageMetrics()
+    return _metrics_instance
+
+
+def render_metrics() -> str:
+    """
+    /metrics で返すPrometheus形式のメトリクスを生成する
+
+    Returns:
+        str: 処理段階のヒストグラム（prometheus_client がある場合はその既定のレジストリの内容も含む）
+    """
+    text = get_stage_metrics().render_prometheus()
+    if PROMETHEUS_AVAILABLE:
+        text += generate_latest().decode("utf-8")
+    return text
+
+
+def label_request(speaker_id: int, text: Optional[str]) -> None:
+    """
+    処理中のリクエストに話者IDとテキスト長を設定する（レスポンスの送信時間のラベルに使う）
+
+    Args:
+        speaker_id: 話者ID
+        text: 合成するテキスト
+    """
+    timings = current_timings.get()
+    if timings is not None:
+        timings.label(speaker_id, text)
+
+
+def record_cached_ratio(ratio: float) -> None:
+    """
+    処理中のリクエストで、音声の長さのうちキャッシュから返した割合を設定する
+
+    Args:
+        ratio: キャッシュ済みの文が占める割合（0〜1）
+    """
+    timings = current_timings.get()
+    if timings is not None:
+        timings.cached_ratio = ratio
+
+
+@contextmanager
+def measure_stage(
+    stage: str,
+    speaker_id: Optional[int] = None,
+    text: Optional[str] = None
+) -> Iterator[StageRecord]:
+    """
+    処理段階の所要時間を計測し、ヒストグラムと処理中のリクエストに記録する
+
+    例外で終了した場合は記録しない。
+
+    Args:
+        stage: 処理段階の名前
+        speaker_id: 話者ID（省略時はリクエストに設定されたもの。未知の話者は other として記録する）
+        text: 処理するテキスト（省略時はリクエストに設定されたテキスト長の区分）
+
+    Yields:
+        StageRecord: bytes に生成したバイト数を設定すると、バイト数も記録する
+    """
+    record = StageRecord()
+    start = time.perf_counter()
+    yield record
+    end = time.perf_counter()
+    seconds = end - start
+
+    timings = current_timings.get()
+    if timings is not None:
+        timings.add(stage, start, end)
+    if speaker_id is not None:
+        labels = (speaker_label(speaker_id), text_length_bucket(text))
+    elif timings is not None and timings.speaker_id is not None:
+        labels = (timings.speaker_id, timings.text_length or UNKNOWN)
+    else:
+        labels = (UNKNOWN, text_length_bucket(text))
+    get_stage_metrics().observe(stage, labels[0], labels[1], seconds, record.bytes)
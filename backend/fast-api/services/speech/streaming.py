@@ -0,0 +1,156 @@
+"""
+Streaming speech synthesis
+
+長文を文単位に分割して並列に合成し、先頭の文から順にWAVとして逐次送信する。
+最初の音声が届くまでの時間は段落全体ではなく最初の文の合成時間で決まる。
+"""
+import asyncio
+from typing import Any, AsyncIterator, Dict, List, Optional
+from fastapi import HTTPException
+from fastapi.responses import StreamingResponse
+
+from config import settings, logger
+from .filler import get_filler_pool
+from .query_cache import FORMAT_QUERY_PARAMS
+from .segmentation import split_sentences
+from .speech_service import synthesize_text, trim_leading_silence
+from .stage_timing import label_request
+from ..audio.wav import WavInfo, parse_wav, build_wav_header
+from ..response.formatters import get_wav_stream_response
+
+
+def _cancel_tasks(tasks: List["asyncio.Task[bytes]"]) -> None:
+    """未完了のタスクをキャンセルし、完了済みタスクの例外は回収する"""
+    for task in tasks:
+        if not task.done():
+            task.cancel()
+        elif not task.cancelled():
+            task.exception()
+
+
+async def _iter_wav_stream(
+    first_audio: bytes,
+    first_info: WavInfo,
+    pending: List["asyncio.Task[bytes]"]
+) -> AsyncIterator[bytes]:
+    """
+    1つのWAVヘッダーに続けて各文のPCMデータを順番に返す
+
+    Args:
+        first_audio: 最初の文の音声データ
+        first_info: 最初の文のWAV情報（ストリーム全体のフォーマット）
+        pending: 2文目以降の合成タスク（文の順）
+    """
+    try:
+        yield build_wav_header(first_info, None)
+        yield first_audio[first_info.data_offset:first_info.data_offset + first_info.data_size]
+        for task in pending:
+            audio = await task
+            info = parse_wav(audio)
+            if not info.same_format(first_info):
+                logger.error("文ごとの音声フォーマットが一致しないためストリーミングを中断します")
+                break
+            yield audio[info.data_offset:info.data_offset + info.data_size]
+    except HTTPException as e:
+        # ヘッダー送信後はステータスを変更できないため、ログを残してストリームを終了する
+        logger.error(f"ストリーミング音声合成中にエラーが発生しました: {e.detail}")
+    except ValueError as e:
+        logger.error(f"AivisSpeech Engineから不正な音声データが返されたためストリーミングを中断します: {e}")
+    finally:
+        _cancel_tasks(pending)
+
+
+async def _filler_if_over_budget(
+    first: "asyncio.Task[bytes]",
+    speaker_id: int,
+    query_overrides: Optional[Dict[str, Any]]
+) -> Optional[bytes]:
+    """
+    最初の文が予算内に合成できない場合に、先に流すつなぎの音声を返す
+
+    Args:
+        first: 最初の文の合成タスク
+        speaker_id: 話者ID
+        query_overrides: audio_queryに上書きするパラメータ
+
+    Returns:
+        Optional[bytes]: つなぎの音声（予算内に合成できた場合、無効な場合、
+            合成済みのつなぎの音声がない場合はNone）
+    """
+    budget = settings.tts_filler_budget_ms / 1000
+    # サンプリングレートなどを上書きすると、つなぎの音声とPCMを連結できない
+    if budget <= 0 or any(name in (query_overrides or {}) for name in FORMAT_QUERY_PARAMS):
+        return None
+    done, _ = await asyncio.wait({first}, timeout=budget)
+    if done:
+        return None
+    return get_filler_pool().take(speaker_id)
+
+
+async def stream_text_to_speech(
+    text: str,
+    speaker_id: int,
+    query_overrides: Optional[Dict[str, Any]] = None
+) -> StreamingResponse:
+    """
+    テキストを文単位で並列に合成し、順番にストリーミングするレスポンスを返す
+
+    Args:
+        text: 合成したいテキスト
+        speaker_id: 話者ID
+        query_overrides: audio_queryに上書きするパラメータ（speedScaleなど）
+
+    Returns:
+        StreamingResponse: 1つのWAVヘッダーと各文のPCMデータを順に送信するレスポンス
+
+    Raises:
+        HTTPException: 最初の文の合成に失敗した場合
+
+    Note:
+        同時に合成する文の数は TTS_STREAM_CONCURRENCY で制限する。
+        WAVヘッダーのサイズ欄は長さ未確定を示す値になる。
+        最初の文が TTS_FILLER_BUDGET_MS 以内に合成できない場合は、つなぎの音声
+        （「えーと…」など）を先に送信し、その長さを X-TTS-Filler-Ms ヘッダーで返す。
+        この場合は送信開始後に最初の文が失敗しても、エラーのステータスは返せない。
+    """
+    label_request(speaker_id, text)
+    segments = split_sentences(text) or [text]
+    semaphore = asyncio.Semaphore(max(1, settings.tts_stream_concurrency))
+
+    async def synthesize_segment(segment: str) -> bytes:
+        async with semaphore:
+            audio, _ = await synthesize_text(segment, speaker_id, query_overrides)
+            return audio
+
+    tasks = [asyncio.create_task(synthesize_segment(segment)) for segment in segments]
+
+    filler = await _filler_if_over_budget(tasks[0], speaker_id, query_overrides)
+    if filler is not None:
+        filler_info = parse_wav(filler)
+        return get_wav_stream_response(
+            _iter_wav_stream(filler, filler_info, tasks),
+            headers={
+                "X-TTS-Segments": str(len(segments)),
+                "X-TTS-Filler-Ms": str(round(filler_info.duration * 1000)),
+            }
+        )
+
+    # 最初の文が失敗した場合は通常のエラーレスポンスとして返す
+    try:
+        # 再生開始を早めるため、最初の文のみ先頭の無音を取り除く
+        first_audio = trim_leading_silence(await tasks[0])
+        first_info = parse_wav(first_audio)
+    except ValueError:
+        _cancel_tasks(tasks)
+        raise HTTPException(
+            status_code=502,
+            detail="AivisSpeech Engineから不正な音声データが返されました"
+        )
+    except BaseException:
+        _cancel_tasks(tasks)
+        raise
+
+    return get_wav_stream_response(
+        _iter_wav_stream(first_audio, first_info, tasks[1:]),
+        headers={"X-TTS-Segments": str(len(segments))}
+    )
@@ -0,0 +1,97 @@
+"""
+Viseme timeline
+
+audio_queryのモーラごとの子音長・母音長から、口形（母音）のタイムラインを求める。
+アバターの口パクに使用し、クライアント側での音声解析や audio_query の再取得を不要にする。
+"""
+import json
+from typing import Any, Dict, List, Optional
+
+# タイムラインの1件: [口形, 開始ミリ秒, 終了ミリ秒]
+VisemeTimeline = List[List[Any]]
+
+# audio_queryの母音から口形への対応（無声化母音は大文字で返される）
+# 促音（cl）と無音（pau）は口を閉じた区間としてタイムラインに含めない
+VOWEL_VISEMES = {
+    "a": "a",
+    "i": "i",
+    "u": "u",
+    "e": "e",
+    "o": "o",
+    "N": "n",
+}
+
+
+def _viseme(vowel: str) -> Optional[str]:
+    return VOWEL_VISEMES.get(vowel) or VOWEL_VISEMES.get(vowel.lower())
+
+
+def build_viseme_timeline(query: Dict[str, Any], duration: Optional[float] = None) -> VisemeTimeline:
+    """
+    audio_queryから口形のタイムラインを求める
+
+    子音の区間は続く母音の口形に含める。話速（speedScale）と前後の無音
+    （prePhonemeLength, postPhonemeLength）を反映し、duration が分かる場合は
+    合計の長さが実際の音声の長さと一致するように伸縮する。
+
+    Args:
+        query: 合成に使用したaudio_queryデータ
+        duration: 合成された音声の秒数
+
+    Returns:
+        VisemeTimeline: [口形（a, i, u, e, o, n）, 開始ミリ秒, 終了ミリ秒] のリスト
+    """
+    speed = query.get("speedScale") or 1.0
+    pause_scale = query.get("pauseLengthScale") or 1.0
+    segments = []
+    position = float(query.get("prePhonemeLength") or 0.0)
+    for phrase in query.get("accent_phrases") or []:
+        for mora in phrase.get("moras") or []:
+            length = (mora.get("consonant_length") or 0.0) + (mora.get("vowel_length") or 0.0)
+            segments.append((_viseme(mora.get("vowel", "")), position, position + length))
+            position += length
+        pause = phrase.get("pause_mora")
+        if pause:
+            position += (pause.get("vowel_length") or 0.0) * pause_scale
+    total = position + float(query.get("postPhonemeLength") or 0.0)
+
+    scale = 1.0 / speed
+    if duration and total > 0:
+        scale = duration / total
+    return [
+        [viseme, round(start * scale * 1000), round(end * scale * 1000)]
+        for viseme, start, end in segments
+        if viseme is not None and end > start
+    ]
+
+
+def shift_viseme_timeline(timeline: VisemeTimeline, offset_ms: int) -> VisemeTimeline:
+    """
+    タイムラインを前にずらす（先頭の無音を取り除いた音声に合わせる）
+
+    Args:
+        timeline: 口形のタイムライン
+        offset_ms: 取り除いたミリ秒数
+
+    Returns:
+        VisemeTimeline: ずらした後のタイムライン（0ミリ秒より前の部分は切り詰める）
+    """
+    shifted = []
+    for viseme, start, end in timeline:
+        end -= offset_ms
+        if end > 0:
+            shifted.append([viseme, max(0, start - offset_ms), end])
+    return shifted
+
+
+def dump_viseme_timeline(timeline: VisemeTimeline) -> str:
+    """
+    タイムラインをコンパクトなJSONにする（キャッシュやレスポンスヘッダーに使用）
+
+    Args:
+        timeline: 口形のタイムライン
+
+    Returns:
+        str: 空白を含まないJSON文字列
+    """
+    return json.dumps(timeline, separators=(",", ":"))
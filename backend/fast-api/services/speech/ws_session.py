@@ -0,0 +1,232 @@
+"""
+WebSocket speech synthesis
+
+1本のWebSocket接続でテキストの断片を順次受け取り、合成できたものから
+バイナリフレームとして音声を返す。発話ごとのHTTP接続やBase64による
+データ量の増加をなくすために使用する。
+
+クライアント → サーバー（JSONテキスト）:
+    {"type": "synthesize", "seq": 1, "text": "...", "speaker_id": 888753760, "format": "wav"}
+        seq は省略時に採番する。speaker_id と format は省略可能
+    {"type": "cancel", "seq": 1}
+        seq を省略した場合は未送信のものをすべて取り消す
+
+サーバー → クライアント:
+    {"type": "audio", "seq": 1, "format": "wav", "bytes": 12345, "cached": false}（JSONテキスト）
+        続けて、先頭4バイトがseq（ビッグエンディアン）、残りが音声データのバイナリフレーム
+    {"type": "cancelled", "seq": 1}
+    {"type": "error", "seq": 1, "status": 503, "detail": "..."}
+
+音声は断片を受け取った順（seq の順ではなく送信順）に返す。
+"""
+import asyncio
+import json
+import struct
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Set, Tuple
+from fastapi import HTTPException, WebSocket, WebSocketDisconnect
+from starlette.websockets import WebSocketState
+
+from config import settings, logger
+from .speech_service import synthesize_encoded, synthesize_text, trim_leading_silence
+from ..audio.encoder import AUDIO_FORMATS
+
+# 話者IDを省略した場合の話者ID
+DEFAULT_SPEAKER_ID = 888753760
+
+# WebSocketで指定できる出力形式
+WS_FORMATS = ("wav", *AUDIO_FORMATS)
+
+
+def pack_audio_frame(seq: int, audio: bytes) -> bytes:
+    """
+    音声データに seq を付けたバイナリフレームを生成する
+
+    Args:
+        seq: シーケンスID
+        audio: 音声データ
+
+    Returns:
+        bytes: 先頭4バイトがseq（ビッグエンディアン）のフレーム
+    """
+    return struct.pack(">I", seq) + audio
+
+
+async def synthesize_fragment(text: str, speaker_id: int, format_name: str) -> Tuple[bytes, bool]:
+    """
+    テキストの断片を指定の形式で合成する
+
+    Returns:
+        Tuple[bytes, bool]: 音声データとキャッシュヒットしたかどうか
+    """
+    if format_name in AUDIO_FORMATS:
+        return await synthesize_encoded(text, speaker_id, format_name)
+    audio, cached = await synthesize_text(text, speaker_id)
+    return trim_leading_silence(audio), cached
+
+
+def _is_int(value: Any) -> bool:
+    """JSONの整数かどうか（true/false は整数として扱わない）"""
+    return isinstance(value, int) and not isinstance(value, bool)
+
+
+class TTSWebSocketSession:
+    """1本のWebSocket接続での音声合成のやり取りを管理する"""
+
+    def __init__(self, websocket: WebSocket):
+        """
+        Args:
+            websocket: 接続済み（accept前）のWebSocket
+        """
+        self.websocket = websocket
+        self._semaphore = asyncio.Semaphore(max(1, settings.tts_ws_concurrency))
+        # 受け取った順の合成タスク（送信が済むまで保持する）
+        self._jobs: "OrderedDict[int, Tuple[str, asyncio.Task[Tuple[bytes, bool]]]]" = OrderedDict()
+        self._cancelled: Set[int] = set()
+        self._job_added = asyncio.Event()
+        self._next_seq = 1
+        # 受信側の応答と送信ループが同時に書き込まないよう、送信はすべてこのロックの中で行う
+        self._send_lock = asyncio.Lock()
+
+    async def run(self) -> None:
+        """接続を受け付け、切断されるまでメッセージを処理する"""
+        await self.websocket.accept()
+        sender = asyncio.create_task(self._send_loop())
+        try:
+            while True:
+                try:
+                    raw = await self.websocket.receive_text()
+                except (KeyError, RuntimeError):
+                    # バイナリフレームは text を持たない（切断後の受信もRuntimeErrorになる）
+                    if self.websocket.application_state != WebSocketState.CONNECTED:
+                        break
+                    await self._send_json({
+                        "type": "error",
+                        "status": 400,
+                        "detail": "メッセージはJSONテキストで送信してください"
+                    })
+                    continue
+                await self._handle(raw)
+        except WebSocketDisconnect:
+            pass
+        finally:
+            sender.cancel()
+            for _, task in self._jobs.values():
+                task.cancel()
+            self._jobs.clear()
+            # 送信ループが例外で終了していた場合は、例外を取り出して記録する
+            (result,) = await asyncio.gather(sender, return_exceptions=True)
+            if isinstance(result, Exception):
+                logger.warning(f"WebSocketの音声送信が中断されました: {result}")
+
+    async def _send_json(self, message: Dict[str, Any]) -> None:
+        async with self._send_lock:
+            await self.websocket.send_text(json.dumps(message, ensure_ascii=False))
+
+    async def _send_audio(self, message: Dict[str, Any], frame: bytes) -> None:
+        """audioメッセージと続くバイナリフレームを、間に他のメッセージを挟まずに送信する"""
+        async with self._send_lock:
+            await self.websocket.send_text(json.dumps(message, ensure_ascii=False))
+            await self.websocket.send_bytes(frame)
+
+    async def _handle(self, raw: str) -> None:
+        """クライアントからのメッセージを1件処理する"""
+        try:
+            message = json.loads(raw)
+            if not isinstance(message, dict):
+                raise ValueError("メッセージはJSONオブジェクトである必要があります")
+        except ValueError as e:
+            await self._send_json({"type": "error", "status": 400, "detail": f"不正なメッセージです: {e}"})
+            return
+
+        message_type = message.get("type")
+        if message_type == "synthesize":
+            await self._submit(message)
+        elif message_type == "cancel":
+            await self._cancel(message.get("seq"))
+        else:
+            await self._send_json({
+                "type": "error",
+                "status": 400,
+                "detail": f"不明なメッセージの種類です: {message_type}"
+            })
+
+    async def _submit(self, message: Dict[str, Any]) -> None:
+        """合成を受け付ける"""
+        seq = message.get("seq")
+        if seq is None:
+            seq = self._next_seq
+        text = message.get("text")
+        format_name = message.get("format", "wav")
+        speaker_id = message.get("speaker_id", DEFAULT_SPEAKER_ID)
+        error = None
+        if not _is_int(seq) or not 0 <= seq <= 0xFFFFFFFF:
+            error = "seq は0以上の整数で指定してください"
+        elif seq in self._jobs:
+            error = f"seq {seq} は処理中です"
+        elif not isinstance(text, str) or not text.strip():
+            error = "text が指定されていません"
+        elif format_name not in WS_FORMATS:
+            error = f"対応していない形式です: {format_name}"
+        elif not _is_int(speaker_id):
+            error = "speaker_id は整数で指定してください"
+        elif len(self._jobs) >= settings.tts_ws_max_pending:
+            error = f"未送信の合成が上限（{settings.tts_ws_max_pending}）に達しています"
+        if error is not None:
+            await self._send_json({"type": "error", "seq": seq, "status": 400, "detail": error})
+            return
+
+        self._next_seq = max(self._next_seq, seq + 1)
+
+        async def synthesize() -> Tuple[bytes, bool]:
+            async with self._semaphore:
+                return await synthesize_fragment(text, speaker_id, format_name)
+
+        self._cancelled.discard(seq)
+        self._jobs[seq] = (format_name, asyncio.create_task(synthesize()))
+        self._job_added.set()
+
+    async def _cancel(self, seq: Optional[int]) -> None:
+        """合成を取り消す（送信済みのものは対象外）"""
+        targets = list(self._jobs) if seq is None else [seq]
+        for target in targets:
+            job = self._jobs.get(target)
+            if job is None:
+                continue
+            self._cancelled.add(target)
+            job[1].cancel()
+
+    async def _send_loop(self) -> None:
+        """受け取った順に合成の完了を待ち、音声を送信する"""
+        while True:
+            if not self._jobs:
+                self._job_added.clear()
+                await self._job_added.wait()
+                continue
+
+            seq, (format_name, task) = next(iter(self._jobs.items()))
+            await asyncio.wait([task])
+            self._jobs.pop(seq, None)
+
+            if seq in self._cancelled or task.cancelled():
+                self._cancelled.discard(seq)
+                await self._send_json({"type": "cancelled", "seq": seq})
+                continue
+            error = task.exception()
+            if error is not None:
+                if isinstance(error, HTTPException):
+                    status, detail = error.status_code, error.detail
+                else:
+                    logger.error(f"WebSocket音声合成でエラーが発生しました: {error}")
+                    status, detail = 500, str(error)
+                await self._send_json({"type": "error", "seq": seq, "status": status, "detail": detail})
+                continue
+
+            audio, cached = task.result()
+            await self._send_audio({
+                "type": "audio",
+                "seq": seq,
+                "format": format_name,
+                "bytes": len(audio),
+                "cached": cached,
+            }, pack_audio_frame(seq, audio))
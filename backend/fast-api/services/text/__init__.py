@@ -0,0 +1,19 @@
+"""
+Text processing module
+
+キャッシュキー用のテキスト正規化など、音声合成とLLMで共通のテキスト処理を提供するモジュールです。
+"""
+
+from .canonical import (
+    CANONICALIZATION_EXAMPLES,
+    CanonicalizationStats,
+    canonicalize_text,
+    get_canonicalization_stats,
+)
+
+__all__ = [
+    "CANONICALIZATION_EXAMPLES",
+    "CanonicalizationStats",
+    "canonicalize_text",
+    "get_canonicalization_stats",
+]
@@ -0,0 +1,146 @@
+"""
+Cache-key canonicalization
+
+来場者の入力やLLMの出力には、全角・半角の違い、前後や連続する空白、
+句読点の表記揺れなど、読み上げ結果に影響しない差異が含まれる。
+キャッシュキーを作るときだけテキストを正規形に揃え、完全一致では
+ヒットしないこれらの差異でもキャッシュを共有できるようにする。
+エンジンへは常に元のテキストを送る。
+
+適用する規則は、エンジンのテキスト解析（OpenJTalk）が解析前に同じ形へ
+揃えるものに限定している。各規則の例は CANONICALIZATION_EXAMPLES にあり、
+scripts/verify_text_canonicalization.py で、稼働中のエンジンの audio_query が
+変換前後で一致することを確認できる。
+"""
+import re
+import unicodedata
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+# 全角英数記号・半角カナ・全角空白（エンジンの前処理で同じ文字幅に揃えられる文字）
+_WIDTH_VARIANTS = re.compile(r"[　！-￯]+")
+# 数字に挟まれていない読点相当のカンマ（1,000 のような桁区切りは残す）
+_COMMA = re.compile(r"(?<!\d),|,(?!\d)")
+_WHITESPACE = re.compile(r"\s+")
+# 文末の句点（末尾の「。」の有無で audio_query は変わらない）
+_TRAILING_PERIOD = re.compile(r"[。\s]+$")
+
+# 規則ごとの (変換前, 変換後) の例。検証スクリプトとテストで使用する
+CANONICALIZATION_EXAMPLES: List[Tuple[str, str]] = [
+    ("ＡＩアバターです！", "AIアバターです!"),
+    ("１２３円", "123円"),
+    ("ｺﾝﾆﾁﾊﾞﾝ", "コンニチバン"),
+    ("こんにちは　世界", "こんにちは 世界"),
+    ("  ようこそ   会場へ  ", "ようこそ 会場へ"),
+    ("はい，そうです", "はい、そうです"),
+    ("1,000円です", "1,000円です"),
+    ("ありがとうございます。", "ありがとうございます"),
+    ("本当ですか？", "本当ですか?"),
+]
+
+
+def canonicalize_text(text: str) -> str:
+    """
+    キャッシュキー用にテキストを正規形にする
+
+    1. 全角英数記号・半角カナ・全角空白に NFKC を適用する（他の文字は変換しない）
+    2. 数字に挟まれていないカンマを読点（、）にする
+    3. 連続する空白を1つにし、前後の空白を除く
+    4. 文末の句点（。）を除く
+
+    Args:
+        text: 元のテキスト
+
+    Returns:
+        str: 正規形のテキスト（キャッシュキーにのみ使用する）
+    """
+    text = _WIDTH_VARIANTS.sub(lambda m: unicodedata.normalize("NFKC", m.group(0)), text)
+    text = _COMMA.sub("、", text)
+    text = _WHITESPACE.sub(" ", text).strip()
+    return _TRAILING_PERIOD.sub("", text) or text
+
+
+class CanonicalizationStats:
+    """
+    正規化によって増えたキャッシュヒットを数える
+
+    キャッシュキーごとに、これまでに問い合わせのあった元のテキストを記録する。
+    ヒットしたときに元のテキストが初めてのものであれば、完全一致のキーでは
+    ヒットしなかった（正規化によって得られた）ヒットとみなす。
+    """
+
+    # キャッシュキーごとに記録する元のテキストの上限
+    MAX_VARIANTS = 8
+
+    def __init__(self, max_keys: int = 4096):
+        """
+        Args:
+            max_keys: 記録するキャッシュキーの上限（超えた場合は古いものから忘れる）
+        """
+        self.max_keys = max_keys
+        self._variants: Dict[str, "OrderedDict[Any, Set[str]]"] = {}
+        self._counts: Dict[str, Dict[str, int]] = {}
+
+    def observe(self, namespace: str, key: Any, raw_text: str, hit: bool) -> None:
+        """
+        キャッシュの問い合わせを記録する
+
+        Args:
+            namespace: キャッシュの種類（tts, audio_query など）
+            key: 正規化したテキストから作ったキャッシュキー
+            raw_text: 正規化前のテキスト
+            hit: キャッシュにヒットしたかどうか
+        """
+        variants = self._variants.setdefault(namespace, OrderedDict())
+        counts = self._counts.setdefault(namespace, {"lookups": 0, "hits": 0, "hits_gained": 0})
+        seen = variants.get(key)
+        counts["lookups"] += 1
+        if hit:
+            counts["hits"] += 1
+            if seen is None or raw_text not in seen:
+                counts["hits_gained"] += 1
+
+        if seen is None:
+            seen = variants[key] = set()
+        variants.move_to_end(key)
+        if len(seen) < self.MAX_VARIANTS:
+            seen.add(raw_text)
+        while len(variants) > self.max_keys:
+            variants.popitem(last=False)
+
+    def get_stats(self) -> Dict[str, Dict[str, Any]]:
+        """
+        キャッシュの種類ごとのヒット率と、正規化によるヒット率の向上を取得する
+
+        Returns:
+            Dict[str, Dict[str, Any]]: 問い合わせ数、ヒット数、正規化で得たヒット数、
+                ヒット率、完全一致だった場合のヒット率、その差（hit_rate_gain）
+        """
+        stats = {}
+        for namespace, counts in self._counts.items():
+            lookups = counts["lookups"]
+            exact_hits = counts["hits"] - counts["hits_gained"]
+            stats[namespace] = {
+                **counts,
+                "hit_rate": counts["hits"] / lookups if lookups else 0.0,
+                "exact_match_hit_rate": exact_hits / lookups if lookups else 0.0,
+                "hit_rate_gain": counts["hits_gained"] / lookups if lookups else 0.0,
+            }
+        return stats
+
+
+# アプリケーション全体で共有するインスタンス
+_stats_instance: Optional[CanonicalizationStats] = None
+
+
+def get_canonicalization_stats() -> CanonicalizationStats:
+    """
+    共有のCanonicalizationStatsを取得する
+
+    Returns:
+        CanonicalizationStats: 共有インスタンス
+    """
+    global _stats_instance
+    if _stats_instance is None:
+        _stats_instance = CanonicalizationStats()
+    return _stats_instance
@@ -0,0 +1,92 @@
+"""
+テスト共通のヘルパー
+
+複数のテストで使うWAVの生成とモックエンジンをまとめる。
+"""
+import asyncio
+import io
+import json
+import wave
+from dataclasses import dataclass, field
+from typing import Callable, Dict, List, Optional
+
+import httpx
+
+from services.speech import AivisSpeechClient
+
+
+def make_wav(
+    pcm: bytes = b"",
+    sample_rate: int = 24000,
+    channels: int = 1,
+    frames: Optional[int] = None,
+    sample: bytes = b"\x01\x00",
+) -> bytes:
+    """テスト用の16bit PCMのWAVを生成する
+
+    frames を指定した場合は pcm の代わりに sample をフレーム数だけ並べる。
+    """
+    if frames is not None:
+        pcm = sample * channels * frames
+    buffer = io.BytesIO()
+    with wave.open(buffer, "wb") as f:
+        f.setnchannels(channels)
+        f.setsampwidth(2)
+        f.setframerate(sample_rate)
+        f.writeframes(pcm)
+    return buffer.getvalue()
+
+
+def text_wav(text: str) -> bytes:
+    """テキストの長さに比例した長さのWAVを生成する"""
+    return make_wav(frames=len(text) * 100)
+
+
+@dataclass
+class FakeEngine:
+    """モックエンジンのクライアントと、エンジンが受けた呼び出しの記録"""
+    client: AivisSpeechClient
+    calls: Dict[str, int] = field(default_factory=lambda: {"/audio_query": 0, "/synthesis": 0})
+    texts: List[str] = field(default_factory=list)
+    queries: List[dict] = field(default_factory=list)
+
+    @property
+    def synthesized(self) -> List[str]:
+        """合成したテキスト（synthesis に送られたクエリの kana）"""
+        return [query["kana"] for query in self.queries]
+
+
+def fake_engine(
+    audio: Optional[Callable[[str], bytes]] = None,
+    delay: float = 0.0,
+) -> FakeEngine:
+    """audio_query と synthesis に応答するモックエンジンを生成する
+
+    audio_query は送られたテキストを kana に入れたクエリを返す。synthesis は
+    delay 秒待ってから、audio にクエリの kana を渡した結果（省略時は b"RIFF-audio"）を返す。
+    """
+    engine = FakeEngine(client=None)
+
+    async def handler(request):
+        path = request.url.path
+        if path in engine.calls:
+            engine.calls[path] += 1
+        if path == "/audio_query":
+            text = request.url.params["text"]
+            engine.texts.append(text)
+            return httpx.Response(200, json={"accent_phrases": [], "speedScale": 1.0, "kana": text})
+        if path == "/synthesis":
+            query = json.loads(request.content)
+            engine.queries.append(query)
+            if delay:
+                await asyncio.sleep(delay)
+            content = audio(query["kana"]) if audio else b"RIFF-audio"
+            return httpx.Response(200, content=content)
+        if path == "/version":
+            return httpx.Response(200, json="1.0.0")
+        if path == "/user_dict":
+            return httpx.Response(200, json={})
+        return httpx.Response(404)
+
+    engine.client = AivisSpeechClient("http://engine.test", transport=httpx.MockTransport(handler))
+    return engine
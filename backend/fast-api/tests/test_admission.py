@@ -0,0 +1,272 @@
+"""
+エンジンへのリクエストの待ち行列とサーキットブレーカーのテスト
+
+優先度クラスごとの割り当て、エージング、優先度の引き上げも確認する。
+"""
+import asyncio
+import pytest
+import httpx
+from unittest.mock import patch
+from fastapi import HTTPException
+
+from services.speech import AivisSpeechClient, AdmissionController, CircuitBreaker, Priority
+from services.speech.admission import PriorityTicket, current_ticket
+
+
+def _controller(max_concurrency=1, max_queue=1, failure_threshold=2, reset_timeout=30.0):
+    return AdmissionController(
+        max_concurrency=max_concurrency,
+        max_queue=max_queue,
+        default_max_wait=1.0,
+        breaker=CircuitBreaker(failure_threshold, reset_timeout)
+    )
+
+
+class TestAdmissionController:
+    """AdmissionControllerのテスト"""
+
+    @pytest.mark.asyncio
+    async def test_waiter_gets_slot_in_order(self):
+        """上限を超えたリクエストは待ち、枠が空けば順に実行される"""
+        controller = _controller(max_queue=2)
+        order = []
+        release = asyncio.Event()
+
+        async def run(name):
+            async with controller.admit():
+                order.append(name)
+                await release.wait()
+
+        tasks = [asyncio.create_task(run(name)) for name in ("a", "b", "c")]
+        await asyncio.sleep(0)
+        assert controller.get_stats()["queue_depth"] == 2
+        release.set()
+        await asyncio.gather(*tasks)
+
+        stats = controller.get_stats()
+        assert order == ["a", "b", "c"]
+        assert stats["active"] == 0
+        assert stats["admitted"] == 3
+
+    @pytest.mark.asyncio
+    async def test_queue_full_and_timeout(self):
+        """待ち行列が満杯なら即座に、待ち時間切れなら上限時間後に503を返す"""
+        controller = _controller(max_queue=1)
+        release = asyncio.Event()
+
+        async def hold():
+            async with controller.admit():
+                await release.wait()
+
+        holder = asyncio.create_task(hold())
+        await asyncio.sleep(0)
+        waiter = asyncio.create_task(controller.admit(max_wait=0.05).__aenter__())
+        await asyncio.sleep(0)
+
+        with pytest.raises(HTTPException) as exc_info:
+            async with controller.admit():
+                pass
+        assert exc_info.value.status_code == 503
+        assert "Retry-After" in exc_info.value.headers
+
+        with pytest.raises(HTTPException):
+            await waiter
+        release.set()
+        await holder
+
+        stats = controller.get_stats()
+        assert stats["rejected_queue_full"] == 1
+        assert stats["rejected_timeout"] == 1
+        assert stats["active"] == 0
+        assert stats["queue_depth"] == 0
+
+
+class TestCircuitBreaker:
+    """CircuitBreakerのテスト"""
+
+    def test_open_then_half_open(self):
+        """連続失敗で open になり、期限後は1件だけ試行を通す"""
+        breaker = CircuitBreaker(failure_threshold=2, reset_timeout=10.0)
+        breaker.record_failure()
+        assert breaker.state == CircuitBreaker.CLOSED
+        breaker.record_failure()
+        assert breaker.state == CircuitBreaker.OPEN
+        with pytest.raises(HTTPException) as exc_info:
+            breaker.before_call()
+        assert int(exc_info.value.headers["Retry-After"]) == 10
+
+        breaker._opened_at -= 10.0
+        assert breaker.state == CircuitBreaker.HALF_OPEN
+        breaker.before_call()
+        with pytest.raises(HTTPException):
+            breaker.before_call()
+        breaker.record_success()
+        assert breaker.state == CircuitBreaker.CLOSED
+
+
+class TestClientAdmission:
+    """AivisSpeechClientでの待ち行列とブレーカーの適用のテスト"""
+
+    @pytest.mark.asyncio
+    async def test_breaker_fails_fast(self):
+        """エンジンの失敗が続くとリクエストを送らずに503を返す"""
+        calls = []
+
+        def handler(request):
+            calls.append(request.url.path)
+            return httpx.Response(500)
+
+        with patch('services.speech.admission.settings.engine_breaker_failure_threshold', 2):
+            client = AivisSpeechClient("http://engine.test", transport=httpx.MockTransport(handler))
+        for _ in range(2):
+            with pytest.raises(HTTPException) as exc_info:
+                await client.get_version()
+            assert exc_info.value.status_code == 500
+
+        with pytest.raises(HTTPException) as exc_info:
+            await client.get_version()
+        assert exc_info.value.status_code == 503
+        assert "Retry-After" in exc_info.value.headers
+        assert len(calls) == 2
+        assert client.admission.get_stats()["rejected_circuit_open"] == 1
+        await client.aclose()
+
+
+class TestPriorityScheduling:
+    """優先度クラスによる実行枠の割り当てのテスト"""
+
+    @pytest.mark.asyncio
+    async def test_interactive_goes_first_and_class_limit(self):
+        """空いた枠は interactive から割り当て、background はクラスの上限を超えない"""
+        controller = AdmissionController(
+            max_concurrency=2,
+            max_queue=10,
+            default_max_wait=1.0,
+            breaker=CircuitBreaker(5, 30.0),
+            class_limits={Priority.BACKGROUND: 1},
+            aging_seconds=60.0
+        )
+        order = []
+        release = asyncio.Event()
+
+        async def run(name, priority, hold=False):
+            async with controller.admit(priority=priority):
+                order.append(name)
+                if hold:
+                    await release.wait()
+
+        holders = [asyncio.create_task(run(f"hold{i}", Priority.NORMAL, hold=True)) for i in range(2)]
+        await asyncio.sleep(0)
+        tasks = [
+            asyncio.create_task(run("bg1", Priority.BACKGROUND, hold=True)),
+            asyncio.create_task(run("bg2", Priority.BACKGROUND)),
+            asyncio.create_task(run("live", Priority.INTERACTIVE)),
+        ]
+        await asyncio.sleep(0)
+        assert controller.get_stats()["classes"][Priority.BACKGROUND]["queue_depth"] == 2
+
+        release.set()
+        await asyncio.gather(*holders, *tasks)
+        assert order[2:] == ["live", "bg1", "bg2"]
+        assert controller.get_stats()["classes"][Priority.BACKGROUND]["admitted"] == 2
+
+    @pytest.mark.asyncio
+    async def test_aging_prevents_starvation(self):
+        """長く待った background は後から来た interactive より先に割り当てられる"""
+        controller = AdmissionController(
+            max_concurrency=1,
+            max_queue=10,
+            default_max_wait=5.0,
+            breaker=CircuitBreaker(5, 30.0),
+            aging_seconds=0.01
+        )
+        order = []
+        release = asyncio.Event()
+
+        async def run(name, priority, hold=False):
+            async with controller.admit(priority=priority):
+                order.append(name)
+                if hold:
+                    await release.wait()
+
+        holder = asyncio.create_task(run("hold", Priority.NORMAL, hold=True))
+        await asyncio.sleep(0)
+        background = asyncio.create_task(run("bg", Priority.BACKGROUND))
+        await asyncio.sleep(0.05)
+        live = asyncio.create_task(run("live", Priority.INTERACTIVE))
+        await asyncio.sleep(0)
+        release.set()
+        await asyncio.gather(holder, background, live)
+        assert order == ["hold", "bg", "live"]
+
+    @pytest.mark.asyncio
+    async def test_ticket_promotes_queued_request(self):
+        """合流した高優先度の待ち手に合わせて、待機中のリクエストの優先度を引き上げる"""
+        controller = AdmissionController(
+            max_concurrency=1,
+            max_queue=10,
+            default_max_wait=1.0,
+            breaker=CircuitBreaker(5, 30.0),
+            aging_seconds=60.0
+        )
+        order = []
+        release = asyncio.Event()
+        ticket = PriorityTicket(Priority.BACKGROUND)
+
+        async def run(name, priority=None, hold=False):
+            async with controller.admit(priority=priority):
+                order.append(name)
+                if hold:
+                    await release.wait()
+
+        async def run_with_ticket():
+            current_ticket.set(ticket)
+            await run("flight")
+
+        holder = asyncio.create_task(run("hold", Priority.NORMAL, hold=True))
+        await asyncio.sleep(0)
+        flight = asyncio.create_task(run_with_ticket())
+        normal = asyncio.create_task(run("normal", Priority.NORMAL))
+        await asyncio.sleep(0)
+
+        ticket.raise_to(Priority.INTERACTIVE)
+        assert controller.get_stats()["classes"][Priority.INTERACTIVE]["queue_depth"] == 1
+        release.set()
+        await asyncio.gather(holder, flight, normal)
+        assert order == ["hold", "flight", "normal"]
+
+    @pytest.mark.asyncio
+    async def test_ticket_demotes_queued_request(self):
+        """待ち手がいなくなった処理は、待機中のリクエストごと優先度を引き下げる"""
+        controller = AdmissionController(
+            max_concurrency=1,
+            max_queue=10,
+            default_max_wait=1.0,
+            breaker=CircuitBreaker(5, 30.0),
+            aging_seconds=60.0
+        )
+        order = []
+        release = asyncio.Event()
+        ticket = PriorityTicket(Priority.INTERACTIVE)
+
+        async def run(name, priority=None, hold=False):
+            async with controller.admit(priority=priority):
+                order.append(name)
+                if hold:
+                    await release.wait()
+
+        async def run_with_ticket():
+            current_ticket.set(ticket)
+            await run("flight")
+
+        holder = asyncio.create_task(run("hold", Priority.NORMAL, hold=True))
+        await asyncio.sleep(0)
+        flight = asyncio.create_task(run_with_ticket())
+        normal = asyncio.create_task(run("normal", Priority.NORMAL))
+        await asyncio.sleep(0)
+
+        ticket.lower_to(Priority.BACKGROUND)
+        assert controller.get_stats()["classes"][Priority.BACKGROUND]["queue_depth"] == 1
+        release.set()
+        await asyncio.gather(holder, flight, normal)
+        assert order == ["hold", "normal", "flight"]
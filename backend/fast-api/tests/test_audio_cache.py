@@ -0,0 +1,246 @@
+"""
+合成音声キャッシュのテスト
+
+メモリ層・ディスク層の動作、コストを考慮した追い出し、
+およびtext_to_speechからのキャッシュ利用を確認する。
+"""
+import asyncio
+import os
+import threading
+import time
+import pytest
+import httpx
+from unittest.mock import patch
+
+from services.speech import AivisSpeechClient, AudioCache
+from services.speech.audio_cache import make_tts_key, variant_key
+from services.speech.query_cache import QueryCache, apply_query_overrides
+from services.speech.speech_service import synthesize_text
+from conftest import fake_engine
+
+
+class TestCacheKey:
+    """キャッシュキー生成のテスト"""
+
+    def test_whitespace_is_normalized(self):
+        """前後・連続空白の違いは同じキーになる"""
+        assert make_tts_key(" こんにちは  世界 ", 1, None, "v1") == make_tts_key("こんにちは 世界", 1, None, "v1")
+
+    def test_engine_tag_changes_key(self):
+        """エンジン識別子が変わるとキーも変わる"""
+        assert make_tts_key("こんにちは", 1, None, "v1") != make_tts_key("こんにちは", 1, None, "v2")
+
+    def test_params_change_key(self):
+        """audio_queryのパラメータが変わるとキーも変わる"""
+        assert make_tts_key("こんにちは", 1, {"speedScale": 1.2}, "v1") != make_tts_key("こんにちは", 1, None, "v1")
+
+
+class TestAudioCache:
+    """AudioCacheのテスト"""
+
+    @pytest.mark.asyncio
+    async def test_memory_hit(self):
+        """メモリ層からの取得"""
+        cache = AudioCache(None, memory_budget_bytes=1024, disk_budget_bytes=0)
+        await cache.put("a", b"audio", 0.5)
+        assert await cache.get("a") == b"audio"
+        assert await cache.get("b") is None
+        stats = cache.get_stats()
+        assert stats["memory_hits"] == 1
+        assert stats["misses"] == 1
+
+    @pytest.mark.asyncio
+    async def test_disk_hit_after_restart(self, tmp_path):
+        """ディスク層は新しいインスタンスからも読み込める"""
+        cache = AudioCache(str(tmp_path), memory_budget_bytes=1024, disk_budget_bytes=1024)
+        await cache.put("a", b"audio", 0.5)
+
+        reloaded = AudioCache(str(tmp_path), memory_budget_bytes=1024, disk_budget_bytes=1024)
+        assert await reloaded.get("a") == b"audio"
+        assert reloaded.get_stats()["disk_hits"] == 1
+        # 2回目はメモリ層へ昇格している
+        assert await reloaded.get("a") == b"audio"
+        assert reloaded.get_stats()["memory_hits"] == 1
+
+    @pytest.mark.asyncio
+    async def test_encoded_variant_is_stored_next_to_wav(self, tmp_path):
+        """圧縮形式の変換結果はWAVと並べて保存され、再起動後も読み込める"""
+        cache = AudioCache(str(tmp_path), memory_budget_bytes=1024, disk_budget_bytes=1024)
+        await cache.put("a", b"wav", 0.5)
+        await cache.put(variant_key("a", "mp3"), b"mp3", 0.1)
+        assert (tmp_path / "a.wav").exists()
+        assert (tmp_path / "a.mp3").exists()
+
+        reloaded = AudioCache(str(tmp_path), memory_budget_bytes=1024, disk_budget_bytes=1024)
+        assert await reloaded.get("a.mp3") == b"mp3"
+        assert reloaded.get_stats()["disk_entries"] == 2
+
+    @pytest.mark.asyncio
+    async def test_cost_aware_eviction(self):
+        """容量超過時は再生成コストが小さいエントリから追い出す"""
+        cache = AudioCache(None, memory_budget_bytes=30, disk_budget_bytes=0)
+        await cache.put("expensive", b"x" * 10, 5.0)
+        await cache.put("cheap", b"x" * 10, 0.1)
+        await cache.put("new", b"x" * 10, 1.0)
+        # 上限内なので追い出しなし
+        assert cache.get_stats()["memory_evictions"] == 0
+
+        await cache.put("overflow", b"x" * 10, 1.0)
+        assert await cache.get("cheap") is None
+        assert await cache.get("expensive") == b"x" * 10
+
+    @pytest.mark.asyncio
+    async def test_disk_budget_is_enforced(self, tmp_path):
+        """ディスク層も上限バイト数を超えない"""
+        cache = AudioCache(str(tmp_path), memory_budget_bytes=0, disk_budget_bytes=15)
+        await cache.put("a", b"x" * 10, 1.0)
+        await cache.put("b", b"x" * 10, 1.0)
+        stats = cache.get_stats()
+        assert stats["disk_bytes"] <= 15
+        assert stats["disk_evictions"] == 1
+
+    @pytest.mark.asyncio
+    async def test_evicted_files_removed_off_loop(self, tmp_path):
+        """追い出したファイルはイベントループ外で削除する"""
+        cache = AudioCache(str(tmp_path), memory_budget_bytes=0, disk_budget_bytes=15)
+        removed_on = []
+        remove = os.remove
+
+        def recording_remove(path):
+            removed_on.append(threading.current_thread())
+            remove(path)
+
+        await cache.put("a", b"x" * 10, 1.0)
+        with patch('services.speech.audio_cache.os.remove', side_effect=recording_remove):
+            await cache.put("b", b"x" * 10, 1.0)
+
+        assert removed_on and threading.main_thread() not in removed_on
+        assert not (tmp_path / "a.wav").exists()
+
+    @pytest.mark.asyncio
+    async def test_eviction_during_disk_read(self, tmp_path):
+        """ディスク層の読み込み中に追い出されたエントリのバイト数を二重に減らさない"""
+        cache = AudioCache(str(tmp_path), memory_budget_bytes=0, disk_budget_bytes=100)
+        await cache.put("a", b"x" * 60, 0.1)
+        read_disk = cache._read_disk
+
+        def slow_read(key):
+            time.sleep(0.05)
+            return read_disk(key)
+
+        with patch.object(cache, "_read_disk", side_effect=slow_read):
+            reading = asyncio.create_task(cache.get("a"))
+            await asyncio.sleep(0.01)
+            await cache.put("b", b"y" * 60, 10.0)
+            assert await reading is None
+
+        stats = cache.get_stats()
+        assert (stats["disk_entries"], stats["disk_bytes"]) == (1, 60)
+
+
+class TestSynthesizeTextCache:
+    """synthesize_textのキャッシュ利用のテスト"""
+
+    @pytest.mark.asyncio
+    async def test_repeat_is_served_from_cache(self, tmp_path):
+        """同じテキストの2回目はエンジンを呼ばない"""
+        engine = fake_engine()
+        client = engine.client
+        cache = AudioCache(str(tmp_path), memory_budget_bytes=1024, disk_budget_bytes=1024)
+
+        with patch('services.speech.speech_service.get_aivis_client', return_value=client), \
+                patch('services.speech.speech_service.get_audio_cache', return_value=cache), \
+                patch('services.speech.speech_service.get_query_cache', return_value=QueryCache(16)):
+            first, first_hit = await synthesize_text("こんにちは", 1)
+            second, second_hit = await synthesize_text("こんにちは", 1)
+
+        assert first == second == b"RIFF-audio"
+        assert (first_hit, second_hit) == (False, True)
+        assert engine.calls == {"/audio_query": 1, "/synthesis": 1}
+        await client.aclose()
+
+
+class TestEngineFingerprint:
+    """キャッシュキーに含めるエンジン識別子のテスト"""
+
+    @pytest.mark.asyncio
+    async def test_stale_fingerprint_does_not_block(self):
+        """有効期限を過ぎても保持している値をすぐに返し、バックグラウンドで求め直す"""
+        release = asyncio.Event()
+        dicts = [{}, {"word": "辞書"}]
+
+        async def handler(request):
+            if request.url.path == "/user_dict":
+                user_dict = dicts.pop(0)
+                if not dicts:
+                    await release.wait()
+                return httpx.Response(200, json=user_dict)
+            return httpx.Response(200, json="1.0.0")
+
+        client = AivisSpeechClient("http://engine.test", transport=httpx.MockTransport(handler))
+        first = await client.get_fingerprint()
+        client._fingerprint_next_refresh = 0.0
+
+        assert await asyncio.wait_for(client.get_fingerprint(), 0.1) == first
+        release.set()
+        await client._fingerprint_task
+        assert await client.get_fingerprint() not in (first, "unknown")
+        await client.aclose()
+
+    @pytest.mark.asyncio
+    async def test_failure_is_retried(self):
+        """求められなかった場合は有効期限を待たずに求め直す"""
+        statuses = [500, 200]
+
+        def handler(request):
+            if request.url.path == "/user_dict":
+                return httpx.Response(statuses.pop(0), json={})
+            return httpx.Response(200, json="1.0.0")
+
+        client = AivisSpeechClient("http://engine.test", transport=httpx.MockTransport(handler))
+        with patch('services.speech.aivis_client.FINGERPRINT_RETRY_SECONDS', 0.0):
+            assert await client.get_fingerprint() == "unknown"
+            assert await client.get_fingerprint() != "unknown"
+        await client.aclose()
+
+
+class TestQueryVariants:
+    """audio_queryキャッシュとパラメータ上書きによる再合成のテスト"""
+
+    def test_apply_overrides_does_not_mutate(self):
+        """上書きは元のクエリを変更しない"""
+        query = {"speedScale": 1.0, "accent_phrases": []}
+        result = apply_query_overrides(query, {"speedScale": 1.5})
+        assert result["speedScale"] == 1.5
+        assert query["speedScale"] == 1.0
+
+    def test_unsupported_override_is_rejected(self):
+        """許可されていないパラメータは上書きできない"""
+        with pytest.raises(ValueError):
+            apply_query_overrides({}, {"accent_phrases": []})
+
+    def test_query_cache_lru(self):
+        """件数上限を超えると古いものから追い出す"""
+        cache = QueryCache(max_entries=1)
+        cache.put("あ", 1, "v1", {"speedScale": 1.0})
+        cache.put("い", 1, "v1", {"speedScale": 1.0})
+        assert cache.get("あ", 1, "v1") is None
+        assert cache.get("い", 1, "v1") == {"speedScale": 1.0}
+
+    @pytest.mark.asyncio
+    async def test_variant_skips_audio_query(self, tmp_path):
+        """速度違いのバリエーションはaudio_queryを再実行しない"""
+        engine = fake_engine()
+        client = engine.client
+        cache = AudioCache(str(tmp_path), memory_budget_bytes=1024, disk_budget_bytes=1024)
+
+        with patch('services.speech.speech_service.get_aivis_client', return_value=client), \
+                patch('services.speech.speech_service.get_audio_cache', return_value=cache), \
+                patch('services.speech.speech_service.get_query_cache', return_value=QueryCache(16)):
+            await synthesize_text("こんにちは", 1)
+            _, hit = await synthesize_text("こんにちは", 1, {"speedScale": 1.5})
+
+        assert hit is False
+        assert engine.calls == {"/audio_query": 1, "/synthesis": 2}
+        assert engine.queries[-1]["speedScale"] == 1.5
+        await client.aclose()
@@ -0,0 +1,116 @@
+"""
+圧縮形式への変換のテスト
+
+soundfile による変換、プロセスプールでの実行、変換結果のキャッシュを確認する。
+"""
+import io
+import numpy as np
+import pytest
+from unittest.mock import patch
+
+from models import TTSRequest
+from services.audio import AudioEncoder, encode_wav
+from services.speech import AudioCache
+from services.speech.speech_service import text_to_speech
+from conftest import make_wav
+
+sf = pytest.importorskip("soundfile")
+
+
+def sine_wav(sample_rate: int = 44100, seconds: float = 0.2) -> bytes:
+    """テスト用の正弦波のWAVを生成する"""
+    t = np.arange(int(sample_rate * seconds)) / sample_rate
+    samples = (np.sin(2 * np.pi * 440 * t) * 8000).astype("<i2")
+    return make_wav(samples.tobytes(), sample_rate)
+
+
+class TestEncodeWav:
+    """encode_wavのテスト"""
+
+    @pytest.mark.parametrize("format_name,expected_format", [
+        ("flac", "FLAC"),
+        ("mp3", "MP3"),
+        ("ogg", "OGG"),
+    ])
+    def test_encode(self, format_name, expected_format):
+        """各形式に変換でき、元のWAVより小さくなる"""
+        wav = sine_wav()
+        encoded = encode_wav(wav, format_name)
+        info = sf.info(io.BytesIO(encoded))
+        assert info.format == expected_format
+        assert len(encoded) < len(wav)
+
+    def test_opus_resamples_unsupported_rate(self):
+        """Opusが対応しないサンプリングレートは対応レートに変換する"""
+        encoded = encode_wav(sine_wav(sample_rate=44100), "ogg")
+        assert sf.info(io.BytesIO(encoded)).samplerate == 48000
+
+    def test_unsupported_format(self):
+        """未対応の形式はValueErrorになる"""
+        with pytest.raises(ValueError):
+            encode_wav(sine_wav(), "aac")
+
+
+class TestAudioEncoder:
+    """AudioEncoderのテスト"""
+
+    @pytest.mark.asyncio
+    async def test_encode_in_process_pool(self):
+        """プロセスプールで変換し、統計情報を記録する"""
+        encoder = AudioEncoder(max_workers=1)
+        try:
+            encoded = await encoder.encode(sine_wav(), "flac")
+        finally:
+            encoder.shutdown()
+        assert sf.info(io.BytesIO(encoded)).format == "FLAC"
+        assert encoder.get_stats()["encoded"] == 1
+
+
+class TestEncodedTextToSpeech:
+    """圧縮形式の /tts のテスト"""
+
+    @pytest.mark.asyncio
+    async def test_encoded_variant_is_cached(self):
+        """変換結果はキャッシュされ、2回目は合成も変換も行わない"""
+        cache = AudioCache(None, memory_budget_bytes=10 * 1024 * 1024, disk_budget_bytes=0)
+        encoder = AudioEncoder(max_workers=1)
+        calls = []
+
+        async def fake_synthesize(text, speaker_id, query_overrides=None):
+            calls.append(text)
+            return sine_wav(), False
+
+        async def fake_key(text, speaker_id, query_overrides):
+            return "key"
+
+        try:
+            with patch('services.speech.speech_service.get_audio_cache', return_value=cache), \
+                 patch('services.speech.speech_service.get_audio_encoder', return_value=encoder), \
+                 patch('services.speech.speech_service.synthesize_text', side_effect=fake_synthesize), \
+                 patch('services.speech.speech_service._tts_cache_key', side_effect=fake_key):
+                first = await text_to_speech("こんにちは", 1, "mp3")
+                second = await text_to_speech("こんにちは", 1, "mp3")
+        finally:
+            encoder.shutdown()
+
+        assert first.media_type == "audio/mpeg"
+        assert first.headers["X-TTS-Cache"] == "MISS"
+        assert second.headers["X-TTS-Cache"] == "HIT"
+        assert second.body == first.body
+        assert calls == ["こんにちは"]
+        assert await cache.get("key.mp3") == first.body
+
+
+class TestLowBandwidthProfile:
+    """low_bandwidth プロファイルのテスト"""
+
+    def test_profile_sets_output_format(self):
+        """サンプリングレートとモノラル出力をaudio_queryの上書きに含める"""
+        overrides = TTSRequest(text="あ", profile="low_bandwidth", speed_scale=1.2).query_overrides()
+        assert overrides["outputStereo"] is False
+        assert overrides["outputSamplingRate"] == 24000
+        assert overrides["speedScale"] == 1.2
+
+    def test_standard_profile(self):
+        """標準プロファイルでは上書きしない"""
+        assert TTSRequest(text="あ").query_overrides() is None
@@ -0,0 +1,150 @@
+"""
+キャッシュ済み音声のURL配信のテスト
+
+/tts の delivery=url で得たURLから、ETag・Range に対応して音声を取得できることを確認する。
+"""
+import asyncio
+import hashlib
+import pytest
+from unittest.mock import patch
+from fastapi.testclient import TestClient
+
+from app import app
+from services.speech import AudioCache
+from services.response.ranged import RangedAudioResponse, parse_byte_range
+
+AUDIO = bytes(range(256)) * 4
+
+
+async def fake_synthesize(text, speaker_id, query_overrides=None):
+    return AUDIO, False
+
+
+def _request(client, cache, method, url, **kwargs):
+    with patch('services.speech.speech_service.get_audio_cache', return_value=cache), \
+         patch('services.speech.speech_service.synthesize_text', side_effect=fake_synthesize), \
+         patch('services.speech.speech_service.trim_leading_silence', side_effect=lambda audio: audio):
+        return client.request(method, url, **kwargs)
+
+
+class TestParseByteRange:
+    """parse_byte_rangeのテスト"""
+
+    @pytest.mark.parametrize("value,expected", [
+        ("bytes=0-9", (0, 9)),
+        ("bytes=10-", (10, 99)),
+        ("bytes=-10", (90, 99)),
+        ("bytes=90-200", (90, 99)),
+        ("bytes=0-1,5-6", None),
+        ("items=0-9", None),
+        ("bytes=9-0", None),
+    ])
+    def test_parse(self, value, expected):
+        """単一の範囲のみ解釈し、それ以外は全体を返す扱いにする"""
+        assert parse_byte_range(value, 100) == expected
+
+    def test_unsatisfiable(self):
+        """コンテンツの外の範囲はValueErrorになる"""
+        with pytest.raises(ValueError):
+            parse_byte_range("bytes=100-", 100)
+
+
+class TestAudioURL:
+    """/tts の delivery=url と /audio/{sha256}.{形式} のテスト"""
+
+    def test_url_roundtrip(self, tmp_path):
+        """返されたURLから同じ音声を取得でき、immutable なキャッシュ指定と強いETagが付く"""
+        client = TestClient(app)
+        cache = AudioCache(str(tmp_path), memory_budget_bytes=1 << 20, disk_budget_bytes=1 << 20)
+        response = _request(client, cache, "POST", "/tts", json={"text": "こんにちは", "delivery": "url"})
+        assert response.status_code == 200
+        digest = hashlib.sha256(AUDIO).hexdigest()
+        assert response.json()["url"] == f"/audio/{digest}.wav"
+        assert response.json()["size"] == len(AUDIO)
+
+        audio = _request(client, cache, "GET", response.json()["url"])
+        assert audio.status_code == 200
+        assert audio.content == AUDIO
+        assert audio.headers["etag"] == f'"{digest}"'
+        assert "immutable" in audio.headers["cache-control"]
+        assert audio.headers["accept-ranges"] == "bytes"
+        assert audio.headers["content-type"] == "audio/wav"
+
+        revalidated = _request(client, cache, "GET", response.json()["url"], headers={"If-None-Match": f'"{digest}"'})
+        assert revalidated.status_code == 304
+        assert revalidated.content == b""
+
+    def test_range_from_disk(self, tmp_path):
+        """ディスク層のみにある音声もファイルから範囲を指定して取得できる"""
+        client = TestClient(app)
+        cache = AudioCache(str(tmp_path), memory_budget_bytes=0, disk_budget_bytes=1 << 20)
+        url = _request(client, cache, "POST", "/tts", json={"text": "こんにちは", "delivery": "url"}).json()["url"]
+
+        partial = _request(client, cache, "GET", url, headers={"Range": "bytes=100-199"})
+        assert partial.status_code == 206
+        assert partial.content == AUDIO[100:200]
+        assert partial.headers["content-range"] == f"bytes 100-199/{len(AUDIO)}"
+
+        suffix = _request(client, cache, "GET", url, headers={"Range": "bytes=-24"})
+        assert suffix.content == AUDIO[-24:]
+
+        stale = _request(client, cache, "GET", url, headers={"Range": "bytes=0-9", "If-Range": '"other"'})
+        assert stale.status_code == 200
+        assert stale.content == AUDIO
+
+        outside = _request(client, cache, "GET", url, headers={"Range": f"bytes={len(AUDIO)}-"})
+        assert outside.status_code == 416
+        assert outside.headers["content-range"] == f"bytes */{len(AUDIO)}"
+
+        head = _request(client, cache, "HEAD", url)
+        assert head.status_code == 200
+        assert head.headers["content-length"] == str(len(AUDIO))
+        assert head.content == b""
+
+    def test_unknown_audio(self, tmp_path):
+        """存在しない・不正な名前は404を返す"""
+        client = TestClient(app)
+        cache = AudioCache(str(tmp_path), memory_budget_bytes=1 << 20, disk_budget_bytes=1 << 20)
+        assert _request(client, cache, "GET", f"/audio/{'0' * 64}.wav").status_code == 404
+        assert _request(client, cache, "GET", "/audio/../config.py").status_code == 404
+        assert _request(client, cache, "GET", f"/audio/{'0' * 64}.exe").status_code == 404
+
+    def test_base64_url_is_rejected(self, tmp_path):
+        """base64 形式はURLでは返せない"""
+        client = TestClient(app)
+        cache = AudioCache(str(tmp_path), memory_budget_bytes=1 << 20, disk_budget_bytes=1 << 20)
+        response = _request(client, cache, "POST", "/tts", json={"text": "あ", "format": "base64", "delivery": "url"})
+        assert response.status_code == 400
+
+
+class TestRangedAudioResponse:
+    """RangedAudioResponseのテスト"""
+
+    def test_zerocopysend(self, tmp_path):
+        """サーバーが zerocopysend に対応していればファイルの範囲をそのまま渡す"""
+        path = tmp_path / "audio.wav"
+        path.write_bytes(AUDIO)
+        response = RangedAudioResponse(path=str(path), start=10, length=20, media_type="audio/wav")
+        messages = []
+
+        async def send(message):
+            messages.append(message)
+
+        scope = {"type": "http", "extensions": {"http.response.zerocopysend": {}}}
+        asyncio.run(response(scope, None, send))
+        assert messages[1]["type"] == "http.response.zerocopysend"
+        assert (messages[1]["offset"], messages[1]["count"]) == (10, 20)
+
+    def test_file_removed_before_send(self, tmp_path):
+        """ヘッダーを送る前にファイルが追い出されていた場合は404を返す"""
+        response = RangedAudioResponse(
+            path=str(tmp_path / "evicted.wav"), start=0, length=len(AUDIO), media_type="audio/wav"
+        )
+        messages = []
+
+        async def send(message):
+            messages.append(message)
+
+        asyncio.run(response({"type": "http"}, None, send))
+        assert messages[0]["status"] == 404
+        assert b"detail" in messages[1]["body"]
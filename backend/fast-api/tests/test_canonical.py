@@ -0,0 +1,73 @@
+"""
+キャッシュキー用のテキスト正規化のテスト
+
+正規化の規則、正規化で得たヒットの集計、TTSキャッシュでの共有を確認する。
+"""
+import pytest
+from unittest.mock import patch
+
+from services.speech import AudioCache
+from services.speech.query_cache import QueryCache
+from services.speech.speech_service import synthesize_text
+from services.text import CANONICALIZATION_EXAMPLES, CanonicalizationStats, canonicalize_text
+from conftest import fake_engine
+
+
+class TestCanonicalizeText:
+    """canonicalize_textのテスト"""
+
+    @pytest.mark.parametrize("raw,expected", CANONICALIZATION_EXAMPLES)
+    def test_examples(self, raw, expected):
+        """規則ごとの例のとおりに変換する"""
+        assert canonicalize_text(raw) == expected
+
+    def test_idempotent(self):
+        """正規形をもう一度正規化しても変わらない"""
+        for _, expected in CANONICALIZATION_EXAMPLES:
+            assert canonicalize_text(expected) == expected
+
+    def test_period_only_is_kept(self):
+        """句点だけのテキストは空にしない"""
+        assert canonicalize_text("。") == "。"
+
+
+class TestCanonicalizationStats:
+    """CanonicalizationStatsのテスト"""
+
+    def test_hits_gained(self):
+        """初めての表記でヒットした場合だけ正規化で得たヒットとして数える"""
+        stats = CanonicalizationStats()
+        stats.observe("tts", "k", "こんにちは", False)
+        stats.observe("tts", "k", "こんにちは", True)
+        stats.observe("tts", "k", "こんにちは。", True)
+        stats.observe("tts", "k", "こんにちは。", True)
+
+        result = stats.get_stats()["tts"]
+        assert (result["lookups"], result["hits"], result["hits_gained"]) == (4, 3, 1)
+        assert result["hit_rate"] == 0.75
+        assert result["exact_match_hit_rate"] == 0.5
+        assert result["hit_rate_gain"] == 0.25
+
+
+class TestSharedCacheEntry:
+    """TTSキャッシュでの正規化のテスト"""
+
+    @pytest.mark.asyncio
+    async def test_variants_share_entry(self, tmp_path):
+        """表記の違うテキストが同じキャッシュを使い、エンジンには元のテキストを送る"""
+        engine = fake_engine()
+        client = engine.client
+        cache = AudioCache(str(tmp_path), memory_budget_bytes=1024, disk_budget_bytes=1024)
+        stats = CanonicalizationStats()
+
+        with patch('services.speech.speech_service.get_aivis_client', return_value=client), \
+                patch('services.speech.speech_service.get_audio_cache', return_value=cache), \
+                patch('services.speech.speech_service.get_query_cache', return_value=QueryCache(16)), \
+                patch('services.speech.speech_service.get_canonicalization_stats', return_value=stats):
+            _, first_hit = await synthesize_text("こんにちは。", 1)
+            _, second_hit = await synthesize_text(" こんにちは", 1)
+
+        assert (first_hit, second_hit) == (False, True)
+        assert engine.texts == ["こんにちは。"]
+        assert stats.get_stats()["tts"]["hits_gained"] == 1
+        await client.aclose()
@@ -0,0 +1,153 @@
+"""
+文単位の合成と連結のテスト
+
+キャッシュ済みの文の再利用、ヘッダーを作り直した連結、
+キャッシュから返した音声の割合の記録を確認する。
+"""
+import json
+import pytest
+from unittest.mock import patch
+from fastapi.testclient import TestClient
+
+from app import app
+from services.audio import parse_wav
+from services.audio.wav import concat_wav
+from services.speech import AudioCache
+from services.speech.composition import CompositionStats, compose_segments
+from services.speech.query_cache import QueryCache
+from services.speech.audio_cache import variant_key
+from services.speech.speech_service import _tts_cache_key, synthesize_composed, synthesize_text, text_to_speech
+from conftest import fake_engine, make_wav, text_wav
+
+
+def _patches(client, cache, stats):
+    return (
+        patch('services.speech.speech_service.get_aivis_client', return_value=client),
+        patch('services.speech.speech_service.get_audio_cache', return_value=cache),
+        patch('services.speech.speech_service.get_query_cache', return_value=QueryCache(16)),
+        patch('services.speech.speech_service.get_composition_stats', return_value=stats),
+    )
+
+
+class TestComposeSegments:
+    """compose_segmentsのテスト"""
+
+    def test_cached_ratio_by_duration(self):
+        """キャッシュから返した割合は文の数ではなく音声の長さで求める"""
+        composed = compose_segments([(make_wav(frames=300), True), (make_wav(frames=100), False)])
+        assert parse_wav(composed.audio).num_frames == 400
+        assert composed.cached_ratio == pytest.approx(0.75)
+
+    def test_mismatched_format(self):
+        """WAVとして解釈できない音声は連結できない"""
+        with pytest.raises(ValueError):
+            compose_segments([(make_wav(frames=10), True), (b"RIFF-audio", False)])
+
+
+class TestSynthesizeComposed:
+    """synthesize_composedのテスト"""
+
+    @pytest.mark.asyncio
+    async def test_reuses_cached_sentence(self, tmp_path):
+        """キャッシュ済みの文は合成せず、新しい文だけを合成して連結する"""
+        engine = fake_engine(audio=text_wav)
+        client = engine.client
+        cache = AudioCache(str(tmp_path), memory_budget_bytes=1 << 20, disk_budget_bytes=1 << 20)
+        stats = CompositionStats()
+        patches = _patches(client, cache, stats)
+
+        with patches[0], patches[1], patches[2], patches[3]:
+            closing, _ = await synthesize_text("ご来場ありがとうございます。", 1)
+            audio, hit = await synthesize_composed("本日は晴れです。ご来場ありがとうございます。", 1)
+            fresh, _ = await synthesize_text("本日は晴れです。", 1)
+
+        assert hit is False
+        assert engine.synthesized == ["ご来場ありがとうございます。", "本日は晴れです。"]
+        assert audio == concat_wav([fresh, closing])
+        summary = stats.get_stats()
+        assert summary["partial_hits"] == 1
+        assert summary["segment_hit_rate"] == 0.5
+        assert 0 < summary["cached_audio_ratio"] < 1
+        await client.aclose()
+
+    @pytest.mark.asyncio
+    async def test_whole_text_cached_after_composition(self, tmp_path):
+        """連結した音声はテキスト全体のキャッシュにも格納する"""
+        engine = fake_engine(audio=text_wav)
+        client = engine.client
+        cache = AudioCache(str(tmp_path), memory_budget_bytes=1 << 20, disk_budget_bytes=1 << 20)
+        stats = CompositionStats()
+        patches = _patches(client, cache, stats)
+        text = "本日は晴れです。ご来場ありがとうございます。"
+
+        with patches[0], patches[1], patches[2], patches[3]:
+            first, _ = await synthesize_composed(text, 1)
+            second, hit = await synthesize_composed(text, 1)
+
+        assert hit is True
+        assert first == second
+        assert len(engine.synthesized) == 2
+        assert stats.get_stats()["full_hits"] == 1
+        await client.aclose()
+
+    @pytest.mark.asyncio
+    async def test_single_sentence_is_not_composed(self, tmp_path):
+        """1文のみのテキストはそのまま合成する"""
+        engine = fake_engine(audio=text_wav)
+        client = engine.client
+        cache = AudioCache(str(tmp_path), memory_budget_bytes=1 << 20, disk_budget_bytes=1 << 20)
+        stats = CompositionStats()
+        patches = _patches(client, cache, stats)
+
+        with patches[0], patches[1], patches[2], patches[3]:
+            await synthesize_composed("こんにちは。", 1)
+
+        assert engine.synthesized == ["こんにちは。"]
+        assert stats.get_stats()["requests"] == 0
+        await client.aclose()
+
+    @pytest.mark.asyncio
+    async def test_visemes_composed_on_demand(self, tmp_path):
+        """口形のタイムラインは求められた時に文ごとのタイムラインから組み立て、テキスト全体は合成しない"""
+        engine = fake_engine(audio=text_wav)
+        client = engine.client
+        cache = AudioCache(str(tmp_path), memory_budget_bytes=1 << 20, disk_budget_bytes=1 << 20)
+        patches = _patches(client, cache, CompositionStats())
+        text = "本日は晴れです。ご来場ありがとうございます。"
+
+        with patches[0], patches[1], patches[2], patches[3]:
+            await synthesize_composed(text, 1)
+            key = await _tts_cache_key(text, 1, None)
+            assert not cache.contains(variant_key(key, "visemes"))
+
+            # テキスト全体の音声がキャッシュから追い出された状態で、圧縮形式と口形を求める
+            get = cache.get
+
+            async def evicted_get(k):
+                return None if k == key else await get(k)
+
+            with patch.object(cache, "get", side_effect=evicted_get):
+                response = await text_to_speech(text, 1, "ogg", include_visemes=True)
+
+        assert engine.synthesized == ["本日は晴れです。", "ご来場ありがとうございます。"]
+        assert json.loads(response.headers["X-TTS-Visemes"]) == []
+        assert cache.contains(variant_key(key, "visemes"))
+        await client.aclose()
+
+
+class TestCachedAudioTiming:
+    """/tts の Server-Timing のテスト"""
+
+    def test_reports_cached_ratio(self, tmp_path):
+        """複数の文からなるテキストでは、キャッシュから返した割合を Server-Timing で返す"""
+        client = fake_engine(audio=text_wav).client
+        cache = AudioCache(str(tmp_path), memory_budget_bytes=1 << 20, disk_budget_bytes=1 << 20)
+        patches = _patches(client, cache, CompositionStats())
+
+        with patches[0], patches[1], patches[2], patches[3]:
+            test_client = TestClient(app)
+            test_client.post("/tts", json={"text": "二文目です。", "speaker_id": 1, "format": "wav"})
+            response = test_client.post("/tts", json={"text": "一文目です。二文目です。", "speaker_id": 1, "format": "wav"})
+
+        assert response.status_code == 200
+        assert 'cached_audio;desc="0.50"' in response.headers["server-timing"]
@@ -0,0 +1,138 @@
+"""
+クライアントの切断による合成の中止のテスト
+
+切断の検出と、待ち手のいなくなった合成の中止・低い優先度での続行を確認する。
+"""
+import asyncio
+import pytest
+import httpx
+from unittest.mock import patch
+from fastapi import Request
+
+from services.speech import AivisSpeechClient, AudioCache
+from services.speech.disconnect import DisconnectStats, run_until_disconnected
+from services.speech.query_cache import QueryCache
+from services.speech.speech_service import _synthesis_flight, synthesize_text
+
+
+def _request(disconnected: asyncio.Event) -> Request:
+    """disconnected がセットされると切断を通知するリクエストを生成する"""
+    async def receive():
+        await disconnected.wait()
+        return {"type": "http.disconnect"}
+
+    return Request({"type": "http", "method": "POST", "path": "/tts", "headers": []}, receive)
+
+
+def _gated_engine():
+    """/synthesis の応答を gate がセットされるまで止めるモックエンジンを生成する"""
+    gate = asyncio.Event()
+    calls = {"/audio_query": 0, "/synthesis": 0}
+
+    async def handler(request):
+        path = request.url.path
+        if path in calls:
+            calls[path] += 1
+        if path == "/audio_query":
+            return httpx.Response(200, json={"accent_phrases": [], "speedScale": 1.0})
+        if path == "/synthesis":
+            await gate.wait()
+            return httpx.Response(200, content=b"RIFF-audio")
+        if path == "/version":
+            return httpx.Response(200, json="1.0.0")
+        if path == "/user_dict":
+            return httpx.Response(200, json={})
+        return httpx.Response(404)
+
+    client = AivisSpeechClient("http://engine.test", transport=httpx.MockTransport(handler))
+    return client, calls, gate
+
+
+async def _wait_until(condition, timeout=2.0):
+    """条件が満たされるまで待つ"""
+    deadline = asyncio.get_running_loop().time() + timeout
+    while not condition():
+        assert asyncio.get_running_loop().time() < deadline
+        await asyncio.sleep(0.01)
+
+
+class TestRunUntilDisconnected:
+    """run_until_disconnectedのテスト"""
+
+    @pytest.mark.asyncio
+    async def test_returns_result(self):
+        """切断しなければ処理結果を返す"""
+        async def work():
+            return "done"
+
+        assert await run_until_disconnected(_request(asyncio.Event()), work()) == "done"
+
+    @pytest.mark.asyncio
+    async def test_cancels_on_disconnect(self):
+        """切断した場合は処理をキャンセルして499を返す"""
+        disconnected = asyncio.Event()
+        cancelled = asyncio.Event()
+        stats = DisconnectStats()
+
+        async def work():
+            try:
+                await asyncio.sleep(10)
+            except asyncio.CancelledError:
+                cancelled.set()
+                raise
+
+        with patch('services.speech.disconnect.get_disconnect_stats', return_value=stats):
+            running = asyncio.create_task(run_until_disconnected(_request(disconnected), work()))
+            await asyncio.sleep(0)
+            disconnected.set()
+            response = await running
+
+        assert response.status_code == 499
+        assert cancelled.is_set()
+        assert stats.disconnected == 1
+
+
+class TestAbandonedSynthesis:
+    """切断された合成の中止と続行のテスト"""
+
+    @pytest.mark.asyncio
+    async def test_demoted_synthesis_is_cached(self, tmp_path):
+        """キャッシュが有効な場合は合成を続け、結果をキャッシュに格納する"""
+        client, calls, gate = _gated_engine()
+        cache = AudioCache(str(tmp_path), memory_budget_bytes=1024, disk_budget_bytes=1024)
+        stats = DisconnectStats()
+
+        with patch('services.speech.speech_service.get_aivis_client', return_value=client), \
+                patch('services.speech.speech_service.get_audio_cache', return_value=cache), \
+                patch('services.speech.speech_service.get_query_cache', return_value=QueryCache(16)), \
+                patch('services.speech.speech_service.get_disconnect_stats', return_value=stats):
+            waiter = asyncio.create_task(synthesize_text("さようなら", 1))
+            await _wait_until(lambda: calls["/synthesis"] == 1)
+            waiter.cancel()
+            await asyncio.sleep(0)
+            gate.set()
+            await _wait_until(lambda: _synthesis_flight.get_stats()["in_flight"] == 0)
+            audio, hit = await synthesize_text("さようなら", 1)
+
+        assert (audio, hit) == (b"RIFF-audio", True)
+        assert (stats.demoted, stats.cancelled) == (1, 0)
+        await client.aclose()
+
+    @pytest.mark.asyncio
+    async def test_cancelled_without_cache(self, tmp_path):
+        """キャッシュが無効な場合はエンジンへのリクエストを中止する"""
+        client, calls, gate = _gated_engine()
+        stats = DisconnectStats()
+
+        with patch('services.speech.speech_service.get_aivis_client', return_value=client), \
+                patch('services.speech.speech_service.settings.audio_cache_enabled', False), \
+                patch('services.speech.speech_service.get_query_cache', return_value=QueryCache(16)), \
+                patch('services.speech.speech_service.get_disconnect_stats', return_value=stats):
+            waiter = asyncio.create_task(synthesize_text("さようなら", 1))
+            await _wait_until(lambda: calls["/synthesis"] == 1)
+            waiter.cancel()
+            await _wait_until(lambda: _synthesis_flight.get_stats()["in_flight"] == 0)
+
+        assert (stats.demoted, stats.cancelled) == (0, 1)
+        assert client.admission.active == 0
+        await client.aclose()
@@ -0,0 +1,141 @@
+"""
+エンジンの死活監視のテスト
+
+/version の定期的な確認、再起動の検出、/status がエンジンへ問い合わせないことを確認する。
+"""
+import pytest
+import httpx
+from unittest.mock import patch, MagicMock
+from fastapi.testclient import TestClient
+
+from app import app
+from services.engine import EngineHealthMonitor
+from services.speech import AivisSpeechClient
+
+
+def _engine(versions):
+    """/version に順番に応答するモックエンジンを生成する（Noneは接続エラー）"""
+    calls = []
+
+    def handler(request):
+        if request.url.path == "/user_dict":
+            return httpx.Response(200, json={})
+        calls.append(request.url.path)
+        version = versions[min(len(calls), len(versions)) - 1]
+        if version is None:
+            raise httpx.ConnectError("Connection refused", request=request)
+        return httpx.Response(200, json=version)
+
+    client = AivisSpeechClient("http://engine.test", transport=httpx.MockTransport(handler))
+    return client, calls
+
+
+class TestEngineHealthMonitor:
+    """EngineHealthMonitorのテスト"""
+
+    @pytest.mark.asyncio
+    async def test_snapshot_after_poll(self):
+        """確認した結果をバージョン・応答時間・最後に成功した時刻として保持する"""
+        client, calls = _engine(["1.0.0"])
+        monitor = EngineHealthMonitor(interval=5.0, timeout=1.0)
+        assert monitor.get_snapshot()["status"] == "unknown"
+
+        with patch('services.engine.health_monitor.get_aivis_client', return_value=client), \
+                patch('services.engine.health_monitor.get_speaker_residency'):
+            await monitor.poll_once()
+        snapshot = monitor.get_snapshot()
+
+        assert calls == ["/version"]
+        assert snapshot["status"] == "ok"
+        assert snapshot["engine_info"]["version"] == "1.0.0"
+        assert snapshot["engine_info"]["rtt_ms"] is not None
+        assert snapshot["engine_info"]["last_success"] is not None
+        assert snapshot["engines"][0]["url"] == "http://engine.test"
+        await client.aclose()
+
+    @pytest.mark.asyncio
+    async def test_detects_restart(self):
+        """接続できなかったエンジンへの再接続とバージョンの変化を再起動として扱う"""
+        client, _ = _engine(["1.0.0", None, "1.0.0", "1.1.0"])
+        residency = MagicMock()
+        monitor = EngineHealthMonitor(interval=5.0, timeout=1.0)
+
+        with patch('services.engine.health_monitor.get_aivis_client', return_value=client), \
+                patch('services.engine.health_monitor.get_speaker_residency', return_value=residency):
+            await monitor.poll_once()
+            await monitor.poll_once()
+            assert monitor.get_snapshot()["status"] == "error"
+            await monitor.poll_once()
+            await monitor.poll_once()
+
+        restarted = [call.args[2] for call in residency.observe_engine.call_args_list if len(call.args) > 2]
+        assert restarted == [False, True, True]
+        assert monitor.get_snapshot()["engines"][0]["restarts_detected"] == 2
+        assert monitor.get_snapshot()["engine_info"]["version"] == "1.1.0"
+        await client.aclose()
+
+    @pytest.mark.asyncio
+    async def test_unreachable_engine(self):
+        """接続できない場合はエラーとして扱い、失敗の回数を数える"""
+        client, _ = _engine([None])
+        monitor = EngineHealthMonitor(interval=5.0, timeout=1.0)
+
+        with patch('services.engine.health_monitor.get_aivis_client', return_value=client), \
+                patch('services.engine.health_monitor.get_speaker_residency'):
+            await monitor.poll_once()
+            await monitor.poll_once()
+        snapshot = monitor.get_snapshot()
+
+        assert snapshot["status"] == "error"
+        assert snapshot["engine_info"] is None
+        assert snapshot["engines"][0]["consecutive_failures"] == 2
+        await client.aclose()
+
+    @pytest.mark.asyncio
+    async def test_probe_does_not_affect_pool(self):
+        """確認の失敗はエンジンプールの処理中の数や失敗の回数に数えず、エンジンを除外しない"""
+        client, _ = _engine([None])
+        monitor = EngineHealthMonitor(interval=5.0, timeout=1.0)
+
+        with patch('services.engine.health_monitor.get_aivis_client', return_value=client), \
+                patch('services.engine.health_monitor.get_speaker_residency'):
+            for _ in range(client.pool.failure_threshold + 1):
+                await monitor.poll_once()
+        stats = client.pool.get_stats()[0]
+
+        assert monitor.get_snapshot()["engines"][0]["consecutive_failures"] == client.pool.failure_threshold + 1
+        assert stats["available"] is True
+        assert (stats["outstanding"], stats["total_requests"], stats["total_failures"]) == (0, 0, 0)
+        await client.aclose()
+
+    @pytest.mark.asyncio
+    async def test_refreshes_fingerprint(self):
+        """エンジン識別子は確認で取得したバージョンから求め、再起動を検出した時に求め直す"""
+        client, calls = _engine(["1.0.0", "1.1.0"])
+        monitor = EngineHealthMonitor(interval=5.0, timeout=1.0)
+
+        with patch('services.engine.health_monitor.get_aivis_client', return_value=client), \
+                patch('services.engine.health_monitor.get_speaker_residency'):
+            await monitor.poll_once()
+            first = await client.get_fingerprint()
+            await monitor.poll_once()
+            second = await client.get_fingerprint()
+
+        assert calls == ["/version", "/version"]
+        assert first != second != "unknown"
+        await client.aclose()
+
+
+class TestStatusFromMemory:
+    """/status のテスト"""
+
+    def test_status_does_not_call_engine(self):
+        """/status は保持している状態を返し、エンジンへ問い合わせない"""
+        client, calls = _engine(["1.0.0"])
+        with patch('services.engine.engine_service.get_aivis_client', return_value=client), \
+                patch('services.engine.health_monitor.get_aivis_client', return_value=client):
+            response = TestClient(app).get("/status")
+
+        assert response.status_code == 200
+        assert response.json()["status"] in ("ok", "error", "unknown")
+        assert calls == []
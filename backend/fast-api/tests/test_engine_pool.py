@@ -0,0 +1,79 @@
+"""
+エンジンプールのテスト
+
+least-outstanding-requestsの振り分け、連続失敗による除外と再投入を確認する。
+"""
+import pytest
+import httpx
+from unittest.mock import patch
+
+from services.speech import AivisSpeechClient
+from services.speech.engine_pool import EnginePool
+
+
+class TestEnginePool:
+    """EnginePoolのテスト"""
+
+    def test_least_outstanding(self):
+        """処理中のリクエストが少ないエンジンを選ぶ"""
+        pool = EnginePool(["http://a", "http://b"])
+        first = pool.acquire()
+        second = pool.acquire()
+        assert first is not second
+        pool.release(first, success=True)
+        assert pool.acquire() is first
+
+    def test_ejection_and_readmission(self):
+        """連続失敗で除外され、除外期間の経過後に戻る"""
+        pool = EnginePool(["http://a", "http://b"], failure_threshold=2, ejection_seconds=10.0)
+        bad = pool.backends[0]
+        for _ in range(2):
+            pool.release(_acquire(pool, bad), success=False)
+
+        with patch('services.speech.engine_pool.time.monotonic', return_value=bad.ejected_until - 1):
+            assert all(pool.acquire().url == "http://b" for _ in range(3))
+        with patch('services.speech.engine_pool.time.monotonic', return_value=bad.ejected_until + 1):
+            assert pool.acquire() is bad
+
+    def test_ejection_backoff(self):
+        """再投入後に再び失敗すると除外期間が延びる"""
+        pool = EnginePool(["http://a"], failure_threshold=1, ejection_seconds=10.0)
+        backend = pool.backends[0]
+        with patch('services.speech.engine_pool.time.monotonic', return_value=100.0):
+            pool.release(_acquire(pool, backend), success=False)
+        assert backend.ejected_until == 110.0
+        with patch('services.speech.engine_pool.time.monotonic', return_value=200.0):
+            pool.release(_acquire(pool, backend), success=False)
+        assert backend.ejected_until == 220.0
+
+    def test_all_ejected_still_returns_backend(self):
+        """全台が除外中でもリクエスト先は返す"""
+        pool = EnginePool(["http://a"], failure_threshold=1)
+        pool.release(pool.acquire(), success=False)
+        assert pool.acquire().url == "http://a"
+
+
+def _acquire(pool: EnginePool, backend):
+    """指定したエンジンの処理中の数を加算して返す"""
+    backend.outstanding += 1
+    return backend
+
+
+class TestClientFailover:
+    """AivisSpeechClientの振り分けのテスト"""
+
+    @pytest.mark.asyncio
+    async def test_connect_error_retries_other_engine(self):
+        """接続できないエンジンがあれば別のエンジンで再試行する"""
+        def handler(request):
+            if request.url.host == "down":
+                raise httpx.ConnectError("refused", request=request)
+            return httpx.Response(200, json=[])
+
+        client = AivisSpeechClient("http://down,http://up", transport=httpx.MockTransport(handler))
+        for _ in range(4):
+            assert await client.get_speakers() == []
+        stats = {s["url"]: s for s in client.pool.get_stats()}
+        assert stats["http://up"]["total_failures"] == 0
+        assert stats["http://down"]["total_failures"] >= 1
+        await client.aclose()
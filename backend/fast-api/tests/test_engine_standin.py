@@ -0,0 +1,72 @@
+"""
+AivisSpeech Engineのスタンドインのテスト
+
+AivisSpeechClientからスタンドインを呼び出し、決定的な合成音声、
+失敗の注入、同時処理数の上限を確認する。
+"""
+import asyncio
+import pytest
+import httpx
+from fastapi import HTTPException
+
+from scripts.engine_standin import LatencyProfile, StandinConfig, build_audio_query, create_app
+from services.audio.wav import parse_wav
+from services.speech import AivisSpeechClient
+
+
+def _client(config=None):
+    """スタンドインに接続するクライアントを生成する"""
+    app = create_app(config)
+    client = AivisSpeechClient("http://standin.test", transport=httpx.ASGITransport(app=app))
+    return client, app.state.engine
+
+
+class TestEngineStandin:
+    """スタンドインのテスト"""
+
+    def test_audio_query_per_character(self):
+        """空白以外の1文字を1モーラとし、句読点でアクセント句を区切る"""
+        query = build_audio_query("こんにちは、 世界？")
+        assert [len(phrase["moras"]) for phrase in query["accent_phrases"]] == [5, 2]
+        assert query["accent_phrases"][0]["pause_mora"]["vowel"] == "pau"
+        assert query["accent_phrases"][1]["is_interrogative"] is True
+
+    @pytest.mark.asyncio
+    async def test_deterministic_wav_sized_to_text(self):
+        """同じテキストからは同じWAVを返し、長いテキストほど長い音声になる"""
+        client, _ = _client()
+        short_query = await client.create_audio_query("こんにちは", 1)
+        long_query = await client.create_audio_query("こんにちは、今日はいい天気ですね", 1)
+
+        first = await client.synthesize_speech(short_query, 1)
+        second = await client.synthesize_speech(short_query, 1)
+        longer = await client.synthesize_speech(long_query, 1)
+
+        assert first == second
+        spoken = sum(
+            (mora["consonant_length"] or 0.0) + mora["vowel_length"]
+            for phrase in short_query["accent_phrases"] for mora in phrase["moras"]
+        )
+        assert parse_wav(first).duration == pytest.approx(0.1 + spoken + 0.1, abs=0.01)
+        assert parse_wav(longer).duration > parse_wav(first).duration
+        assert await client.get_version() == "1.0.0-standin"
+        await client.aclose()
+
+    @pytest.mark.asyncio
+    async def test_injected_failures(self):
+        """失敗率を指定すると audio_query が500を返す"""
+        client, engine = _client(StandinConfig(failure_rate=1.0))
+        with pytest.raises(HTTPException):
+            await client.create_audio_query("こんにちは", 1)
+        assert engine.failures >= 1
+        await client.aclose()
+
+    @pytest.mark.asyncio
+    async def test_concurrency_limit(self):
+        """同時処理数の上限を超えたリクエストは順番を待つ"""
+        config = StandinConfig(audio_query=LatencyProfile(base_ms=20), max_concurrency=1)
+        client, engine = _client(config)
+        await asyncio.gather(*(client.create_audio_query(f"テキスト{i}", 1) for i in range(4)))
+        assert engine.max_active == 1
+        assert engine.requests == 4
+        await client.aclose()
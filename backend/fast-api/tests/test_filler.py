@@ -0,0 +1,110 @@
+"""
+つなぎの音声のテスト
+
+話者ごとのつなぎの音声の保持と貸し出し、/tts/stream で最初の文が予算内に
+合成できない場合につなぎの音声を先に流すことを確認する。
+"""
+import asyncio
+import pytest
+from unittest.mock import patch
+
+from services.audio import parse_wav
+from services.speech.filler import FillerPool
+from services.speech.streaming import stream_text_to_speech
+from conftest import make_wav
+
+
+async def _collect(response) -> bytes:
+    body = b""
+    async for chunk in response.body_iterator:
+        body += chunk
+    return body
+
+
+FILLER_PCM = b"\x10\x10" * 2400
+
+
+async def _warm_pool(texts=("えーと…",)):
+    """つなぎの音声を合成済みのプールを生成する"""
+    async def fake_synthesize(text, speaker_id, query_overrides=None):
+        return make_wav(FILLER_PCM), False
+
+    pool = FillerPool(list(texts), [1])
+    with patch('services.speech.filler.synthesize_text', side_effect=fake_synthesize):
+        await pool.warm(1)
+    return pool
+
+
+class TestFillerPool:
+    """FillerPoolのテスト"""
+
+    @pytest.mark.asyncio
+    async def test_rotates_clips(self):
+        """同じ話者では文言を順番に使い、利用回数を数える"""
+        pool = await _warm_pool(("えーと…", "うーんと…"))
+        first, second, third = pool.take(1), pool.take(1), pool.take(1)
+
+        assert first is not second
+        assert third is first
+        assert pool.get_stats()["speakers"]["1"] == {"clips": 2, "served": 3, "warming": False}
+
+    @pytest.mark.asyncio
+    async def test_missing_speaker_warms_in_background(self):
+        """保持していない話者では何も返さず、次回のためにバックグラウンドで合成する"""
+        pool = await _warm_pool()
+
+        async def fake_synthesize(text, speaker_id, query_overrides=None):
+            return make_wav(FILLER_PCM), False
+
+        with patch('services.speech.filler.synthesize_text', side_effect=fake_synthesize):
+            assert pool.take(2) is None
+            await asyncio.gather(*pool._tasks)
+
+        assert pool.take(2) is not None
+        assert pool.get_stats()["missing"] == 1
+
+
+class TestStreamFiller:
+    """/tts/stream のつなぎの音声のテスト"""
+
+    @pytest.mark.asyncio
+    async def test_filler_when_over_budget(self):
+        """最初の文が予算内に合成できない場合は、つなぎの音声の後に本来の音声を流す"""
+        pool = await _warm_pool()
+        pcm = {"一文目。": b"\x01\x00" * 4, "二文目。": b"\x02\x00" * 4}
+
+        async def slow_synthesize(text, speaker_id, query_overrides=None):
+            await asyncio.sleep(0.05)
+            return make_wav(pcm[text]), False
+
+        with patch('services.speech.streaming.synthesize_text', side_effect=slow_synthesize), \
+                patch('services.speech.streaming.get_filler_pool', return_value=pool), \
+                patch('services.speech.streaming.settings.tts_filler_budget_ms', 10):
+            response = await stream_text_to_speech("一文目。二文目。", 1)
+            body = await _collect(response)
+
+        assert response.headers["X-TTS-Filler-Ms"] == "100"
+        info = parse_wav(body)
+        assert body[info.data_offset:] == FILLER_PCM + pcm["一文目。"] + pcm["二文目。"]
+        assert pool.get_stats()["served"] == 1
+
+    @pytest.mark.asyncio
+    async def test_no_filler_within_budget(self):
+        """予算内に合成できた場合や、フォーマットを変える上書きがある場合はつなぎの音声を流さない"""
+        pool = await _warm_pool()
+
+        async def fake_synthesize(text, speaker_id, query_overrides=None):
+            await asyncio.sleep(0.05 if query_overrides else 0)
+            return make_wav(b"\x01\x00" * 4), False
+
+        with patch('services.speech.streaming.synthesize_text', side_effect=fake_synthesize), \
+                patch('services.speech.streaming.get_filler_pool', return_value=pool), \
+                patch('services.speech.streaming.settings.tts_filler_budget_ms', 30):
+            fast = await stream_text_to_speech("一文目。", 1)
+            await _collect(fast)
+            resampled = await stream_text_to_speech("一文目。", 1, {"outputSamplingRate": 48000})
+            await _collect(resampled)
+
+        assert "X-TTS-Filler-Ms" not in fast.headers
+        assert "X-TTS-Filler-Ms" not in resampled.headers
+        assert pool.get_stats()["served"] == 0
@@ -0,0 +1,162 @@
+"""
+話者一覧とユーザー辞書のキャッシュのテスト
+
+有効期限内の再利用、期限切れ後のバックグラウンドでの取得し直し、
+ETag による304、gzip圧縮済みの本文を確認する。
+"""
+import asyncio
+import gzip
+import json
+import pytest
+from unittest.mock import patch, AsyncMock
+from fastapi import HTTPException
+from fastapi.testclient import TestClient
+
+from app import app
+from services.engine import MetadataCache
+from services.engine.metadata_cache import accepts_gzip, get_document_response
+
+SPEAKERS = [{"name": "話者1", "styles": [{"id": 1, "name": "通常"}]}]
+
+
+class TestMetadataCache:
+    """MetadataCacheのテスト"""
+
+    @pytest.mark.asyncio
+    async def test_reuse_within_ttl(self):
+        """有効期限内は同時に届いたリクエストも含めてエンジンから1回だけ取得する"""
+        fetch = AsyncMock(return_value=SPEAKERS)
+        cache = MetadataCache(ttl=60)
+        documents = await asyncio.gather(*(cache.get("speakers", fetch) for _ in range(5)))
+        await cache.get("speakers", fetch)
+
+        assert fetch.await_count == 1
+        assert len({document.etag for document in documents}) == 1
+        assert json.loads(documents[0].body) == SPEAKERS
+        assert json.loads(gzip.decompress(documents[0].gzip_body)) == SPEAKERS
+        assert cache.get_stats()["hits"] == 1
+
+    @pytest.mark.asyncio
+    async def test_stale_while_refreshing(self):
+        """有効期限を過ぎた応答は返しつつ、バックグラウンドで取得し直す"""
+        fetch = AsyncMock(side_effect=[SPEAKERS, SPEAKERS + [{"name": "話者2", "styles": []}]])
+        cache = MetadataCache(ttl=60)
+        first = await cache.get("speakers", fetch)
+        first.fetched_at -= 60
+
+        stale = await cache.get("speakers", fetch)
+        assert stale is first
+        await cache._refreshing["speakers"]
+
+        fresh = await cache.get("speakers", fetch)
+        assert fetch.await_count == 2
+        assert fresh.etag != first.etag
+        assert cache.get_stats()["stale_hits"] == 1
+
+    @pytest.mark.asyncio
+    async def test_keep_stale_on_refresh_error(self):
+        """取得し直せなかった場合は保持している応答を返し続ける"""
+        fetch = AsyncMock(side_effect=[SPEAKERS, HTTPException(status_code=503, detail="down")])
+        cache = MetadataCache(ttl=60)
+        first = await cache.get("speakers", fetch)
+        first.fetched_at -= 60
+
+        await cache.get("speakers", fetch)
+        await cache._refreshing["speakers"]
+
+        assert await cache.get("speakers", fetch) is first
+        assert fetch.await_count == 2
+        assert cache.get_stats()["refresh_errors"] == 1
+
+    @pytest.mark.asyncio
+    async def test_invalidate_discards_inflight_fetches(self):
+        """破棄より前に始めた取得の結果は保持せず、取得し直しは中止する"""
+        before_restart = SPEAKERS + [{"name": "再起動前", "styles": []}]
+        restarted = SPEAKERS + [{"name": "話者2", "styles": []}]
+        release = asyncio.Event()
+        responses = [SPEAKERS, before_restart, restarted]
+
+        async def fetch():
+            data = responses.pop(0)
+            if data is before_restart:
+                await release.wait()
+            return data
+
+        cache = MetadataCache(ttl=60)
+        (await cache.get("speakers", fetch)).fetched_at -= 60
+        await cache.get("speakers", fetch)
+        refreshing = cache._refreshing["speakers"]
+        await asyncio.sleep(0.01)
+
+        cache.invalidate()
+        fresh = await asyncio.wait_for(cache.get("speakers", fetch), 1)
+        release.set()
+        await asyncio.sleep(0.01)
+
+        assert refreshing.cancelled()
+        assert json.loads(fresh.body) == restarted
+        assert (await cache.get("speakers", fetch)) is fresh
+
+    @pytest.mark.asyncio
+    async def test_disabled_without_ttl(self):
+        """有効期限が0の場合は毎回取得する"""
+        fetch = AsyncMock(return_value=SPEAKERS)
+        cache = MetadataCache(ttl=0)
+        await cache.get("speakers", fetch)
+        await cache.get("speakers", fetch)
+        assert fetch.await_count == 2
+
+
+class TestDocumentResponse:
+    """条件付きリクエストとgzipのテスト"""
+
+    def test_accepts_gzip(self):
+        """Accept-Encoding の q=0 は受け付けないものとして扱う"""
+        assert accepts_gzip("gzip, deflate, br")
+        assert accepts_gzip("br;q=1.0, *;q=0.5")
+        assert not accepts_gzip("gzip;q=0")
+        assert not accepts_gzip(None)
+
+    @pytest.mark.asyncio
+    async def test_not_modified(self):
+        """圧縮の有無によらず、一致するETagには304を返す"""
+        document = await MetadataCache(ttl=60).get("speakers", AsyncMock(return_value=SPEAKERS))
+
+        compressed = get_document_response(document, accept_encoding="gzip")
+        assert compressed.headers["content-encoding"] == "gzip"
+        assert compressed.headers["etag"] == document.gzip_etag
+        assert compressed.body == document.gzip_body
+
+        assert get_document_response(document, if_none_match=document.gzip_etag).status_code == 304
+        assert get_document_response(document, if_none_match=f"W/{document.etag}").status_code == 304
+        assert get_document_response(document, if_none_match='"other"').status_code == 200
+
+
+class TestMetadataRoutes:
+    """/speakers と /user_dict のテスト"""
+
+    def test_speakers_revalidation(self):
+        """/speakers はETagを返し、If-None-Match が一致すれば304を返す"""
+        fetch = AsyncMock(return_value=SPEAKERS)
+        with patch('services.engine.metadata_cache.get_metadata_cache', return_value=MetadataCache(60)), \
+                patch('services.get_speakers', fetch):
+            client = TestClient(app)
+            response = client.get("/speakers")
+            revalidated = client.get("/speakers", headers={"If-None-Match": response.headers["etag"]})
+
+        assert response.status_code == 200
+        assert response.json() == SPEAKERS
+        assert response.headers["content-encoding"] == "gzip"
+        assert revalidated.status_code == 304
+        assert fetch.await_count == 1
+
+    def test_user_dict_uncompressed(self):
+        """gzipを受け付けないクライアントには非圧縮の本文を返す"""
+        user_dict = {"id": {"surface": "単語", "pronunciation": "タンゴ"}}
+        with patch('services.engine.metadata_cache.get_metadata_cache', return_value=MetadataCache(60)), \
+                patch('services.get_user_dict', AsyncMock(return_value=user_dict)):
+            response = TestClient(app).get("/user_dict", headers={"Accept-Encoding": "identity"})
+
+        assert response.status_code == 200
+        assert "content-encoding" not in response.headers
+        assert response.json() == user_dict
@@ -0,0 +1,101 @@
+"""
+定型文の事前合成のテスト
+"""
+import json
+import pytest
+from unittest.mock import patch, AsyncMock
+from fastapi import HTTPException
+from fastapi.testclient import TestClient
+
+from app import app
+from services.speech import Prewarmer, Priority, load_prewarm_manifest
+from services.speech.admission import current_priority
+
+
+class TestLoadPrewarmManifest:
+    """load_prewarm_manifestのテスト"""
+
+    def test_load(self, tmp_path):
+        """speaker_id を省略した項目は既定の話者になり、空のテキストは除く"""
+        path = tmp_path / "prewarm.json"
+        path.write_text(json.dumps([
+            {"text": "ようこそ", "speaker_id": 1},
+            {"text": "こんにちは"},
+            {"text": "  "},
+        ]), encoding="utf-8")
+        assert load_prewarm_manifest(str(path)) == [("ようこそ", 1), ("こんにちは", 888753760)]
+
+    def test_missing_file(self, tmp_path):
+        """ファイルがない場合は空のリストを返す"""
+        assert load_prewarm_manifest(str(tmp_path / "none.json")) == []
+
+    def test_invalid_manifest(self, tmp_path):
+        """text のない項目はエラーになる"""
+        path = tmp_path / "prewarm.json"
+        path.write_text(json.dumps([{"speaker_id": 1}]), encoding="utf-8")
+        with pytest.raises(ValueError):
+            load_prewarm_manifest(str(path))
+
+
+class TestPrewarmer:
+    """Prewarmerのテスト"""
+
+    @pytest.mark.asyncio
+    async def test_run_reports_progress(self, tmp_path):
+        """全件を合成し、キャッシュ済みと失敗の件数を記録する"""
+        path = tmp_path / "prewarm.json"
+        path.write_text(json.dumps([{"text": "あ"}, {"text": "い"}, {"text": "う"}]), encoding="utf-8")
+
+        priorities = []
+
+        async def fake_synthesize(text, speaker_id):
+            priorities.append(current_priority.get())
+            if text == "う":
+                raise HTTPException(status_code=500, detail="error")
+            return b"audio", text == "い"
+
+        prewarmer = Prewarmer()
+        prewarmer.load(str(path))
+        assert prewarmer.get_status()["state"] == "pending"
+
+        with patch('services.speech.prewarm.synthesize_text', AsyncMock(side_effect=fake_synthesize)):
+            prewarmer.start()
+            await prewarmer._task
+
+        status = prewarmer.get_status()
+        assert status["state"] == "completed"
+        assert status["completed"] == 2
+        assert status["already_cached"] == 1
+        assert status["failed"] == 1
+        assert status["progress"] == 1.0
+        assert set(priorities) == {Priority.BACKGROUND}
+
+    @pytest.mark.asyncio
+    async def test_retry_while_engine_unavailable(self, tmp_path):
+        """エンジンに接続できない間は再試行する"""
+        path = tmp_path / "prewarm.json"
+        path.write_text(json.dumps([{"text": "あ"}]), encoding="utf-8")
+        synthesize = AsyncMock(side_effect=[HTTPException(status_code=503, detail="down"), (b"audio", False)])
+
+        prewarmer = Prewarmer()
+        prewarmer.load(str(path))
+        with patch('services.speech.prewarm.synthesize_text', synthesize), \
+             patch('services.speech.prewarm.settings.tts_prewarm_retry_seconds', 0):
+            prewarmer.start()
+            await prewarmer._task
+
+        assert synthesize.await_count == 2
+        assert prewarmer.get_status()["completed"] == 1
+
+
+class TestStatusWarmup:
+    """/status の事前合成の進捗のテスト"""
+
+    def test_status_includes_warmup(self):
+        """/status のレスポンスに事前合成の進捗が含まれる"""
+        with patch('services.get_engine_health', return_value={
+            "status": "ok", "message": "ok", "engine_info": {"version": "1.0.0"}
+        }):
+            response = TestClient(app).get("/status")
+        assert response.status_code == 200
+        assert "state" in response.json()["warmup"]
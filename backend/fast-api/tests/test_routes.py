@@ -4,6 +4,7 @@ AivisSpeech API サーバーのルーターのテスト
 APIエンドポイントの機能をテストする。
 """
 import pytest
+from fastapi import Response
 from fastapi.testclient import TestClient
 from unittest.mock import patch
 
@@ -22,15 +23,15 @@ class TestHealthRoutes:
         assert response.status_code == 200
         assert response.json() == {"message": "AivisSpeech API サーバーが稼働中です"}
     
-    @patch('services.get_engine_version')
-    def test_status_endpoint_success(self, mock_get_engine_version):
+    @patch('services.get_engine_health')
+    def test_status_endpoint_success(self, mock_get_engine_health):
         """ステータスエンドポイントの正常系テスト"""
         # モックの設定
-        mock_get_engine_version.return_value = (True, {
+        mock_get_engine_health.return_value = {
             "status": "ok",
             "message": "AivisSpeech Engineが正常に動作しています",
             "engine_info": {"version": "1.0.0"}
-        })
+        }
         
         # リクエストの送信
         response = client.get("/status")
@@ -40,14 +41,14 @@ class TestHealthRoutes:
         assert response.json()["status"] == "ok"
         assert response.json()["engine_info"] == {"version": "1.0.0"}
     
-    @patch('services.get_engine_version')
-    def test_status_endpoint_error(self, mock_get_engine_version):
+    @patch('services.get_engine_health')
+    def test_status_endpoint_error(self, mock_get_engine_health):
         """ステータスエンドポイントのエラー系テスト"""
         # モックの設定
-        mock_get_engine_version.return_value = (False, {
+        mock_get_engine_health.return_value = {
             "status": "error",
             "message": "AivisSpeech Engineに接続できません: Connection refused"
-        })
+        }
         
         # リクエストの送信
         response = client.get("/status")
@@ -96,6 +97,9 @@ class TestSpeechRoutes:
     @patch('services.text_to_speech')
     def test_tts_endpoint_wav(self, mock_text_to_speech):
         """TTSエンドポイント（WAV形式）のテスト"""
+        # モックの設定
+        mock_text_to_speech.return_value = Response(content=b"RIFF", media_type="audio/wav")
+        
         # リクエストの送信
         request_data = {
             "text": "こんにちは", 
@@ -105,7 +109,9 @@ class TestSpeechRoutes:
         client.post("/tts", json=request_data)
         
         # モックの呼び出し確認
-        mock_text_to_speech.assert_called_once_with("こんにちは", 1, "wav")
+        mock_text_to_speech.assert_called_once_with(
+            "こんにちは", 1, "wav", query_overrides=None, delivery="inline", include_visemes=False
+        )
 
 class TestDictionaryRoutes:
     """ユーザー辞書関連のエンドポイントのテスト"""
@@ -4,7 +4,8 @@ AivisSpeech API サーバーのサービス層のテスト
 servicesモジュールの関数をテスト。
 """
 import pytest
-from unittest.mock import patch, MagicMock
+import httpx
+from unittest.mock import patch
 from fastapi import HTTPException
 import base64
 
@@ -14,22 +15,26 @@ from services import (
     get_wav_response,
     get_base64_response,
 )
+from services.speech import AivisSpeechClient
+
+
+def _mock_client(handler):
+    """ハンドラーで応答するモックトランスポート付きのクライアントを生成する"""
+    return AivisSpeechClient("http://engine.test", transport=httpx.MockTransport(handler))
 
 
 class TestEngineVersionService:
     """get_engine_versionサービス関数のテスト"""
     
-    @patch('services.requests.get')
-    def test_get_engine_version_success(self, mock_get):
+    @pytest.mark.asyncio
+    async def test_get_engine_version_success(self):
         """正常系: エンジンのバージョン情報が取得できる場合"""
         # モックの設定
-        mock_response = MagicMock()
-        mock_response.status_code = 200
-        mock_response.json.return_value = {"version": "1.0.0"}
-        mock_get.return_value = mock_response
+        client = _mock_client(lambda request: httpx.Response(200, json={"version": "1.0.0"}))
         
         # 関数の実行
-        success, data = get_engine_version()
+        with patch('services.engine.engine_service.get_aivis_client', return_value=client):
+            success, data = await get_engine_version()
         
         # アサーション
         assert success is True
@@ -37,30 +42,32 @@ class TestEngineVersionService:
         assert data["message"] == "AivisSpeech Engineが正常に動作しています"
         assert data["engine_info"] == {"version": "1.0.0"}
     
-    @patch('services.requests.get')
-    def test_get_engine_version_error_status(self, mock_get):
+    @pytest.mark.asyncio
+    async def test_get_engine_version_error_status(self):
         """異常系: エンジンからエラーステータスが返ってくる場合"""
         # モックの設定
-        mock_response = MagicMock()
-        mock_response.status_code = 500
-        mock_get.return_value = mock_response
+        client = _mock_client(lambda request: httpx.Response(500))
         
         # 関数の実行
-        success, data = get_engine_version()
+        with patch('services.engine.engine_service.get_aivis_client', return_value=client):
+            success, data = await get_engine_version()
         
         # アサーション
         assert success is False
         assert data["status"] == "error"
         assert "正常なレスポンスが返ってきませんでした" in data["message"]
     
-    @patch('services.requests.get')
-    def test_get_engine_version_connection_error(self, mock_get):
+    @pytest.mark.asyncio
+    async def test_get_engine_version_connection_error(self):
         """異常系: エンジンに接続できない場合"""
         # モックの設定
-        mock_get.side_effect = Exception("Connection refused")
+        def handler(request):
+            raise httpx.ConnectError("Connection refused", request=request)
+        client = _mock_client(handler)
         
         # 関数の実行
-        success, data = get_engine_version()
+        with patch('services.engine.engine_service.get_aivis_client', return_value=client):
+            success, data = await get_engine_version()
         
         # アサーション
         assert success is False
@@ -71,35 +78,32 @@ class TestEngineVersionService:
 class TestSpeakersService:
     """get_speakersサービス関数のテスト"""
     
-    @patch('services.requests.get')
-    def test_get_speakers_success(self, mock_get):
+    @pytest.mark.asyncio
+    async def test_get_speakers_success(self):
         """正常系: 話者一覧が取得できる場合"""
         # モックの設定
-        mock_response = MagicMock()
-        mock_response.status_code = 200
         mock_speakers = [
             {"name": "話者1", "styles": [{"id": 1, "name": "通常"}]}
         ]
-        mock_response.json.return_value = mock_speakers
-        mock_get.return_value = mock_response
+        client = _mock_client(lambda request: httpx.Response(200, json=mock_speakers))
         
         # 関数の実行
-        result = get_speakers()
+        with patch('services.engine.engine_service.get_aivis_client', return_value=client):
+            result = await get_speakers()
         
         # アサーション
         assert result == mock_speakers
     
-    @patch('services.requests.get')
-    def test_get_speakers_error_status(self, mock_get):
+    @pytest.mark.asyncio
+    async def test_get_speakers_error_status(self):
         """異常系: エンジンからエラーステータスが返ってくる場合"""
         # モックの設定
-        mock_response = MagicMock()
-        mock_response.status_code = 500
-        mock_get.return_value = mock_response
+        client = _mock_client(lambda request: httpx.Response(500))
         
         # 関数の実行と例外の確認
-        with pytest.raises(HTTPException) as excinfo:
-            get_speakers()
+        with patch('services.engine.engine_service.get_aivis_client', return_value=client):
+            with pytest.raises(HTTPException) as excinfo:
+                await get_speakers()
         
         # アサーション
         assert excinfo.value.status_code == 500
@@ -4,7 +4,9 @@ Tests for refactored services modules
 リファクタリング後のservicesモジュールのテスト。
 """
 import pytest
+import httpx
 from unittest.mock import Mock, patch
+from fastapi import HTTPException
 
 # 感情分析モジュールのテスト
 from services.sentiment import SentimentCategory, SentimentAnalyzer
@@ -33,38 +35,40 @@ class TestSentimentAnalyzer:
 
 # エンジン管理モジュールのテスト
 from services.engine import get_engine_version, get_speakers, get_user_dict
+from services.speech import AivisSpeechClient
 
 
 class TestEngineService:
     """エンジン管理サービスのテスト"""
     
-    @patch('services.engine.engine_service.requests.get')
-    def test_get_engine_version_success(self, mock_get):
+    @pytest.mark.asyncio
+    async def test_get_engine_version_success(self):
         """エンジンバージョン取得成功ケース"""
-        mock_response = Mock()
-        mock_response.status_code = 200
-        mock_response.json.return_value = {"version": "1.0.0"}
-        mock_get.return_value = mock_response
+        client = AivisSpeechClient(
+            "http://engine.test",
+            transport=httpx.MockTransport(lambda request: httpx.Response(200, json={"version": "1.0.0"}))
+        )
         
-        success, result = get_engine_version()
+        with patch('services.engine.engine_service.get_aivis_client', return_value=client):
+            success, result = await get_engine_version()
         assert success is True
         assert result["status"] == "ok"
         assert "engine_info" in result
     
-    @patch('services.engine.engine_service.requests.get')
-    def test_get_speakers_success(self, mock_get):
+    @pytest.mark.asyncio
+    async def test_get_speakers_success(self):
         """スピーカー情報取得成功ケース"""
-        mock_response = Mock()
-        mock_response.status_code = 200
-        mock_response.json.return_value = [{"id": 0, "name": "テストスピーカー"}]
-        mock_get.return_value = mock_response
+        client = AivisSpeechClient(
+            "http://engine.test",
+            transport=httpx.MockTransport(lambda request: httpx.Response(200, json=[{"id": 0, "name": "テストスピーカー"}]))
+        )
         
-        result = get_speakers()
+        with patch('services.engine.engine_service.get_aivis_client', return_value=client):
+            result = await get_speakers()
         assert isinstance(result, list)
 
 
 # 音声合成モジュールのテスト
-from services.speech import AivisSpeechClient
 
 
 class TestAivisSpeechClient:
@@ -80,6 +84,23 @@ class TestAivisSpeechClient:
         custom_url = "http://localhost:50021"
         client = AivisSpeechClient(custom_url)
         assert client.base_url == custom_url
+    
+    def test_http_pool_is_shared(self):
+        """接続プールが呼び出し間で共有されるテスト"""
+        client = AivisSpeechClient("http://engine.test")
+        assert client.http is client.http
+    
+    @pytest.mark.asyncio
+    async def test_synthesize_connection_error(self):
+        """接続失敗が503のHTTPExceptionに変換されるテスト"""
+        def handler(request):
+            raise httpx.ConnectTimeout("timed out", request=request)
+        client = AivisSpeechClient("http://engine.test", transport=httpx.MockTransport(handler))
+        
+        with pytest.raises(HTTPException) as excinfo:
+            await client.synthesize_speech({"accent_phrases": []}, 1)
+        assert excinfo.value.status_code == 503
+        await client.aclose()
 
 
 # レスポンス生成モジュールのテスト
@@ -0,0 +1,99 @@
+"""
+single-flightのテスト
+
+同時に届いた同一内容の処理が1回だけ実行されることを確認する。
+"""
+import asyncio
+import pytest
+
+from services.speech.singleflight import SingleFlight
+
+
+class TestSingleFlight:
+    """SingleFlightのテスト"""
+
+    @pytest.mark.asyncio
+    async def test_concurrent_calls_are_coalesced(self):
+        """同じキーの同時呼び出しは1回だけ実行され、followersとして数えられる"""
+        flight = SingleFlight()
+        calls = 0
+
+        async def work():
+            nonlocal calls
+            calls += 1
+            await asyncio.sleep(0.01)
+            return b"audio"
+
+        results = await asyncio.gather(*(flight.do("key", work) for _ in range(5)))
+
+        assert calls == 1
+        assert [audio for audio, _ in results] == [b"audio"] * 5
+        assert sum(shared for _, shared in results) == 4
+        assert flight.get_stats() == {"leaders": 1, "followers": 4, "in_flight": 0, "abandoned": 0}
+
+    @pytest.mark.asyncio
+    async def test_different_keys_run_separately(self):
+        """キーが異なれば別々に実行される"""
+        flight = SingleFlight()
+
+        async def work():
+            await asyncio.sleep(0)
+            return 1
+
+        await asyncio.gather(flight.do("a", work), flight.do("b", work))
+        assert flight.get_stats()["leaders"] == 2
+
+    @pytest.mark.asyncio
+    async def test_error_is_shared(self):
+        """失敗した場合は待っている全員に同じ例外が伝わる"""
+        flight = SingleFlight()
+
+        async def work():
+            await asyncio.sleep(0.01)
+            raise RuntimeError("engine error")
+
+        results = await asyncio.gather(
+            flight.do("key", work), flight.do("key", work), return_exceptions=True
+        )
+        assert all(isinstance(result, RuntimeError) for result in results)
+
+    @pytest.mark.asyncio
+    async def test_leader_cancellation_does_not_affect_followers(self):
+        """最初の呼び出し元がキャンセルされても、他の待ち手は結果を受け取れる"""
+        flight = SingleFlight()
+
+        async def work():
+            await asyncio.sleep(0.02)
+            return b"audio"
+
+        leader = asyncio.create_task(flight.do("key", work))
+        await asyncio.sleep(0)
+        follower = asyncio.create_task(flight.do("key", work))
+        await asyncio.sleep(0)
+        leader.cancel()
+
+        assert await follower == (b"audio", True)
+
+    @pytest.mark.asyncio
+    async def test_abandon_after_last_waiter(self):
+        """最後の待ち手がキャンセルされた時点で on_abandon を呼ぶ"""
+        abandoned = []
+        flight = SingleFlight(on_abandon=lambda key, task: abandoned.append(key))
+        gate = asyncio.Event()
+
+        async def work():
+            await gate.wait()
+            return 1
+
+        first = asyncio.create_task(flight.do("k", work))
+        second = asyncio.create_task(flight.do("k", work))
+        await asyncio.sleep(0)
+        first.cancel()
+        await asyncio.sleep(0)
+        assert abandoned == []
+
+        second.cancel()
+        await asyncio.sleep(0)
+        assert abandoned == ["k"]
+        assert flight.get_stats()["abandoned"] == 1
+        gate.set()
@@ -0,0 +1,111 @@
+"""
+話者の初期化（エンジンへのモデルの読み込み）のテスト
+
+各エンジンでの初期化、失敗時の再試行、再起動の検出による再初期化を確認する。
+"""
+import pytest
+import httpx
+from unittest.mock import patch
+from fastapi.testclient import TestClient
+
+from app import app
+from services.engine import SpeakerResidency
+from services.speech import AivisSpeechClient
+
+
+def _engine(fail_first=0):
+    """/initialize_speaker の呼び出しを記録するモックエンジンを生成する"""
+    calls = []
+
+    def handler(request):
+        if request.url.path == "/initialize_speaker":
+            calls.append((request.url.host, int(request.url.params["speaker"])))
+            assert request.url.params["skip_reinit"] == "true"
+            if len(calls) <= fail_first:
+                return httpx.Response(500)
+            return httpx.Response(204)
+        return httpx.Response(404)
+
+    client = AivisSpeechClient("http://engine-a,http://engine-b", transport=httpx.MockTransport(handler))
+    return client, calls
+
+
+class TestSpeakerResidency:
+    """SpeakerResidencyのテスト"""
+
+    @pytest.mark.asyncio
+    async def test_initializes_every_engine(self):
+        """設定された話者をすべてのエンジンで初期化する"""
+        client, calls = _engine()
+        residency = SpeakerResidency([1, 2])
+        with patch('services.engine.speaker_residency.get_aivis_client', return_value=client):
+            residency.start()
+            await residency._task
+            status = residency.get_status()
+
+        assert sorted(calls) == [("engine-a", 1), ("engine-a", 2), ("engine-b", 1), ("engine-b", 2)]
+        assert status["state"] == "ready"
+        assert status["speakers"][0]["engines"] == {"http://engine-a": "resident", "http://engine-b": "resident"}
+        await client.aclose()
+
+    @pytest.mark.asyncio
+    async def test_retry_failed_speaker(self):
+        """初期化に失敗した話者だけを再試行する"""
+        client, calls = _engine(fail_first=1)
+        residency = SpeakerResidency([1])
+        with patch('services.engine.speaker_residency.get_aivis_client', return_value=client), \
+             patch('services.engine.speaker_residency.settings.engine_init_retry_seconds', 0):
+            residency.start()
+            await residency._task
+            status = residency.get_status()
+
+        assert len(calls) == 3
+        assert status["state"] == "ready"
+        assert status["errors"] == {}
+        await client.aclose()
+
+    @pytest.mark.asyncio
+    async def test_reinitialize_after_restart(self):
+        """再起動を検出したエンジンでだけ話者を初期化し直す"""
+        client, calls = _engine()
+        residency = SpeakerResidency([1])
+        with patch('services.engine.speaker_residency.get_aivis_client', return_value=client):
+            residency.start()
+            await residency._task
+            residency.observe_engine("http://engine-a", True)
+            residency.observe_engine("http://engine-b", False)
+            assert not residency.running
+            assert len(calls) == 2
+
+            residency.observe_engine("http://engine-b", True, restarted=True)
+            await residency._task
+            assert calls[2:] == [("engine-b", 1)]
+
+            residency.observe_engine("http://engine-a", True, restarted=True)
+            await residency._task
+            status = residency.get_status()
+
+        assert calls[3:] == [("engine-a", 1)]
+        assert status["restarts_detected"] == 2
+        assert status["state"] == "ready"
+        await client.aclose()
+
+    def test_disabled_without_speakers(self):
+        """話者が設定されていない場合は何もしない"""
+        residency = SpeakerResidency([])
+        residency.start()
+        assert residency._task is None
+        assert residency.get_status()["state"] == "disabled"
+
+
+class TestStatusSpeakers:
+    """/status の話者の初期化状態のテスト"""
+
+    def test_status_includes_speakers(self):
+        """/status のレスポンスに話者の初期化状態が含まれる"""
+        with patch('services.get_engine_health', return_value={
+            "status": "ok", "message": "ok", "engine_info": {"version": "1.0.0"}
+        }):
+            response = TestClient(app).get("/status")
+        assert response.status_code == 200
+        assert "state" in response.json()["speakers"]
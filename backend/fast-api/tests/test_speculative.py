@@ -0,0 +1,130 @@
+"""
+LLMの回答からの先回りの音声合成のテスト
+
+完結した文だけを合成すること、上限と取り消し、後から届く合成が
+キャッシュヒットまたは実行中の合成への合流になることを確認する。
+"""
+import asyncio
+import json
+import pytest
+from unittest.mock import patch, AsyncMock
+
+from services.speech import AudioCache
+from services.speech.composition import CompositionStats
+from services.speech.query_cache import QueryCache
+from services.speech.speculation_stats import SpeculationStats
+from services.speech.speculative import SpeculativeSynthesizer, speculate_from_stream
+from services.speech.speech_service import synthesize_composed
+from conftest import fake_engine, text_wav
+
+
+def _line(type_, content=""):
+    return json.dumps({"id": "t", "type": type_, "content": content, "timestamp": ""}) + "\n"
+
+
+async def _lines(*lines):
+    for line in lines:
+        yield line
+
+
+class TestSpeculativeSynthesizer:
+    """SpeculativeSynthesizerのテスト"""
+
+    @pytest.mark.asyncio
+    async def test_waits_for_complete_sentence(self):
+        """最後の文は次の文が始まるか回答が終わるまで合成しない"""
+        synthesize = AsyncMock(return_value=(b"audio", False))
+        stats = SpeculationStats()
+        with patch('services.speech.speculative.synthesize_text', synthesize), \
+                patch('services.speech.speculative.get_speculation_stats', return_value=stats):
+            synthesizer = SpeculativeSynthesizer(1, max_sentences=10, max_jobs=10)
+            synthesizer.feed("こんにちは。今日")
+            synthesizer.feed("は晴れ")
+            await asyncio.sleep(0)
+            assert [c.args[0] for c in synthesize.await_args_list] == ["こんにちは。"]
+
+            synthesizer.feed("です。「ようこそ。")
+            synthesizer.feed("」")
+            synthesizer.finish()
+            await asyncio.gather(*synthesizer._tasks)
+
+        assert [c.args[0] for c in synthesize.await_args_list] == ["こんにちは。", "今日は晴れです。", "「ようこそ。」"]
+        assert stats.started == 3
+        assert stats.active == 0
+
+    @pytest.mark.asyncio
+    async def test_bounded(self):
+        """回答ごとの文の数と、全体で同時に実行する数の上限を超えた文は合成しない"""
+        synthesize = AsyncMock(return_value=(b"audio", False))
+        stats = SpeculationStats()
+        with patch('services.speech.speculative.synthesize_text', synthesize), \
+                patch('services.speech.speculative.get_speculation_stats', return_value=stats):
+            synthesizer = SpeculativeSynthesizer(1, max_sentences=2, max_jobs=10)
+            synthesizer.feed("一。二。三。")
+            synthesizer.finish()
+            stats.active = 10
+            other = SpeculativeSynthesizer(1, max_sentences=10, max_jobs=10)
+            other.feed("四。")
+            other.finish()
+            stats.active -= 10
+            await asyncio.gather(*synthesizer._tasks)
+
+        assert synthesize.await_count == 2
+        assert stats.dropped == 2
+
+    @pytest.mark.asyncio
+    async def test_cancel_on_disconnect(self):
+        """回答のストリームが途中で閉じられた場合は合成を取り消す"""
+        started = asyncio.Event()
+
+        async def slow_synthesize(text, speaker_id):
+            started.set()
+            await asyncio.sleep(10)
+
+        stats = SpeculationStats()
+        with patch('services.speech.speculative.synthesize_text', side_effect=slow_synthesize), \
+                patch('services.speech.speculative.get_speculation_stats', return_value=stats):
+            stream = speculate_from_stream(
+                _lines(_line("content", "一文目です。"), _line("content", "二文目"), _line("done")), 1
+            )
+            assert json.loads(await stream.__anext__())["content"] == "一文目です。"
+            assert json.loads(await stream.__anext__())["content"] == "二文目"
+            await started.wait()
+            await stream.aclose()
+            await asyncio.sleep(0.01)
+
+        assert stats.cancelled == 1
+        assert stats.active == 0
+
+
+class TestSpeculationHits:
+    """先回りの合成と後から届く合成のテスト"""
+
+    @pytest.mark.asyncio
+    async def test_tts_joins_or_hits_speculation(self, tmp_path):
+        """/tts と同じ文単位の合成は、先回りの合成に合流するかキャッシュヒットする"""
+        engine = fake_engine(audio=text_wav, delay=0.05)
+        client = engine.client
+        cache = AudioCache(str(tmp_path), memory_budget_bytes=1 << 20, disk_budget_bytes=1 << 20)
+        stats = SpeculationStats()
+        answer = ["本日は晴れです。", "ご来場ありがとうございます。"]
+
+        with patch('services.speech.speech_service.get_aivis_client', return_value=client), \
+                patch('services.speech.speech_service.get_audio_cache', return_value=cache), \
+                patch('services.speech.speech_service.get_query_cache', return_value=QueryCache(16)), \
+                patch('services.speech.speech_service.get_composition_stats', return_value=CompositionStats()), \
+                patch('services.speech.speech_service.get_speculation_stats', return_value=stats), \
+                patch('services.speech.speculative.get_speculation_stats', return_value=stats):
+            lines = [line async for line in speculate_from_stream(
+                _lines(*(_line("content", sentence) for sentence in answer), _line("done")), 1
+            )]
+            # 先回りの合成が終わる前に /tts が届く
+            await asyncio.sleep(0.02)
+            audio, _ = await synthesize_composed("".join(answer), 1)
+
+        assert len(lines) == 3
+        assert sorted(engine.synthesized) == sorted(answer)
+        summary = stats.get_stats()
+        assert summary["cache_hits"] + summary["joined"] == 2
+        assert summary["hit_rate"] == 1.0
+        await client.aclose()
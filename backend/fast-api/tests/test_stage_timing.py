@@ -0,0 +1,95 @@
+"""
+処理段階ごとの所要時間の計測のテスト
+
+ヒストグラムの集計、Prometheus形式の出力、/tts の Server-Timing ヘッダーを確認する。
+"""
+from unittest.mock import patch
+from fastapi.testclient import TestClient
+
+from app import app
+from services.speech import AudioCache
+from services.speech.query_cache import QueryCache
+from services.speech.stage_timing import Histogram, RequestTimings, StageMetrics, measure_stage, text_length_bucket
+from conftest import fake_engine
+
+
+class TestHistogram:
+    """ヒストグラムとラベルのテスト"""
+
+    def test_text_length_bucket(self):
+        """テキスト長を区分に分ける"""
+        assert text_length_bucket("あ" * 10) == "1-10"
+        assert text_length_bucket("あ" * 11) == "11-30"
+        assert text_length_bucket("あ" * 201) == "201+"
+        assert text_length_bucket(None) == "unknown"
+
+    def test_quantile(self):
+        """分位点は該当する区間の上限で近似する"""
+        histogram = Histogram((0.1, 0.5, 1.0))
+        for value in (0.05, 0.05, 0.3, 0.8):
+            histogram.observe(value)
+        assert histogram.quantile(0.5) == 0.1
+        assert histogram.quantile(0.95) == 1.0
+        assert histogram.cumulative_counts() == [("0.1", 2), ("0.5", 3), ("1", 4), ("+Inf", 4)]
+
+    def test_render_prometheus(self):
+        """ラベルごとに累積件数・合計・件数を出力する"""
+        metrics = StageMetrics()
+        metrics.observe("synthesis", "1", "1-10", 0.2, 2048)
+        text = metrics.render_prometheus()
+        assert 'tts_stage_duration_seconds_bucket{stage="synthesis",speaker_id="1",text_length="1-10",le="0.25"} 1' in text
+        assert 'tts_stage_bytes_count{stage="synthesis",speaker_id="1",text_length="1-10"} 1' in text
+
+    def test_unknown_speakers_share_label(self):
+        """話者一覧と ENGINE_INIT_SPEAKERS にない話者IDは other にまとめる"""
+        metrics = StageMetrics()
+        with patch('services.speech.stage_timing.get_stage_metrics', return_value=metrics), \
+                patch('services.speech.stage_timing._known_speakers', {2}), \
+                patch('services.speech.stage_timing.settings.engine_init_speakers', [1]):
+            for speaker_id in (1, 2, 3, 4, 5):
+                with measure_stage("cache_lookup", speaker_id, "あ"):
+                    pass
+
+        labels = sorted(entry["speaker_id"] for entry in metrics.get_stats()["stages"])
+        assert labels == ["1", "2", "other"]
+
+
+class TestRequestTimings:
+    """RequestTimingsのテスト"""
+
+    def test_overlapping_stages_use_wall_clock_span(self):
+        """並列に行った同じ段階は合計せず、最初の開始から最後の終了までを所要時間にする"""
+        timings = RequestTimings()
+        timings.add("synthesis", 1.0, 1.3)
+        timings.add("synthesis", 1.1, 1.4)
+        timings.add("synthesis", 1.2, 1.25)
+        assert timings.server_timing() == "synthesis;dur=400.0"
+
+
+class TestServerTiming:
+    """/tts の Server-Timing ヘッダーと集計のテスト"""
+
+    def test_tts_reports_stages(self, tmp_path):
+        """/tts の応答に処理段階ごとの所要時間が含まれ、送信時間も集計される"""
+        engine = fake_engine().client
+        metrics = StageMetrics()
+        cache = AudioCache(str(tmp_path), memory_budget_bytes=1024, disk_budget_bytes=1024)
+
+        with patch('services.speech.speech_service.get_aivis_client', return_value=engine), \
+                patch('services.speech.speech_service.get_audio_cache', return_value=cache), \
+                patch('services.speech.speech_service.get_query_cache', return_value=QueryCache(16)), \
+                patch('services.speech.stage_timing.get_stage_metrics', return_value=metrics), \
+                patch('middleware.server_timing.get_stage_metrics', return_value=metrics):
+            client = TestClient(app)
+            response = client.post("/tts", json={"text": "こんにちは", "speaker_id": 1, "format": "base64"})
+            prometheus = client.get("/metrics")
+
+        assert response.status_code == 200
+        names = [entry.split(";")[0] for entry in response.headers["server-timing"].split(", ")]
+        assert names == ["cache_lookup", "audio_query", "synthesis", "base64", "total"]
+
+        stages = {(entry["stage"], entry["text_length"]) for entry in metrics.get_stats()["stages"]}
+        assert ("synthesis", "1-10") in stages
+        assert ("response_write", "1-10") in stages
+        assert prometheus.status_code == 200
+        assert "tts_stage_duration_seconds_bucket" in prometheus.text
@@ -0,0 +1,137 @@
+"""
+一括音声合成のテスト
+
+重複除去、/multi_synthesis の利用とフォールバック、出力形式を確認する。
+"""
+import base64
+import io
+import json
+import zipfile
+import pytest
+import httpx
+from unittest.mock import patch
+from fastapi.testclient import TestClient
+
+from app import app
+from services.speech import AivisSpeechClient, AudioCache, QueryCache
+from services.speech.batch import dedupe_items, batch_text_to_speech
+
+
+def _batch_engine(multi_supported: bool):
+    """/multi_synthesis の対応有無を切り替えられるモックエンジンを生成する"""
+    calls = {"/audio_query": 0, "/synthesis": 0, "/multi_synthesis": 0}
+
+    def handler(request):
+        path = request.url.path
+        if path in calls:
+            calls[path] += 1
+        if path == "/audio_query":
+            return httpx.Response(200, json={"text": request.url.params["text"]})
+        if path == "/synthesis":
+            return httpx.Response(200, content=json.loads(request.content)["text"].encode("utf-8"))
+        if path == "/multi_synthesis":
+            if not multi_supported:
+                return httpx.Response(404)
+            buffer = io.BytesIO()
+            with zipfile.ZipFile(buffer, "w") as archive:
+                for i, query in enumerate(json.loads(request.content)):
+                    archive.writestr(f"{i + 1:03d}.wav", query["text"].encode("utf-8"))
+            return httpx.Response(200, content=buffer.getvalue())
+        if path == "/version":
+            return httpx.Response(200, json="1.0.0")
+        if path == "/user_dict":
+            return httpx.Response(200, json={})
+        return httpx.Response(404)
+
+    client = AivisSpeechClient("http://engine.test", transport=httpx.MockTransport(handler))
+    return client, calls
+
+
+async def _collect(response) -> bytes:
+    body = b""
+    async for chunk in response.body_iterator:
+        body += chunk if isinstance(chunk, bytes) else chunk.encode("utf-8")
+    return body
+
+
+def _patched(client):
+    """共有インスタンスをテスト用に差し替える"""
+    cache = AudioCache(None, memory_budget_bytes=1024 * 1024, disk_budget_bytes=0)
+    return (
+        patch('services.speech.speech_service.get_aivis_client', return_value=client),
+        patch('services.speech.batch.get_aivis_client', return_value=client),
+        patch('services.speech.speech_service.get_audio_cache', return_value=cache),
+        patch('services.speech.speech_service.get_query_cache', return_value=QueryCache(64)),
+    )
+
+
+class TestDedupe:
+    """dedupe_itemsのテスト"""
+
+    def test_duplicates_are_merged(self):
+        """同じテキストと話者は1件にまとめ、元の位置を保持する"""
+        items = dedupe_items([("あ", 1), ("い", 1), ("あ ", 1), ("あ", 2)])
+        assert [(item.text, item.speaker_id) for item in items] == [("あ", 1), ("い", 1), ("あ", 2)]
+        assert items[0].positions == [0, 2]
+
+
+class TestBatchTextToSpeech:
+    """batch_text_to_speechのテスト"""
+
+    @pytest.mark.asyncio
+    async def test_multi_synthesis_is_used(self):
+        """同じ話者の未キャッシュ項目は /multi_synthesis でまとめて合成する"""
+        client, calls = _batch_engine(multi_supported=True)
+        p1, p2, p3, p4 = _patched(client)
+        with p1, p2, p3, p4:
+            response = await batch_text_to_speech([("あ", 1), ("い", 1), ("あ", 1)], "ndjson")
+            lines = [json.loads(line) for line in (await _collect(response)).decode().splitlines()]
+
+        assert calls["/multi_synthesis"] == 1
+        assert calls["/synthesis"] == 0
+        audio = {line["text"]: base64.b64decode(line["base64_audio"]) for line in lines}
+        assert audio == {"あ": "あ".encode(), "い": "い".encode()}
+        await client.aclose()
+
+    @pytest.mark.asyncio
+    async def test_fallback_and_cache(self):
+        """/multi_synthesis 非対応なら1件ずつ合成し、2回目はキャッシュから返す"""
+        client, calls = _batch_engine(multi_supported=False)
+        p1, p2, p3, p4 = _patched(client)
+        with p1, p2, p3, p4:
+            await _collect(await batch_text_to_speech([("あ", 1), ("い", 1)], "ndjson"))
+            response = await batch_text_to_speech([("あ", 1), ("い", 1)], "ndjson")
+            lines = [json.loads(line) for line in (await _collect(response)).decode().splitlines()]
+
+        assert client.supports_multi_synthesis is False
+        assert calls["/synthesis"] == 2
+        assert all(line["cached"] for line in lines)
+        await client.aclose()
+
+    @pytest.mark.asyncio
+    async def test_zip_output(self):
+        """ZIP形式では連番のWAVと manifest.json を含む"""
+        client, _ = _batch_engine(multi_supported=True)
+        p1, p2, p3, p4 = _patched(client)
+        with p1, p2, p3, p4:
+            response = await batch_text_to_speech([("あ", 1), ("い", 2)], "zip")
+            body = await _collect(response)
+
+        with zipfile.ZipFile(io.BytesIO(body)) as archive:
+            manifest = json.loads(archive.read("manifest.json"))
+            assert [entry["file"] for entry in manifest] == ["0000.wav", "0001.wav"]
+            assert archive.read("0001.wav") == "い".encode()
+        await client.aclose()
+
+
+class TestBatchRoute:
+    """/tts/batch エンドポイントのテスト"""
+
+    def test_too_many_items(self):
+        """件数が上限を超える場合は400を返す"""
+        with patch('routers.speech.settings.tts_batch_max_items', 1):
+            response = TestClient(app).post(
+                "/tts/batch",
+                json={"items": [{"text": "あ"}, {"text": "い"}]}
+            )
+        assert response.status_code == 400
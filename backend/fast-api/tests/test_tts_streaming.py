@@ -0,0 +1,96 @@
+"""
+文単位のストリーミング音声合成のテスト
+
+文分割と、並列合成した音声が文の順にストリーミングされることを確認する。
+"""
+import asyncio
+import pytest
+from unittest.mock import patch
+
+from services.audio import parse_wav
+from services.speech.segmentation import split_sentences
+from services.speech.streaming import stream_text_to_speech
+from conftest import make_wav
+
+
+class TestSplitSentences:
+    """split_sentencesのテスト"""
+
+    def test_split_on_japanese_punctuation(self):
+        """。！？と改行で区切る"""
+        assert split_sentences("こんにちは。元気ですか？はい！\n次の行") == [
+            "こんにちは。", "元気ですか？", "はい！", "次の行"
+        ]
+
+    def test_closing_bracket_stays_with_sentence(self):
+        """文末記号の直後の閉じ括弧は同じ文に含める"""
+        assert split_sentences("「ようこそ。」どうぞ。") == ["「ようこそ。」", "どうぞ。"]
+
+    def test_blank_text(self):
+        """空白のみのテキストは空のリストになる"""
+        assert split_sentences("  \n ") == []
+
+
+async def _collect(response) -> bytes:
+    body = b""
+    async for chunk in response.body_iterator:
+        body += chunk
+    return body
+
+
+class TestStreamTextToSpeech:
+    """stream_text_to_speechのテスト"""
+
+    @pytest.mark.asyncio
+    async def test_segments_are_streamed_in_order(self):
+        """後の文が先に合成されても文の順に連結される"""
+        pcm = {"一文目。": b"\x01\x00" * 4, "二文目。": b"\x02\x00" * 4, "三文目。": b"\x03\x00" * 4}
+        delays = {"一文目。": 0.03, "二文目。": 0.02, "三文目。": 0.0}
+
+        async def fake_synthesize(text, speaker_id, query_overrides=None):
+            await asyncio.sleep(delays[text])
+            return make_wav(pcm[text]), False
+
+        with patch('services.speech.streaming.synthesize_text', side_effect=fake_synthesize):
+            response = await stream_text_to_speech("一文目。二文目。三文目。", 1)
+            body = await _collect(response)
+
+        assert response.headers["X-TTS-Segments"] == "3"
+        info = parse_wav(body)
+        assert body[info.data_offset:] == pcm["一文目。"] + pcm["二文目。"] + pcm["三文目。"]
+
+    @pytest.mark.asyncio
+    async def test_concurrency_is_bounded(self):
+        """同時に合成する文の数が設定値を超えない"""
+        running = 0
+        peak = 0
+
+        async def fake_synthesize(text, speaker_id, query_overrides=None):
+            nonlocal running, peak
+            running += 1
+            peak = max(peak, running)
+            await asyncio.sleep(0.01)
+            running -= 1
+            return make_wav(b"\x00\x00"), False
+
+        with patch('services.speech.streaming.synthesize_text', side_effect=fake_synthesize), \
+                patch('services.speech.streaming.settings.tts_stream_concurrency', 2):
+            response = await stream_text_to_speech("あ。い。う。え。お。", 1)
+            await _collect(response)
+
+        assert peak == 2
+
+    @pytest.mark.asyncio
+    async def test_invalid_later_segment_ends_stream(self):
+        """2文目以降がWAVとして解釈できない場合は、それまでの音声でストリームを終了する"""
+        async def fake_synthesize(text, speaker_id, query_overrides=None):
+            if text == "二文目。":
+                return b"not-wav", False
+            return make_wav(b"\x01\x00" * 4), False
+
+        with patch('services.speech.streaming.synthesize_text', side_effect=fake_synthesize):
+            response = await stream_text_to_speech("一文目。二文目。三文目。", 1)
+            body = await _collect(response)
+
+        info = parse_wav(body)
+        assert body[info.data_offset:] == b"\x01\x00" * 4
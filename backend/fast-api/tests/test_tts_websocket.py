@@ -0,0 +1,215 @@
+"""
+WebSocketでの音声合成のテスト
+
+断片ごとの音声フレームの送信順、取り消し、エラー応答を確認する。
+"""
+import asyncio
+import json
+import struct
+from unittest.mock import patch
+from fastapi import HTTPException, WebSocketDisconnect
+from fastapi.testclient import TestClient
+from starlette.websockets import WebSocketState
+
+from app import app
+from services.speech.ws_session import TTSWebSocketSession
+
+
+def _receive_audio(websocket):
+    """audioメッセージと続くバイナリフレームを受け取る"""
+    meta = websocket.receive_json()
+    assert meta["type"] == "audio"
+    frame = websocket.receive_bytes()
+    seq = struct.unpack(">I", frame[:4])[0]
+    assert seq == meta["seq"]
+    return meta, frame[4:]
+
+
+class TestTTSWebSocket:
+    """/ws/tts エンドポイントのテスト"""
+
+    def test_frames_follow_submission_order(self):
+        """後の断片が先に合成されても受け取った順に返す"""
+        delays = {"一つ目。": 0.05, "二つ目。": 0.0}
+
+        async def fake_fragment(text, speaker_id, format_name):
+            await asyncio.sleep(delays[text])
+            return text.encode("utf-8"), False
+
+        with patch('services.speech.ws_session.synthesize_fragment', side_effect=fake_fragment):
+            with TestClient(app).websocket_connect("/ws/tts") as websocket:
+                websocket.send_json({"type": "synthesize", "seq": 10, "text": "一つ目。"})
+                websocket.send_json({"type": "synthesize", "text": "二つ目。"})
+                first_meta, first_audio = _receive_audio(websocket)
+                second_meta, second_audio = _receive_audio(websocket)
+
+        assert (first_meta["seq"], first_audio) == (10, "一つ目。".encode("utf-8"))
+        assert (second_meta["seq"], second_audio) == (11, "二つ目。".encode("utf-8"))
+        assert first_meta["format"] == "wav"
+
+    def test_cancel(self):
+        """取り消した断片は cancelled を返し、音声は送らない"""
+        release = asyncio.Event()
+
+        async def fake_fragment(text, speaker_id, format_name):
+            if text == "長い文。":
+                await release.wait()
+            return text.encode("utf-8"), True
+
+        with patch('services.speech.ws_session.synthesize_fragment', side_effect=fake_fragment):
+            with TestClient(app).websocket_connect("/ws/tts") as websocket:
+                websocket.send_json({"type": "synthesize", "seq": 1, "text": "長い文。"})
+                websocket.send_json({"type": "synthesize", "seq": 2, "text": "短い文。"})
+                websocket.send_json({"type": "cancel", "seq": 1})
+                assert websocket.receive_json() == {"type": "cancelled", "seq": 1}
+                meta, audio = _receive_audio(websocket)
+
+        assert meta["seq"] == 2
+        assert meta["cached"] is True
+
+    def test_errors(self):
+        """不正なメッセージや合成の失敗はerrorメッセージで返し、接続は維持する"""
+        async def fake_fragment(text, speaker_id, format_name):
+            raise HTTPException(status_code=503, detail="混雑しています")
+
+        with patch('services.speech.ws_session.synthesize_fragment', side_effect=fake_fragment):
+            with TestClient(app).websocket_connect("/ws/tts") as websocket:
+                websocket.send_text("not json")
+                assert websocket.receive_json()["status"] == 400
+                websocket.send_json({"type": "synthesize", "seq": 1, "text": "あ", "format": "aac"})
+                assert websocket.receive_json()["seq"] == 1
+                websocket.send_json({"type": "synthesize", "seq": 2, "text": "あ"})
+                error = websocket.receive_json()
+
+        assert error == {"type": "error", "seq": 2, "status": 503, "detail": "混雑しています"}
+
+    def test_invalid_speaker_id_keeps_session(self):
+        """不正な speaker_id はerrorで返し、受付済みの断片の音声は送る"""
+        release = asyncio.Event()
+
+        async def fake_fragment(text, speaker_id, format_name):
+            await release.wait()
+            return text.encode("utf-8"), False
+
+        with patch('services.speech.ws_session.synthesize_fragment', side_effect=fake_fragment):
+            with TestClient(app).websocket_connect("/ws/tts") as websocket:
+                websocket.send_json({"type": "synthesize", "seq": 1, "text": "a"})
+                websocket.send_json({"type": "synthesize", "seq": 2, "text": "b", "speaker_id": "abc"})
+                first = websocket.receive_json()
+                websocket.send_json({"type": "synthesize", "seq": 3, "text": "b", "speaker_id": None})
+                second = websocket.receive_json()
+                websocket.send_json({"type": "synthesize", "seq": 4, "text": "b", "speaker_id": {"id": 1}})
+                third = websocket.receive_json()
+                websocket.send_json({"type": "synthesize", "seq": 5, "text": "b", "speaker_id": True})
+                fourth = websocket.receive_json()
+                release.set()
+                meta, audio = _receive_audio(websocket)
+
+        assert [e["seq"] for e in (first, second, third, fourth)] == [2, 3, 4, 5]
+        assert all(e["type"] == "error" and e["status"] == 400 for e in (first, second, third, fourth))
+        assert (meta["seq"], audio) == (1, b"a")
+
+    def test_boolean_seq_rejected(self):
+        """seq に true を指定した場合はerrorを返す"""
+        with TestClient(app).websocket_connect("/ws/tts") as websocket:
+            websocket.send_json({"type": "synthesize", "seq": True, "text": "あ"})
+            error = websocket.receive_json()
+
+        assert error["type"] == "error"
+        assert error["status"] == 400
+
+    def test_binary_frame_keeps_session(self):
+        """バイナリフレームはerrorで返し、接続は維持する"""
+        async def fake_fragment(text, speaker_id, format_name):
+            return text.encode("utf-8"), False
+
+        with patch('services.speech.ws_session.synthesize_fragment', side_effect=fake_fragment):
+            with TestClient(app).websocket_connect("/ws/tts") as websocket:
+                websocket.send_bytes(b"\x00\x01")
+                error = websocket.receive_json()
+                websocket.send_json({"type": "synthesize", "seq": 1, "text": "a"})
+                meta, audio = _receive_audio(websocket)
+
+        assert error["type"] == "error"
+        assert error["status"] == 400
+        assert (meta["seq"], audio) == (1, b"a")
+
+    def test_send_failure_is_retrieved(self):
+        """送信ループが例外で終了した場合は、接続の終了時に例外を取り出して記録する"""
+        class FailingWebSocket:
+            application_state = WebSocketState.CONNECTED
+
+            def __init__(self):
+                self.messages = [json.dumps({"type": "synthesize", "seq": 1, "text": "a"})]
+
+            async def accept(self):
+                pass
+
+            async def receive_text(self):
+                if self.messages:
+                    return self.messages.pop()
+                await asyncio.sleep(0.01)
+                raise WebSocketDisconnect()
+
+            async def send_text(self, data):
+                raise RuntimeError("送信できません")
+
+        async def fake_fragment(text, speaker_id, format_name):
+            return text.encode("utf-8"), False
+
+        async def run():
+            with patch('services.speech.ws_session.synthesize_fragment', side_effect=fake_fragment), \
+                    patch('services.speech.ws_session.logger') as logger:
+                await TTSWebSocketSession(FailingWebSocket()).run()
+            return logger
+
+        logger = asyncio.run(run())
+
+        logger.warning.assert_called_once()
+        assert "送信できません" in logger.warning.call_args.args[0]
+
+    def test_audio_frame_follows_its_header(self):
+        """受信側のerrorがaudioメッセージとそのバイナリフレームの間に入らない"""
+        class SlowWebSocket:
+            application_state = WebSocketState.CONNECTED
+
+            def __init__(self):
+                self.sent = []
+                self.sending = asyncio.Event()
+                self.received = 0
+
+            async def accept(self):
+                pass
+
+            async def receive_text(self):
+                self.received += 1
+                if self.received == 1:
+                    return json.dumps({"type": "synthesize", "seq": 1, "text": "a"})
+                if self.received == 2:
+                    # audioメッセージの送信中に不正なメッセージが届く
+                    await self.sending.wait()
+                    return "not json"
+                await asyncio.sleep(0.05)
+                raise WebSocketDisconnect()
+
+            async def send_text(self, data):
+                self.sending.set()
+                await asyncio.sleep(0.01)
+                self.sent.append(json.loads(data)["type"])
+
+            async def send_bytes(self, data):
+                await asyncio.sleep(0.01)
+                self.sent.append("frame")
+
+        async def fake_fragment(text, speaker_id, format_name):
+            return text.encode("utf-8"), False
+
+        websocket = SlowWebSocket()
+
+        async def run():
+            with patch('services.speech.ws_session.synthesize_fragment', side_effect=fake_fragment):
+                await TTSWebSocketSession(websocket).run()
+
+        asyncio.run(run())
+
+        assert websocket.sent == ["audio", "frame", "error"]
@@ -0,0 +1,130 @@
+"""
+口形のタイムラインのテスト
+
+audio_queryのモーラからのタイムラインの算出と、/tts での音声とのキャッシュを確認する。
+"""
+import json
+import pytest
+import httpx
+from unittest.mock import patch
+from fastapi import HTTPException
+
+from services.speech import AivisSpeechClient, AudioCache
+from services.speech.query_cache import QueryCache
+from services.speech.speech_service import text_to_speech
+from services.speech.visemes import build_viseme_timeline, shift_viseme_timeline
+from conftest import make_wav
+
+QUERY = {
+    "accent_phrases": [
+        {
+            "moras": [
+                {"text": "コ", "consonant": "k", "consonant_length": 0.05, "vowel": "o", "vowel_length": 0.1},
+                {"text": "ン", "consonant": None, "consonant_length": None, "vowel": "N", "vowel_length": 0.1},
+            ],
+            "pause_mora": {"text": "、", "vowel": "pau", "vowel_length": 0.2},
+        },
+        {
+            "moras": [
+                {"text": "ッ", "consonant": None, "consonant_length": None, "vowel": "cl", "vowel_length": 0.05},
+                {"text": "シ", "consonant": "sh", "consonant_length": 0.05, "vowel": "I", "vowel_length": 0.1},
+            ],
+            "pause_mora": None,
+        },
+    ],
+    "speedScale": 1.0,
+    "prePhonemeLength": 0.1,
+    "postPhonemeLength": 0.1,
+}
+
+
+class TestBuildVisemeTimeline:
+    """build_viseme_timelineのテスト"""
+
+    def test_from_moras(self):
+        """子音は続く母音の区間に含め、無音・促音は含めない"""
+        assert build_viseme_timeline(QUERY) == [
+            ["o", 100, 250],
+            ["n", 250, 350],
+            ["i", 600, 750],
+        ]
+
+    def test_speed_scale(self):
+        """話速に合わせて区間を縮める"""
+        timeline = build_viseme_timeline({**QUERY, "speedScale": 2.0})
+        assert timeline[0] == ["o", 50, 125]
+
+    def test_scaled_to_audio_duration(self):
+        """音声の長さが分かる場合は全体がその長さになるように伸縮する"""
+        timeline = build_viseme_timeline(QUERY, duration=1.7)
+        assert timeline[-1] == ["i", 1200, 1500]
+
+    def test_shift(self):
+        """先頭を取り除いた分だけ前にずらし、0より前は切り詰める"""
+        assert shift_viseme_timeline([["a", 0, 100], ["o", 100, 200]], 150) == [["o", 0, 50]]
+
+
+class TestTTSVisemes:
+    """text_to_speech でのタイムラインの返却とキャッシュのテスト"""
+
+    @pytest.mark.asyncio
+    async def test_visemes_are_cached_with_audio(self, tmp_path):
+        """タイムラインは合成時に音声と並べてキャッシュされ、2回目はaudio_queryを呼ばない"""
+        calls = {"/audio_query": 0, "/synthesis": 0}
+
+        def handler(request):
+            path = request.url.path
+            calls[path] = calls.get(path, 0) + 1
+            if path == "/audio_query":
+                return httpx.Response(200, json=QUERY)
+            if path == "/synthesis":
+                return httpx.Response(200, content=make_wav(frames=850, sample_rate=1000, sample=b"\x00\x40"))
+            if path == "/version":
+                return httpx.Response(200, json="1.0.0")
+            return httpx.Response(200, json={})
+
+        client = AivisSpeechClient("http://engine.test", transport=httpx.MockTransport(handler))
+        cache = AudioCache(str(tmp_path), memory_budget_bytes=1 << 20, disk_budget_bytes=1 << 20)
+        with patch('services.speech.speech_service.get_aivis_client', return_value=client), \
+             patch('services.speech.speech_service.get_audio_cache', return_value=cache), \
+             patch('services.speech.speech_service.get_query_cache', return_value=QueryCache(16)), \
+             patch('services.speech.speech_service.settings.tts_trim_leading_silence', False):
+            first = await text_to_speech("こんにちは", 1, "base64", include_visemes=True)
+            second = await text_to_speech("こんにちは", 1, "wav", include_visemes=True)
+
+        assert first.visemes == [("o", 100, 250), ("n", 250, 350), ("i", 600, 750)]
+        assert json.loads(second.headers["X-TTS-Visemes"]) == [["o", 100, 250], ["n", 250, 350], ["i", 600, 750]]
+        assert calls["/audio_query"] == 1
+        assert calls["/synthesis"] == 1
+        assert len(list(tmp_path.glob("*.visemes"))) == 1
+        await client.aclose()
+
+    @pytest.mark.asyncio
+    async def test_header_limit(self, tmp_path):
+        """ヘッダーの上限を超えるタイムラインは音声ファイルでは413とし、JSONでは返す"""
+        def handler(request):
+            path = request.url.path
+            if path == "/audio_query":
+                return httpx.Response(200, json=QUERY)
+            if path == "/synthesis":
+                return httpx.Response(200, content=make_wav(frames=850, sample_rate=1000, sample=b"\x00\x40"))
+            if path == "/version":
+                return httpx.Response(200, json="1.0.0")
+            return httpx.Response(200, json={})
+
+        client = AivisSpeechClient("http://engine.test", transport=httpx.MockTransport(handler))
+        cache = AudioCache(str(tmp_path), memory_budget_bytes=1 << 20, disk_budget_bytes=1 << 20)
+        with patch('services.speech.speech_service.get_aivis_client', return_value=client), \
+             patch('services.speech.speech_service.get_audio_cache', return_value=cache), \
+             patch('services.speech.speech_service.get_query_cache', return_value=QueryCache(16)), \
+             patch('services.speech.speech_service.settings.tts_trim_leading_silence', False), \
+             patch('services.speech.speech_service.settings.tts_viseme_header_max_bytes', 32):
+            with pytest.raises(HTTPException) as error:
+                await text_to_speech("こんにちは", 1, "wav", include_visemes=True)
+            response = await text_to_speech("こんにちは", 1, "base64", include_visemes=True)
+            within_limit = await text_to_speech("こんにちは", 1, "wav")
+
+        assert error.value.status_code == 413
+        assert response.visemes == [("o", 100, 250), ("n", 250, 350), ("i", 600, 750)]
+        assert "X-TTS-Visemes" not in within_limit.headers
+        await client.aclose()
@@ -0,0 +1,124 @@
+"""
+WAVユーティリティのテスト
+
+RIFFヘッダーの解析と生成、PCMの連結・切り出し・無音の除去を確認する。
+"""
+import numpy as np
+import pytest
+
+from services.audio import (
+    parse_wav,
+    build_wav_header,
+    pcm_view,
+    pcm_samples,
+    concat_wav,
+    slice_wav,
+    find_sound_bounds,
+    trim_silence,
+)
+from services.audio.wav import STREAMING_CHUNK_SIZE
+from conftest import make_wav
+
+
+class TestParseWav:
+    """parse_wavのテスト"""
+
+    def test_parse_header(self):
+        """フォーマット情報とPCMの位置を取得できる"""
+        data = make_wav(b"\x01\x00" * 100, sample_rate=44100)
+        info = parse_wav(data)
+        assert info.sample_rate == 44100
+        assert info.num_channels == 1
+        assert info.bits_per_sample == 16
+        assert data[info.data_offset:info.data_offset + info.data_size] == b"\x01\x00" * 100
+
+    def test_skips_unknown_chunks(self):
+        """fmtとdataの間にある未知のチャンクを読み飛ばす"""
+        data = make_wav(b"\x00\x00" * 4)
+        info = parse_wav(data)
+        extra = b"LIST" + (3).to_bytes(4, "little") + b"abc\x00"
+        patched = data[:info.data_offset - 8] + extra + data[info.data_offset - 8:]
+        assert parse_wav(patched).data_size == 8
+
+    def test_invalid_data(self):
+        """WAVでないデータはValueErrorになる"""
+        with pytest.raises(ValueError):
+            parse_wav(b"not a wav file")
+
+
+class TestBuildWavHeader:
+    """build_wav_headerのテスト"""
+
+    def test_roundtrip(self):
+        """生成したヘッダーとPCMを再解析できる"""
+        pcm = b"\x02\x00" * 50
+        info = parse_wav(make_wav(pcm))
+        rebuilt = build_wav_header(info, len(pcm)) + pcm
+        assert rebuilt == make_wav(pcm)
+
+    def test_streaming_header(self):
+        """長さ未確定のヘッダーはストリーミング用のサイズ値になる"""
+        info = parse_wav(make_wav(b""))
+        header = build_wav_header(info, None)
+        assert len(header) == 44
+        assert int.from_bytes(header[40:44], "little") == STREAMING_CHUNK_SIZE
+
+
+def make_tone(amplitudes) -> bytes:
+    """各値を10ミリ秒（240サンプル）ずつ並べた16bit PCMのWAVを生成する"""
+    samples = np.repeat(np.asarray(amplitudes, dtype="<i2"), 240)
+    return make_wav(samples.tobytes())
+
+
+class TestPcmViews:
+    """pcm_view / pcm_samplesのテスト"""
+
+    def test_views_do_not_copy(self):
+        """PCMはコピーせずに参照される"""
+        data = make_wav(b"\x01\x00\x02\x00" * 3, channels=2)
+        samples = pcm_samples(data)
+        assert samples.shape == (3, 2)
+        assert samples[0].tolist() == [1, 2]
+        assert np.shares_memory(samples, np.frombuffer(data, dtype="u1"))
+        assert bytes(pcm_view(data)) == b"\x01\x00\x02\x00" * 3
+
+
+class TestConcatAndSlice:
+    """concat_wav / slice_wavのテスト"""
+
+    def test_concat(self):
+        """PCMを結合し、ヘッダーのサイズを書き換える"""
+        joined = concat_wav([make_wav(b"\x01\x00" * 2), make_wav(b"\x02\x00" * 3)])
+        assert joined == make_wav(b"\x01\x00" * 2 + b"\x02\x00" * 3)
+
+    def test_concat_format_mismatch(self):
+        """フォーマットが異なる場合はValueErrorになる"""
+        with pytest.raises(ValueError):
+            concat_wav([make_wav(b"\x00\x00"), make_wav(b"\x00\x00", sample_rate=44100)])
+
+    def test_slice(self):
+        """時間で切り出す"""
+        data = make_tone([1, 2, 3])
+        sliced = slice_wav(data, 0.01, 0.02)
+        assert pcm_samples(sliced)[:, 0].tolist() == [2] * 240
+        assert parse_wav(slice_wav(data, 0.025)).num_frames == 120
+
+
+class TestTrimSilence:
+    """trim_silenceのテスト"""
+
+    def test_find_sound_bounds(self):
+        """閾値を超える区間を窓単位で求める"""
+        data = make_tone([0, 0, 8000, 8000, 0])
+        assert find_sound_bounds(data) == (480, 960)
+
+    def test_trim_leading_only(self):
+        """先頭の無音のみを取り除き、余白を残す"""
+        data = make_tone([0, 0, 0, 8000, 0, 0])
+        trimmed = trim_silence(data, padding_ms=10.0, trailing=False)
+        assert parse_wav(trimmed).num_frames == 240 * 4
+
+    def test_all_silent(self):
+        """全体が無音の場合は元のまま返す"""
+        data = make_tone([0, 0])
+        assert trim_silence(data) is data